@@ -0,0 +1,124 @@
+﻿'''bench_apply_oto
+| Ust.apply_oto_allと、各ノートのNote.apply_otoを順に実行する方法の時間を比較します。
+| 両者の結果が一致することも確認します。
+| 原音設定とprefix.mapは、3音階の多音階音源を模して一時フォルダに生成します。
+
+    >>> python benchmarks/bench_apply_oto.py --notes 10000
+'''
+
+import os
+import os.path
+import sys
+import gc
+import time
+import random
+import argparse
+import logging
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from projects.Ust import Ust
+from voicebank import VoiceBank
+import common.convert_notenum as convert_notenum
+from bench_ust import make_lines, note_state
+
+
+LYRICS: list = ["あ", "い", "う", "え", "お", "か", "き", "く", "け", "こ", "さ", "し", "す", "せ", "そ", "R"]
+SUFFIXES: list = ["_L", "_M", "_H"]
+
+
+def make_vb(dirpath: str, logger: logging.Logger) -> VoiceBank:
+    '''
+    dirpathに原音設定とprefix.mapを書き込み、音源として読み込みます。
+
+    Parameters
+    ----------
+    dirpath: str
+        音源のルートパス
+
+    logger: logging.Logger
+
+    Returns
+    -------
+    vb: VoiceBank
+    '''
+    with open(os.path.join(dirpath, "character.txt"), "w", encoding="cp932") as fw:
+        fw.write("name=bench\r\n")
+    for suffix in SUFFIXES:
+        os.makedirs(os.path.join(dirpath, suffix[1:]), exist_ok=True)
+        with open(os.path.join(dirpath, suffix[1:], "oto.ini"), "w", encoding="cp932") as fw:
+            for i, lyric in enumerate(LYRICS):
+                fw.write("{}.wav={},100,300,-500,{},{}\r\n".format(i, lyric + suffix, 50 + i * 10, 20 + i))
+    with open(os.path.join(dirpath, "prefix.map"), "w", encoding="cp932") as fw:
+        for notenum in range(24, 108):
+            fw.write("{}\t\t{}\r\n".format(convert_notenum.toStr(notenum), SUFFIXES[min(max((notenum - 48) // 12, 0), 2)]))
+    return VoiceBank(dirpath, logger=logger)
+
+
+def make_ust(lines: list, notes: int, logger: logging.Logger) -> Ust:
+    '''
+    linesを読み込み、歌詞と音高を乱数で変えたUstを生成します。
+
+    Parameters
+    ----------
+    lines: list of str
+        ノート部分
+
+    notes: int
+        ノート数
+
+    logger: logging.Logger
+
+    Returns
+    -------
+    ust: Ust
+    '''
+    ust: Ust = Ust("bench.ust", logger=logger)
+    ust._load_note_helper(lines)
+    rnd: random.Random = random.Random(notes)
+    for i, note in enumerate(ust.notes):
+        note.lyric.value = rnd.choice(LYRICS)
+        note.notenum.value = rnd.randint(48, 84)
+        if i != 0:
+            note.prev = ust.notes[i - 1]
+            ust.notes[i - 1].next = note
+    return ust
+
+
+def main():
+    parser = argparse.ArgumentParser(description="apply_oto_allのベンチマーク")
+    parser.add_argument("--notes", type=int, default=10000, help="ノート数")
+    parser.add_argument("--repeat", type=int, default=5, help="計測回数")
+    args = parser.parse_args()
+    # UTAUが出力した@alias等は除き、エイリアスを原音設定から特定させる
+    lines: list = [line for line in make_lines(args.notes) if not line.startswith("@")]
+    logger: logging.Logger = logging.getLogger("bench_apply_oto")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    tempdir: tempfile.TemporaryDirectory = tempfile.TemporaryDirectory()
+    vb: VoiceBank = make_vb(tempdir.name, logger)
+
+    def per_note(ust: Ust):
+        for note in ust.notes:
+            note.apply_oto(vb.oto, vb.prefix)
+
+    results: dict = {}
+    for name, func in [("apply_oto", per_note), ("apply_oto_all", lambda ust: ust.apply_oto_all(vb))]:
+        seconds: list = []
+        for i in range(args.repeat):
+            ust: Ust = make_ust(lines, args.notes, logger)
+            gc.collect()
+            start: float = time.perf_counter()
+            func(ust)
+            seconds.append(time.perf_counter() - start)
+        results[name] = [note_state(note) for note in ust.notes]
+        print("{}: {:.4f} s".format(name, min(seconds)))
+    print("notes: {}".format(args.notes))
+    print("identical: {}".format(results["apply_oto"] == results["apply_oto_all"]))
+    print("alias cache: hits {}, misses {}".format(vb.alias_hits, vb.alias_misses))
+    tempdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
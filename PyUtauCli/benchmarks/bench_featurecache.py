@@ -0,0 +1,86 @@
+﻿'''bench_featurecache
+| 同じ原音を使用するノートのresampを、FeatureCacheを使用しない場合と使用する場合で比較します。
+| 両方の方法で生成したキャッシュファイルが一致することも確認します。
+
+    >>> python benchmarks/bench_featurecache.py --notes 20 --aliases 4
+'''
+
+import os
+import os.path
+import sys
+import time
+import wave
+import shutil
+import tempfile
+import argparse
+import logging
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from projects.Render import FastResamp
+from projects.FeatureCache import FeatureCache
+
+
+def write_wav(path: str, frequency: float, seconds: float):
+    t: np.ndarray = np.arange(int(44100 * seconds)) / 44100
+    with wave.open(path, "wb") as ww:
+        ww.setnchannels(1)
+        ww.setsampwidth(2)
+        ww.setframerate(44100)
+        ww.writeframes((0.5 * np.sin(2 * np.pi * frequency * t) * 32767).astype("<i2").tobytes())
+
+
+def run(paths: list, cache_dir: str, notes: int, logger: logging.Logger, feature_cache: FeatureCache = None) -> float:
+    start: float = time.perf_counter()
+    for i in range(notes):
+        resamp: FastResamp = FastResamp(paths[i % len(paths)], os.path.join(cache_dir, "{}.wav".format(i)),
+                                        ["C4", "D4", "E4", "G4"][i % 4], 100, "", 0, 300 + (i % 3) * 100, 100, 0,
+                                        logger=logger)
+        if feature_cache is not None:
+            feature_cache.attach(resamp)
+        resamp.resamp()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FeatureCacheのベンチマーク")
+    parser.add_argument("--notes", type=int, default=20, help="ノート数")
+    parser.add_argument("--aliases", type=int, default=4, help="原音の数")
+    parser.add_argument("--seconds", type=float, default=1.0, help="原音の長さ(秒)")
+    args = parser.parse_args()
+    logger: logging.Logger = logging.getLogger("bench_featurecache")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    root: str = tempfile.mkdtemp()
+    try:
+        paths: list = [os.path.join(root, "{}.wav".format(i)) for i in range(args.aliases)]
+        for i, path in enumerate(paths):
+            write_wav(path, 200 + i * 20, args.seconds)
+        for name in ["plain", "cached"]:
+            os.makedirs(os.path.join(root, name))
+        # _wav.frqの生成を計測から除く
+        run(paths, os.path.join(root, "plain"), len(paths), logger)
+        plain_sec: float = run(paths, os.path.join(root, "plain"), args.notes, logger)
+        feature_cache: FeatureCache = FeatureCache(os.path.join(root, "features"), logger=logger)
+        cached_sec: float = run(paths, os.path.join(root, "cached"), args.notes, logger, feature_cache)
+        identical: bool = True
+        for i in range(args.notes):
+            with open(os.path.join(root, "plain", "{}.wav".format(i)), "rb") as fr1:
+                with open(os.path.join(root, "cached", "{}.wav".format(i)), "rb") as fr2:
+                    identical = identical and fr1.read() == fr2.read()
+        feature_cache.close()
+    finally:
+        shutil.rmtree(root)
+
+    print("notes: {}, aliases: {}".format(args.notes, args.aliases))
+    print("plain : {:.4f} s".format(plain_sec))
+    print("cached: {:.4f} s ({:.1f}x) hits: {}, misses: {}, identical: {}".format(
+        cached_sec, plain_sec / cached_sec, feature_cache.hits, feature_cache.misses, identical))
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+﻿'''bench_frq
+| 複数のwavのfrqを生成する処理を、f0の推定方法ごとに比較します。
+| 振幅の計算は、変更前の1フレームずつ平均する方法とも比較し、結果が一致することを確認します。
+
+    >>> python benchmarks/bench_frq.py --files 20 --seconds 2
+'''
+
+import os
+import os.path
+import sys
+import time
+import wave
+import shutil
+import tempfile
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from voicebank.frq import Frq, F0_METHODS
+
+
+def write_wav(path: str, frequency: float, seconds: float, seed: int):
+    t: np.ndarray = np.arange(int(44100 * seconds)) / 44100
+    frequencies: np.ndarray = frequency * (1 + 0.05 * np.sin(2 * np.pi * 5 * t))
+    phase: np.ndarray = 2 * np.pi * np.cumsum(frequencies) / 44100
+    data: np.ndarray = sum([np.sin(k * phase) / k for k in range(1, 8)]) * 0.2
+    data += np.random.RandomState(seed).randn(data.shape[0]) * 0.01
+    with wave.open(path, "wb") as ww:
+        ww.setnchannels(1)
+        ww.setsampwidth(2)
+        ww.setframerate(44100)
+        ww.writeframes((data * 32767).astype("<i2").tobytes())
+
+
+def loop_amp(datas: np.ndarray, frames: int) -> np.ndarray:
+    '''
+    比較用の、1フレームずつ平均する変更前の方法。
+    '''
+    amp: np.ndarray = np.zeros(frames)
+    for i in range(frames):
+        amp[i] = np.average(np.abs(datas[i * 256:(i + 1) * 256]))
+    return amp
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Frq.makeのベンチマーク")
+    parser.add_argument("--files", type=int, default=20, help="wavの数")
+    parser.add_argument("--seconds", type=float, default=2.0, help="wavの長さ(秒)")
+    args = parser.parse_args()
+    root: str = tempfile.mkdtemp()
+    try:
+        paths: list = [os.path.join(root, "{}.wav".format(i)) for i in range(args.files)]
+        for i, path in enumerate(paths):
+            write_wav(path, 150 + i * 10, args.seconds, i)
+        print("files: {}, seconds: {}".format(args.files, args.seconds))
+
+        results: dict = {}
+        for f0_method in F0_METHODS:
+            start: float = time.perf_counter()
+            results[f0_method] = []
+            for path in paths:
+                frq: Frq = Frq()
+                frq.make(path, f0_method)
+                results[f0_method].append(frq.f0)
+            results[f0_method + "_sec"] = time.perf_counter() - start
+        for f0_method in F0_METHODS:
+            cents: list = []
+            for base, f0 in zip(results["harvest"], results[f0_method]):
+                voiced: np.ndarray = (base > 0) & (f0 > 0)
+                cents.append(np.abs(1200 * np.log2(f0[voiced] / base[voiced])))
+            cents_all: np.ndarray = np.concatenate(cents)
+            print("{:8}: {:.4f} s ({:.1f}x) diff from harvest mean {:.1f} cent, p95 {:.1f} cent".format(
+                f0_method, results[f0_method + "_sec"], results["harvest_sec"] / results[f0_method + "_sec"],
+                cents_all.mean(), np.percentile(cents_all, 95)))
+
+        datas, framerate = Frq()._wave_load(paths[0])
+        frames: int = datas.shape[0] // 256 + 1
+        start = time.perf_counter()
+        expected: np.ndarray = loop_amp(datas, frames)
+        loop_sec: float = time.perf_counter() - start
+        start = time.perf_counter()
+        actual: np.ndarray = Frq._get_amp(datas, frames)
+        vector_sec: float = time.perf_counter() - start
+        identical: bool = bool(np.allclose(np.nan_to_num(expected), actual))
+        print("amp loop  : {:.6f} s".format(loop_sec))
+        print("amp vector: {:.6f} s ({:.1f}x) identical: {}".format(vector_sec, loop_sec / vector_sec, identical))
+    finally:
+        shutil.rmtree(root)
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+﻿'''bench_note_memory
+| NoteとEntryの1ノートあたりのメモリ使用量と生成時間を計測します。
+| 空のNoteと、ustから読み込んだNoteの両方を計測します。
+
+    >>> python benchmarks/bench_note_memory.py --notes 10000
+'''
+
+import os
+import os.path
+import sys
+import gc
+import time
+import argparse
+import logging
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from projects.Ust import Ust
+from projects.Note import Note
+from bench_ust import make_lines
+
+
+def measure(func, notes: int) -> tuple:
+    '''
+    funcを実行し、保持されたメモリと時間を計測します。
+
+    Parameters
+    ----------
+    func: function
+        Noteのリストを返す関数
+
+    notes: int
+        ノート数
+
+    Returns
+    -------
+    bytes_per_note: float
+        funcの戻り値が保持している、1ノートあたりのメモリ(byte)
+
+    seconds: float
+        funcの実行時間(秒)
+    '''
+    gc.collect()
+    start: float = time.perf_counter()
+    func()
+    seconds: float = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    result: list = func()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current / notes, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Noteのメモリ使用量のベンチマーク")
+    parser.add_argument("--notes", type=int, default=10000, help="ノート数")
+    args = parser.parse_args()
+    lines: list = make_lines(args.notes)
+    logger: logging.Logger = logging.getLogger("bench_note_memory")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    def load() -> list:
+        ust: Ust = Ust("bench.ust", logger=logger)
+        ust._load_note_helper(lines)
+        return ust.notes
+
+    empty_bytes, empty_sec = measure(lambda: [Note() for i in range(args.notes)], args.notes)
+    loaded_bytes, loaded_sec = measure(load, args.notes)
+    print("notes: {}".format(args.notes))
+    print("Note(): {:.0f} bytes/note, {:.3f} s".format(empty_bytes, empty_sec))
+    print("loaded: {:.0f} bytes/note, {:.3f} s".format(loaded_bytes, loaded_sec))
+
+
+if __name__ == "__main__":
+    main()
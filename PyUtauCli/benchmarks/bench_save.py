@@ -0,0 +1,217 @@
+﻿'''bench_save
+| Ust.saveとUtauPlugin.saveの書込速度を、パラメータごとにwriteしていた以前の実装と比較します。
+| 両方の実装で書き込んだファイルがバイト単位で一致することも確認します。
+
+    >>> python benchmarks/bench_save.py --notes 10000 --repeat 5
+'''
+
+import os
+import os.path
+import sys
+import gc
+import time
+import argparse
+import logging
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from projects.Ust import Ust
+from projects.UtauPlugin import UtauPlugin
+from bench_ust import make_lines
+
+
+def legacy_ust_save(ust: Ust, filepath: str, encoding: str = "cp932"):
+    '''
+    比較用の、以前のUst.saveの書込部分。
+    '''
+    with open(filepath, "w", encoding=encoding) as fw:
+        fw.write("[#VERSION]\n")
+        fw.write("UST Version{:.1f}\n".format(ust.version))
+        fw.write("[#SETTING]\n")
+        fw.write("Tempo={:.2f}\n".format(ust.tempo))
+        fw.write("Tracks=1\n")
+        fw.write("Project={}\n".format(ust.project_name))
+        fw.write("VoiceDir={}\n".format(ust.voice_dir))
+        fw.write("OutFile={}\n".format(ust.output_file))
+        fw.write("CacheDir={}\n".format(ust.cache_dir))
+        fw.write("Tool1={}\n".format(ust.wavtool))
+        fw.write("Tool2={}\n".format(ust.resamp))
+        fw.write("Flags={}\n".format(ust.flags))
+        fw.write("Mode2={}\n".format(ust.mode2))
+        for note in ust.notes:
+            fw.write("[{}]\n".format(str(note.num)))
+            fw.write("Length={}\n".format(str(note.length)))
+            fw.write("Lyric={}\n".format(str(note.lyric)))
+            fw.write("NoteNum={}\n".format(str(note.notenum.value)))
+            if note.tempo.hasValue:
+                fw.write("Tempo={}\n".format(str(note.tempo)))
+            if note.pre.hasValue:
+                fw.write("PreUtterance={}\n".format(str(note.pre)))
+            else:
+                fw.write("PreUtterance=\n")
+            if note.ove.hasValue:
+                fw.write("VoiceOverlap={}\n".format(str(note.ove)))
+            if note.stp.hasValue:
+                fw.write("StartPoint={}\n".format(str(note.stp)))
+            if note.velocity.hasValue:
+                fw.write("Velocity={}\n".format(str(note.velocity)))
+            if note.intensity.hasValue:
+                fw.write("Intensity={}\n".format(str(note.intensity)))
+            if note.modulation.hasValue:
+                fw.write("Modulation={}\n".format(str(note.modulation)))
+            if note.pitches.hasValue:
+                fw.write("PitchBend={}\n".format(str(note.pitches)))
+            if note.pbStart.hasValue:
+                fw.write("PBStart={}\n".format(str(note.pbStart)))
+            if note.pbs.hasValue:
+                fw.write("PBS={}\n".format(str(note.pbs)))
+            if note.pby.hasValue:
+                fw.write("PBY={}\n".format(str(note.pby)))
+            if note.pbm.hasValue:
+                fw.write("PBM={}\n".format(str(note.pbm)))
+            if note.pbw.hasValue:
+                fw.write("PBW={}\n".format(str(note.pbw)))
+            if note.flags.hasValue:
+                fw.write("Flags={}\n".format(str(note.flags)))
+            if note.vibrato.hasValue:
+                fw.write("VBR={}\n".format(str(note.vibrato)))
+            if note.envelope.hasValue:
+                fw.write("Envelope={}\n".format(str(note.envelope)))
+            if note.label.hasValue:
+                fw.write("Label={}\n".format(str(note.label)))
+            if note.direct.hasValue:
+                fw.write("$direct={}\n".format(str(note.direct)))
+            if note.region.hasValue:
+                fw.write("$region={}\n".format(str(note.region)))
+            if note.region_end.hasValue:
+                fw.write("$region_end={}\n".format(str(note.region_end)))
+        fw.write("[#TRACKEND]\n")
+
+
+def legacy_plugin_save(plugin: UtauPlugin, filepath: str, encoding: str = "cp932"):
+    '''
+    比較用の、以前のUtauPlugin.saveの書込部分。
+    '''
+    with open(filepath, "w", encoding=encoding) as fw:
+        for note in plugin.notes:
+            fw.write("[{}]\n".format(str(note.num)))
+            if note.num.value == "#DELETE":
+                continue
+            if note.length.hasValue and note.length.isUpdate:
+                fw.write("Length={}\n".format(str(note.length)))
+            if note.lyric.hasValue and note.lyric.isUpdate:
+                fw.write("Lyric={}\n".format(str(note.lyric)))
+            if note.notenum.hasValue and note.notenum.isUpdate:
+                fw.write("NoteNum={}\n".format(str(note.notenum.value)))
+            if note.tempo.hasValue and note.tempo.isUpdate:
+                fw.write("Tempo={}\n".format(str(note.tempo)))
+            if note.pre.hasValue and note.pre.isUpdate:
+                fw.write("PreUtterance={}\n".format(str(note.pre)))
+            if note.ove.hasValue and note.ove.isUpdate:
+                fw.write("VoiceOverlap={}\n".format(str(note.ove)))
+            if note.stp.hasValue and note.stp.isUpdate:
+                fw.write("StartPoint={}\n".format(str(note.stp)))
+            if note.velocity.hasValue and note.velocity.isUpdate:
+                fw.write("Velocity={}\n".format(str(note.velocity)))
+            if note.intensity.hasValue and note.intensity.isUpdate:
+                fw.write("Intensity={}\n".format(str(note.intensity)))
+            if note.modulation.hasValue and note.modulation.isUpdate:
+                fw.write("Modulation={}\n".format(str(note.modulation)))
+            if note.pitches.hasValue and note.pitches.isUpdate:
+                fw.write("Pitches={}\n".format(str(note.pitches)))
+            if note.pbStart.hasValue and note.pbStart.isUpdate:
+                fw.write("PBStart={}\n".format(str(note.pbStart)))
+            if note.pbs.hasValue and note.pbs.isUpdate:
+                fw.write("PBS={}\n".format(str(note.pbs)))
+            if note.pby.hasValue and note.pby.isUpdate:
+                fw.write("PBY={}\n".format(str(note.pby)))
+            if note.pbm.hasValue and note.pbm.isUpdate:
+                fw.write("PBM={}\n".format(str(note.pbm)))
+            if note.pbw.hasValue and note.pbw.isUpdate:
+                fw.write("PBW={}\n".format(str(note.pbw)))
+            if note.flags.hasValue and note.flags.isUpdate:
+                fw.write("Flags={}\n".format(str(note.flags)))
+            if note.vibrato.hasValue and note.vibrato.isUpdate:
+                fw.write("VBR={}\n".format(str(note.vibrato)))
+            if note.envelope.hasValue and note.envelope.isUpdate:
+                fw.write("Envelope={}\n".format(str(note.envelope)))
+            if note.label.hasValue and note.label.isUpdate:
+                fw.write("Label={}\n".format(str(note.label)))
+            if note.direct.hasValue and note.direct.isUpdate:
+                fw.write("$direct={}\n".format(str(note.direct)))
+            if note.region.hasValue and note.region.isUpdate:
+                fw.write("$region={}\n".format(str(note.region)))
+            if note.region_end.hasValue and note.region_end.isUpdate:
+                fw.write("$region_end={}\n".format(str(note.region_end)))
+
+
+def measure(func, repeat: int) -> float:
+    '''
+    funcの実行時間を計測します。
+
+    Parameters
+    ----------
+    func: function
+        引数をとらない書込関数
+
+    repeat: int
+        計測回数
+
+    Returns
+    -------
+    seconds: float
+        最も速かった回の秒数
+    '''
+    best: float = float("inf")
+    for i in range(repeat):
+        gc.collect()
+        start: float = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def read_bytes(filepath: str) -> bytes:
+    with open(filepath, "rb") as fr:
+        return fr.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ust.saveとUtauPlugin.saveのベンチマーク")
+    parser.add_argument("--notes", type=int, default=10000, help="ノート数")
+    parser.add_argument("--repeat", type=int, default=5, help="計測回数")
+    args = parser.parse_args()
+    lines: list = make_lines(args.notes)
+    logger: logging.Logger = logging.getLogger("bench_save")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    ust: Ust = Ust("bench.ust", logger=logger)
+    ust._load_note_helper(lines)
+    plugin: UtauPlugin = UtauPlugin("bench.tmp", logger=logger)
+    plugin._load_note_helper(lines)
+    # プラグインが4ノートに1つの歌詞と長さを変更した場合を想定する
+    for note in plugin.notes[::4]:
+        note.lyric.value = "い"
+        note.length.value = 240
+    identical: bool = True
+    with tempfile.TemporaryDirectory() as tempdir:
+        print("notes: {}".format(args.notes))
+        for name, target, legacy in [("ust", ust, legacy_ust_save), ("plugin", plugin, legacy_plugin_save)]:
+            legacy_path: str = os.path.join(tempdir, name + "_legacy")
+            target.filepath = os.path.join(tempdir, name)
+            legacy_sec: float = measure(lambda: legacy(target, legacy_path), args.repeat)
+            save_sec: float = measure(target.save, args.repeat)
+            same: bool = read_bytes(legacy_path) == read_bytes(target.filepath)
+            identical = identical and same
+            print("{} legacy: {:.3f} s".format(name, legacy_sec))
+            print("{} save  : {:.3f} s ({:.1f}x) identical: {}".format(name, save_sec, legacy_sec / save_sec, same))
+        dirty_sec: float = measure(lambda: plugin.save(dirty_only=True), args.repeat)
+        print("plugin dirty_only: {:.3f} s, {} bytes / {} bytes".format(
+            dirty_sec, os.path.getsize(plugin.filepath), os.path.getsize(os.path.join(tempdir, "plugin_legacy"))))
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
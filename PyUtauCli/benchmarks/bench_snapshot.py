@@ -0,0 +1,90 @@
+﻿'''bench_snapshot
+| Ust.loadとUst.from_snapshotの読込速度を比較します。
+| 両方の方法で読み込んだNoteの全パラメータが一致することも確認します。
+
+    >>> python benchmarks/bench_snapshot.py --notes 10000 --repeat 5
+'''
+
+import os
+import os.path
+import sys
+import gc
+import time
+import argparse
+import logging
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from projects.Ust import Ust
+from bench_ust import make_lines, note_state
+
+
+HEADER: str = "[#VERSION]\nUST Version1.2\n[#SETTING]\nTempo=120.00\nTracks=1\nProject=bench\n" \
+              "VoiceDir=\nOutFile=output.wav\nCacheDir=bench.cache\nTool1=wavtool.exe\nTool2=resamp.exe\nFlags=\nMode2=True\n"
+'''ベンチマークに使用するustのヘッダ'''
+
+
+def measure(func, repeat: int) -> tuple:
+    '''
+    funcの実行時間を計測します。
+
+    Parameters
+    ----------
+    func: function
+        引数をとらず、読み込んだUstを返す関数
+
+    repeat: int
+        計測回数
+
+    Returns
+    -------
+    seconds: float
+        最も速かった回の秒数
+
+    ust: Ust
+        最後に読み込んだUst
+    '''
+    best: float = float("inf")
+    ust: Ust = None
+    for i in range(repeat):
+        ust = None
+        gc.collect()
+        start: float = time.perf_counter()
+        ust = func()
+        best = min(best, time.perf_counter() - start)
+    return best, ust
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ust.from_snapshotのベンチマーク")
+    parser.add_argument("--notes", type=int, default=10000, help="ノート数")
+    parser.add_argument("--repeat", type=int, default=5, help="計測回数")
+    args = parser.parse_args()
+    logger: logging.Logger = logging.getLogger("bench_snapshot")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    with tempfile.TemporaryDirectory() as tempdir:
+        filepath: str = os.path.join(tempdir, "bench.ust")
+        with open(filepath, "w", encoding="cp932") as fw:
+            fw.write(HEADER)
+            fw.write("\n".join(make_lines(args.notes)) + "\n")
+
+        def load() -> Ust:
+            ust: Ust = Ust(filepath, logger=logger)
+            ust.load()
+            return ust
+        load_sec, loaded = measure(load, args.repeat)
+        data: bytes = loaded.to_snapshot()
+        snapshot_sec, restored = measure(lambda: Ust.from_snapshot(data, logger=logger), args.repeat)
+        identical: bool = [note_state(note) for note in loaded.notes] == [note_state(note) for note in restored.notes]
+        print("notes: {}".format(args.notes))
+        print("ust     : {} bytes, snapshot: {} bytes".format(os.path.getsize(filepath), len(data)))
+        print("load    : {:.3f} s".format(load_sec))
+        print("snapshot: {:.3f} s ({:.1f}x) identical: {}".format(snapshot_sec, load_sec / snapshot_sec, identical))
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
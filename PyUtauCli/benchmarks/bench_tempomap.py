@@ -0,0 +1,69 @@
+﻿'''bench_tempomap
+| 時刻から発音中のノートを求める処理を、ノートを先頭からたどる方法とTempoMapで比較します。
+| 両方の方法で求めたノートの位置が一致することも確認します。
+
+    >>> python benchmarks/bench_tempomap.py --notes 10000 --queries 200
+'''
+
+import os
+import os.path
+import sys
+import time
+import random
+import argparse
+import logging
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from projects.Ust import Ust
+from bench_ust import make_lines
+
+
+def linear_note_at(ust: Ust, ms: float) -> int:
+    '''
+    比較用の、ノートを先頭からたどってmsの時点のノートを求める方法。
+    '''
+    start: float = 0
+    for i, note in enumerate(ust.notes):
+        end: float = start + note.msLength
+        if start <= ms < end:
+            return i
+        start = end
+    return -1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TempoMapのベンチマーク")
+    parser.add_argument("--notes", type=int, default=10000, help="ノート数")
+    parser.add_argument("--queries", type=int, default=200, help="検索回数")
+    args = parser.parse_args()
+    logger: logging.Logger = logging.getLogger("bench_tempomap")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    ust: Ust = Ust("bench.ust", logger=logger)
+    ust._load_note_helper(make_lines(args.notes))
+    start: float = time.perf_counter()
+    total_ms: float = ust.tempo_map.total_ms()
+    build_sec: float = time.perf_counter() - start
+    queries: list = [random.Random(i).uniform(0, total_ms) for i in range(args.queries)]
+
+    start = time.perf_counter()
+    expected: list = [linear_note_at(ust, ms) for ms in queries]
+    linear_sec: float = time.perf_counter() - start
+    start = time.perf_counter()
+    actual: list = [ust.tempo_map.note_at(ms) for ms in queries]
+    map_sec: float = time.perf_counter() - start
+    start = time.perf_counter()
+    ust.tempo_map.set_length(args.notes // 2, 240)
+    update_sec: float = time.perf_counter() - start
+
+    print("notes: {}, queries: {}".format(args.notes, args.queries))
+    print("linear  : {:.4f} s".format(linear_sec))
+    print("tempomap: {:.4f} s ({:.1f}x) identical: {}".format(map_sec, linear_sec / map_sec, expected == actual))
+    print("build   : {:.4f} s, set_length: {:.6f} s".format(build_sec, update_sec))
+    if expected != actual:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
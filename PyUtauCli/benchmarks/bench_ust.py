@@ -0,0 +1,353 @@
+﻿'''bench_ust
+| Ust._load_note_helperの読込速度を、startswithを連ねていた以前の実装と比較します。
+| 両方の実装で読み込んだNoteの全パラメータが一致することも確認します。
+
+    >>> python benchmarks/bench_ust.py --notes 10000 --repeat 5
+'''
+
+import os
+import os.path
+import sys
+import gc
+import time
+import argparse
+import logging
+import traceback
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from projects.Ust import Ust
+from projects.Note import Note
+
+
+NOTE_LINES: list = ["Length=480",
+                    "Lyric=あ",
+                    "NoteNum=60",
+                    "PreUtterance=",
+                    "VoiceOverlap=5",
+                    "Intensity=100",
+                    "Modulation=0",
+                    "StartPoint=0",
+                    "PBS=-40;0",
+                    "PBW=80",
+                    "PBY=",
+                    "PBM=",
+                    "Envelope=5,35,0,100,100,100,100",
+                    "Flags=",
+                    "VBR=65,180,35,20,20,0,0,0",
+                    "Label=",
+                    "@preuttr=10",
+                    "@overlap=5",
+                    "@stpoint=0",
+                    "@filename=a.wav",
+                    "@alias=あ",
+                    ]
+'''UTAUで保存したustに近い、1ノート分のパラメータ'''
+
+
+def legacy_load_note_helper(self: Ust, lines: list):
+    '''
+    | 比較用の、以前のUst._load_note_helper。
+    | 各行をline.startswithで順に判定します。
+    '''
+    tempo: float = self.tempo
+    note: Note = None
+    for line in lines:
+        if line == "[#TRACKEND]":
+            continue
+        elif line.startswith("[#"):
+            self.notes.append(Note())
+            note = self.notes[-1]
+            note.num.init(line.replace("[", "").replace("]", ""))
+            note.tempo.init(tempo)
+            note.tempo.hasValue = False
+            note.flags.init(self.flags)
+            note.flags.hasValue = False
+        elif line.startswith("Length"):
+            try:
+                note.length.init(line.replace("Length=", ""))
+            except Exception as e:
+                note.length.init(480)
+                self.logger.warn("{} length can't init. because {}".format(note.num.value,
+                                                                           traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("Lyric"):
+            try:
+                note.lyric.init(line.replace("Lyric=", ""))
+            except Exception as e:
+                note.lyric.init("あ")
+                self.logger.warn("{} lyric can't init. because {}".format(note.num.value,
+                                                                          traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("NoteNum"):
+            try:
+                note.notenum.init(line.replace("NoteNum=", ""))
+            except Exception as e:
+                note.notenum.init(60)
+                self.logger.warn("{} notenum can't init. because {}".format(note.num.value,
+                                                                            traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("Tempo"):
+            try:
+                note.tempo.init(line.replace("Tempo=", ""))
+                tempo = note.tempo.value
+            except Exception as e:
+                self.logger.warn("{} tempo can't init. because {}".format(note.num.value,
+                                                                          traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("PreUtterance"):
+            try:
+                if line.replace("PreUtterance=", "") != "":
+                    note.pre.init(line.replace("PreUtterance=", ""))
+            except Exception as e:
+                self.logger.warn("{} pre can't init. because {}".format(note.num.value,
+                                                                        traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("@preuttr"):
+            try:
+                note.atPre.init(line.replace("@preuttr=", ""))
+            except Exception as e:
+                self.logger.warn("{} @preuttr can't init. because {}".format(note.num.value,
+                                                                             traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("VoiceOverlap"):
+            try:
+                note.ove.init(line.replace("VoiceOverlap=", ""))
+            except Exception as e:
+                self.logger.warn("{} ove can't init. because {}".format(note.num.value,
+                                                                        traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("@overlap"):
+            try:
+                note.atOve.init(line.replace("@overlap=", ""))
+            except Exception as e:
+                self.logger.warn("{} @overlap can't init. because {}".format(note.num.value,
+                                                                             traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("StartPoint"):
+            try:
+                note.stp.init(line.replace("StartPoint=", ""))
+            except Exception as e:
+                self.logger.warn("{} stp can't init. because {}".format(note.num.value,
+                                                                        traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("@stpoint"):
+            try:
+                note.atStp.init(line.replace("@stpoint=", ""))
+            except Exception as e:
+                self.logger.warn("{} @stpoint can't init. because {}".format(note.num.value,
+                                                                             traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("@filename"):
+            try:
+                note.atFileName.init(line.replace("@filename=", ""))
+            except Exception as e:
+                self.logger.warn("{} @filename can't init. because {}".format(note.num.value,
+                                                                              traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("@alias"):
+            try:
+                note.atAlias.init(line.replace("@alias=", ""))
+            except Exception as e:
+                self.logger.warn("{} @alias can't init. because {}".format(note.num.value,
+                                                                           traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("Velocity"):
+            try:
+                note.velocity.init(line.replace("Velocity=", ""))
+            except Exception as e:
+                self.logger.warn("{} Velocity can't init. because {}".format(note.num.value,
+                                                                             traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("Intensity"):
+            try:
+                note.intensity.init(line.replace("Intensity=", ""))
+            except Exception as e:
+                self.logger.warn("{} Intensity can't init. because {}".format(note.num.value,
+                                                                              traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("Modulation"):
+            try:
+                note.modulation.init(line.replace("Modulation=", ""))
+            except Exception as e:
+                self.logger.warn("{} Modulation can't init. because {}".format(note.num.value,
+                                                                               traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("PitchBend="):
+            try:
+                note.pitches.init_from_str(line.replace("PitchBend=", ""))
+            except Exception as e:
+                self.logger.warn("{} PitchBend can't init. because {}".format(note.num.value,
+                                                                            traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("PBStart"):
+            try:
+                note.pbStart.init(line.replace("PBStart=", ""))
+            except Exception as e:
+                self.logger.warn("{} PBStart can't init. because {}".format(note.num.value,
+                                                                            traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("PBS"):
+            try:
+                note.pbs.init(line.replace("PBS=", ""))
+            except Exception as e:
+                self.logger.warn("{} PBS can't init. because {}".format(note.num.value,
+                                                                        traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("PBY"):
+            try:
+                note.pby.init_from_str(line.replace("PBY=", ""))
+            except Exception as e:
+                self.logger.warn("{} PBY can't init. because {}".format(note.num.value,
+                                                                        traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("PBM"):
+            try:
+                note.pbm.init_from_str(line.replace("PBM=", ""))
+            except Exception as e:
+                self.logger.warn("{} PBM can't init. because {}".format(note.num.value,
+                                                                        traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("PBW"):
+            try:
+                note.pbw.init_from_str(line.replace("PBW=", ""))
+            except Exception as e:
+                self.logger.warn("{} PBW can't init. because {}".format(note.num.value,
+                                                                        traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("Flags"):
+            try:
+                note.flags.init(line.replace("Flags=", ""))
+            except Exception as e:
+                self.logger.warn("{} Flags can't init. because {}".format(note.num.value,
+                                                                          traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("VBR"):
+            try:
+                note.vibrato.init(line.replace("VBR=", ""))
+            except Exception as e:
+                self.logger.warn("{} VBR can't init. because {}".format(note.num.value,
+                                                                        traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("Envelope"):
+            try:
+                note.envelope.init(line.replace("Envelope=", ""))
+            except Exception as e:
+                self.logger.warn("{} Envelope can't init. because {}".format(note.num.value,
+                                                                             traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("Label"):
+            try:
+                note.label.init(line.replace("Label=", ""))
+            except Exception as e:
+                self.logger.warn("{} Label can't init. because {}".format(note.num.value,
+                                                                          traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("$direct"):
+            try:
+                note.direct.init(line.replace("$direct=", ""))
+            except Exception as e:
+                self.logger.warn("{} $direct can't init. because {}".format(note.num.value,
+                                                                            traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("$region="):
+            try:
+                note.region.init(line.replace("$region=", ""))
+            except Exception as e:
+                self.logger.warn("{} $region can't init. because {}".format(note.num.value,
+                                                                            traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+        elif line.startswith("$region_end="):
+            try:
+                note.region_end.init(line.replace("$region_end=", ""))
+            except Exception as e:
+                self.logger.warn("{} $region_end can't init. because {}".format(note.num.value,
+                                                                                traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+
+
+def make_lines(notes: int) -> list:
+    '''
+    notes個のノートからなるustのノート部分を生成します。
+
+    Parameters
+    ----------
+    notes: int
+        ノート数
+
+    Returns
+    -------
+    lines: list of str
+    '''
+    lines: list = []
+    for i in range(notes):
+        lines.append("[#{:04}]".format(i))
+        lines.extend(NOTE_LINES)
+        if i % 16 == 0:
+            lines.append("Tempo={}".format(120 + i % 7))
+    lines.append("[#TRACKEND]")
+    return lines
+
+
+def slot_state(value) -> dict:
+    '''
+    __slots__で定義された属性の値を返します。値が設定されていない属性は含みません。
+
+    Parameters
+    ----------
+    value: object
+
+    Returns
+    -------
+    state: dict
+    '''
+    state: dict = {}
+    for cls in type(value).__mro__:
+        for key in getattr(cls, "__slots__", ()):
+            if not key.startswith("__") and hasattr(value, key):
+                state[key] = getattr(value, key)
+    return state
+
+
+def note_state(note: Note) -> dict:
+    '''
+    noteの全パラメータの内部状態を返します。
+
+    Parameters
+    ----------
+    note: Note
+
+    Returns
+    -------
+    state: dict
+    '''
+    return {key: slot_state(value) if hasattr(value, "__slots__") else value
+            for key, value in slot_state(note).items() if key not in ["prev", "next"]}
+
+
+def measure(func, lines: list, repeat: int) -> tuple:
+    '''
+    funcでlinesを読み込む時間を計測します。
+
+    Parameters
+    ----------
+    func: function
+        Ustとlinesを引数にとる読込関数
+
+    lines: list of str
+
+    repeat: int
+        計測回数
+
+    Returns
+    -------
+    seconds: float
+        最も速かった回の秒数
+
+    ust: Ust
+        最後に読み込んだUst
+    '''
+    logger: logging.Logger = logging.getLogger("bench_ust")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    best: float = float("inf")
+    for i in range(repeat):
+        ust: Ust = Ust("bench.ust", logger=logger)
+        gc.collect()
+        start: float = time.perf_counter()
+        func(ust, lines)
+        best = min(best, time.perf_counter() - start)
+    return best, ust
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ust._load_note_helperのベンチマーク")
+    parser.add_argument("--notes", type=int, default=10000, help="ノート数")
+    parser.add_argument("--repeat", type=int, default=5, help="計測回数")
+    args = parser.parse_args()
+    lines: list = make_lines(args.notes)
+    legacy_sec, legacy_ust = measure(legacy_load_note_helper, lines, args.repeat)
+    table_sec, table_ust = measure(Ust._load_note_helper, lines, args.repeat)
+    identical: bool = [note_state(note) for note in legacy_ust.notes] == [note_state(note) for note in table_ust.notes]
+    print("notes: {}, lines: {}".format(args.notes, len(lines)))
+    print("legacy: {:.3f} s".format(legacy_sec))
+    print("table : {:.3f} s ({:.1f}x)".format(table_sec, legacy_sec / table_sec))
+    print("identical notes: {}".format(identical))
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+﻿'''bench_wavfile
+| wave.openで読み込んでからnumpy配列に変換する従来の方法と、common.wavfile.WavFileを比較します。
+| 24bitは1サンプルずつint.from_bytesで変換していたfrqの方法と、バイト列を並べ替えていたWavMixerの方法も比較します。
+| 全ての方法で読み込んだデータが一致することも確認します。
+
+    >>> python benchmarks/bench_wavfile.py --seconds 10 --repeat 10
+'''
+
+import os
+import os.path
+import sys
+import time
+import wave
+import shutil
+import tempfile
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import common.wavfile as wavfile
+
+
+def write_wav(path: str, sampwidth: int, seconds: float):
+    samples: np.ndarray = np.random.RandomState(0).randint(-2 ** (sampwidth * 8 - 1), 2 ** (sampwidth * 8 - 1),
+                                                           int(44100 * seconds))
+    with wave.open(path, "wb") as ww:
+        ww.setnchannels(1)
+        ww.setsampwidth(sampwidth)
+        ww.setframerate(44100)
+        ww.writeframes(samples.astype("<i4").view(np.uint8).reshape(-1, 4)[:, :sampwidth].tobytes())
+
+
+def load_wave(path: str) -> np.ndarray:
+    with wave.open(path, "rb") as wr:
+        sampwidth: int = wr.getsampwidth()
+        bytes_data: bytes = wr.readframes(wr.getnframes())
+    if sampwidth == 3:
+        raw: np.ndarray = np.frombuffer(bytes_data, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        data: np.ndarray = ((raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)) << 8) >> 8
+    else:
+        data: np.ndarray = np.frombuffer(bytes_data, dtype={2: "<i2", 4: "<i4"}[sampwidth])
+    return data / 2 ** (sampwidth * 8 - 1)
+
+
+def load_loop(path: str) -> np.ndarray:
+    with wave.open(path, "rb") as wr:
+        bytes_data: bytes = wr.readframes(wr.getnframes())
+    data: np.ndarray = np.zeros(len(bytes_data) // 3, dtype=np.int32)
+    for i in range(data.shape[0]):
+        data[i] = int.from_bytes(bytes_data[i * 3:(i + 1) * 3], "little", signed=True)
+    return data / 2 ** 23
+
+
+def measure(func, repeat: int) -> float:
+    start: float = time.perf_counter()
+    for i in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WavFileのベンチマーク")
+    parser.add_argument("--seconds", type=float, default=10.0, help="wavの長さ(秒)")
+    parser.add_argument("--repeat", type=int, default=10, help="繰り返し回数")
+    args = parser.parse_args()
+    root: str = tempfile.mkdtemp()
+    identical: bool = True
+    try:
+        for sampwidth in [2, 3]:
+            path: str = os.path.join(root, "{}.wav".format(sampwidth))
+            write_wav(path, sampwidth, args.seconds)
+            expected: np.ndarray = load_wave(path)
+            identical = identical and np.array_equal(wavfile.read(path)[0], expected)
+            wave_sec: float = measure(lambda: load_wave(path), args.repeat)
+            wavfile_sec: float = measure(lambda: wavfile.read(path), args.repeat)
+            # oto.iniのoffset～blankに相当する、先頭から1秒～1.5秒の区間
+            window_sec: float = measure(lambda: wavfile.read(path, 44100, 66150), args.repeat)
+            print("{}bit {}s".format(sampwidth * 8, args.seconds))
+            print("  wave.open         : {:.5f} s".format(wave_sec))
+            print("  WavFile           : {:.5f} s ({:.1f}x)".format(wavfile_sec, wave_sec / wavfile_sec))
+            print("  WavFile 0.5s range: {:.5f} s ({:.1f}x)".format(window_sec, wave_sec / window_sec))
+            if sampwidth == 3:
+                identical = identical and np.array_equal(load_loop(path), expected)
+                loop_sec: float = measure(lambda: load_loop(path), 1)
+                print("  int.from_bytes    : {:.5f} s ({:.1f}x slower than WavFile)".format(loop_sec, loop_sec / wavfile_sec))
+    finally:
+        shutil.rmtree(root)
+    print("identical: {}".format(identical))
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+﻿'''
+| テキストファイルを1度だけ読み込み、文字コードを判定してデコードします。
+| ust、oto.ini、prefix.map、character.txtの読込に使用します。
+'''
+
+import codecs
+
+DEFAULT_ENCODINGS: tuple = ("utf-8", "cp932")
+'''文字コードの候補の既定値。BOMがあるか、utf-8として正しいバイト列であればutf-8とみなします。'''
+
+
+def _normalize(encoding: str) -> str:
+    '''
+    encodingをcodecsの正式名に変換します。
+
+    Parameters
+    ----------
+    encoding: str
+
+    Returns
+    -------
+    name: str
+        | codecsの正式名。
+        | encodingがNoneもしくは未知の文字コードの場合は""
+    '''
+    if not encoding:
+        return ""
+    try:
+        return codecs.lookup(encoding).name
+    except LookupError:
+        return ""
+
+
+def decode(data: bytes, encodings: tuple = DEFAULT_ENCODINGS) -> tuple:
+    '''
+    | dataをencodingsの順にデコードを試み、最初に成功した結果を返します。
+    | 候補にutf-8が含まれ、dataがBOMで始まる場合は、BOMを除いてutf-8でデコードします。
+
+    | utf-8のデコードは最初の不正なバイトで失敗するため、cp932のファイルでも、やり直しになるのは最初の非ASCII文字より前だけです。
+
+    Parameters
+    ----------
+    data: bytes
+
+    encodings: tuple of str, default DEFAULT_ENCODINGS
+        | 文字コードの候補。
+        | Noneや未知の文字コードは無視します。
+
+    Returns
+    -------
+    text: str
+
+    encoding: str
+        | デコードに使用した文字コードのcodecsの正式名。
+        | BOM付きのutf-8は"utf-8-sig"
+
+    Raises
+    ------
+    UnicodeDecodeError
+        いずれの候補でもデコードできなかった場合。最後の候補で発生したもの
+    '''
+    names: list = [name for name in map(_normalize, encodings) if name != ""]
+    if "utf-8" in names and data.startswith(codecs.BOM_UTF8):
+        return data[len(codecs.BOM_UTF8):].decode("utf-8"), "utf-8-sig"
+    error: UnicodeDecodeError = None
+    for name in names:
+        try:
+            return data.decode(name), name
+        except UnicodeDecodeError as e:
+            error = e
+    if error is None:
+        raise UnicodeDecodeError("", data, 0, len(data), "no available encoding")
+    raise error
+
+
+def split_lines(text: str) -> list:
+    '''
+    textを改行コードで分割します。
+
+    Parameters
+    ----------
+    text: str
+
+    Returns
+    -------
+    lines: list of str
+    '''
+    return text.replace("\r", "").split("\n")
+
+
+def read_lines(filepath: str, encodings: tuple = DEFAULT_ENCODINGS) -> tuple:
+    '''
+    filepathをバイナリで1度だけ読み込み、文字コードを判定してデコードし、行ごとに分割します。
+
+    Parameters
+    ----------
+    filepath: str
+
+    encodings: tuple of str, default DEFAULT_ENCODINGS
+        文字コードの候補
+
+    Returns
+    -------
+    lines: list of str
+
+    encoding: str
+        デコードに使用した文字コードのcodecsの正式名
+
+    Raises
+    ------
+    UnicodeDecodeError
+        いずれの候補でもデコードできなかった場合
+    '''
+    with open(filepath, "rb") as fr:
+        data: bytes = fr.read()
+    text, encoding = decode(data, encodings)
+    return split_lines(text), encoding
@@ -0,0 +1,268 @@
+﻿'''
+| wavファイルをメモリマップし、RIFFのチャンクを自前で解析して、サンプルをコピーせずにnumpy配列として参照します。
+| 原音やキャッシュファイルの読込、frqの生成に使用します。
+'''
+
+import os
+import os.path
+import mmap
+import wave
+import struct
+from typing import Tuple
+
+import numpy as np
+
+WAVE_FORMAT_PCM: int = 0x0001
+WAVE_FORMAT_IEEE_FLOAT: int = 0x0003
+WAVE_FORMAT_EXTENSIBLE: int = 0xFFFE
+
+_DTYPES: dict = {(WAVE_FORMAT_PCM, 1): np.dtype(np.uint8),
+                 (WAVE_FORMAT_PCM, 2): np.dtype("<i2"),
+                 (WAVE_FORMAT_PCM, 4): np.dtype("<i4"),
+                 (WAVE_FORMAT_IEEE_FLOAT, 4): np.dtype("<f4"),
+                 (WAVE_FORMAT_IEEE_FLOAT, 8): np.dtype("<f8")}
+'''(フォーマット, 1サンプルのバイト数)ごとの、そのまま参照できるdtype。24bitは別に扱います。'''
+
+
+class WavFile:
+    '''
+    | メモリマップしたwavファイル。
+    | framesが返す配列はファイルの内容を直接参照する読み取り専用の配列で、24bit以外はコピーしません。
+
+    | 参照中の配列がある間にcloseした場合、メモリマップは配列が破棄された時点で閉じられます。
+
+    Attributes
+    ----------
+    path: str
+        wavファイルのパス
+
+    format: int
+        WAVE_FORMAT_PCMもしくはWAVE_FORMAT_IEEE_FLOAT
+
+    channels: int
+        チャンネル数
+
+    framerate: int
+        サンプリング周波数
+
+    sampwidth: int
+        1サンプルのバイト数
+
+    nframes: int
+        フレーム数
+    '''
+    path: str
+    format: int
+    channels: int
+    framerate: int
+    sampwidth: int
+    nframes: int
+    _mm: mmap.mmap = None
+    _data_offset: int
+
+    @property
+    def length_ms(self) -> float:
+        return self.nframes / self.framerate * 1000
+
+    def __init__(self, path: str):
+        '''
+        Parameters
+        ----------
+        path: str
+            wavファイルのパス
+
+        Raises
+        ------
+        FileNotFoundError
+            pathにファイルがなかったとき
+        wave.Error
+            pathがwavではないか、対応していないフォーマットのとき
+        '''
+        if not os.path.isfile(path):
+            raise FileNotFoundError("{} not found.".format(path))
+        self.path = path
+        with open(path, "rb") as fr:
+            if os.fstat(fr.fileno()).st_size < 12:
+                raise wave.Error("file does not start with RIFF id")
+            self._mm = mmap.mmap(fr.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse()
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self) -> "WavFile":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        '''
+        メモリマップを閉じます。
+        '''
+        if self._mm is None:
+            return
+        try:
+            self._mm.close()
+        except BufferError:
+            # framesが返した配列が残っている場合、その配列が破棄されたときに閉じられる
+            pass
+        self._mm = None
+
+    def _parse(self):
+        '''
+        RIFFのチャンクを順にたどり、fmtチャンクの内容とdataチャンクの位置を取得します。
+
+        Raises
+        ------
+        wave.Error
+            wavではないか、対応していないフォーマットのとき
+        '''
+        mm: mmap.mmap = self._mm
+        if mm[0:4] != b"RIFF":
+            raise wave.Error("file does not start with RIFF id")
+        if mm[8:12] != b"WAVE":
+            raise wave.Error("not a WAVE file")
+        fmt: tuple = None
+        pos: int = 12
+        while pos + 8 <= len(mm):
+            chunk_id: bytes = mm[pos:pos + 4]
+            chunk_size: int = struct.unpack_from("<I", mm, pos + 4)[0]
+            body: int = pos + 8
+            if chunk_id == b"fmt ":
+                if chunk_size < 16 or body + 16 > len(mm):
+                    raise wave.Error("fmt chunk is broken")
+                fmt = struct.unpack_from("<HHIIHH", mm, body)
+                if fmt[0] == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26 and body + 26 <= len(mm):
+                    # サブフォーマットのGUIDの先頭2バイトが実際のフォーマット
+                    fmt = (struct.unpack_from("<H", mm, body + 24)[0],) + fmt[1:]
+            elif chunk_id == b"data":
+                if fmt is None:
+                    raise wave.Error("data chunk before fmt chunk")
+                self._set_format(*fmt)
+                self._data_offset = body
+                # 書込み途中などでチャンクの長さがファイルより長い場合は、ファイルの末尾までとする
+                self.nframes = min(chunk_size, len(mm) - body) // (self.channels * self.sampwidth)
+                return
+            pos = body + chunk_size + (chunk_size & 1)
+        if fmt is None:
+            raise wave.Error("fmt chunk missing")
+        raise wave.Error("data chunk missing")
+
+    def _set_format(self, format_tag: int, channels: int, framerate: int, byterate: int, blockalign: int, bits: int):
+        self.format = format_tag
+        self.channels = channels
+        self.framerate = framerate
+        self.sampwidth = (bits + 7) // 8
+        if channels == 0 or framerate == 0:
+            raise wave.Error("bad # of channels or framerate")
+        if (format_tag, self.sampwidth) not in _DTYPES and (format_tag, self.sampwidth) != (WAVE_FORMAT_PCM, 3):
+            raise wave.Error("unknown format: {} {}bit".format(format_tag, bits))
+
+    def frames(self, start: int = 0, end: int = None) -> np.ndarray:
+        '''
+        | start～endフレームのサンプルを、(フレーム数, チャンネル数)の配列で返します。
+        | 範囲はファイルの長さに切り詰めます。
+        | 8bitはnp.uint8、16bitと32bitは符号付き整数、浮動小数点は元のdtypeのまま、メモリマップを直接参照します。
+        | 24bitは重なり合う4バイトずつを参照するビューを右に8bitシフトし、符号付きのnp.int32に展開します。
+
+        Parameters
+        ----------
+        start: int, default 0
+            先頭のフレーム
+
+        end: int, default None
+            末尾のフレーム(含まない)。省略した場合ファイルの末尾
+
+        Returns
+        -------
+        frames: np.ndarray
+        '''
+        start = min(max(start, 0), self.nframes)
+        end = self.nframes if end is None else min(max(end, start), self.nframes)
+        count: int = (end - start) * self.channels
+        offset: int = self._data_offset + start * self.channels * self.sampwidth
+        # np.frombufferの配列はmmapのバッファを保持するため、参照中の配列があるとmmapは閉じられない
+        if self.sampwidth == 3:
+            if count == 0:
+                return np.zeros((0, self.channels), dtype=np.int32)
+            # 各サンプルの1バイト前から4バイトを読むと、上位24bitがサンプルになる
+            raw: np.ndarray = np.frombuffer(self._mm, dtype=np.uint8, count=count * 3 + 1, offset=offset - 1)
+            words: np.ndarray = np.lib.stride_tricks.as_strided(raw[:4].view("<i4"), shape=(count,), strides=(3,),
+                                                                writeable=False)
+            return (words >> 8).reshape(-1, self.channels)
+        return np.frombuffer(self._mm, dtype=_DTYPES[(self.format, self.sampwidth)], count=count,
+                             offset=offset).reshape(-1, self.channels)
+
+    def read(self, start: int = 0, end: int = None, channel: int = 0) -> np.ndarray:
+        '''
+        start～endフレームのchannelのサンプルを、最大1に正規化して返します。
+
+        Parameters
+        ----------
+        start: int, default 0
+            先頭のフレーム
+
+        end: int, default None
+            末尾のフレーム(含まない)。省略した場合ファイルの末尾
+
+        channel: int, default 0
+            読み込むチャンネル
+
+        Returns
+        -------
+        data: np.ndarray of np.float64
+        '''
+        data: np.ndarray = self.frames(start, end)[:, channel]
+        if self.format == WAVE_FORMAT_IEEE_FLOAT:
+            return data.astype(np.float64)
+        if self.sampwidth == 1:
+            return (data.astype(np.float64) - 128) / 128
+        return data / 2 ** (self.sampwidth * 8 - 1)
+
+    def ms_to_frame(self, ms: float) -> int:
+        '''
+        ファイル先頭からのmsをフレーム位置に変換します。
+
+        Parameters
+        ----------
+        ms: float
+
+        Returns
+        -------
+        frame: int
+        '''
+        return int(ms * self.framerate / 1000)
+
+
+def read(path: str, start: int = 0, end: int = None) -> Tuple[np.ndarray, int]:
+    '''
+    wavファイルのstart～endフレームの先頭チャンネルを、最大1に正規化して返します。
+
+    Parameters
+    ----------
+    path: str
+        wavファイルのパス
+
+    start: int, default 0
+        先頭のフレーム
+
+    end: int, default None
+        末尾のフレーム(含まない)。省略した場合ファイルの末尾
+
+    Returns
+    -------
+    data: np.ndarray of np.float64
+
+    framerate: int
+
+    Raises
+    ------
+    FileNotFoundError
+        pathにファイルがなかったとき
+    wave.Error
+        pathがwavではないか、対応していないフォーマットのとき
+    '''
+    with WavFile(path) as wav:
+        return wav.read(start, end), wav.framerate
@@ -3,19 +3,21 @@ import common.convert_notenum as convert_notenum
 
 
 class NumberEntry(StringEntry):
-    pass
+    __slots__ = ()
 
 
 class LengthEntry(IntEntry):
-    _value = 480
+    __slots__ = ()
+    _default = 480
 
 
 class LyricEntry(StringEntry):
-    pass
+    __slots__ = ()
 
 
 class NoteNumEntry(IntEntry):
-    _value = 60
+    __slots__ = ()
+    _default = 60
 
     def set_from_str(self, value: str):
         self.value = convert_notenum.toInt(value)
@@ -27,7 +29,8 @@ class NoteNumEntry(IntEntry):
 
 
 class TempoEntry(FloatEntry):
-    _value = 120
+    __slots__ = ()
+    _default = 120
     point = 2
 
     @property
@@ -40,6 +43,8 @@ class TempoEntry(FloatEntry):
 
 
 class PreEntry(FloatEntry):
+    __slots__ = ()
+
     @property
     def hasValue(self) -> bool:
         return self._hasValue
@@ -50,10 +55,12 @@ class PreEntry(FloatEntry):
 
 
 class AtPreEntry(FloatEntry):
-    pass
+    __slots__ = ()
 
 
 class OveEntry(FloatEntry):
+    __slots__ = ()
+
     @property
     def hasValue(self) -> bool:
         return self._hasValue
@@ -64,27 +71,28 @@ class OveEntry(FloatEntry):
 
 
 class AtOveEntry(FloatEntry):
-    pass
+    __slots__ = ()
 
 
 class StpEntry(FloatEntry):
-    pass
+    __slots__ = ()
 
 
 class AtStpEntry(FloatEntry):
-    pass
+    __slots__ = ()
 
 
 class AtFileNameEntry(StringEntry):
-    pass
+    __slots__ = ()
 
 
 class AtAliasEntry(StringEntry):
-    pass
+    __slots__ = ()
 
 
 class VelocityEntry(IntEntry):
-    _value = 100
+    __slots__ = ()
+    _default = 100
 
     @property
     def rate(self) -> float:
@@ -92,14 +100,18 @@ class VelocityEntry(IntEntry):
 
 
 class IntensityEntry(IntEntry):
-    _value = 100
+    __slots__ = ()
+    _default = 100
 
 
 class ModulationEntry(IntEntry):
-    _value = 100
+    __slots__ = ()
+    _default = 100
 
 
 class PitchesEntry(ListEntry):
+    __slots__ = ()
+
     def _check_value(self, value):
         try:
             return int(value)
@@ -108,14 +120,21 @@ class PitchesEntry(ListEntry):
 
 
 class PBStartEntry(FloatEntry):
-    pass
+    __slots__ = ()
 
 
 class PBSEntry(EntryBase):
-    _time: float = 0
-    _height: float = 0
+    __slots__ = ("_time", "_height", "_value")
+    _time: float
+    _height: float
     _value: str
 
+    def __init__(self):
+        self._isUpdate = False
+        self._hasValue = False
+        self._time = 0
+        self._height = 0
+
     @property
     def time(self) -> float:
         return self._time
@@ -205,6 +224,8 @@ class PBSEntry(EntryBase):
 
 
 class PBYEntry(ListEntry):
+    __slots__ = ()
+
     def _check_value(self, value):
         try:
             if value == " ":
@@ -217,6 +238,8 @@ class PBYEntry(ListEntry):
 
 
 class PBWEntry(ListEntry):
+    __slots__ = ()
+
     def _check_value(self, value):
         try:
             return float(value)
@@ -225,6 +248,8 @@ class PBWEntry(ListEntry):
 
 
 class PBMEntry(ListEntry):
+    __slots__ = ()
+
     def _check_value(self, value):
         if value in ["", "s", "r", "j"]:
             return str(value)
@@ -233,6 +258,7 @@ class PBMEntry(ListEntry):
 
 
 class EnvelopeEntry(EntryBase):
+    __slots__ = ("_value", "_p", "_v")
     _value: str
     _p: list
     _v: list
@@ -294,6 +320,7 @@ class EnvelopeEntry(EntryBase):
 
 
 class VibratoEntry(EntryBase):
+    __slots__ = ("_length", "_cycle", "_depth", "_fadeInTime", "_fadeOutTime", "_phase", "_height", "_amp", "_value")
     _length: float
     _cycle: float
     _depth: float
@@ -434,22 +461,24 @@ class VibratoEntry(EntryBase):
 
 
 class LabelEntry(StringEntry):
-    pass
+    __slots__ = ()
 
 
 class DirectEntry(BoolEntry):
-    pass
+    __slots__ = ()
 
 
 class RegionEntry(StringEntry):
-    pass
+    __slots__ = ()
 
 
 class RegionEndEntry(StringEntry):
-    pass
+    __slots__ = ()
 
 
 class FlagsEntry(StringEntry):
+    __slots__ = ()
+
     @property
     def hasValue(self) -> bool:
         return self._hasValue
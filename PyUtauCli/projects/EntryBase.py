@@ -1,5 +1,6 @@
 ﻿'''EntryBase
 各ノートパラメータ設定用のベースクラスを定義します。
+1つのustで数十万個生成されるため、全てのエントリーは__slots__で属性を固定し、__dict__を持ちません。
 '''
 
 
@@ -7,12 +8,24 @@ class EntryBase:
     '''
     エントリー用のベースクラスです。
     継承して使います。
+    継承先では__slots__に追加する属性を定義してください。
+    '''
+    __slots__ = ("_isUpdate", "_hasValue")
+    _isUpdate: bool
+    _hasValue: bool
+    revision: int = 0
+    '''
+    | いずれかのエントリーのvalueが変更されるたびに増える値。全てのエントリーで共有します。
+    | Ust.columnsやUst.tempo_mapが、Noteを直接変更したことを検出するために使用します。
     '''
-    _isUpdate: bool = False
-    _hasValue: bool = False
+
+    def __init__(self):
+        self._isUpdate = False
+        self._hasValue = False
 
     def _set_update(self):
         self._isUpdate = True
+        EntryBase.revision += 1
 
     @property
     def isUpdate(self) -> bool:
@@ -28,7 +41,14 @@ class StringEntry(EntryBase):
     Str型のvalueをもつエントリー用のベースクラスです。
     継承して使います。
     '''
-    _value: str = ""
+    __slots__ = ("_value",)
+    _value: str
+    _default: str = ""
+
+    def __init__(self):
+        self._isUpdate = False
+        self._hasValue = False
+        self._value = self._default
 
     @property
     def value(self) -> str:
@@ -53,7 +73,14 @@ class IntEntry(EntryBase):
     int型のvalueをもつエントリー用のベースクラスです。
     継承して使います。
     '''
-    _value: int = 0
+    __slots__ = ("_value",)
+    _value: int
+    _default: int = 0
+
+    def __init__(self):
+        self._isUpdate = False
+        self._hasValue = False
+        self._value = self._default
 
     @property
     def value(self) -> int:
@@ -84,9 +111,16 @@ class FloatEntry(EntryBase):
     float型のvalueをもつエントリー用のベースクラスです。
     継承して使います。
     '''
-    _value: float = 0.0
+    __slots__ = ("_value",)
+    _value: float
+    _default: float = 0.0
     point: int = 3
 
+    def __init__(self):
+        self._isUpdate = False
+        self._hasValue = False
+        self._value = self._default
+
     @property
     def value(self) -> float:
         return self._value
@@ -116,7 +150,14 @@ class BoolEntry(EntryBase):
     bool型のvalueをもつエントリー用のベースクラスです。
     継承して使います。
     '''
-    _value: bool = False
+    __slots__ = ("_value",)
+    _value: bool
+    _default: bool = False
+
+    def __init__(self):
+        self._isUpdate = False
+        self._hasValue = False
+        self._value = self._default
 
     @property
     def value(self) -> bool:
@@ -142,9 +183,15 @@ class ListEntry(EntryBase):
     継承して使います。
     各パラメータのフォーマットが適切かは、self._checl_valueを継承して定義します。
     '''
-    _value: list = []
+    __slots__ = ("_value",)
+    _value: list
     separater: str = ","
 
+    def __init__(self):
+        self._isUpdate = False
+        self._hasValue = False
+        self._value = []
+
     @property
     def value(self) -> list:
         return self._value
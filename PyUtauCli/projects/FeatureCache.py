@@ -0,0 +1,416 @@
+﻿'''FeatureCache
+同じ原音を使用するノートで共有できる、resampの入力wavのworld解析結果(f0, sp, ap)のキャッシュ。
+'''
+
+import os
+import os.path
+import time
+import shutil
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from logging import Logger
+
+import numpy as np
+import PyRwu
+
+from .ResampCache import ResampCache
+import settings.logger as mylogger
+
+default_logger = mylogger.get_logger(__name__, False)
+
+ANALYSIS_SETTINGS: list = ["PYWORLD_F0_FLOOR", "PYWORLD_F0_CEIL", "PYWORLD_PERIOD", "PYWORLD_Q1", "PYWORLD_THRESHOLD",
+                           "USE_PYWORLD_CACHE", "USE_D4C_FILE", "DEFAULT_FRAMERATE"]
+'''キーに含める、解析結果に影響するPyRwu.settingsの値'''
+
+FEATURE_NAMES: list = ["f0", "sp", "ap"]
+'''保存するworldパラメータ'''
+
+
+class FeatureCache:
+    '''
+    | resamplerがgetInputDataで求める入力wavのworld解析結果を、入力wavのパス・更新日時・サイズ、解析範囲、解析の設定から求めたキーで保存します。
+    | 同じエイリアスを使用するノートは、長さや音高が違っても同じキーになるため、2回目以降のresampは解析を省略します。
+
+    | 解析結果はメモリ上に保持し、rootを指定した場合は.npyファイルとしても保存します。
+    | ファイルから読み込んだ解析結果はmemmapとして参照します。
+    | それぞれ合計サイズが上限を超えた場合、最後に使用した日時が古いものから破棄します。
+
+    | Renderの使用するProcessPoolExecutorでは、workerの起動時に1度だけ渡し、そのworkerで処理する全てのノートで共有します。
+    | workerは呼び出し元のメモリ上の解析結果を引き継がず、worker間ではrootのファイルだけを共有します。
+    | hitsとmissesは、呼び出し元のプロセスで処理した分だけを数えます。
+
+    Attributes
+    ----------
+    root: str
+        解析結果を保存するフォルダ。メモリ上にだけ保持する場合""
+
+    max_memory_bytes: int
+        メモリ上に保持する解析結果の合計サイズの上限
+
+    max_bytes: int
+        rootに保存する解析結果の合計サイズの上限
+
+    hits: int
+        解析結果が見つかった回数
+
+    misses: int
+        解析結果が見つからず、解析した回数
+    '''
+    INDEX_NAME: str = "index.sqlite3"
+
+    _root: str
+    _max_memory_bytes: int
+    _max_bytes: int
+    _memory: OrderedDict
+    _memory_bytes: int
+    _conn: sqlite3.Connection = None
+    _lock: threading.Lock
+    _hits: int
+    _misses: int
+
+    @property
+    def root(self) -> str:
+        return self._root
+
+    @property
+    def max_memory_bytes(self) -> int:
+        return self._max_memory_bytes
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    @property
+    def memory_bytes(self) -> int:
+        return self._memory_bytes
+
+    @property
+    def total_bytes(self) -> int:
+        if self._conn is None:
+            return 0
+        with self._lock:
+            return self._conn.execute("SELECT value FROM meta WHERE key = 'total_bytes'").fetchone()[0]
+
+    def __init__(self, root: str = "", *, max_memory_bytes: int = 256 * 1024 ** 2, max_bytes: int = 2 * 1024 ** 3,
+                 logger: Logger = None):
+        '''
+        Parameters
+        ----------
+        root: str, default ""
+            | 解析結果を保存するフォルダ。存在しない場合は作成します。
+            | ""の場合、メモリ上にだけ保持します。
+
+        max_memory_bytes: int, default 256MiB
+            メモリ上に保持する解析結果の合計サイズの上限
+
+        max_bytes: int, default 2GiB
+            rootに保存する解析結果の合計サイズの上限
+        '''
+        self.logger = logger or default_logger
+        self._root = root
+        self._max_memory_bytes = max_memory_bytes
+        self._max_bytes = max_bytes
+        self._hits = 0
+        self._misses = 0
+        self._open()
+
+    def _open(self):
+        '''
+        メモリ上の解析結果を初期化し、rootのインデックスを開きます。
+        '''
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        if self._root == "":
+            return
+        os.makedirs(self._root, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(self._root, self.INDEX_NAME), timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS entries ("
+                               "key TEXT PRIMARY KEY, framerate INTEGER NOT NULL, size INTEGER NOT NULL, "
+                               "created REAL NOT NULL, accessed REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            # ResampCacheと同様、合計サイズはentriesの変更に合わせてtriggerで更新し続ける
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn.execute("INSERT OR IGNORE INTO meta (key, value) SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM entries")
+            self._conn.execute("CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN "
+                               "UPDATE meta SET value = value + NEW.size WHERE key = 'total_bytes'; END")
+            self._conn.execute("CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN "
+                               "UPDATE meta SET value = value - OLD.size WHERE key = 'total_bytes'; END")
+            self._conn.execute("CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN "
+                               "UPDATE meta SET value = value - OLD.size + NEW.size WHERE key = 'total_bytes'; END")
+
+    def __getstate__(self) -> dict:
+        state: dict = self.__dict__.copy()
+        for name in ["_memory", "_memory_bytes", "_conn", "_lock"]:
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._open()
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            if key in self._memory:
+                return True
+            if self._conn is None:
+                return False
+            row: tuple = self._conn.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone()
+            return row is not None and os.path.isdir(self._get_dir(key))
+
+    def close(self):
+        '''
+        インデックスを閉じます。
+        '''
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    @staticmethod
+    def get_key(resamp: PyRwu.Resamp) -> str:
+        '''
+        resampの入力wavの解析結果に対応するキーを返します。
+
+        Parameters
+        ----------
+        resamp: PyRwu.Resamp
+            PyRwu.Resampもしくはその派生クラスのインスタンス
+
+        Returns
+        -------
+        key: str
+            sha256の64桁のハッシュ文字
+
+        Raises
+        ------
+        FileNotFoundError
+            入力wavが見つからなかったとき
+        '''
+        if not os.path.isfile(resamp.input_path):
+            raise FileNotFoundError("{} not found.".format(resamp.input_path))
+        sources: list = []
+        # 入力wavに加え、f0とapの解析に使用されるファイルの変更も検出する
+        for path in [resamp.input_path,
+                     os.path.splitext(resamp.input_path)[0] + "_wav.frq",
+                     os.path.splitext(resamp.input_path)[0] + "_wav.d4c"]:
+            if os.path.isfile(path):
+                stat: os.stat_result = os.stat(path)
+                sources.append("{}:{}:{}".format(os.path.realpath(path), stat.st_mtime_ns, stat.st_size))
+        analysis: list = ["{}={}".format(name, getattr(PyRwu.settings, name, None)) for name in ANALYSIS_SETTINGS]
+        return hashlib.sha256("\n".join(sources + ["{}:{}".format(float(resamp.offset), float(resamp.end_ms))] + analysis +
+                                        [ResampCache.get_resamp_identity(type(resamp))]).encode()).hexdigest()
+
+    def _get_dir(self, key: str) -> str:
+        return os.path.join(self._root, key[:2], key)
+
+    def fetch(self, key: str) -> tuple:
+        '''
+        keyに対応する解析結果を返します。
+
+        Parameters
+        ----------
+        key: str
+
+        Returns
+        -------
+        features: tuple or None
+            | (framerate, f0, sp, ap)の組。見つからなかった場合None
+            | 配列は他の呼出し元と共有しているため、書き換えないでください。
+        '''
+        with self._lock:
+            features: tuple = self._memory.get(key)
+            if features is not None:
+                self._memory.move_to_end(key)
+                self._hits += 1
+                return features
+            features = self._fetch_file(key)
+            if features is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._store_memory(key, features)
+            return features
+
+    def _fetch_file(self, key: str) -> tuple:
+        '''
+        rootに保存したkeyの解析結果をmemmapとして読み込みます。
+
+        Parameters
+        ----------
+        key: str
+
+        Returns
+        -------
+        features: tuple or None
+            (framerate, f0, sp, ap)の組。見つからなかった場合None
+        '''
+        if self._conn is None:
+            return None
+        row: tuple = self._conn.execute("SELECT framerate FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        try:
+            arrays: list = [np.load(os.path.join(self._get_dir(key), name + ".npy"), mmap_mode="r") for name in FEATURE_NAMES]
+        except (OSError, ValueError):
+            with self._conn:
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            return None
+        with self._conn:
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+        return (row[0], *arrays)
+
+    def store(self, key: str, framerate: int, f0: np.ndarray, sp: np.ndarray, ap: np.ndarray):
+        '''
+        解析結果をkeyで保存し、上限を超えた分の解析結果を破棄します。
+
+        Parameters
+        ----------
+        key: str
+
+        framerate: int
+            入力wavのサンプリング周波数
+
+        f0: np.ndarray
+
+        sp: np.ndarray
+
+        ap: np.ndarray
+        '''
+        features: tuple = (framerate,) + tuple([np.array(array) for array in (f0, sp, ap)])
+        for array in features[1:]:
+            array.flags.writeable = False
+        with self._lock:
+            self._store_memory(key, features)
+            if self._conn is not None:
+                self._store_file(key, features)
+                self._evict_files()
+
+    def _store_memory(self, key: str, features: tuple):
+        '''
+        解析結果をメモリ上に保持し、max_memory_bytesを超えた分を古いものから破棄します。
+
+        Parameters
+        ----------
+        key: str
+
+        features: tuple
+            (framerate, f0, sp, ap)の組
+        '''
+        if key in self._memory:
+            self._memory_bytes -= sum([array.nbytes for array in self._memory.pop(key)[1:]])
+        self._memory[key] = features
+        self._memory_bytes += sum([array.nbytes for array in features[1:]])
+        while self._memory_bytes > self._max_memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= sum([array.nbytes for array in evicted[1:]])
+
+    def _store_file(self, key: str, features: tuple):
+        '''
+        解析結果をrootに.npyファイルとして保存します。
+
+        Parameters
+        ----------
+        key: str
+
+        features: tuple
+            (framerate, f0, sp, ap)の組
+        '''
+        dirpath: str = self._get_dir(key)
+        tmp_path: str = "{}.{}.{}.tmp".format(dirpath, os.getpid(), threading.get_ident())
+        os.makedirs(tmp_path, exist_ok=True)
+        for name, array in zip(FEATURE_NAMES, features[1:]):
+            np.save(os.path.join(tmp_path, name + ".npy"), array)
+        if os.path.isdir(dirpath):
+            shutil.rmtree(dirpath, ignore_errors=True)
+        try:
+            os.replace(tmp_path, dirpath)
+        except OSError:
+            # 他のプロセスが同じキーを先に保存した場合、そちらを使用する
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return
+        now: float = time.time()
+        with self._conn:
+            self._conn.execute("INSERT INTO entries (key, framerate, size, created, accessed) VALUES (?, ?, ?, ?, ?) "
+                               "ON CONFLICT (key) DO UPDATE SET framerate = excluded.framerate, size = excluded.size, "
+                               "created = excluded.created, accessed = excluded.accessed",
+                               (key, features[0], sum([array.nbytes for array in features[1:]]), now, now))
+
+    def _evict_files(self) -> int:
+        '''
+        rootの解析結果の合計サイズがmax_bytesを超えている間、最後に使用した日時が古いものから削除します。
+
+        Returns
+        -------
+        count: int
+            削除した解析結果の数
+        '''
+        removed: list = []
+        total: int = self._conn.execute("SELECT value FROM meta WHERE key = 'total_bytes'").fetchone()[0]
+        # entries_accessedの順に必要な行だけを読み、削除は読み終えてから行う
+        cursor: sqlite3.Cursor = self._conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC")
+        for key, size in cursor:
+            if total <= self._max_bytes:
+                break
+            removed.append(key)
+            total -= size
+        cursor.close()
+        with self._conn:
+            for key in removed:
+                shutil.rmtree(self._get_dir(key), ignore_errors=True)
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        if len(removed) != 0:
+            self.logger.debug("{} feature caches are evicted.".format(len(removed)))
+        return len(removed)
+
+    def clear(self):
+        '''
+        メモリ上とrootの全ての解析結果を破棄します。
+        '''
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._conn is None:
+                return
+            keys: list = [row[0] for row in self._conn.execute("SELECT key FROM entries").fetchall()]
+            with self._conn:
+                for key in keys:
+                    shutil.rmtree(self._get_dir(key), ignore_errors=True)
+                self._conn.execute("DELETE FROM entries")
+
+    def attach(self, resamp: PyRwu.Resamp):
+        '''
+        | resampのgetInputDataを、このキャッシュを参照するものに置き換えます。
+        | 解析結果が見つかった場合は解析を行わず、見つからなかった場合は元のgetInputDataで解析した結果を保存します。
+
+        Parameters
+        ----------
+        resamp: PyRwu.Resamp
+            PyRwu.Resampもしくはその派生クラスのインスタンス
+        '''
+        get_input_data = resamp.getInputData
+
+        def cached_get_input_data(*args, **kwargs):
+            key: str = self.get_key(resamp)
+            features: tuple = self.fetch(key)
+            if features is None:
+                get_input_data(*args, **kwargs)
+                # 解析中に_wav.frqが生成される場合があるため、キーを求め直す
+                self.store(self.get_key(resamp), resamp._framerate, resamp._f0, resamp._sp, resamp._ap)
+                return
+            self.logger.debug("{} is analyzed already.".format(resamp.input_path))
+            # フラグによってはsp等を直接書き換えるため、共有している配列は複製して渡す
+            resamp._framerate = features[0]
+            resamp._f0, resamp._sp, resamp._ap = [np.array(array) for array in features[1:]]
+
+        resamp.getInputData = cached_get_input_data
@@ -1,6 +1,5 @@
-﻿import os.path
-
-from .Entry import *
+﻿from .Entry import *
+from voicebank import VoiceBank
 from voicebank.prefixmap import PrefixMap
 from voicebank.oto import Oto
 
@@ -184,8 +183,13 @@ class Note:
     region: RegionEntry
     region_end: RegionEndEntry
     flags: FlagsEntry
-    prev = None
-    next = None
+    autoren: bool
+    prev: "Note"
+    next: "Note"
+    __slots__ = ("num", "length", "lyric", "notenum", "tempo", "pre", "atPre", "ove", "atOve", "stp", "atStp",
+                 "atFileName", "atAlias", "velocity", "intensity", "modulation", "pitches", "pbStart", "pbs", "pby",
+                 "pbm", "pbw", "envelope", "vibrato", "label", "direct", "region", "region_end", "flags", "autoren",
+                 "prev", "next", "__weakref__")
 
     def __init__(self):
         self.num = NumberEntry()
@@ -281,16 +285,11 @@ class Note:
 
         if self.atAlias.hasValue:
             return self.atAlias.value
-        elif not no_prefix and oto.haskey(prefix[self.notenum.value].prefix + lyric + prefix[self.notenum.value].suffix):
-            self.atAlias.value = prefix[self.notenum.value].prefix + lyric + prefix[self.notenum.value].suffix
-            self.atFileName.value = os.path.join(oto[self.atAlias.value].otopath, oto[self.atAlias.value].filename)
-            return prefix[self.notenum.value].prefix + lyric + prefix[self.notenum.value].suffix
-        elif oto.haskey(lyric):
-            self.atAlias.value = lyric
-            self.atFileName.value = os.path.join(oto[lyric].otopath, oto[lyric].filename)
-            return lyric
-        else:
-            return ""
+        alias, filename = VoiceBank.find_alias(lyric, self.notenum.value, no_prefix, oto, prefix)
+        if alias != "":
+            self.atAlias.value = alias
+            self.atFileName.value = filename
+        return alias
 
     def _apply_oto_to_pre(self, alias: str, oto: Oto):
         '''
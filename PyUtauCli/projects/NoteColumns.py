@@ -0,0 +1,211 @@
+﻿'''NoteColumns
+Ust.notesの数値パラメータを、ノートごとではなく列ごとのnumpy配列として扱います。
+'''
+
+import numpy as np
+
+from .Note import Note
+from .EntryBase import EntryBase
+
+FIELDS: list = [("length", np.int64),
+                ("notenum", np.int64),
+                ("tempo", np.float64),
+                ("velocity", np.int64),
+                ("intensity", np.int64),
+                ("modulation", np.int64),
+                ("pre", np.float64),
+                ("atPre", np.float64),
+                ("ove", np.float64),
+                ("atOve", np.float64),
+                ("stp", np.float64),
+                ("atStp", np.float64)]
+'''列の名前と型。列の名前はNoteの属性名と同じです。'''
+
+DTYPE: np.dtype = np.dtype(FIELDS)
+
+
+class NoteColumns:
+    '''
+    | notesの各パラメータのvalueを、1行が1ノートの構造化配列に保持します。
+    | 曲全体の各ノートの位置や長さを、ノートを1つずつたどらずに求めるために使います。
+
+    | setで変更した値は、配列と対応するNoteの両方に反映されます。
+    | Noteを直接変更した場合や、notesにノートを追加・削除した場合は、refreshを呼んでください。
+    | Ust.columnsは、is_currentがFalseの場合に自動でrefreshします。
+
+    Attributes
+    ----------
+    notes: list of Note
+        元になったノートのリスト
+
+    data: np.ndarray
+        | DTYPEの構造化配列。
+        | 書き換えできないビューを返します。
+
+    is_current: bool
+        | 配列を作成した後に、set以外でいずれかのエントリーのvalueが変更されていなければTrue。
+        | 変更を検出するEntryBase.revisionは全てのNoteで共有するため、notes以外のNoteの変更でもFalseになります。
+    '''
+    _notes: list
+    _data: np.ndarray
+    _revision: int
+
+    @property
+    def notes(self) -> list:
+        return self._notes
+
+    @property
+    def data(self) -> np.ndarray:
+        view: np.ndarray = self._data.view()
+        view.flags.writeable = False
+        return view
+
+    @property
+    def is_current(self) -> bool:
+        return self._revision == EntryBase.revision
+
+    def __init__(self, notes: list):
+        '''
+        Parameters
+        ----------
+        notes: list of Note
+        '''
+        self._notes = notes
+        self.refresh()
+
+    def __len__(self) -> int:
+        return self._data.shape[0]
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        '''
+        fieldの列を、書き換えできないビューで返します。
+
+        Parameters
+        ----------
+        field: str
+            FIELDSの列の名前
+
+        Returns
+        -------
+        column: np.ndarray
+
+        Raises
+        ------
+        KeyError
+            fieldがFIELDSにない場合
+        '''
+        if field not in DTYPE.names:
+            raise KeyError(field)
+        view: np.ndarray = self._data[field].view()
+        view.flags.writeable = False
+        return view
+
+    def refresh(self):
+        '''
+        self.notesから配列を作り直します。
+        '''
+        self._revision = EntryBase.revision
+        self._data = np.array([(note.length.value,
+                                note.notenum.value,
+                                note.tempo.value,
+                                note.velocity.value,
+                                note.intensity.value,
+                                note.modulation.value,
+                                note.pre.value,
+                                note.atPre.value,
+                                note.ove.value,
+                                note.atOve.value,
+                                note.stp.value,
+                                note.atStp.value) for note in self._notes], dtype=DTYPE)
+
+    def set(self, field: str, index: int, value):
+        '''
+        | index番目のノートのfieldを更新します。
+        | Noteのvalueに代入するため、isUpdateも更新されます。
+        | テンポを変更しても、後続のノートのテンポは変わりません。
+
+        Parameters
+        ----------
+        field: str
+            FIELDSの列の名前
+
+        index: int
+            ノートの位置
+
+        value
+            新しい値
+
+        Raises
+        ------
+        KeyError
+            fieldがFIELDSにない場合
+
+        ValueError
+            valueが不正な値の場合
+        '''
+        if field not in DTYPE.names:
+            raise KeyError(field)
+        note: Note = self._notes[index]
+        is_current: bool = self.is_current
+        getattr(note, field).value = value
+        self._data[field][index] = getattr(note, field).value
+        if is_current:
+            self._revision = EntryBase.revision
+
+    def tick_starts(self) -> np.ndarray:
+        '''
+        各ノートの開始位置(tick)を返します。
+
+        Returns
+        -------
+        tick_starts: np.ndarray of np.int64
+        '''
+        return np.cumsum(self._data["length"]) - self._data["length"]
+
+    def ms_lengths(self) -> np.ndarray:
+        '''
+        各ノートの長さ(ms)を返します。値はNote.msLengthと一致します。
+
+        Returns
+        -------
+        ms_lengths: np.ndarray of np.float64
+        '''
+        return 60 / self._data["tempo"] * self._data["length"] / 480 * 1000
+
+    def ms_starts(self) -> np.ndarray:
+        '''
+        各ノートの開始位置(ms)を返します。
+
+        Returns
+        -------
+        ms_starts: np.ndarray of np.float64
+        '''
+        return self.positions()[1]
+
+    def positions(self) -> tuple:
+        '''
+        各ノートの開始位置と長さをまとめて返します。
+
+        Returns
+        -------
+        tick_starts: np.ndarray of np.int64
+            各ノートの開始位置(tick)
+
+        ms_starts: np.ndarray of np.float64
+            各ノートの開始位置(ms)
+
+        ms_lengths: np.ndarray of np.float64
+            各ノートの長さ(ms)
+        '''
+        ms_lengths: np.ndarray = self.ms_lengths()
+        return self.tick_starts(), np.cumsum(ms_lengths) - ms_lengths, ms_lengths
+
+    def total_ms(self) -> float:
+        '''
+        曲全体の長さ(ms)を返します。
+
+        Returns
+        -------
+        total_ms: float
+        '''
+        return float(self.ms_lengths().sum())
@@ -1,15 +1,27 @@
 ﻿import os
 import os.path
 import shutil
+import wave
+import logging
+import pickle
+import traceback
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
 from logging import Logger
+from typing import Tuple
 
 import numpy as np
 import PyRwu
 import PyWavTool
 
 from .Ust import Ust
+from .TempoMap import TempoMap
 from .RenderNote import RenderNote
+from .WavMixer import WavMixer
+from .ResampCache import ResampCache
+from .FeatureCache import FeatureCache
+from .SongPitch import SongPitch
 from voicebank import VoiceBank
+from voicebank.registry import VoiceBankRegistry
 import settings.logger as mylogger
 import settings
 
@@ -23,17 +35,100 @@ class FastResamp(PyRwu.Resamp):
                threshold: float):
         self._ap = np.zeros_like(self._sp)
 
+class _ListHandler(logging.Handler):
+    '''
+    worker内で出力されたログを、呼び出し元に返すために保持します。
+    '''
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.messages = []
+
+    def emit(self, record: logging.LogRecord):
+        self.messages.append(record.getMessage())
+
+_worker_feature_cache: FeatureCache = None
+'''ProcessPoolExecutorのworkerごとに1つ生成し、そのworkerで処理する全てのノートで共有する解析結果のキャッシュ'''
+
+def _init_worker(feature_cache: bytes):
+    '''
+    | ProcessPoolExecutorのworkerの起動時に呼び出され、_worker_feature_cacheを初期化する。
+    | forkで起動した場合も呼び出し元のsqliteの接続を引き継がないよう、pickleしたFeatureCacheを受け取る。
+
+    Parameters
+    ----------
+    feature_cache: bytes
+        pickleしたFeatureCache
+    '''
+    global _worker_feature_cache
+    _worker_feature_cache = pickle.loads(feature_cache)
+
+def _run_resamp(resamp_class: type, params: tuple, feature_cache: FeatureCache = None) -> Tuple[str, list]:
+    '''
+    | worker poolから呼び出され、1ノート分のキャッシュファイルを生成する。
+    | 例外は呼び出し元に送らず、エラーメッセージとして返す。
+
+    Parameters
+    ----------
+    resamp_class: type
+        PyRwu.Resampもしくはその派生クラス
+
+    params: tuple
+        resamp_classに渡す位置引数
+
+    feature_cache: FeatureCache, default None
+        | 入力wavの解析結果のキャッシュ。
+        | 省略した場合、_init_workerで初期化したworkerのキャッシュがあればそれを使用する。
+
+    Returns
+    -------
+    error: str
+        エラーメッセージ。正常終了した場合""
+
+    messages: list of str
+        処理中に出力されたログ
+    '''
+    handler: _ListHandler = _ListHandler()
+    logger: Logger = logging.Logger(__name__ + ".worker")
+    logger.addHandler(handler)
+    if feature_cache is None:
+        feature_cache = _worker_feature_cache
+    try:
+        resamp = resamp_class(*params, logger=logger)
+        if feature_cache is not None:
+            feature_cache.attach(resamp)
+        resamp.resamp()
+    except Exception as e:
+        return traceback.format_exception_only(type(e), e)[0].rstrip('\n'), handler.messages
+    return "", handler.messages
+
 class Render:
     '''
     ustからwavを生成する処理を扱います。
+
+    Attributes
+    ----------
+    window: tuple or None
+        | 出力する範囲を曲頭からのmsで表した(先頭, 末尾)の組。
+        | 曲全体を出力する場合None
     '''
     _cache_dir: str
     _output_file: str
     _ust: Ust
+    _window: tuple = None
+    _window_origin: float = 0
     notes: list
     vb: VoiceBank
+    resamp_cache: ResampCache = None
+    feature_cache: FeatureCache = None
+    song_pitch: SongPitch = None
+
+    @property
+    def window(self) -> tuple:
+        return self._window
 
-    def __init__(self, ust: Ust, *, voice_dir: str = "",cache_dir: str = "", output_file: str = "", logger: Logger = None):
+    def __init__(self, ust: Ust, *, voice_dir: str = "",cache_dir: str = "", output_file: str = "", logger: Logger = None,
+                 resamp_cache: ResampCache = None, song_pitch: bool = False, registry: VoiceBankRegistry = None,
+                 start: float = None, end: float = None, tick: bool = False, feature_cache: FeatureCache = None):
         '''
         Parameters
         ----------
@@ -50,12 +145,43 @@ class Render:
         output_file: str, default ""
             ustで指定している以外の場所にwavファイルを生成する場合、フルパスを指定します。
 
+        resamp_cache: ResampCache, default None
+            | 複数のプロジェクトで共有するキャッシュ。
+            | 指定した場合、cache_dirにキャッシュファイルがなければresamp_cacheから取得し、生成したキャッシュファイルを保存します。
+
+        song_pitch: bool, default False
+            | Trueの場合、ustがmode2であれば曲全体のピッチ曲線を1度だけ求めてself.song_pitchに保持し、各ノートはそこから切り出します。
+            | ノートの境界付近では、ノート単位の計算と結果が異なる場合があります。
+
+        registry: VoiceBankRegistry, default None
+            | 複数のRenderで共有する音源の一覧。
+            | 指定した場合、音源を読み込む代わりにregistryから取得します。
+
+        start: float, default None
+            | 出力する範囲の先頭。曲頭からのmsで指定します。
+            | startかendを指定した場合、範囲に音が含まれるノートだけをresampして合成し、出力ファイルをその範囲に切り詰めます。
+            | 省略した場合は曲頭です。
+
+        end: float, default None
+            | 出力する範囲の末尾。曲頭からのmsで指定します。
+            | 省略した場合は曲末です。
+
+        tick: bool, default False
+            Trueの場合、startとendをmsの代わりにtickとして扱います。
+
+        feature_cache: FeatureCache, default None
+            | 入力wavのworld解析結果のキャッシュ。
+            | 指定した場合、同じ原音を使用するノートは2回目以降のresampで解析を省略します。
         '''
         self.logger = logger or default_logger
+        self.resamp_cache = resamp_cache
+        self.feature_cache = feature_cache
         self._ust = ust
-        self.notes = []
         
-        self.vb = VoiceBank(self._init_voicedir(voice_dir))
+        if registry is not None:
+            self.vb = registry.get(self._init_voicedir(voice_dir))
+        else:
+            self.vb = VoiceBank(self._init_voicedir(voice_dir))
 
         if cache_dir != "":
             self._cache_dir = cache_dir
@@ -67,11 +193,116 @@ class Render:
         else:
             self._output_file = ust.output_file
 
-        for note in ust.notes:
-            note.apply_oto(self.vb.oto,self.vb.prefix)
+        if start is not None or end is not None:
+            self._window = self._init_window(ust, start, end, tick)
+        self._load_notes(ust, song_pitch)
+
+    def _load_notes(self, ust: Ust, song_pitch: bool):
+        '''
+        ustの各ノートに原音設定を適用し、self.notesを生成します。
+
+        Parameters
+        ----------
+        ust: Ust
+            load済みのustもしくはUtauPlugin形式のデータ
+
+        song_pitch: bool
+            Trueの場合、ustがmode2であれば曲全体のピッチ曲線を求めてself.song_pitchに保持します。
+        '''
+        self.notes = []
+        self.song_pitch = None
+        ust.apply_oto_all(self.vb)
+
+        if song_pitch and ust.mode2:
+            self.song_pitch = SongPitch(ust.notes)
+
+        notes: list = ust.notes
+        if self._window is not None:
+            indexes, self._window_origin = self._get_window_notes(ust, *self._window)
+            notes = notes[indexes.start:indexes.stop]
+            self.logger.info("rendering {} / {} notes in {:.2f} - {:.2f} ms".format(len(notes), len(ust.notes), *self._window))
+        for note in notes:
+            self.notes.append(RenderNote(note, self.vb, self._cache_dir, self._output_file, ust.mode2, self.song_pitch))
+
+    @staticmethod
+    def _init_window(ust: Ust, start: float, end: float, tick: bool) -> tuple:
+        '''
+        出力する範囲を、曲の長さに収めたmsに変換します。
+
+        Parameters
+        ----------
+        ust: Ust
+
+        start: float or None
+            範囲の先頭。Noneの場合は曲頭
+
+        end: float or None
+            範囲の末尾。Noneの場合は曲末
+
+        tick: bool
+            Trueの場合、startとendをtickとして扱います。
+
+        Returns
+        -------
+        window: tuple
+            (先頭, 末尾)のms
+
+        Raises
+        ------
+        ValueError
+            範囲の末尾が先頭より前の場合
+        '''
+        # Ust.tempo_mapは、参照時にNoteの変更を読み直した索引を返す
+        tempo_map: TempoMap = ust.tempo_map
+        total_ms: float = tempo_map.total_ms()
+        start_ms: float = 0 if start is None else tempo_map.tick_to_ms(start) if tick else float(start)
+        # 曲末以降のstartだけを指定した場合は、曲末の長さ0の範囲にする
+        end_ms: float = max(total_ms, start_ms) if end is None else tempo_map.tick_to_ms(end) if tick else float(end)
+        if end_ms < start_ms:
+            raise ValueError("end {} is before start {}".format(end, start))
+        return min(max(start_ms, 0), total_ms), min(max(end_ms, 0), total_ms)
+
+    @staticmethod
+    def _get_window_notes(ust: Ust, start_ms: float, end_ms: float) -> Tuple[range, float]:
+        '''
+        | start_ms～end_msに音が含まれるノートの範囲を、ust.tempo_mapの二分探索で求めます。
+        | 各ノートの音は、先行発声の分だけノートの開始位置より前から、次のノートのオーバーラップの位置まで続くものとして扱います。
+        | 範囲と重なるノートを探索した後、前後のノートを音が範囲に届く間だけ加えます。
 
-        for note in ust.notes:
-            self.notes.append(RenderNote(note, self.vb, self._cache_dir, self._output_file, ust.mode2))
+        Parameters
+        ----------
+        ust: Ust
+            apply_oto済みのust
+
+        start_ms: float
+            範囲の先頭(ms)
+
+        end_ms: float
+            範囲の末尾(ms)
+
+        Returns
+        -------
+        indexes: range
+            出力するノートの位置
+
+        origin: float
+            | 出力するノートだけを合成した波形の先頭に当たる、曲頭からの位置(ms)。
+            | 先頭のノートの開始位置から先行発声を引いた値です。
+        '''
+        tempo_map: TempoMap = ust.tempo_map
+        indexes: range = tempo_map.notes_between(start_ms, end_ms)
+        if len(indexes) == 0:
+            return range(0), start_ms
+        notes: list = ust.notes
+        ms_starts: np.ndarray = tempo_map.ms_starts
+        first: int = indexes.start
+        last: int = indexes.stop
+        # 次のノートのオーバーラップが先行発声より長い場合、前のノートの音は次のノートの開始位置より後まで続く
+        while first > 0 and ms_starts[first] + notes[first].atOve.value - notes[first].atPre.value > start_ms:
+            first -= 1
+        while last < len(notes) and ms_starts[last] - notes[last].atPre.value < end_ms:
+            last += 1
+        return range(first, last), float(ms_starts[first] - notes[first].atPre.value)
 
     def _init_voicedir(self, voice_dir) -> str:
         '''
@@ -100,7 +331,7 @@ class Render:
 
         return voice_dir
 
-    def resamp(self, * , force:bool = False):
+    def resamp(self, * , force:bool = False, workers: int = 1, use_thread: bool = False) -> list:
         '''
         PyRwu.Resampを使用してキャッシュファイルを生成する。
 
@@ -108,75 +339,436 @@ class Render:
         ----------
         force: bool, default False
             Trueの場合、キャッシュファイルがあっても生成する。
+
+        workers: int, default 1
+            | 並列に実行するworkerの数。
+            | 1の場合、1ノートずつ順番に処理する。
+            | 0の場合、os.cpu_count()の値を使用する。
+
+        use_thread: bool, default False
+            | Trueの場合、ProcessPoolExecutorの代わりにThreadPoolExecutorを使用する。
+            | workersが1の場合は無視される。
+
+        Returns
+        -------
+        failed_notes: list of RenderNote
+            | キャッシュファイルの生成に失敗したノート。
+            | 失敗したノートがあっても、残りのノートの処理は継続する。
+
+        Notes
+        -----
+        | windows環境でworkersに2以上を指定する場合、呼び出し元のスクリプトを if __name__ == "__main__": で保護してください。
         '''
+        return self._resamp_notes(PyRwu.Resamp, force, workers, use_thread)
+
+    def fast_resamp(self, * , force:bool = False, workers: int = 1, use_thread: bool = False) -> list:
+        '''
+        FastResampを使用してキャッシュファイルを生成する。
+
+        Parameters
+        ----------
+        force: bool, default False
+            Trueの場合、キャッシュファイルがあっても生成する。
+
+        workers: int, default 1
+            | 並列に実行するworkerの数。
+            | 1の場合、1ノートずつ順番に処理する。
+            | 0の場合、os.cpu_count()の値を使用する。
+
+        use_thread: bool, default False
+            | Trueの場合、ProcessPoolExecutorの代わりにThreadPoolExecutorを使用する。
+            | workersが1の場合は無視される。
+
+        Returns
+        -------
+        failed_notes: list of RenderNote
+            | キャッシュファイルの生成に失敗したノート。
+            | 失敗したノートがあっても、残りのノートの処理は継続する。
+        '''
+        return self._resamp_notes(FastResamp, force, workers, use_thread)
+
+    def _resamp_notes(self, resamp_class: type, force: bool, workers: int, use_thread: bool, notes: list = None) -> list:
+        '''
+        | resamp_classを使用して、キャッシュが存在しないノートのキャッシュファイルを生成する。
+        | workersが2以上の場合、worker poolに処理を分配し、ログと結果はノート順に出力する。
+
+        Parameters
+        ----------
+        resamp_class: type
+            PyRwu.Resampもしくはその派生クラス
+
+        force: bool
+            Trueの場合、キャッシュファイルがあっても生成する。
+
+        workers: int
+            並列に実行するworkerの数。0の場合、os.cpu_count()の値を使用する。
+
+        use_thread: bool
+            Trueの場合、ThreadPoolExecutorを使用する。
+
+        notes: list of RenderNote, default None
+            処理するノート。省略した場合self.notes
+
+        Returns
+        -------
+        failed_notes: list of RenderNote
+            キャッシュファイルの生成に失敗したノート
+        '''
+        if notes is None:
+            notes = self.notes
         os.makedirs(self._cache_dir, exist_ok=True)
-        for note in self.notes:
-            if not note.require_resamp:
-                continue
-            if force or not os.path.isfile(note.cache_path):
-                self.logger.info("{} {} {} {} {} {} {} {} {} {} {} {} {}".format(note.input_path, note.cache_path, note.target_tone, note.velocity, note.flags,
-                                      note.offset, note.target_ms, note.fixed_ms, note.end_ms, note.intensity,
-                                      note.modulation, note.tempo, note.pitchbend))
-                resamp = PyRwu.Resamp(note.input_path, note.cache_path, note.target_tone, note.velocity, note.flags,
-                                      note.offset, note.target_ms, note.fixed_ms, note.end_ms, note.intensity,
-                                      note.modulation, note.tempo, note.pitchbend, logger=self.logger)
-                resamp.resamp()
-            else:
-                self.logger.info("{} have be cached".format(note.cache_path))
+        if workers == 0:
+            workers = os.cpu_count() or 1
+        failed_notes: list = []
+        if workers == 1:
+            for note in notes:
+                if not self._resamp_note(resamp_class, note, force):
+                    failed_notes.append(note)
+            return failed_notes
 
-                
+        with self._get_pool(workers, use_thread, self.feature_cache) as executor:
+            futures: list = self._submit_notes(executor, resamp_class, force, notes)
+            for note, future in zip(notes, futures):
+                if not self._collect_note(resamp_class, note, future):
+                    failed_notes.append(note)
+        return failed_notes
 
-    def fast_resamp(self, * , force:bool = False):
+    def render(self, * , force: bool = False, workers: int = 0, use_thread: bool = False, fast: bool = False, in_memory: bool = False) -> list:
         '''
-        FastResampを使用してキャッシュファイルを生成する。
+        | キャッシュファイルの生成と出力ファイルの合成を並行して実行する。
+        | 全ノートのresampをworker poolに送ったうえで、先頭のノートから順に、キャッシュファイルが生成され次第wavtoolで追記する。
 
         Parameters
         ----------
         force: bool, default False
             Trueの場合、キャッシュファイルがあっても生成する。
+
+        workers: int, default 0
+            | 並列に実行するworkerの数。
+            | 0の場合、os.cpu_count()の値を使用する。
+            | 1の場合、1ノートずつresampとappendを交互に実行する。
+
+        use_thread: bool, default False
+            Trueの場合、ProcessPoolExecutorの代わりにThreadPoolExecutorを使用する。
+
+        fast: bool, default False
+            Trueの場合、PyRwu.Resampの代わりにFastResampを使用する。
+
+        in_memory: bool, default False
+            Trueの場合、PyWavToolの代わりにWavMixerを使用し、一時ファイルを経由せずに合成する。
+
+        Returns
+        -------
+        failed_notes: list of RenderNote
+            | キャッシュファイルの生成に失敗したノート。
+            | 失敗したノートは無音として出力ファイルに追記される。
         '''
+        resamp_class: type = FastResamp if fast else PyRwu.Resamp
         os.makedirs(self._cache_dir, exist_ok=True)
-        for note in self.notes:
-            if not note.require_resamp:
-                continue
-            if force or not os.path.isfile(note.cache_path):
-                self.logger.info("{} {} {} {} {} {} {} {} {} {} {} {} {}".format(note.input_path, note.cache_path, note.target_tone, note.velocity, note.flags,
-                                      note.offset, note.target_ms, note.fixed_ms, note.end_ms, note.intensity,
-                                      note.modulation, note.tempo, note.pitchbend))
-                resamp = FastResamp(note.input_path, note.cache_path, note.target_tone, note.velocity, note.flags,
-                                      note.offset, note.target_ms, note.fixed_ms, note.end_ms, note.intensity,
-                                      note.modulation, note.tempo, note.pitchbend, logger=self.logger)
+        if workers == 0:
+            workers = os.cpu_count() or 1
+        failed_notes: list = []
+        wavtool: PyWavTool.WavTool = self._open_wavtool(in_memory)
+        if workers == 1:
+            for note in self.notes:
+                if not self._resamp_note(resamp_class, note, force):
+                    failed_notes.append(note)
+                self._append_note(wavtool, note)
+        else:
+            with self._get_pool(workers, use_thread, self.feature_cache) as executor:
+                futures: list = self._submit_notes(executor, resamp_class, force)
+                for note, future in zip(self.notes, futures):
+                    if not self._collect_note(resamp_class, note, future):
+                        failed_notes.append(note)
+                    self._append_note(wavtool, note)
+        self._close_wavtool(wavtool)
+        self._trim_output()
+        return failed_notes
+
+    @staticmethod
+    def _get_pool(workers: int, use_thread: bool, feature_cache: FeatureCache = None) -> Executor:
+        '''
+        worker poolを返す。
+
+        Parameters
+        ----------
+        workers: int
+            並列に実行するworkerの数。
+
+        use_thread: bool
+            Trueの場合、ThreadPoolExecutorを使用する。
+
+        feature_cache: FeatureCache, default None
+            | ProcessPoolExecutorの各workerに1度だけ渡す解析結果のキャッシュ。
+            | ノートごとに渡すとメモリ上の解析結果を引き継げないため、workerの起動時に渡して全てのノートで共有する。
+
+        Returns
+        -------
+        executor: concurrent.futures.Executor
+        '''
+        if use_thread:
+            return ThreadPoolExecutor(max_workers=workers)
+        if feature_cache is None:
+            return ProcessPoolExecutor(max_workers=workers)
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(pickle.dumps(feature_cache),))
+
+    def _resamp_note(self, resamp_class: type, note: RenderNote, force: bool) -> bool:
+        '''
+        | 必要であれば、呼び出し元のプロセスでnoteのキャッシュファイルを生成する。
+        | 生成中の例外は、worker poolで実行した場合と同様にログに出力し、送出しない。
+
+        Parameters
+        ----------
+        resamp_class: type
+            PyRwu.Resampもしくはその派生クラス
+
+        note: RenderNote
+
+        force: bool
+            Trueの場合、キャッシュファイルがあっても生成する。
+
+        Returns
+        -------
+        success: bool
+            キャッシュファイルの生成に失敗した場合False
+        '''
+        if not note.require_resamp:
+            return True
+        if force or not (os.path.isfile(note.cache_path) or self._fetch_cache(resamp_class, note)):
+            self.logger.info(self._format_resamp_params(note))
+            try:
+                resamp = resamp_class(*self._get_resamp_params(note), logger=self.logger)
+                if self.feature_cache is not None:
+                    self.feature_cache.attach(resamp)
                 resamp.resamp()
+            except Exception as e:
+                self.logger.error("{} can't resamp. because {}".format(
+                    note.cache_path, traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+                return False
+            self._store_cache(resamp_class, note)
+        else:
+            self.logger.info("{} have be cached".format(note.cache_path))
+        return True
+
+    def _submit_notes(self, executor: Executor, resamp_class: type, force: bool, notes: list = None) -> list:
+        '''
+        キャッシュファイルの生成が必要なノートをexecutorに送る。
+
+        Parameters
+        ----------
+        executor: concurrent.futures.Executor
+
+        resamp_class: type
+            PyRwu.Resampもしくはその派生クラス
+
+        force: bool
+            Trueの場合、キャッシュファイルがあっても生成する。
+
+        notes: list of RenderNote, default None
+            処理するノート。省略した場合self.notes
+
+        Returns
+        -------
+        futures: list of concurrent.futures.Future
+            notesと同じ順に並べたFuture。executorに送らなかったノートはNone
+        '''
+        if notes is None:
+            notes = self.notes
+        futures: list = []
+        for note in notes:
+            if note.require_resamp and (force or not (os.path.isfile(note.cache_path) or self._fetch_cache(resamp_class, note))):
+                # ProcessPoolExecutorでは、_get_poolでworkerに渡したキャッシュを使用する
+                if self.feature_cache is None or isinstance(executor, ProcessPoolExecutor):
+                    futures.append(executor.submit(_run_resamp, resamp_class, self._get_resamp_params(note)))
+                else:
+                    futures.append(executor.submit(_run_resamp, resamp_class, self._get_resamp_params(note), self.feature_cache))
             else:
-                self.logger.info("{} have be cached".format(note.cache_path))
+                futures.append(None)
+        return futures
 
-    def append(self):
+    def _collect_note(self, resamp_class: type, note: RenderNote, future: Future) -> bool:
+        '''
+        futureの完了を待ち、worker内で出力されたログを出力する。
+
+        Parameters
+        ----------
+        resamp_class: type
+            PyRwu.Resampもしくはその派生クラス
+
+        note: RenderNote
+
+        future: concurrent.futures.Future or None
+            _submit_notesが返したFuture
+
+        Returns
+        -------
+        success: bool
+            キャッシュファイルの生成に失敗した場合False
+        '''
+        if not note.require_resamp:
+            return True
+        if future is None:
+            self.logger.info("{} have be cached".format(note.cache_path))
+            return True
+        self.logger.info(self._format_resamp_params(note))
+        try:
+            error, messages = future.result()
+        except Exception as e:
+            error, messages = traceback.format_exception_only(type(e), e)[0].rstrip('\n'), []
+        for message in messages:
+            self.logger.info(message)
+        if error != "":
+            self.logger.error("{} can't resamp. because {}".format(note.cache_path, error))
+            return False
+        self._store_cache(resamp_class, note)
+        return True
+
+    def _fetch_cache(self, resamp_class: type, note: RenderNote) -> bool:
+        '''
+        self.resamp_cacheにnoteのキャッシュがあれば、note.cache_pathにコピーする。
+
+        Parameters
+        ----------
+        resamp_class: type
+            PyRwu.Resampもしくはその派生クラス
+
+        note: RenderNote
+
+        Returns
+        -------
+        hit: bool
+            キャッシュが見つかった場合True
+        '''
+        if self.resamp_cache is None:
+            return False
+        return self.resamp_cache.fetch(ResampCache.get_key(note, resamp_class), note.cache_path)
+
+    def _store_cache(self, resamp_class: type, note: RenderNote):
+        '''
+        生成したnote.cache_pathをself.resamp_cacheに保存する。
+
+        Parameters
+        ----------
+        resamp_class: type
+            PyRwu.Resampもしくはその派生クラス
+
+        note: RenderNote
+        '''
+        if self.resamp_cache is None or not os.path.isfile(note.cache_path):
+            return
+        self.resamp_cache.store(ResampCache.get_key(note, resamp_class), note.cache_path)
+
+    @staticmethod
+    def _get_resamp_params(note: RenderNote) -> tuple:
+        '''
+        noteからPyRwu.Resampに渡す位置引数を返す。
+
+        Parameters
+        ----------
+        note: RenderNote
+
+        Returns
+        -------
+        params: tuple
+        '''
+        return (note.input_path, note.cache_path, note.target_tone, note.velocity, note.flags,
+                note.offset, note.target_ms, note.fixed_ms, note.end_ms, note.intensity,
+                note.modulation, note.tempo, note.pitchbend)
+
+    @staticmethod
+    def _format_resamp_params(note: RenderNote) -> str:
+        '''
+        ログ出力用に、PyRwu.Resampに渡すパラメータを空白区切りの文字列にして返す。
+
+        Parameters
+        ----------
+        note: RenderNote
+
+        Returns
+        -------
+        params: str
+        '''
+        return " ".join(map(str, Render._get_resamp_params(note)))
+
+    def append(self, *, in_memory: bool = False):
         '''
         PyWavToolを使用してキャッシュファイルから出力ファイルを合成する。
+
+        Parameters
+        ----------
+        in_memory: bool, default False
+            | Trueの場合、PyWavToolの代わりにWavMixerを使用する。
+            | 全ノートのoutput_msの合計から確保したバッファに直接合成し、.whdと.datの一時ファイルを使用しない。
+        '''
+        wavtool: PyWavTool.WavTool = self._open_wavtool(in_memory)
+        for note in self.notes:
+            self._append_note(wavtool, note)
+        self._close_wavtool(wavtool)
+        self._trim_output()
+
+    def _open_wavtool(self, in_memory: bool = False) -> PyWavTool.WavTool:
+        '''
+        既存の一時ファイルを削除し、self._output_fileに出力するPyWavTool.WavToolを返す。
+
+        Parameters
+        ----------
+        in_memory: bool, default False
+            | Trueの場合、全ノートのoutput_msの合計の長さを確保したWavMixerを返す。
+            | 出力するノートが無い場合も、WavMixerを返す。
+
+        Returns
+        -------
+        wavtool: PyWavTool.WavTool or WavMixer
         '''
+        # PyWavToolは1ノートも追記しないと.datを作成しないため、範囲内にノートが無い場合は空のwavをWavMixerで書き込む
+        if in_memory or len(self.notes) == 0:
+            return WavMixer(self._output_file, sum([note.output_ms for note in self.notes]))
+
         output_dir: str = os.path.split(self._output_file)[0]
         if output_dir != "":
-            os.makedirs(output_dir, exists_ok=True)
+            os.makedirs(output_dir, exist_ok=True)
 
         if os.path.isfile(self._output_file+".whd"):
             os.remove(self._output_file+".whd")
 
         if os.path.isfile(self._output_file+".dat"):
             os.remove(self._output_file+".dat")
-        wavtool = PyWavTool.WavTool(self._output_file)
-        for note in self.notes:
-            if note.direct:
-                self.logger.info("{} {} {} {}".format(note.input_path, note.envelope, note.stp+note.offset, note.output_ms))
-                wavtool.inputCheck(note.input_path)
-                wavtool.setEnvelope([float(item) for item in note.envelope.split(" ")])
-                wavtool.applyData(note.stp + note.offset, note.output_ms)
-            else:
-                self.logger.info("{} {} {} {}".format(note.cache_path, note.envelope, note.stp, note.output_ms))
-                wavtool.inputCheck(note.cache_path)
-                wavtool.setEnvelope([float(item) for item in note.envelope.split(" ")])
-                wavtool.applyData(note.stp, note.output_ms)
+        return PyWavTool.WavTool(self._output_file)
+
+    def _append_note(self, wavtool: PyWavTool.WavTool, note: RenderNote):
+        '''
+        noteの波形をwavtoolに追記する。
+
+        Parameters
+        ----------
+        wavtool: PyWavTool.WavTool or WavMixer
+
+        note: RenderNote
+        '''
+        if note.direct:
+            self.logger.info("{} {} {} {}".format(note.input_path, note.envelope, note.stp+note.offset, note.output_ms))
+            wavtool.inputCheck(note.input_path)
+            wavtool.setEnvelope([float(item) for item in note.envelope.split(" ")])
+            wavtool.applyData(note.stp + note.offset, note.output_ms)
+        else:
+            self.logger.info("{} {} {} {}".format(note.cache_path, note.envelope, note.stp, note.output_ms))
+            wavtool.inputCheck(note.cache_path)
+            wavtool.setEnvelope([float(item) for item in note.envelope.split(" ")])
+            wavtool.applyData(note.stp, note.output_ms)
+
+    def _close_wavtool(self, wavtool: PyWavTool.WavTool):
+        '''
+        wavtoolが出力した.whdと.datを結合してself._output_fileを生成し、一時ファイルを削除する。
+
+        Parameters
+        ----------
+        wavtool: PyWavTool.WavTool or WavMixer
+            WavMixerの場合、self._output_fileに直接書き込む。
+        '''
         wavtool.write()
-            
+        if isinstance(wavtool, WavMixer):
+            return
+
         with open(self._output_file, "wb") as fw:
             with open(self._output_file+".whd", "rb") as fr:
                 fw.write(fr.read())
@@ -189,6 +781,25 @@ class Render:
         if os.path.isfile(self._output_file+".dat"):
             os.remove(self._output_file+".dat")
 
+    def _trim_output(self):
+        '''
+        | self.windowが指定されている場合、self._output_fileをself.windowの範囲に切り詰めます。
+        | 合成した波形が範囲より短い場合は、末尾を無音で埋めます。
+        '''
+        if self._window is None:
+            return
+        with wave.open(self._output_file, "rb") as wr:
+            params: tuple = wr.getparams()
+            frame_per_ms: float = params.framerate / 1000
+            head: int = max(int((self._window[0] - self._window_origin) * frame_per_ms), 0)
+            nframes: int = int((self._window[1] - self._window[0]) * frame_per_ms)
+            wr.setpos(min(head, params.nframes))
+            data: bytes = wr.readframes(nframes)
+        data += b"\x00" * (nframes * params.sampwidth * params.nchannels - len(data))
+        with wave.open(self._output_file, "wb") as ww:
+            ww.setparams(params)
+            ww.writeframes(data)
+
     def clean(self):
         '''
         self._cache_dirとself._output_fileが存在すれば削除する。
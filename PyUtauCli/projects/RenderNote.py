@@ -1,7 +1,9 @@
-﻿import os.path
+﻿import os
+import os.path
+import re
 import hashlib
 
-from typing import Tuple
+from typing import Tuple, TYPE_CHECKING
 
 import numpy as np
 import PyRwu.pitch
@@ -9,6 +11,14 @@ import PyRwu.pitch
 from .Note import Note
 from voicebank import VoiceBank
 import settings
+if TYPE_CHECKING:
+    from .SongPitch import SongPitch
+
+_BASE64_TABLE: bytes = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+_BASE64_ENCODER: np.ndarray = np.frombuffer(_BASE64_TABLE, dtype=np.uint8)
+_BASE64_DECODER: np.ndarray = np.zeros(256, dtype=np.int64)
+_BASE64_DECODER[_BASE64_ENCODER] = np.arange(64)
+_RUNLENGTH_PATTERN: re.Pattern = re.compile("#([0-9]+)#")
 
 class RenderNote:
     '''
@@ -22,6 +32,9 @@ class RenderNote:
     cache_path: str
         resampが出力する中間ファイルのパス
 
+    cache_key: str
+        resampに渡す全てのパラメータと原音ファイルの更新日時・サイズから求めたsha256のハッシュ文字
+
     output_path: str
         wavtoolが出力する最終ファイルのパス
 
@@ -104,6 +117,7 @@ class RenderNote:
     _stp: float
     _envelope: str
     _cache_path: str
+    _cache_key: str
     _output_ms: float
     _require_resamp: bool = True
     _direct: bool = False
@@ -171,6 +185,10 @@ class RenderNote:
     @property
     def cache_path(self) -> str:
         return self._cache_path
+
+    @property
+    def cache_key(self) -> str:
+        return self._cache_key
     
     @property
     def output_ms(self) -> float:
@@ -184,7 +202,7 @@ class RenderNote:
     def direct(self) -> bool:
         return self._direct
 
-    def __init__(self, note: Note, vb: VoiceBank, cachedir: str, output: str, mode2: bool = True):
+    def __init__(self, note: Note, vb: VoiceBank, cachedir: str, output: str, mode2: bool = True, song_pitch: "SongPitch" = None):
         '''
         Parameters
         ----------
@@ -205,6 +223,10 @@ class RenderNote:
             | ピッチデータの扱い。
             | Trueの場合、PBS,PBY,PBM,PBW,Vibratoを解釈
             | Falseの場合、Pitches,PBStartを解釈
+
+        song_pitch: SongPitch, default None
+            | mode2がTrueの場合に、ノート単位でピッチを計算する代わりに使用する曲全体のピッチ曲線。
+            | noteを含むUstから生成しておくこと
         '''
         self._input_path = os.path.join(vb.dirpath, note.atFileName.value)
         self._output_path = output
@@ -229,7 +251,7 @@ class RenderNote:
         self._modulation = note.modulation.value
         self._tempo = "!{:.2f}".format(note.tempo.value)
         if note.lyric.value != "R":
-            self._pitchbend = self._get_pitches(note, mode2)
+            self._pitchbend = self._get_pitches(note, mode2, song_pitch)
         else:
             self._pitchbend = ""
         self._stp = note.atStp.value
@@ -240,42 +262,48 @@ class RenderNote:
                 self._envelope = note.envelope.value.replace(","," ") + " " +str(note.atOve)
         else:
             self._envelope = settings.DEFAULT_ENV.replace("%", str(note.atOve))
+        self._cache_key = self._get_cache_hash()
         self._cache_path = os.path.join(cachedir, "{}_{}_{}_{}.wav".format(note.num.value[1:],
                                                 note.atAlias.value.replace(" ","+"),
                                                 note.notenum.get_tone_name(),
-                                                self._get_cache_hash(note)))
+                                                self._cache_key))
         if note.direct.value:
             self._require_resamp = False
             self._direct = True
 
 
-    def _get_cache_hash(self, note: Note) -> str:
+    def _get_cache_hash(self) -> str:
         '''
-        resampが使用する各パラメータを使用して、ハッシュ値を生成します。
-
-        Parameters
-        ----------
-        note: Note
-            | 変換するノート。
-            | noteとnote.nextは事前にapply_otoを実施しておくこと
+        | resampに渡す全てのパラメータと、原音ファイルの更新日時・サイズを使用して、ハッシュ値を生成します。
+        | 原音ファイルが更新された場合も異なる値になります。
 
         Returns
         -------
         hash: str
-            6桁のハッシュ文字
+            sha256の64桁のハッシュ文字
 
         '''
-        return hashlib.md5("{}_{}_{}_{}_{}_{}_{}_{}".format(note.pre.value,
-                                                            note.stp.value,
-                                                            note.velocity.value,
-                                                            note.flags.value,
-                                                            note.intensity.value,
-                                                            note.modulation.value,
-                                                            note.tempo.value,
-                                                            self._pitchbend,
-                                                            ).encode()).hexdigest()[:6]
-
-    def _get_pitches(self, note: Note, mode2: bool) -> str:
+        if os.path.isfile(self._input_path):
+            stat: os.stat_result = os.stat(self._input_path)
+            input_stat: str = "{}_{}".format(stat.st_mtime_ns, stat.st_size)
+        else:
+            input_stat: str = ""
+        return hashlib.sha256("\n".join(map(str, [os.path.abspath(self._input_path),
+                                                  input_stat,
+                                                  self._target_tone,
+                                                  self._velocity,
+                                                  self._flags,
+                                                  self._offset,
+                                                  self._target_ms,
+                                                  self._fixed_ms,
+                                                  self._end_ms,
+                                                  self._intensity,
+                                                  self._modulation,
+                                                  self._tempo,
+                                                  self._pitchbend,
+                                                  ])).encode()).hexdigest()
+
+    def _get_pitches(self, note: Note, mode2: bool, song_pitch: "SongPitch" = None) -> str:
         '''
         | mode2の値に応じてピッチ列を返します。
         | Falseの場合、Pitches,PBStartを解釈
@@ -292,6 +320,9 @@ class RenderNote:
             | Trueの場合、PBS,PBY,PBM,PBW,Vibratoを解釈
             | Falseの場合、Pitches,PBStartを解釈
 
+        song_pitch: SongPitch, default None
+            mode2がTrueの場合、指定されていればsong_pitchから該当範囲を切り出す
+
         Returns
         -------
         pitchbend: str
@@ -301,7 +332,9 @@ class RenderNote:
         '''
         t: np.ndarray = PyRwu.pitch.getPitchRange(self._tempo, self._target_ms, 44100)
         offset: float = note.atPre.value + note.atStp.value
-        if mode2:
+        if mode2 and song_pitch is not None:
+            base_pitches: np.ndarray = song_pitch.get_pitches(note, t, offset)
+        elif mode2:
             base_pitches: np.ndarray = self._get_base_pitches(note, t)
             if note.prev is not None and note.prev.lyric.value != "R":
                 base_pitches += self._interp_pitches(note.prev, t, offset - note.prev.msLength)
@@ -321,7 +354,7 @@ class RenderNote:
             print(end)
             if start < end:
                 base_pitches[start:end] = np.array(note.pitches.value)
-        return self.encodeRunLength(self.encodeBase64(base_pitches))
+        return self.encodePitches(base_pitches)
 
     def _get_base_pitches(self, note: Note, t:np.ndarray) -> np.ndarray:
         '''
@@ -354,9 +387,9 @@ class RenderNote:
             if note.prev.pbs.time + prev_offset < 0:
                 start = 0
             else:
-                start = np.where(t >= note.prev.pbs.time + prev_offset)[0][0]
+                start = np.searchsorted(t, note.prev.pbs.time + prev_offset)
             if t[0]<=note.pbs.time + offset:
-                end = np.where(t < note.pbs.time + offset)[0][-1]
+                end = np.searchsorted(t, note.pbs.time + offset) - 1
             else:
                 end = 0
             if start < end:
@@ -364,7 +397,7 @@ class RenderNote:
         if note.next is not None and note.next.lyric.value != "R":
             next_offset: float = offset + note.msLength
             if t[-1] >= note.next.pbs.time + next_offset:
-                start = np.where(t >= note.next.pbs.time + next_offset)[0][0]
+                start = np.searchsorted(t, note.next.pbs.time + next_offset)
                 base_pitches[start:] = (note.next.notenum.value - note.notenum.value) * 100
         return base_pitches
 
@@ -395,7 +428,8 @@ class RenderNote:
             return pitches
 
         x, y, mode = self._get_interp_base(note, offset)
-            
+        indexes: np.ndarray = np.searchsorted(t, x)
+
         start: int
         end: int
         for i in range(len(x)):
@@ -403,7 +437,7 @@ class RenderNote:
                 continue
             if t[-1] <= x[i]:
                 continue
-            start, end, cycle, height, phase = self._get_interp_param(x, y, t, i)
+            start, end, cycle, height, phase = self._get_interp_param(x, y, t, i, indexes)
             if start >= end:
                 continue
             if(mode[i-1] == ""):
@@ -437,10 +471,10 @@ class RenderNote:
     def _interp_j(cycle, height, phase, offset):
         return (-np.cos(np.pi / cycle / 2 * phase)+1) * height + offset
 
-    def _get_interp_param(self, x: np.ndarray, y: np.ndarray, t: np.ndarray, i: int) -> Tuple[int, int, float, float, np.ndarray]:
+    def _get_interp_param(self, x: np.ndarray, y: np.ndarray, t: np.ndarray, i: int, indexes: np.ndarray = None) -> Tuple[int, int, float, float, np.ndarray]:
         '''
         x[i-1]～x[i]の間のピッチパラメータを求めるための諸元を求めます。
-        
+
         Parameters
         ----------
         x: np.ndarray
@@ -454,6 +488,10 @@ class RenderNote:
 
         i: xのindex
 
+        indexes: np.ndarray, default None
+            | np.searchsorted(t, x)の結果。
+            | 省略した場合はその都度求めます。
+
         Returns
         -------
         start: int
@@ -471,9 +509,11 @@ class RenderNote:
         phase: np.ndarray
             t[start:end+1]をx[i-1]からの経過時間に変換したもの
         '''
-        start: int = np.where(t>=x[i-1])[0][0]
+        if indexes is None:
+            indexes = np.searchsorted(t, x)
+        start: int = indexes[i-1]
         if t[0]<x[i]:
-            end: int = np.where(t<x[i])[0][-1]
+            end: int = indexes[i] - 1
         else:
             end: int = 0
         cycle: float = x[i] - x[i-1]
@@ -481,7 +521,8 @@ class RenderNote:
         phase: np.ndarray = t[start:end+1] - x[i-1]
         return start, end, cycle, height, phase
 
-    def _get_interp_base(self, note: Note, offset:float) -> Tuple[np.ndarray, np.ndarray, list]:
+    @staticmethod
+    def _get_interp_base(note: Note, offset:float) -> Tuple[np.ndarray, np.ndarray, list]:
         '''
         noteのpbs,pby,pbw,pbmとnote.prev.notenumを使ってinterpに使用するx,y,modeを求める
         
@@ -546,9 +587,9 @@ class RenderNote:
             return pitches
         start_ms: float = offset + note.msLength * (100 - note.vibrato.length) / 100
         end_ms: float = offset + note.msLength
-        start: int = np.where(t>=start_ms)[0][0]
+        start: int = np.searchsorted(t, start_ms)
         if t[0] < end_ms:
-            end: int = np.where(t<end_ms)[0][-1]
+            end: int = np.searchsorted(t, end_ms) - 1
         else:
             end: int =0
         if start >= end:
@@ -568,11 +609,10 @@ class RenderNote:
         fadeintime: float = vibrato_ms * note.vibrato.fadeInTime / 100
         fadeout_start_ms: float = vibrato_ms - vibrato_ms * note.vibrato.fadeOutTime / 100
         fade:np.ndarray = np.ones_like(t,dtype=np.float64)
-        for i in range(len(t)):
-            if t[i] <= fadeintime and fadeintime != 0:
-                fade[i] =  t[i] / fadeintime
-            elif t[i] >= fadeout_start_ms:
-                fade[i] =  1 - ((t[i] - fadeout_start_ms) / (vibrato_ms - fadeout_start_ms))
+        fadein: np.ndarray = (t <= fadeintime) & (fadeintime != 0)
+        fadeout: np.ndarray = ~fadein & (t >= fadeout_start_ms) & (fadeout_start_ms != vibrato_ms)
+        fade[fadein] = t[fadein] / fadeintime
+        fade[fadeout] = 1 - ((t[fadeout] - fadeout_start_ms) / (vibrato_ms - fadeout_start_ms))
         return fade
 
     @staticmethod
@@ -614,12 +654,28 @@ class RenderNote:
         result: list
             base64にエンコードした2桁の文字列のリスト
         '''
-        result: list = []
-        for value in values:
-            tmp = value
-            if value < 0:
-                tmp += 4096
-            result.append(RenderNote.encodeBase64Core(int(tmp/64)) + RenderNote.encodeBase64Core(tmp&63))
+        return RenderNote._encodeBase64Bytes(values).view("S2")[:, 0].astype(str).tolist()
+
+    @staticmethod
+    def _encodeBase64Bytes(values: np.ndarray) -> np.ndarray:
+        '''
+        -2048 ～ 2047の数字を受け取り、base64の文字コードを1組2バイトで並べた配列を返します。
+
+        Parameters
+        ----------
+        values: np.ndarray
+            -2048 ～ 2047のint列
+
+        Returns
+        -------
+        result: np.ndarray of np.uint8
+            len(values) × 2の配列
+        '''
+        tmp: np.ndarray = np.asarray(values, dtype=np.int64)
+        tmp = np.where(tmp < 0, tmp + 4096, tmp)
+        result: np.ndarray = np.empty((tmp.shape[0], 2), dtype=np.uint8)
+        result[:, 0] = _BASE64_ENCODER[np.clip(tmp // 64, 0, 63)]
+        result[:, 1] = _BASE64_ENCODER[tmp & 63]
         return result
 
     @staticmethod
@@ -640,18 +696,79 @@ class RenderNote:
         -------
         result: str
         '''
-        result: str = ""
-        tmp: str = ""
-        num: int = 0
-        for value in values:
-            if tmp != value:
-                tmp = value
-                if num != 0:
-                    result += "#{}#".format(num)
-                num = 0
-                result += value
-            else:
-                num += 1
-        if num != 0:
-            result += "#{}#".format(num)
-        return result
\ No newline at end of file
+        if len(values) == 0:
+            return ""
+        array: np.ndarray = np.array(values)
+        return RenderNote._joinRunLength(array, np.flatnonzero(array[1:] != array[:-1]) + 1)
+
+    @staticmethod
+    def _joinRunLength(values: np.ndarray, changes: np.ndarray) -> str:
+        '''
+        値が変化する位置を受け取り、ランレングス圧縮した文字列を返します。
+
+        Parameters
+        ----------
+        values: np.ndarray of str
+            2文字一組の文字列の配列
+
+        changes: np.ndarray of int
+            ひとつ前の組と値が異なる位置
+
+        Returns
+        -------
+        result: str
+        '''
+        starts: np.ndarray = np.concatenate([[0], changes]).astype(np.int64)
+        repeats: np.ndarray = np.diff(np.append(starts, values.shape[0])) - 1
+        result: list = values[starts].tolist()
+        for i in np.flatnonzero(repeats):
+            result[i] += "#{}#".format(repeats[i])
+        return "".join(result)
+
+    @staticmethod
+    def encodePitches(values: np.ndarray) -> str:
+        '''
+        | -2048 ～ 2047の数字を受け取り、base64にエンコードしたうえでランレングス圧縮します。
+        | encodeRunLength(encodeBase64(values))と同じ結果を返します。
+
+        Parameters
+        ----------
+        values: np.ndarray
+            -2048 ～ 2047のint列
+
+        Returns
+        -------
+        result: str
+        '''
+        if len(values) == 0:
+            return ""
+        codes: np.ndarray = RenderNote._encodeBase64Bytes(values)
+        pairs: np.ndarray = codes.view("S2")[:, 0].astype(str)
+        changes: np.ndarray = np.flatnonzero(np.diff(codes.view(np.uint16)[:, 0].astype(np.int32))) + 1
+        return RenderNote._joinRunLength(pairs, changes)
+
+    @staticmethod
+    def decodePitches(value: str) -> np.ndarray:
+        '''
+        | encodePitchesでエンコードした文字列を展開し、-2048 ～ 2047の数字を返します。
+        | PyRwu.pitch.decodeBase64(PyRwu.pitch.decodeRunLength(value))と同じ結果を返します。
+
+        Parameters
+        ----------
+        value: str
+            base64にエンコードしランレングス圧縮した文字列
+
+        Returns
+        -------
+        result: np.ndarray of np.int16
+        '''
+        parts: list = _RUNLENGTH_PATTERN.split(value)
+        chars: np.ndarray = np.frombuffer("".join(parts[0::2]).encode("ascii"), dtype=np.uint8)
+        codes: np.ndarray = _BASE64_DECODER[chars[0::2]] * 64 + _BASE64_DECODER[chars[1::2]]
+        codes = np.where(codes >= 2048, codes - 4096, codes).astype(np.int16)
+        repeats: np.ndarray = np.ones(codes.shape[0], dtype=np.int64)
+        position: int = 0
+        for i in range(1, len(parts), 2):
+            position += len(parts[i - 1]) // 2
+            repeats[position - 1] += int(parts[i])
+        return np.repeat(codes, repeats)
\ No newline at end of file
@@ -0,0 +1,252 @@
+﻿'''RenderSession
+ustの編集のたびに、変更のあったノートだけをresampし、出力ファイルの該当範囲だけを書き換えます。
+'''
+
+import os
+import os.path
+from logging import Logger
+
+import PyRwu
+
+from .Ust import Ust
+from .Render import Render, FastResamp
+from .RenderNote import RenderNote
+from .WavMixer import WavMixer
+from .ResampCache import ResampCache
+from .FeatureCache import FeatureCache
+from voicebank.registry import VoiceBankRegistry
+
+
+class RenderSession(Render):
+    '''
+    | 直前の出力に使用した各ノートの波形を保持し、updateで与えた新しいustとの差分だけを合成し直します。
+    | プラグインやエディタのプレビューのように、同じustを少しずつ編集しながら繰り返し出力する用途を想定しています。
+
+    | 各ノートは、wavtoolに渡す全てのパラメータ(キャッシュファイルの場合はRenderNote.cache_key)を鍵として比較します。
+    | autofit_atparamによる前後のノートのatPre,atStpの変化や、前後のノートのピッチの変化も、鍵の変化として検出されます。
+    | 鍵が変わらず位置だけがずれたノートは、resampも入力ファイルの読込も行わずに保持している波形を再配置します。
+
+    Attributes
+    ----------
+    dirty_notes: list of RenderNote
+        直前のupdateで、波形を作り直す必要があると判定されたノート
+
+    dirty_ranges: list of tuple
+        直前のrenderで合成し直したフレームの範囲(先頭, 末尾)のリスト
+    '''
+    dirty_notes: list
+    dirty_ranges: list
+    _song_pitch_enabled: bool
+    _mixer: WavMixer = None
+    _layout: list
+    _segments: dict
+
+    def __init__(self, ust: Ust, *, voice_dir: str = "",cache_dir: str = "", output_file: str = "", logger: Logger = None,
+                 resamp_cache: ResampCache = None, song_pitch: bool = False, registry: VoiceBankRegistry = None,
+                 feature_cache: FeatureCache = None):
+        '''
+        Parameters
+        ----------
+        ust: Ust
+            load済みのustもしくはUtauPlugin形式のデータ
+
+        voice_dir: str, default ""
+            | ustで指定している音源以外で出力する場合に音源のフルパスを指定します。
+            | %VOICE%はsettings.VOICE_ROOTの値に置き換えられます。
+
+        cache_dir: str, default ""
+            ustで指定している以外の場所にキャッシュファイルを生成する場合、フルパスを指定します。
+
+        output_file: str, default ""
+            ustで指定している以外の場所にwavファイルを生成する場合、フルパスを指定します。
+
+        resamp_cache: ResampCache, default None
+            複数のプロジェクトで共有するキャッシュ。
+
+        song_pitch: bool, default False
+            Trueの場合、ustがmode2であれば曲全体のピッチ曲線から各ノートのピッチを切り出します。
+
+        registry: VoiceBankRegistry, default None
+            複数のRenderで共有する音源の一覧。
+
+        feature_cache: FeatureCache, default None
+            入力wavのworld解析結果のキャッシュ。
+        '''
+        self._song_pitch_enabled = song_pitch
+        self._layout = []
+        self._segments = {}
+        self.dirty_ranges = []
+        super().__init__(ust, voice_dir=voice_dir, cache_dir=cache_dir, output_file=output_file, logger=logger,
+                         resamp_cache=resamp_cache, song_pitch=song_pitch, registry=registry, feature_cache=feature_cache)
+        self.dirty_notes = list(self.notes)
+
+    def update(self, ust: Ust) -> list:
+        '''
+        | 出力するustを差し替えます。
+        | 音源、キャッシュフォルダ、出力ファイルは初期化時のものを引き継ぎます。
+
+        Parameters
+        ----------
+        ust: Ust
+            load済みのustもしくはUtauPlugin形式のデータ
+
+        Returns
+        -------
+        dirty_notes: list of RenderNote
+            保持している波形を再利用できず、作り直す必要があるノート
+        '''
+        self._ust = ust
+        self._load_notes(ust, self._song_pitch_enabled)
+        self.dirty_notes = [note for note in self.notes if self._get_append_key(note) not in self._segments]
+        self.logger.info("{} / {} notes are changed".format(len(self.dirty_notes), len(self.notes)))
+        return self.dirty_notes
+
+    def render(self, * , force: bool = False, workers: int = 0, use_thread: bool = False, fast: bool = False) -> list:
+        '''
+        | self.dirty_notesのキャッシュファイルを生成し、直前の出力から変化した範囲だけを合成し直して出力ファイルを書き換えます。
+        | 初回は全てのノートを合成し、出力ファイル全体を書き込みます。
+
+        Parameters
+        ----------
+        force: bool, default False
+            Trueの場合、self.dirty_notesはキャッシュファイルがあっても生成する。
+
+        workers: int, default 0
+            | 並列に実行するworkerの数。
+            | 0の場合、os.cpu_count()の値を使用する。
+
+        use_thread: bool, default False
+            Trueの場合、ProcessPoolExecutorの代わりにThreadPoolExecutorを使用する。
+
+        fast: bool, default False
+            Trueの場合、PyRwu.Resampの代わりにFastResampを使用する。
+
+        Returns
+        -------
+        failed_notes: list of RenderNote
+            | キャッシュファイルの生成に失敗したノート。
+            | 失敗したノートは無音として合成され、次回のupdateでも作り直す対象になる。
+        '''
+        resamp_class: type = FastResamp if fast else PyRwu.Resamp
+        failed_notes: list = self._resamp_notes(resamp_class, force, workers, use_thread,
+                                                [note for note in self.dirty_notes if note.require_resamp])
+        if self._mixer is None:
+            self._mixer = WavMixer(self._output_file, sum([note.output_ms for note in self.notes]))
+
+        segments: dict = {}
+        layout: list = []
+        nframes: int = 0
+        for note in self.notes:
+            key: tuple = self._get_append_key(note)
+            if key in self._segments:
+                data, ove_frames = self._segments[key]
+            else:
+                data, ove_frames = self._make_segment(note)
+                if self._mixer.error:
+                    key = ("error",) + key
+            segments[key] = (data, ove_frames)
+            start: int = WavMixer.getStart(nframes, ove_frames, data.shape[0])
+            layout.append((key, start, data))
+            nframes = start + data.shape[0]
+
+        self.dirty_ranges = self._get_dirty_ranges(self._layout, layout)
+        self._mixer.resize(nframes)
+        self._segments = {key: value for key, value in segments.items() if key[0] != "error"}
+        self._layout = layout
+        for start, end in self.dirty_ranges:
+            self._mixer.remix(start, end, [(item[1], item[2]) for item in layout
+                                           if item[1] < end and item[1] + item[2].shape[0] > start])
+        if len(self.dirty_ranges) != 0 or not os.path.isfile(self._output_file):
+            self._patch_output()
+        self.dirty_notes = []
+        return failed_notes
+
+    def _patch_output(self):
+        '''
+        self.dirty_rangesの範囲だけ出力ファイルを書き換えます。
+        '''
+        if len(self.dirty_ranges) == 0:
+            self._mixer.write()
+            return
+        for start, end in self.dirty_ranges:
+            self._mixer.patch(start, end)
+
+    def _make_segment(self, note: RenderNote) -> tuple:
+        '''
+        noteのエンベロープを適用した波形を作ります。
+
+        Parameters
+        ----------
+        note: RenderNote
+
+        Returns
+        -------
+        data: np.ndarray of np.float64
+            WavMixer.makeDataが返した波形
+
+        ove_frames: int
+            先行するノートと重なるフレーム数
+        '''
+        if note.direct:
+            self.logger.info("{} {} {} {}".format(note.input_path, note.envelope, note.stp+note.offset, note.output_ms))
+            self._mixer.inputCheck(note.input_path)
+            stp: float = note.stp + note.offset
+        else:
+            self.logger.info("{} {} {} {}".format(note.cache_path, note.envelope, note.stp, note.output_ms))
+            self._mixer.inputCheck(note.cache_path)
+            stp: float = note.stp
+        self._mixer.setEnvelope([float(item) for item in note.envelope.split(" ")])
+        return self._mixer.makeData(stp, note.output_ms), self._mixer.getOverlap()
+
+    @staticmethod
+    def _get_append_key(note: RenderNote) -> tuple:
+        '''
+        noteをwavtoolに追記する際の波形を一意に決める鍵を返します。
+
+        Parameters
+        ----------
+        note: RenderNote
+
+        Returns
+        -------
+        key: tuple
+        '''
+        if note.direct:
+            stat: os.stat_result = os.stat(note.input_path) if os.path.isfile(note.input_path) else None
+            return ("direct", note.input_path, stat and stat.st_mtime_ns, stat and stat.st_size,
+                    note.envelope, note.stp + note.offset, note.output_ms)
+        return ("cache", note.cache_key, note.envelope, note.stp, note.output_ms)
+
+    @staticmethod
+    def _get_dirty_ranges(old_layout: list, new_layout: list) -> list:
+        '''
+        | 2つの配置を比較し、合成し直す必要があるフレームの範囲を返します。
+        | 同じ鍵の波形が同じ位置にあるノートは変化がないとみなします。
+
+        Parameters
+        ----------
+        old_layout: list of tuple
+            直前の出力の(鍵, 先頭のフレーム位置, 波形)のリスト
+
+        new_layout: list of tuple
+            今回の出力の(鍵, 先頭のフレーム位置, 波形)のリスト
+
+        Returns
+        -------
+        dirty_ranges: list of tuple
+            重複しない(先頭, 末尾)のリストを先頭の昇順に並べたもの
+        '''
+        old_items: set = {(item[0], item[1]) for item in old_layout}
+        new_items: set = {(item[0], item[1]) for item in new_layout}
+        ranges: list = [(item[1], item[1] + item[2].shape[0]) for item in new_layout if (item[0], item[1]) not in old_items]
+        ranges += [(item[1], item[1] + item[2].shape[0]) for item in old_layout if (item[0], item[1]) not in new_items]
+        ranges.sort()
+        merged: list = []
+        for start, end in ranges:
+            if start >= end:
+                continue
+            if len(merged) != 0 and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
@@ -0,0 +1,251 @@
+﻿'''ResampCache
+複数のプロジェクトや音源で共有できる、resampの出力ファイルのキャッシュ。
+'''
+
+import os
+import os.path
+import sys
+import time
+import shutil
+import hashlib
+import sqlite3
+import importlib.metadata
+from logging import Logger
+
+from .RenderNote import RenderNote
+import settings.logger as mylogger
+
+default_logger = mylogger.get_logger(__name__, False)
+
+
+class ResampCache:
+    '''
+    | resampの全入力とresamplerの種類から求めたキーで、出力ファイルを保存します。
+    | 保存したファイルはSQLiteのインデックスで管理し、合計サイズが上限を超えた場合や、
+    | 最後に使用してから一定時間が経過した場合、最後に使用した日時が古いものから削除します。
+
+    Attributes
+    ----------
+    root: str
+        キャッシュを保存するフォルダ
+
+    max_bytes: int
+        キャッシュの合計サイズの上限
+
+    max_age: float
+        最後に使用してから削除されるまでの秒数
+
+    hits: int
+        fetchでキャッシュが見つかった回数
+
+    misses: int
+        fetchでキャッシュが見つからなかった回数
+    '''
+    INDEX_NAME: str = "index.sqlite3"
+
+    _root: str
+    _max_bytes: int
+    _max_age: float
+    _conn: sqlite3.Connection
+    _hits: int
+    _misses: int
+
+    @property
+    def root(self) -> str:
+        return self._root
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    @property
+    def max_age(self) -> float:
+        return self._max_age
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    @property
+    def total_bytes(self) -> int:
+        return self._conn.execute("SELECT value FROM meta WHERE key = 'total_bytes'").fetchone()[0]
+
+    def __init__(self, root: str, *, max_bytes: int = 2 * 1024 ** 3, max_age: float = 30 * 24 * 60 * 60, logger: Logger = None):
+        '''
+        Parameters
+        ----------
+        root: str
+            キャッシュを保存するフォルダ。存在しない場合は作成します。
+
+        max_bytes: int, default 2GiB
+            キャッシュの合計サイズの上限
+
+        max_age: float, default 30日
+            最後に使用してから削除されるまでの秒数
+        '''
+        self.logger = logger or default_logger
+        self._root = root
+        self._max_bytes = max_bytes
+        self._max_age = max_age
+        self._hits = 0
+        self._misses = 0
+        os.makedirs(self._root, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(self._root, self.INDEX_NAME), timeout=30)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS entries ("
+                               "key TEXT PRIMARY KEY, size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            # 合計サイズはstoreのたびに参照するため、entriesの変更に合わせてtriggerで更新し続ける。
+            # 同じrootを共有する他のプロセスの変更も反映されるよう、プロセス内ではなくインデックスに保持する。
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn.execute("INSERT OR IGNORE INTO meta (key, value) SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM entries")
+            self._conn.execute("CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN "
+                               "UPDATE meta SET value = value + NEW.size WHERE key = 'total_bytes'; END")
+            self._conn.execute("CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN "
+                               "UPDATE meta SET value = value - OLD.size WHERE key = 'total_bytes'; END")
+            self._conn.execute("CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN "
+                               "UPDATE meta SET value = value - OLD.size + NEW.size WHERE key = 'total_bytes'; END")
+
+    def close(self):
+        '''
+        インデックスを閉じます。
+        '''
+        self._conn.close()
+
+    @staticmethod
+    def get_resamp_identity(resamp_class: type) -> str:
+        '''
+        resamplerのクラス名と、継承元を含むパッケージのバージョンを返します。
+
+        Parameters
+        ----------
+        resamp_class: type
+            PyRwu.Resampもしくはその派生クラス
+
+        Returns
+        -------
+        identity: str
+        '''
+        identity: list = []
+        for cls in resamp_class.__mro__[:-1]:
+            package: str = cls.__module__.split(".")[0]
+            try:
+                version: str = importlib.metadata.version(package)
+            except importlib.metadata.PackageNotFoundError:
+                version: str = getattr(sys.modules.get(package), "__version__", "")
+            identity.append("{}.{}:{}".format(cls.__module__, cls.__qualname__, version))
+        return ";".join(identity)
+
+    @staticmethod
+    def get_key(note: RenderNote, resamp_class: type) -> str:
+        '''
+        noteのresampに使用するキャッシュのキーを返します。
+
+        Parameters
+        ----------
+        note: RenderNote
+
+        resamp_class: type
+            PyRwu.Resampもしくはその派生クラス
+
+        Returns
+        -------
+        key: str
+            sha256の64桁のハッシュ文字
+        '''
+        return hashlib.sha256("{}\n{}".format(note.cache_key,
+                                              ResampCache.get_resamp_identity(resamp_class)).encode()).hexdigest()
+
+    def _get_path(self, key: str) -> str:
+        return os.path.join(self._root, key[:2], key + ".wav")
+
+    def fetch(self, key: str, dst: str) -> bool:
+        '''
+        keyに対応するキャッシュがあれば、dstにコピーします。
+
+        Parameters
+        ----------
+        key: str
+
+        dst: str
+            コピー先のパス
+
+        Returns
+        -------
+        hit: bool
+            キャッシュが見つかった場合True
+        '''
+        row: tuple = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        path: str = self._get_path(key)
+        if row is None or not os.path.isfile(path):
+            if row is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._misses += 1
+            return False
+        if os.path.split(dst)[0] != "":
+            os.makedirs(os.path.split(dst)[0], exist_ok=True)
+        # hardlinkにすると、force=Trueで再生成したときにキャッシュ側も書き換わるためコピーする
+        shutil.copyfile(path, dst)
+        with self._conn:
+            self._conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+        self._hits += 1
+        return True
+
+    def store(self, key: str, src: str):
+        '''
+        srcをkeyのキャッシュとして保存し、上限を超えた分のキャッシュを削除します。
+
+        Parameters
+        ----------
+        key: str
+
+        src: str
+            保存するファイルのパス
+        '''
+        path: str = self._get_path(key)
+        os.makedirs(os.path.split(path)[0], exist_ok=True)
+        tmp_path: str = "{}.{}.tmp".format(path, os.getpid())
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, path)
+        now: float = time.time()
+        with self._conn:
+            # INSERT OR REPLACEの暗黙の削除ではtriggerが実行されないため、既存のキーはUPDATEにする
+            self._conn.execute("INSERT INTO entries (key, size, created, accessed) VALUES (?, ?, ?, ?) "
+                               "ON CONFLICT (key) DO UPDATE SET size = excluded.size, created = excluded.created, accessed = excluded.accessed",
+                               (key, os.path.getsize(path), now, now))
+        self.evict()
+
+    def evict(self) -> int:
+        '''
+        | 最後に使用してからmax_ageを超えたキャッシュを削除します。
+        | さらに合計サイズがmax_bytesを超えている場合、最後に使用した日時が古いものから削除します。
+
+        Returns
+        -------
+        count: int
+            削除したキャッシュの数
+        '''
+        removed: list = []
+        expire: float = time.time() - self._max_age
+        total: int = self.total_bytes
+        # entries_accessedの順に必要な行だけを読み、削除は読み終えてから行う
+        cursor: sqlite3.Cursor = self._conn.execute("SELECT key, size, accessed FROM entries ORDER BY accessed ASC")
+        for key, size, accessed in cursor:
+            if accessed >= expire and total <= self._max_bytes:
+                break
+            removed.append(key)
+            total -= size
+        cursor.close()
+        with self._conn:
+            for key in removed:
+                if os.path.isfile(self._get_path(key)):
+                    os.remove(self._get_path(key))
+                self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+        if len(removed) != 0:
+            self.logger.debug("{} resamp caches are evicted.".format(len(removed)))
+        return len(removed)
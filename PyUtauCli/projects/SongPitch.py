@@ -0,0 +1,310 @@
+﻿'''SongPitch
+Ust全体のピッチ曲線を、ノートごとではなく曲単位で一度に求めます。
+'''
+
+import math
+from typing import Tuple
+
+import numpy as np
+
+from .Note import Note
+from .RenderNote import RenderNote
+
+TICKS_PER_POINT: int = 5
+'''ピッチ点の間隔(tick)。UTAUは4分音符を96分割してピッチを扱うため、480/96=5tick'''
+
+MARGIN_MS: float = 1000
+'''曲の前後に確保する時間(ms)'''
+
+
+def _concat_ranges(starts: np.ndarray, lengths: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    starts[i]からlengths[i]個の連番を連結した配列と、各要素がどの範囲に属するかを返します。
+
+    Parameters
+    ----------
+    starts: np.ndarray of int
+
+    lengths: np.ndarray of int
+
+    Returns
+    -------
+    indexes: np.ndarray of int
+
+    owners: np.ndarray of int
+    '''
+    lengths = np.maximum(lengths, 0)
+    owners: np.ndarray = np.repeat(np.arange(lengths.shape[0]), lengths)
+    heads: np.ndarray = np.cumsum(lengths) - lengths
+    indexes: np.ndarray = np.arange(owners.shape[0]) - heads[owners] + starts[owners]
+    return indexes, owners
+
+
+class SongPitch:
+    '''
+    | Ust全体の絶対音高(notenum * 100 + ピッチベンド)を、曲頭を0msとした共通の時間軸上で求めます。
+    | 各ノートのPBS,PBW,PBY,PBM,VBRは1度だけ計算され、RenderNoteはこの曲線から自分の範囲を切り出します。
+    | mode2のピッチのみに対応します。
+
+    | ノート単位の計算とは次の点が異なります。
+    | ・前後のノートに限らず、範囲内にかかる全てのノートのポルタメントとビブラートを合成します。
+    | ・ノートの範囲からはみ出すポルタメントも、途中まで合成します。
+    | ・各成分を整数に切り捨てず、最後に四捨五入します。
+
+    Attributes
+    ----------
+    ms: np.ndarray of np.float64
+        | ピッチ点の時刻(ms)。曲頭が0で、TICKS_PER_POINT tickごとの点に加え、音高が不連続に変化する時刻の直前と直後の点を含みます。
+        | 曲の前後にMARGIN_MSの余白があります。
+
+    cents: np.ndarray of np.float64
+        各ピッチ点の絶対音高(cent)。C4(notenum 60)が6000
+
+    starts: np.ndarray of np.float64
+        各ノートの開始時刻(ms)
+    '''
+    _ms: np.ndarray
+    _cents: np.ndarray
+    _starts: np.ndarray
+    _indexes: dict
+
+    @property
+    def ms(self) -> np.ndarray:
+        return self._ms
+
+    @property
+    def cents(self) -> np.ndarray:
+        return self._cents
+
+    @property
+    def starts(self) -> np.ndarray:
+        return self._starts
+
+    def __init__(self, notes: list):
+        '''
+        Parameters
+        ----------
+        notes: list of Note
+            | Ust.notes。
+            | 各ノートは事前にapply_otoを実施しておくこと
+        '''
+        self._indexes = {id(note): i for i, note in enumerate(notes)}
+        ms_lengths: np.ndarray = np.array([note.msLength for note in notes], dtype=np.float64)
+        self._starts = np.cumsum(ms_lengths) - ms_lengths
+        switch_times, switch_values = self._get_switches(notes)
+        segments: tuple = self._get_segments(notes)
+        vibratos: np.ndarray = self._get_vibratos(notes)
+        self._ms = self._get_timeline(notes, np.concatenate([switch_times, segments[0], segments[1], vibratos[:, 0], vibratos[:, 1]]))
+        if switch_times.shape[0] == 0:
+            self._cents = np.zeros_like(self._ms)
+        else:
+            self._cents = switch_values[np.clip(np.searchsorted(switch_times, self._ms, side="right") - 1, 0, None)]
+        self._add_interp_cents(*segments)
+        self._add_vibrato_cents(vibratos)
+
+    def _get_timeline(self, notes: list, breaks: np.ndarray) -> np.ndarray:
+        '''
+        | TICKS_PER_POINT tickごとのピッチ点の時刻を、各ノートのテンポに従って求めます。
+        | 線形補間で段差がなまらないよう、breaksの各時刻とその直前の時刻を加えます。
+
+        Parameters
+        ----------
+        notes: list of Note
+
+        breaks: np.ndarray
+            音高が不連続に変化しうる時刻(ms)
+
+        Returns
+        -------
+        ms: np.ndarray of np.float64
+        '''
+        if len(notes) == 0:
+            return np.zeros(0, dtype=np.float64)
+        ms_per_tick: np.ndarray = np.array([60 / note.tempo.value / 480 * 1000 for note in notes], dtype=np.float64)
+        ticks: np.ndarray = np.array([note.length.value for note in notes], dtype=np.float64)
+        tick_starts: np.ndarray = np.cumsum(ticks) - ticks
+        head: int = math.ceil(MARGIN_MS / ms_per_tick[0] / TICKS_PER_POINT) * TICKS_PER_POINT
+        tail: int = math.ceil(MARGIN_MS / ms_per_tick[-1] / TICKS_PER_POINT) * TICKS_PER_POINT
+        point_ticks: np.ndarray = np.arange(-head, ticks.sum() + tail, TICKS_PER_POINT, dtype=np.float64)
+        owners: np.ndarray = np.clip(np.searchsorted(tick_starts, point_ticks, side="right") - 1, 0, len(notes) - 1)
+        points: np.ndarray = self._starts[owners] + (point_ticks - tick_starts[owners]) * ms_per_tick[owners]
+        breaks = breaks[(breaks > points[0]) & (breaks < points[-1])]
+        return np.unique(np.concatenate([points, breaks, np.nextafter(breaks, -np.inf)]))
+
+    def _get_switches(self, notes: list) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        | 各ノートのPBSの時刻で切り替わる、notenumの階段状の曲線を求めます。
+        | 休符は、休符の先頭で次のノートの音高に切り替えます。
+
+        Parameters
+        ----------
+        notes: list of Note
+
+        Returns
+        -------
+        switch_times: np.ndarray of np.float64
+            音高が切り替わる時刻(ms)の昇順
+
+        switch_values: np.ndarray of np.float64
+            switch_times以降の音高(cent)
+        '''
+        times: list = []
+        values: list = []
+        next_notenum: int = None
+        for i in range(len(notes) - 1, -1, -1):
+            if notes[i].lyric.value != "R":
+                next_notenum = notes[i].notenum.value
+                times.append(self._starts[i] + notes[i].pbs.time)
+                values.append(next_notenum * 100)
+            elif next_notenum is not None:
+                times.append(self._starts[i])
+                values.append(next_notenum * 100)
+        times.reverse()
+        values.reverse()
+        order: np.ndarray = np.argsort(times, kind="stable")
+        return np.array(times, dtype=np.float64)[order], np.array(values, dtype=np.float64)[order]
+
+    def _get_segments(self, notes: list) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        '''
+        全ノートのPBS,PBW,PBY,PBMを、ポルタメントの区間ごとに並べます。
+
+        Parameters
+        ----------
+        notes: list of Note
+
+        Returns
+        -------
+        x0, x1: np.ndarray of np.float64
+            区間の始点と終点の時刻(ms)
+
+        y0, y1: np.ndarray of np.float64
+            区間の始点と終点の、ノートのnotenumからの相対音高(cent)
+
+        modes: np.ndarray of object
+            区間の補完方法
+        '''
+        x0: list = []
+        x1: list = []
+        y0: list = []
+        y1: list = []
+        modes: list = []
+        for i, note in enumerate(notes):
+            if note.lyric.value == "R" or not note.pbs.hasValue:
+                continue
+            x, y, mode = RenderNote._get_interp_base(note, self._starts[i])
+            x0.extend(x[:-1])
+            x1.extend(x[1:])
+            y0.extend(y[:-1])
+            y1.extend(y[1:])
+            modes.extend(mode)
+        return (np.array(x0, dtype=np.float64), np.array(x1, dtype=np.float64),
+                np.array(y0, dtype=np.float64), np.array(y1, dtype=np.float64), np.array(modes, dtype=object))
+
+    def _get_vibratos(self, notes: list) -> np.ndarray:
+        '''
+        全ノートのビブラートのパラメータを並べます。
+
+        Parameters
+        ----------
+        notes: list of Note
+
+        Returns
+        -------
+        vibratos: np.ndarray of np.float64
+            | 1行が1つのビブラートで、列は次の通りです。
+            | 開始時刻(ms), 終了時刻(ms), 長さ(ms), フェードイン(ms), フェードアウト開始(ms), 周期(ms), 深さ(cent), 位相(rad), 高さ
+        '''
+        params: list = []
+        for i, note in enumerate(notes):
+            if note.lyric.value == "R" or not note.vibrato.hasValue:
+                continue
+            vibrato_ms: float = note.msLength * note.vibrato.length / 100
+            params.append((self._starts[i] + note.msLength - vibrato_ms,
+                           self._starts[i] + note.msLength,
+                           vibrato_ms,
+                           vibrato_ms * note.vibrato.fadeInTime / 100,
+                           vibrato_ms - vibrato_ms * note.vibrato.fadeOutTime / 100,
+                           note.vibrato.cycle,
+                           int(note.vibrato.depth),
+                           2 * np.pi * note.vibrato.phase / 100,
+                           note.vibrato.height / 100))
+        return np.array(params, dtype=np.float64).reshape(-1, 9)
+
+    def _add_interp_cents(self, x0: np.ndarray, x1: np.ndarray, y0: np.ndarray, y1: np.ndarray, modes: np.ndarray):
+        '''
+        _get_segmentsで求めたポルタメントを、self._centsに加算します。
+        '''
+        starts: np.ndarray = np.searchsorted(self._ms, x0)
+        indexes, owners = _concat_ranges(starts, np.searchsorted(self._ms, x1) - starts)
+        cycle: np.ndarray = (x1 - x0)[owners]
+        height: np.ndarray = (y1 - y0)[owners]
+        phase: np.ndarray = self._ms[indexes] - x0[owners]
+        mode: np.ndarray = modes[owners]
+        offset: np.ndarray = y0[owners]
+        values: np.ndarray = np.zeros(indexes.shape[0], dtype=np.float64)
+        for key, interp in (("", RenderNote._interp_default),
+                            ("s", RenderNote._interp_s),
+                            ("r", RenderNote._interp_r),
+                            ("j", RenderNote._interp_j)):
+            mask: np.ndarray = mode == key
+            values[mask] = interp(cycle[mask], height[mask], phase[mask], offset[mask])
+        np.add.at(self._cents, indexes, values)
+
+    def _add_vibrato_cents(self, vibratos: np.ndarray):
+        '''
+        _get_vibratosで求めたビブラートを、self._centsに加算します。
+        '''
+        start_ms, end_ms, vibrato_ms, fadein_ms, fadeout_ms, cycle, depth, phase_offset, height = vibratos.T
+        starts: np.ndarray = np.searchsorted(self._ms, start_ms)
+        indexes, owners = _concat_ranges(starts, np.searchsorted(self._ms, end_ms) - starts)
+        phase: np.ndarray = self._ms[indexes] - start_ms[owners]
+        fade: np.ndarray = np.ones_like(phase)
+        fadein: np.ndarray = (phase <= fadein_ms[owners]) & (fadein_ms[owners] != 0)
+        fadeout: np.ndarray = ~fadein & (phase >= fadeout_ms[owners]) & (vibrato_ms[owners] > fadeout_ms[owners])
+        fade[fadein] = phase[fadein] / fadein_ms[owners][fadein]
+        fade[fadeout] = 1 - ((phase[fadeout] - fadeout_ms[owners][fadeout]) / (vibrato_ms[owners] - fadeout_ms[owners])[fadeout])
+        values: np.ndarray = np.round((np.sin(2 * np.pi / cycle[owners] * phase + phase_offset[owners]) + height[owners])
+                                      * fade * depth[owners])
+        np.add.at(self._cents, indexes, values)
+
+    def get_cents(self, ms: np.ndarray) -> np.ndarray:
+        '''
+        任意の時刻の絶対音高を、前後のピッチ点から線形補間して返します。
+
+        Parameters
+        ----------
+        ms: np.ndarray
+            曲頭を0とした時刻(ms)
+
+        Returns
+        -------
+        cents: np.ndarray of np.float64
+        '''
+        return np.interp(ms, self._ms, self._cents)
+
+    def get_pitches(self, note: Note, t: np.ndarray, offset: float) -> np.ndarray:
+        '''
+        | RenderNote._get_pitchesと同じ時間軸で、noteのnotenumからの相対音高を返します。
+
+        Parameters
+        ----------
+        note: Note
+            このSongPitchの生成に使用したノート
+
+        t: np.ndarray
+            ピッチ点の時間列。resampの入力ファイルの先頭を0とした時刻(ms)
+
+        offset: float
+            t上でのノートの開始時刻(ms)
+
+        Returns
+        -------
+        pitches: np.ndarray of np.int16
+
+        Raises
+        ------
+        KeyError
+            noteがこのSongPitchの生成に使用したノートではないとき
+        '''
+        start: float = self._starts[self._indexes[id(note)]]
+        return np.round(self.get_cents(t + start - offset) - note.notenum.value * 100).astype(np.int16)
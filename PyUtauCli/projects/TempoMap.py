@@ -0,0 +1,320 @@
+﻿'''TempoMap
+ノートの長さとテンポから、曲中の位置をtickとmsの間で二分探索により変換します。
+'''
+
+import numpy as np
+
+from .Note import Note
+from .EntryBase import EntryBase
+
+
+class TempoMap:
+    '''
+    | notesの各ノートの開始位置を、tickとmsの両方の累積配列で保持します。
+    | tickとmsの変換や、時刻からのノートの検索はnp.searchsortedで行うため、ノート数nに対してO(log n)です。
+    | 各ノートの中ではテンポが一定とみなし、ノート内の位置は線形に補間します。
+
+    | set_length,set_tempoで変更した場合は、変更したノート以降の累積値だけを計算し直します。
+    | Noteを直接変更した場合や、notesにノートを追加・削除した場合は、変更した位置を与えてrefreshを呼んでください。
+    | Ust.tempo_mapは、is_currentがFalseの場合に自動でrefreshします。
+
+    Attributes
+    ----------
+    notes: list of Note
+        元になったノートのリスト
+
+    tick_starts: np.ndarray of np.int64
+        | 各ノートの開始位置(tick)。末尾に曲全体の長さを加えた、ノート数+1の要素を持ちます。
+        | 書き換えできないビューを返します。
+
+    ms_starts: np.ndarray of np.float64
+        | 各ノートの開始位置(ms)。末尾に曲全体の長さを加えた、ノート数+1の要素を持ちます。
+        | 書き換えできないビューを返します。
+
+    tempo: float
+        ノートがない場合に使用するテンポ
+
+    is_current: bool
+        | 索引を作成した後に、set_length,set_tempo以外でいずれかのエントリーのvalueが変更されていなければTrue。
+        | 変更を検出するEntryBase.revisionは全てのNoteで共有するため、notes以外のNoteの変更でもFalseになります。
+    '''
+    _notes: list
+    _tempo: float
+    _revision: int
+    _lengths: np.ndarray
+    _tempos: np.ndarray
+    _tick_starts: np.ndarray
+    _ms_starts: np.ndarray
+
+    @property
+    def notes(self) -> list:
+        return self._notes
+
+    @property
+    def tempo(self) -> float:
+        return self._tempo
+
+    @property
+    def is_current(self) -> bool:
+        return self._revision == EntryBase.revision
+
+    @property
+    def tick_starts(self) -> np.ndarray:
+        view: np.ndarray = self._tick_starts.view()
+        view.flags.writeable = False
+        return view
+
+    @property
+    def ms_starts(self) -> np.ndarray:
+        view: np.ndarray = self._ms_starts.view()
+        view.flags.writeable = False
+        return view
+
+    def __init__(self, notes: list, tempo: float = 120.0):
+        '''
+        Parameters
+        ----------
+        notes: list of Note
+
+        tempo: float, default 120.0
+            ノートがない場合に、tickとmsの変換に使用するテンポ。通常はUst.tempo
+        '''
+        self._notes = notes
+        self._tempo = tempo
+        self._lengths = np.zeros(0, dtype=np.int64)
+        self._tempos = np.zeros(0, dtype=np.float64)
+        self._tick_starts = np.zeros(1, dtype=np.int64)
+        self._ms_starts = np.zeros(1, dtype=np.float64)
+        self.refresh()
+
+    def __len__(self) -> int:
+        return self._lengths.shape[0]
+
+    def refresh(self, start: int = 0):
+        '''
+        | self.notesのstart番目以降のノートの長さとテンポを読み直し、累積値を計算し直します。
+        | notesにノートを追加・削除した場合は、最初に変更した位置をstartに与えてください。
+
+        Parameters
+        ----------
+        start: int, default 0
+            最初に変更したノートの位置
+        '''
+        self._revision = EntryBase.revision
+        start = max(0, min(start, len(self._notes), len(self)))
+        tail: list = self._notes[start:]
+        self._lengths = np.concatenate([self._lengths[:start],
+                                        np.fromiter((note.length.value for note in tail), dtype=np.int64, count=len(tail))])
+        self._tempos = np.concatenate([self._tempos[:start],
+                                       np.fromiter((note.tempo.value for note in tail), dtype=np.float64, count=len(tail))])
+        self._tick_starts = np.resize(self._tick_starts, len(self) + 1)
+        self._ms_starts = np.resize(self._ms_starts, len(self) + 1)
+        self._update(start)
+
+    def _update(self, start: int):
+        '''
+        start番目以降のノートの開始位置と、曲全体の長さを計算し直します。
+
+        Parameters
+        ----------
+        start: int
+        '''
+        lengths: np.ndarray = self._lengths[start:]
+        # 先頭から計算した場合と同じ順で加算するため、start番目の開始位置を先頭に置いて累積する
+        self._tick_starts[start + 1:] = np.cumsum(lengths) + self._tick_starts[start]
+        ms_lengths: np.ndarray = 60 / self._tempos[start:] * lengths / 480 * 1000
+        self._ms_starts[start:] = np.cumsum(np.concatenate([self._ms_starts[start:start + 1], ms_lengths]))
+
+    def set_length(self, index: int, length: int):
+        '''
+        | index番目のノートの長さを変更し、以降のノートの開始位置を計算し直します。
+        | Noteのvalueに代入するため、isUpdateも更新されます。
+
+        Parameters
+        ----------
+        index: int
+            ノートの位置
+
+        length: int
+            新しい長さ(tick)
+
+        Raises
+        ------
+        ValueError
+            lengthが不正な値の場合
+        '''
+        note: Note = self._notes[index]
+        is_current: bool = self.is_current
+        note.length.value = length
+        self._lengths[index] = note.length.value
+        self._update(index)
+        if is_current:
+            self._revision = EntryBase.revision
+
+    def set_tempo(self, index: int, tempo: float):
+        '''
+        | index番目のノートのテンポを変更し、以降のノートの開始位置を計算し直します。
+        | Ust読込時と同様に、後続のノートのうちテンポを持たない(hasValueがFalseの)ノートにも、次にテンポを持つノートまで反映します。
+
+        Parameters
+        ----------
+        index: int
+            ノートの位置
+
+        tempo: float
+            新しいテンポ(bpm)
+
+        Raises
+        ------
+        ValueError
+            tempoが不正な値の場合
+        '''
+        note: Note = self._notes[index]
+        is_current: bool = self.is_current
+        note.tempo.value = tempo
+        end: int = index + 1
+        while end < len(self._notes) and not self._notes[end].tempo.hasValue:
+            self._notes[end].tempo.init(note.tempo.value)
+            self._notes[end].tempo.hasValue = False
+            end += 1
+        self._tempos[index:end] = note.tempo.value
+        self._update(index)
+        if is_current:
+            self._revision = EntryBase.revision
+
+    def _segments(self, starts: np.ndarray, values) -> tuple:
+        '''
+        valuesを含むノートの位置と、各ノートのテンポを返します。範囲外の値は先頭もしくは末尾のノートで外挿します。
+
+        Parameters
+        ----------
+        starts: np.ndarray
+            self._tick_startsもしくはself._ms_starts
+
+        values: float or np.ndarray
+
+        Returns
+        -------
+        indexes: np.ndarray of np.int64
+
+        tempos: np.ndarray of np.float64
+        '''
+        if len(self) == 0:
+            return np.zeros(np.shape(values), dtype=np.int64), np.full(np.shape(values), float(self._tempo))
+        indexes: np.ndarray = np.clip(np.searchsorted(starts[:-1], values, side="right") - 1, 0, len(self) - 1)
+        return indexes, self._tempos[indexes]
+
+    def tick_to_ms(self, tick):
+        '''
+        曲頭からの位置をtickからmsに変換します。
+
+        Parameters
+        ----------
+        tick: float or np.ndarray
+
+        Returns
+        -------
+        ms: float or np.ndarray of np.float64
+        '''
+        ticks: np.ndarray = np.asarray(tick, dtype=np.float64)
+        indexes, tempos = self._segments(self._tick_starts, ticks)
+        ms: np.ndarray = self._ms_starts[indexes] + 60 / tempos * (ticks - self._tick_starts[indexes]) / 480 * 1000
+        return float(ms) if ms.ndim == 0 else ms
+
+    def ms_to_tick(self, ms):
+        '''
+        曲頭からの位置をmsからtickに変換します。tickは整数に丸めません。
+
+        Parameters
+        ----------
+        ms: float or np.ndarray
+
+        Returns
+        -------
+        tick: float or np.ndarray of np.float64
+        '''
+        mses: np.ndarray = np.asarray(ms, dtype=np.float64)
+        indexes, tempos = self._segments(self._ms_starts, mses)
+        ticks: np.ndarray = self._tick_starts[indexes] + (mses - self._ms_starts[indexes]) / 1000 * 480 * tempos / 60
+        return float(ticks) if ticks.ndim == 0 else ticks
+
+    def note_at(self, ms: float) -> int:
+        '''
+        | msの時点で発音しているノートの位置を返します。
+        | 長さ0のノートは返しません。
+
+        Parameters
+        ----------
+        ms: float
+            曲頭からの位置(ms)
+
+        Returns
+        -------
+        index: int
+            ノートの位置。曲の範囲外の場合は-1
+        '''
+        if ms < 0 or ms >= self._ms_starts[-1]:
+            return -1
+        return int(np.searchsorted(self._ms_starts, ms, side="right")) - 1
+
+    def note_at_tick(self, tick: int) -> int:
+        '''
+        | tickの時点で発音しているノートの位置を返します。
+        | 長さ0のノートは返しません。
+
+        Parameters
+        ----------
+        tick: int
+            曲頭からの位置(tick)
+
+        Returns
+        -------
+        index: int
+            ノートの位置。曲の範囲外の場合は-1
+        '''
+        if tick < 0 or tick >= self._tick_starts[-1]:
+            return -1
+        return int(np.searchsorted(self._tick_starts, tick, side="right")) - 1
+
+    def notes_between(self, start_ms: float, end_ms: float) -> range:
+        '''
+        | start_ms以上end_ms未満の範囲と重なるノートの位置を返します。
+        | 長さ0のノートは、開始位置がstart_msより後でend_ms未満であれば含みます。
+
+        Parameters
+        ----------
+        start_ms: float
+            範囲の先頭(ms)
+
+        end_ms: float
+            範囲の末尾(ms)
+
+        Returns
+        -------
+        indexes: range
+        '''
+        if end_ms <= start_ms:
+            return range(0)
+        first: int = max(int(np.searchsorted(self._ms_starts[1:], start_ms, side="right")), 0)
+        last: int = int(np.searchsorted(self._ms_starts[:-1], end_ms, side="left"))
+        return range(first, max(first, last))
+
+    def total_ticks(self) -> int:
+        '''
+        曲全体の長さ(tick)を返します。
+
+        Returns
+        -------
+        total_ticks: int
+        '''
+        return int(self._tick_starts[-1])
+
+    def total_ms(self) -> float:
+        '''
+        曲全体の長さ(ms)を返します。
+
+        Returns
+        -------
+        total_ms: float
+        '''
+        return float(self._ms_starts[-1])
@@ -1,15 +1,101 @@
 ﻿import os
 import os.path
+import gc
 import locale
 import traceback
+from operator import attrgetter
 from logging import Logger
+from typing import Iterator
+
+import numpy as np
 
 from .Note import Note
+from .NoteColumns import NoteColumns
+from .TempoMap import TempoMap
+from . import UstSnapshot
 import settings.logger as mylogger
+import common.textfile as textfile
+from voicebank import VoiceBank
+from voicebank.oto import Oto
 
 
 default_logger = mylogger.get_logger(__name__, False)
 
+NOTE_ENTRIES: dict = {
+    "Length": ("length", "init", "length", 480),
+    "Lyric": ("lyric", "init", "lyric", "あ"),
+    "NoteNum": ("notenum", "init", "notenum", 60),
+    "Tempo": ("tempo", "init", "tempo", None),
+    "PreUtterance": ("pre", "init", "pre", None),
+    "@preuttr": ("atPre", "init", "@preuttr", None),
+    "VoiceOverlap": ("ove", "init", "ove", None),
+    "@overlap": ("atOve", "init", "@overlap", None),
+    "StartPoint": ("stp", "init", "stp", None),
+    "@stpoint": ("atStp", "init", "@stpoint", None),
+    "@filename": ("atFileName", "init", "@filename", None),
+    "@alias": ("atAlias", "init", "@alias", None),
+    "Velocity": ("velocity", "init", "Velocity", None),
+    "Intensity": ("intensity", "init", "Intensity", None),
+    "Modulation": ("modulation", "init", "Modulation", None),
+    "PitchBend": ("pitches", "init_from_str", "PitchBend", None),
+    "PBStart": ("pbStart", "init", "PBStart", None),
+    "PBS": ("pbs", "init", "PBS", None),
+    "PBY": ("pby", "init_from_str", "PBY", None),
+    "PBM": ("pbm", "init_from_str", "PBM", None),
+    "PBW": ("pbw", "init_from_str", "PBW", None),
+    "Flags": ("flags", "init", "Flags", None),
+    "VBR": ("vibrato", "init", "VBR", None),
+    "Envelope": ("envelope", "init", "Envelope", None),
+    "Label": ("label", "init", "Label", None),
+    "$direct": ("direct", "init", "$direct", None),
+    "$region": ("region", "init", "$region", None),
+    "$region_end": ("region_end", "init", "$region_end", None),
+}
+'''
+| ustのキーと、Noteの属性名、値を与えるメソッド名、ログに出力する名前、値が不正な場合の既定値の対応。
+| 既定値がNoneのパラメータは、値が不正な場合何もしません。
+'''
+
+HEADER_SECTIONS: tuple = (b"[#VERSION]", b"[#SETTING]")
+'''ヘッダの開始を表す行'''
+
+_NOTE_SETTERS: dict = {key: (attrgetter(attr + "." + method), name) for key, (attr, method, name, default) in NOTE_ENTRIES.items()}
+
+SAVE_ENTRIES: tuple = (
+    ("Length", "length", "always"),
+    ("Lyric", "lyric", "always"),
+    ("NoteNum", "notenum", "always"),
+    ("Tempo", "tempo", "value"),
+    ("PreUtterance", "pre", "blank"),
+    ("VoiceOverlap", "ove", "value"),
+    ("StartPoint", "stp", "value"),
+    ("Velocity", "velocity", "value"),
+    ("Intensity", "intensity", "value"),
+    ("Modulation", "modulation", "value"),
+    ("PitchBend", "pitches", "value"),
+    ("PBStart", "pbStart", "value"),
+    ("PBS", "pbs", "value"),
+    ("PBY", "pby", "value"),
+    ("PBM", "pbm", "value"),
+    ("PBW", "pbw", "value"),
+    ("Flags", "flags", "value"),
+    ("VBR", "vibrato", "value"),
+    ("Envelope", "envelope", "value"),
+    ("Label", "label", "value"),
+    ("$direct", "direct", "value"),
+    ("$region", "region", "value"),
+    ("$region_end", "region_end", "value"),
+)
+'''
+| ustに保存する順の、キーとNoteの属性名、書き込む条件の組。
+| always: 常に書き込む。blank: 値がなければキーのみ書き込む。value: 値があれば書き込む。
+'''
+
+_SAVE_HEADS: tuple = tuple(key + "=" for key, attr, mode in SAVE_ENTRIES)
+_SAVE_ALWAYS: tuple = tuple(mode == "always" for key, attr, mode in SAVE_ENTRIES)
+_SAVE_BLANK: tuple = tuple(mode == "blank" for key, attr, mode in SAVE_ENTRIES)
+_get_save_entries = attrgetter(*[attr for key, attr, mode in SAVE_ENTRIES])
+
 
 class Ust:
     '''
@@ -54,8 +140,28 @@ class Ust:
     utf8: bool, default False
         ustがutf8で保存されているかどうか
 
+    header_encoding: str, default ""
+        | 読み込んだustのヘッダのデコードに使用した文字コード。
+        | common.textfile.decodeの返す名前です。
+
+    body_encoding: str, default ""
+        | 読み込んだustのノート部分のデコードに使用した文字コード。
+        | common.textfile.decodeの返す名前です。
+
+    strict: bool, default False
+        | Trueの場合、ノートのパラメータに不正な値があると、読込を中止してValueErrorを送出します。
+        | Falseの場合、警告をログに出力して読込を続けます。
+
     notes: List of Note
         Noteの配列
+
+    columns: NoteColumns
+        | notesの数値パラメータを列ごとに保持した配列。初回参照時に生成します。
+        | notesのノート数が変わった場合は作り直し、Noteの値が変更された場合は読み直します。
+
+    tempo_map: TempoMap
+        | notesの各ノートの開始位置をtickとmsで保持し、二分探索で変換や検索を行う索引。初回参照時に生成します。
+        | notesのノート数かtempoが変わった場合は作り直し、Noteの値が変更された場合は読み直します。
     '''
 
     filepath: str
@@ -70,15 +176,38 @@ class Ust:
     flags: str = ""
     mode2: bool = False
     utf8: bool = False
+    header_encoding: str = ""
+    body_encoding: str = ""
+    strict: bool = False
     notes: list = []
+    _columns: NoteColumns = None
+    _tempo_map: TempoMap = None
 
     @property
     def version(self) -> float:
         return self._version
 
-    def __init__(self, filepath: str, *, logger: Logger = None):
+    @property
+    def columns(self) -> NoteColumns:
+        if self._columns is None or self._columns.notes is not self.notes or len(self._columns) != len(self.notes):
+            self._columns = NoteColumns(self.notes)
+        elif not self._columns.is_current:
+            self._columns.refresh()
+        return self._columns
+
+    @property
+    def tempo_map(self) -> TempoMap:
+        if (self._tempo_map is None or self._tempo_map.notes is not self.notes or len(self._tempo_map) != len(self.notes)
+                or self._tempo_map.tempo != self.tempo):
+            self._tempo_map = TempoMap(self.notes, self.tempo)
+        elif not self._tempo_map.is_current:
+            self._tempo_map.refresh()
+        return self._tempo_map
+
+    def __init__(self, filepath: str, *, logger: Logger = None, strict: bool = False):
         self.logger = logger or default_logger
         self.filepath = filepath
+        self.strict = strict
         self.notes = []
 
     def load(self, filepath: str = ""):
@@ -94,6 +223,9 @@ class Ust:
         ------
         FileNotFoundError
             self.filepathのファイルが見つからなかった場合
+
+        ValueError
+            self.strictがTrueで、ノートのパラメータに不正な値があった場合
         '''
         if filepath != "":
             self.filepath = filepath
@@ -102,17 +234,62 @@ class Ust:
             self.logger.error("{} is not found".format(self.filepath))
             raise FileNotFoundError("{} is not found".format(self.filepath))
         self.logger.info("{} is found. loading file.".format(self.filepath))
+        self.body_encoding = ""
         with open(self.filepath, "rb") as fr:
             data = fr.read()
         seek: int = self._load_header(data)
         self.logger.info("loading header complete.")
         self._load_note(data[seek:])
         self.logger.info("loading note complete.notes:{}".format(len(self.notes)))
+        self._columns = None
+        self._tempo_map = None
         for i in range(len(self.notes)):
             if i != 0:
                 self.notes[i].prev = self.notes[i - 1]
                 self.notes[i - 1].next = self.notes[i]
 
+    def to_snapshot(self) -> bytes:
+        '''
+        | ヘッダと全ノートのパラメータを、UstSnapshot形式のバイト列に変換します。
+        | 各パラメータのhasValue,isUpdateも保存します。
+
+        Returns
+        -------
+        data: bytes
+
+        Raises
+        ------
+        ValueError
+            パラメータに保存できない型の値があるとき
+        '''
+        return UstSnapshot.dumps(self)
+
+    @classmethod
+    def from_snapshot(cls, data: bytes, *, logger: Logger = None, strict: bool = False):
+        '''
+        | to_snapshotで作成したバイト列から、ustを再解析せずに復元します。
+        | filepathはto_snapshotを実行した時点の値になります。
+
+        Parameters
+        ----------
+        data: bytes
+            to_snapshotの戻り値
+
+        Returns
+        -------
+        ust: Ust
+
+        Raises
+        ------
+        ValueError
+            | スナップショットではないか、SNAPSHOT_VERSIONが異なるとき。
+            | もしくは、Noteの定義がスナップショットを作成したときと異なるとき。
+        '''
+        ust = cls("", logger=logger, strict=strict)
+        UstSnapshot.loads(ust, data)
+        ust.logger.info("loading snapshot complete.notes:{}".format(len(ust.notes)))
+        return ust
+
     def _load_header(self, data: bytes) -> int:
         '''
         | dataをシステムの文字コードもしくはcp932でデコードを試み、各パラメータを更新します。
@@ -140,18 +317,37 @@ class Ust:
             setting_cursor = 0
         cursor = data[setting_cursor + 1:].find(b"[#")
         cursor += setting_cursor
-        try:
-            header_lines = data[:cursor].decode(locale.getlocale()[1]).replace("\r", "").split("\n")
-        except:
-            try:
-                header_lines = data[:cursor].decode("cp932").replace("\r", "").split("\n")
-            except UnicodeDecodeError as e:
-                self.logger.error("can't read {}'s header. because required character encoding is system default or cp932".format(self.filepath))
-                e.reason = "can't read {}'s header. because required character encoding is system default or cp932".format(self.filepath)
-                raise e
-        self._load_head_helper(header_lines)
+        self._load_head_helper(self._decode_header(data[:cursor]))
         return cursor
 
+    def _decode_header(self, data: bytes) -> list:
+        '''
+        | dataをシステムの文字コードもしくはcp932でデコードし、行ごとに分割します。
+        | 使用した文字コードはself.header_encodingに保存します。
+
+        Parameters
+        ----------
+        data: byte
+            ヘッダ部分のバイナリ
+
+        Returns
+        -------
+        header_lines: list of str
+
+        Raises
+        ------
+        UnicodeDecodeError
+            dataがシステム既定でもcp932でもデコードできなかった場合
+        '''
+        text: str
+        try:
+            text, self.header_encoding = textfile.decode(data, (locale.getlocale()[1], "cp932"))
+        except UnicodeDecodeError as e:
+            self.logger.error("can't read {}'s header. because required character encoding is system default or cp932".format(self.filepath))
+            e.reason = "can't read {}'s header. because required character encoding is system default or cp932".format(self.filepath)
+            raise e
+        return textfile.split_lines(text)
+
     def _load_head_helper(self, lines):
         vflag: bool = False
         for line in lines:
@@ -193,205 +389,315 @@ class Ust:
         UnicodeDecodeError
             ファイルがcp932でもutf-8でも開けなかった場合
         '''
-        lines: list = []
+        self._load_note_helper(self._decode_body(data))
+
+    def _decode_body(self, data: bytes) -> list:
+        '''
+        | dataがutf-8として正しければutf-8で、そうでなければcp932でデコードし、行ごとに分割します。
+        | 使用した文字コードはself.body_encodingに保存し、utf-8であればself.utf8をTrueにします。
+        | iter_notesは1行ずつデコードするため、ASCIIのみの行は、self.body_encodingが未設定の場合だけ保存します。
+
+        Parameters
+        ----------
+        data: byte
+            ノート部分のバイナリ
+
+        Returns
+        -------
+        lines: list of str
+
+        Raises
+        ------
+        UnicodeDecodeError
+            dataがcp932でもutf-8でもデコードできなかった場合
+        '''
+        text: str
+        encoding: str
         try:
-            lines = data.decode("cp932").replace("\r", "").split("\n")
-        except:
-            try:
-                lines = data.decode("utf-8").replace("\r", "").split("\n")
-            except UnicodeDecodeError as e:
-                self.logger.error("can't read {}'s body. because required character encoding is cp932 or utf-8".format(self.filepath))
-                e.reason = "can't read {}'s body. because required character encoding is cp932 or utf-8".format(self.filepath)
-                raise e
-        self._load_note_helper(lines)
+            text, encoding = textfile.decode(data)
+        except UnicodeDecodeError as e:
+            self.logger.error("can't read {}'s body. because required character encoding is cp932 or utf-8".format(self.filepath))
+            e.reason = "can't read {}'s body. because required character encoding is cp932 or utf-8".format(self.filepath)
+            raise e
+        if self.body_encoding == "" or not data.isascii():
+            self.body_encoding = encoding
+            self.utf8 = encoding.startswith("utf-8")
+        return textfile.split_lines(text)
 
     def _load_note_helper(self, lines: list):
+        '''
+        linesを読み込み、self.notesに追加します。
+
+        Parameters
+        ----------
+        lines: list of str
+            ノート部分の各行
+
+        Raises
+        ------
+        ValueError
+            self.strictがTrueで、値が不正な行もしくはノートの外にある行があった場合
+        '''
+        gc_enabled: bool = gc.isenabled()
+        # 大量のNoteを生成する間は、循環参照の検出を止める
+        gc.disable()
+        try:
+            self.notes.extend(self._parse_notes(lines))
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _parse_notes(self, lines: Iterator[str]) -> Iterator[Note]:
+        '''
+        | linesを1行ずつ"="で区切り、NOTE_ENTRIESに従って各ノートのパラメータを更新します。
+        | NOTE_ENTRIESにないパラメータは無視します。
+        | 次のノートの開始もしくはlinesの末尾に達するたびに、読み終えたノートを返します。
+
+        Parameters
+        ----------
+        lines: Iterator of str
+            ノート部分の各行
+
+        Returns
+        -------
+        notes: Iterator of Note
+            prev, nextは設定されていません。
+
+        Raises
+        ------
+        ValueError
+            self.strictがTrueで、値が不正な行もしくはノートの外にある行があった場合
+        '''
         tempo: float = self.tempo
         note: Note = None
+        setters: dict = _NOTE_SETTERS
         for line in lines:
-            if line == "[#TRACKEND]":
+            key, sep, value = line.partition("=")
+            if not sep:
+                if line == "[#TRACKEND]":
+                    continue
+                elif line.startswith("[#"):
+                    if note is not None:
+                        yield note
+                    note = Note()
+                    note.num.init(line.replace("[", "").replace("]", ""))
+                    note.tempo.init(tempo)
+                    note.tempo.hasValue = False
+                    note.flags.init(self.flags)
+                    note.flags.hasValue = False
+                elif line != "":
+                    self._load_note_error(None, line, "{} is not ust line".format(line))
+                continue
+            setter: tuple = setters.get(key)
+            if setter is None:
+                continue
+            if note is None:
+                self._load_note_error(None, line, "{} is out of note".format(line))
+                continue
+            if value == "" and key == "PreUtterance":
+                continue
+            try:
+                setter[0](note)(value)
+            except Exception as e:
+                self._load_note_error(note, key, "{} {} can't init. because {}".format(
+                    note.num.value, setter[1], traceback.format_exception_only(type(e), e)[0].rstrip('\n')), e)
+                continue
+            if key == "Tempo":
+                tempo = note.tempo.value
+        if note is not None:
+            yield note
+
+    def iter_notes(self, filepath: str = "") -> Iterator[Note]:
+        '''
+        | self.filepathもしくはfilepathのファイルを先頭から少しずつ読み込み、ノートを1つずつ返します。
+        | ファイル全体やself.notesを保持しないため、大きなファイルも一定のメモリで処理できます。
+        | 返すノートは、前後のノートとprev, nextでつながっています。
+        | 2つ前のノートとのつながりは切るため、呼び出し元が保持しない限り読み終えたノートは破棄されます。
+
+        | ヘッダはノートより先に読み込み、各パラメータを更新します。
+        | 複数のustを連結したファイルの場合、ヘッダが現れるたびに読み直し、前のustのノートとはつなげません。
+        | ノート部分は、1行ごとにcp932もしくはutf-8でデコードします。
+
+        Parameters
+        ----------
+        filepath: str, default ""
+            読み込むファイルのパス。値が与えられた場合、self.filepathを更新します。
+
+        Returns
+        -------
+        notes: Iterator of Note
+
+        Raises
+        ------
+        FileNotFoundError
+            self.filepathのファイルが見つからなかった場合
+
+        ValueError
+            self.strictがTrueで、ノートのパラメータに不正な値があった場合
+        '''
+        if filepath != "":
+            self.filepath = filepath
+
+        if not os.path.isfile(self.filepath):
+            self.logger.error("{} is not found".format(self.filepath))
+            raise FileNotFoundError("{} is not found".format(self.filepath))
+        self.logger.info("{} is found. iterating notes.".format(self.filepath))
+        self.body_encoding = ""
+        with open(self.filepath, "rb") as fr:
+            lines: Iterator[bytes] = iter(fr)
+            line: bytes = next(lines, b"")
+            while line != b"":
+                header: list = []
+                while line != b"" and (not line.startswith(b"[#") or line.rstrip(b"\r\n") in HEADER_SECTIONS):
+                    header.append(line)
+                    line = next(lines, b"")
+                self._load_head_helper(self._decode_header(b"".join(header)))
+                body_end: list = []
+                prev: Note = None
+                for note in self._parse_notes(self._iter_body(lines, line, body_end)):
+                    if prev is not None:
+                        if prev.prev is not None:
+                            prev.prev.prev = None
+                        prev.next = note
+                        note.prev = prev
+                        yield prev
+                    prev = note
+                if prev is not None:
+                    if prev.prev is not None:
+                        prev.prev.prev = None
+                    yield prev
+                line = body_end[0]
+
+    def _iter_body(self, lines: Iterator[bytes], line: bytes, body_end: list) -> Iterator[str]:
+        '''
+        | lineから始まるノート部分を、次のヘッダもしくはファイル末尾まで1行ずつデコードして返します。
+        | 読み終えた時点で、次のヘッダの行(ファイル末尾の場合b"")をbody_endに追加します。
+
+        Parameters
+        ----------
+        lines: Iterator of bytes
+            ファイルの残りの行
+
+        line: bytes
+            ノート部分の最初の行
+
+        body_end: list
+            次のヘッダの行を受け取るリスト
+
+        Returns
+        -------
+        lines: Iterator of str
+        '''
+        while line != b"" and line.rstrip(b"\r\n") not in HEADER_SECTIONS:
+            yield self._decode_body(line)[0]
+            line = next(lines, b"")
+        body_end.append(line)
+
+    def _load_note_error(self, note: Note, key: str, message: str, error: Exception = None):
+        '''
+        | ノート部分の不正な行を処理します。
+        | self.strictがTrueの場合はValueErrorを送出し、Falseの場合は警告を出力してNOTE_ENTRIESの既定値を設定します。
+
+        Parameters
+        ----------
+        note: Note
+            不正な行を含むノート。ノートの外の行の場合None
+
+        key: str
+            不正な行のキー
+
+        message: str
+            ログおよび例外のメッセージ
+
+        error: Exception, default None
+            値の設定時に発生した例外
+
+        Raises
+        ------
+        ValueError
+            self.strictがTrueの場合
+        '''
+        if self.strict:
+            self.logger.error(message)
+            raise ValueError(message) from error
+        if note is not None and NOTE_ENTRIES[key][3] is not None:
+            getattr(note, NOTE_ENTRIES[key][0]).init(NOTE_ENTRIES[key][3])
+        self.logger.warning(message)
+
+    def apply_oto_all(self, vb: VoiceBank):
+        '''
+        | self.notesの全てのノートに原音設定を適用します。
+        | 各ノートのapply_otoを順に実行した場合と同じ結果になります。
+        | エイリアスはvb.resolve_aliasのキャッシュで特定し、atPre,atOve,atStpは全ノート分を配列で計算します。
+
+        Parameters
+        ----------
+        vb: VoiceBank
+            原音設定とprefix.mapを参照する音源
+
+        Raises
+        ------
+        ValueError
+            | lyricもしくはnotenumが初期化されていないノートや、前のノートのlengthが初期化されていないノートがある場合。
+            | このとき、いずれのノートも更新しません。
+        '''
+        notes: list = self.notes
+        # 前のノートがリスト上の直前のノートである場合のみ配列で計算し、それ以外はautofit_atparamを使用する。
+        linked: np.ndarray = np.zeros(len(notes), dtype=bool)
+        fallback: list = []
+        for i, note in enumerate(notes):
+            if not note.lyric.hasValue:
+                raise ValueError("lyric is not initial")
+            if not note.notenum.hasValue:
+                raise ValueError("notenum is not initial")
+            if note.prev is None:
                 continue
-            elif line.startswith("[#"):
-                self.notes.append(Note())
-                note = self.notes[-1]
-                note.num.init(line.replace("[", "").replace("]", ""))
-                note.tempo.init(tempo)
-                note.tempo.hasValue = False
-                note.flags.init(self.flags)
-                note.flags.hasValue = False
-            elif line.startswith("Length"):
-                try:
-                    note.length.init(line.replace("Length=", ""))
-                except Exception as e:
-                    note.length.init(480)
-                    self.logger.warn("{} length can't init. because {}".format(note.num.value,
-                                                                               traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("Lyric"):
-                try:
-                    note.lyric.init(line.replace("Lyric=", ""))
-                except Exception as e:
-                    note.lyric.init("あ")
-                    self.logger.warn("{} lyric can't init. because {}".format(note.num.value,
-                                                                              traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("NoteNum"):
-                try:
-                    note.notenum.init(line.replace("NoteNum=", ""))
-                except Exception as e:
-                    note.notenum.init(60)
-                    self.logger.warn("{} notenum can't init. because {}".format(note.num.value,
-                                                                                traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("Tempo"):
-                try:
-                    note.tempo.init(line.replace("Tempo=", ""))
-                    tempo = note.tempo.value
-                except Exception as e:
-                    self.logger.warn("{} tempo can't init. because {}".format(note.num.value,
-                                                                              traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("PreUtterance"):
-                try:
-                    if line.replace("PreUtterance=", "") != "":
-                        note.pre.init(line.replace("PreUtterance=", ""))
-                except Exception as e:
-                    self.logger.warn("{} pre can't init. because {}".format(note.num.value,
-                                                                            traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("@preuttr"):
-                try:
-                    note.atPre.init(line.replace("@preuttr=", ""))
-                except Exception as e:
-                    self.logger.warn("{} @preuttr can't init. because {}".format(note.num.value,
-                                                                                 traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("VoiceOverlap"):
-                try:
-                    note.ove.init(line.replace("VoiceOverlap=", ""))
-                except Exception as e:
-                    self.logger.warn("{} ove can't init. because {}".format(note.num.value,
-                                                                            traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("@overlap"):
-                try:
-                    note.atOve.init(line.replace("@overlap=", ""))
-                except Exception as e:
-                    self.logger.warn("{} @overlap can't init. because {}".format(note.num.value,
-                                                                                 traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("StartPoint"):
-                try:
-                    note.stp.init(line.replace("StartPoint=", ""))
-                except Exception as e:
-                    self.logger.warn("{} stp can't init. because {}".format(note.num.value,
-                                                                            traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("@stpoint"):
-                try:
-                    note.atStp.init(line.replace("@stpoint=", ""))
-                except Exception as e:
-                    self.logger.warn("{} @stpoint can't init. because {}".format(note.num.value,
-                                                                                 traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("@filename"):
-                try:
-                    note.atFileName.init(line.replace("@filename=", ""))
-                except Exception as e:
-                    self.logger.warn("{} @filename can't init. because {}".format(note.num.value,
-                                                                                  traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("@alias"):
-                try:
-                    note.atAlias.init(line.replace("@alias=", ""))
-                except Exception as e:
-                    self.logger.warn("{} @alias can't init. because {}".format(note.num.value,
-                                                                               traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("Velocity"):
-                try:
-                    note.velocity.init(line.replace("Velocity=", ""))
-                except Exception as e:
-                    self.logger.warn("{} Velocity can't init. because {}".format(note.num.value,
-                                                                                 traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("Intensity"):
-                try:
-                    note.intensity.init(line.replace("Intensity=", ""))
-                except Exception as e:
-                    self.logger.warn("{} Intensity can't init. because {}".format(note.num.value,
-                                                                                  traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("Modulation"):
-                try:
-                    note.modulation.init(line.replace("Modulation=", ""))
-                except Exception as e:
-                    self.logger.warn("{} Modulation can't init. because {}".format(note.num.value,
-                                                                                   traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("PitchBend="):
-                try:
-                    note.pitches.init_from_str(line.replace("PitchBend=", ""))
-                except Exception as e:
-                    self.logger.warn("{} PitchBend can't init. because {}".format(note.num.value,
-                                                                                traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("PBStart"):
-                try:
-                    note.pbStart.init(line.replace("PBStart=", ""))
-                except Exception as e:
-                    self.logger.warn("{} PBStart can't init. because {}".format(note.num.value,
-                                                                                traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("PBS"):
-                try:
-                    note.pbs.init(line.replace("PBS=", ""))
-                except Exception as e:
-                    self.logger.warn("{} PBS can't init. because {}".format(note.num.value,
-                                                                            traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("PBY"):
-                try:
-                    note.pby.init_from_str(line.replace("PBY=", ""))
-                except Exception as e:
-                    self.logger.warn("{} PBY can't init. because {}".format(note.num.value,
-                                                                            traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("PBM"):
-                try:
-                    note.pbm.init_from_str(line.replace("PBM=", ""))
-                except Exception as e:
-                    self.logger.warn("{} PBM can't init. because {}".format(note.num.value,
-                                                                            traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("PBW"):
-                try:
-                    note.pbw.init_from_str(line.replace("PBW=", ""))
-                except Exception as e:
-                    self.logger.warn("{} PBW can't init. because {}".format(note.num.value,
-                                                                            traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("Flags"):
-                try:
-                    note.flags.init(line.replace("Flags=", ""))
-                except Exception as e:
-                    self.logger.warn("{} Flags can't init. because {}".format(note.num.value,
-                                                                              traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("VBR"):
-                try:
-                    note.vibrato.init(line.replace("VBR=", ""))
-                except Exception as e:
-                    self.logger.warn("{} VBR can't init. because {}".format(note.num.value,
-                                                                            traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("Envelope"):
-                try:
-                    note.envelope.init(line.replace("Envelope=", ""))
-                except Exception as e:
-                    self.logger.warn("{} Envelope can't init. because {}".format(note.num.value,
-                                                                                 traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("Label"):
-                try:
-                    note.label.init(line.replace("Label=", ""))
-                except Exception as e:
-                    self.logger.warn("{} Label can't init. because {}".format(note.num.value,
-                                                                              traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("$direct"):
-                try:
-                    note.direct.init(line.replace("$direct=", ""))
-                except Exception as e:
-                    self.logger.warn("{} $direct can't init. because {}".format(note.num.value,
-                                                                                traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("$region="):
-                try:
-                    note.region.init(line.replace("$region=", ""))
-                except Exception as e:
-                    self.logger.warn("{} $region can't init. because {}".format(note.num.value,
-                                                                                traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
-            elif line.startswith("$region_end="):
-                try:
-                    note.region_end.init(line.replace("$region_end=", ""))
-                except Exception as e:
-                    self.logger.warn("{} $region_end can't init. because {}".format(note.num.value,
-                                                                                    traceback.format_exception_only(type(e), e)[0].rstrip('\n')))
+            if i == 0 or note.prev is not notes[i - 1]:
+                fallback.append(note)
+            elif not note.prev.length.hasValue:
+                raise ValueError("length is not initial")
+            else:
+                linked[i] = True
+        oto: Oto = vb.oto
+        hits: int = vb.alias_hits
+        for note in notes:
+            lyric: str = note.lyric.value
+            if "!" in lyric:
+                note.autoren = True
+            if note.atAlias.hasValue:
+                alias: str = note.atAlias.value
+            else:
+                alias, filename = vb.resolve_alias(lyric, note.notenum.value, "?" in lyric)
+                if alias != "":
+                    note.atAlias.value = alias
+                    note.atFileName.value = filename
+            note._apply_oto_to_pre(alias, oto)
+            note._apply_oto_to_ove(alias, oto)
+        self.logger.debug("alias cache hits {} / {} notes".format(vb.alias_hits - hits, len(notes)))
+
+        params: np.ndarray = np.array([(note.pre.value, note.ove.value, note.stp.value, note.velocity.rate,
+                                        60 / note.tempo.value * note.length.value / 480 * 1000 if note.length.hasValue else 0,
+                                        note.lyric.value == "R") for note in notes], dtype=np.float64).reshape(-1, 6)
+        pre, ove, stp, rate, ms_lengths, rests = params.T
+        real_pre: np.ndarray = pre * rate
+        real_ove: np.ndarray = ove * rate
+        real_stp: np.ndarray = stp * rate
+        prev_ms: np.ndarray = np.zeros(len(notes), dtype=np.float64)
+        prev_ms[1:] = np.where(rests[:-1] != 0, ms_lengths[:-1], ms_lengths[:-1] / 2)
+        short: np.ndarray = linked & (prev_ms < (real_pre - real_ove))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            at_pre: np.ndarray = np.where(short, real_pre / (real_pre - real_ove) * prev_ms, real_pre)
+            at_ove: np.ndarray = np.where(short, real_ove / (real_pre - real_ove) * prev_ms, real_ove)
+        at_stp: np.ndarray = np.where(short, real_pre - at_pre + real_stp, real_stp)
+        at_pre = np.where(linked, at_pre, pre).tolist()
+        at_ove = np.where(linked, at_ove, ove).tolist()
+        at_stp = np.where(linked, at_stp, stp).tolist()
+        for note, value_pre, value_ove, value_stp in zip(notes, at_pre, at_ove, at_stp):
+            note.atPre.value = value_pre
+            note.atOve.value = value_ove
+            note.atStp.value = value_stp
+        for note in fallback:
+            note.autofit_atparam()
 
     def save(self, filepath: str = "", encoding: str = "cp932"):
         '''
@@ -408,66 +714,50 @@ class Ust:
         if os.path.split(self.filepath)[0] != "":
             os.makedirs(os.path.split(self.filepath)[0], exist_ok=True)
         self.logger.info("saving ust to:{}".format(self.filepath))
+        data: str = "".join([self._format_header()] + [self._format_note(note) for note in self.notes] + ["[#TRACKEND]\n"])
         with open(self.filepath, "w", encoding=encoding) as fw:
-            fw.write("[#VERSION]\n")
-            fw.write("UST Version{:.1f}\n".format(self.version))
-            fw.write("[#SETTING]\n")
-            fw.write("Tempo={:.2f}\n".format(self.tempo))
-            fw.write("Tracks=1\n")
-            fw.write("Project={}\n".format(self.project_name))
-            fw.write("VoiceDir={}\n".format(self.voice_dir))
-            fw.write("OutFile={}\n".format(self.output_file))
-            fw.write("CacheDir={}\n".format(self.cache_dir))
-            fw.write("Tool1={}\n".format(self.wavtool))
-            fw.write("Tool2={}\n".format(self.resamp))
-            fw.write("Flags={}\n".format(self.flags))
-            fw.write("Mode2={}\n".format(self.mode2))
-            for note in self.notes:
-                fw.write("[{}]\n".format(str(note.num)))
-                fw.write("Length={}\n".format(str(note.length)))
-                fw.write("Lyric={}\n".format(str(note.lyric)))
-                fw.write("NoteNum={}\n".format(str(note.notenum.value)))
-                if note.tempo.hasValue:
-                    fw.write("Tempo={}\n".format(str(note.tempo)))
-                if note.pre.hasValue:
-                    fw.write("PreUtterance={}\n".format(str(note.pre)))
-                else:
-                    fw.write("PreUtterance=\n")
-                if note.ove.hasValue:
-                    fw.write("VoiceOverlap={}\n".format(str(note.ove)))
-                if note.stp.hasValue:
-                    fw.write("StartPoint={}\n".format(str(note.stp)))
-                if note.velocity.hasValue:
-                    fw.write("Velocity={}\n".format(str(note.velocity)))
-                if note.intensity.hasValue:
-                    fw.write("Intensity={}\n".format(str(note.intensity)))
-                if note.modulation.hasValue:
-                    fw.write("Modulation={}\n".format(str(note.modulation)))
-                if note.pitches.hasValue:
-                    fw.write("PitchBend={}\n".format(str(note.pitches)))
-                if note.pbStart.hasValue:
-                    fw.write("PBStart={}\n".format(str(note.pbStart)))
-                if note.pbs.hasValue:
-                    fw.write("PBS={}\n".format(str(note.pbs)))
-                if note.pby.hasValue:
-                    fw.write("PBY={}\n".format(str(note.pby)))
-                if note.pbm.hasValue:
-                    fw.write("PBM={}\n".format(str(note.pbm)))
-                if note.pbw.hasValue:
-                    fw.write("PBW={}\n".format(str(note.pbw)))
-                if note.flags.hasValue:
-                    fw.write("Flags={}\n".format(str(note.flags)))
-                if note.vibrato.hasValue:
-                    fw.write("VBR={}\n".format(str(note.vibrato)))
-                if note.envelope.hasValue:
-                    fw.write("Envelope={}\n".format(str(note.envelope)))
-                if note.label.hasValue:
-                    fw.write("Label={}\n".format(str(note.label)))
-                if note.direct.hasValue:
-                    fw.write("$direct={}\n".format(str(note.direct)))
-                if note.region.hasValue:
-                    fw.write("$region={}\n".format(str(note.region)))
-                if note.region_end.hasValue:
-                    fw.write("$region_end={}\n".format(str(note.region_end)))
-            fw.write("[#TRACKEND]\n")
+            fw.write(data)
         self.logger.info("saving ust to:{} complete".format(self.filepath))
+
+    def _format_header(self) -> str:
+        '''
+        ustのヘッダ部分を返します。
+
+        Returns
+        -------
+        header: str
+        '''
+        return ("[#VERSION]\n"
+                "UST Version{:.1f}\n"
+                "[#SETTING]\n"
+                "Tempo={:.2f}\n"
+                "Tracks=1\n"
+                "Project={}\n"
+                "VoiceDir={}\n"
+                "OutFile={}\n"
+                "CacheDir={}\n"
+                "Tool1={}\n"
+                "Tool2={}\n"
+                "Flags={}\n"
+                "Mode2={}\n").format(self.version, self.tempo, self.project_name, self.voice_dir, self.output_file,
+                                      self.cache_dir, self.wavtool, self.resamp, self.flags, self.mode2)
+
+    def _format_note(self, note: Note) -> str:
+        '''
+        SAVE_ENTRIESに従って、ustに書き込むnote1つ分の文字列を返します。
+
+        Parameters
+        ----------
+        note: Note
+
+        Returns
+        -------
+        text: str
+        '''
+        lines: list = ["[{}]\n".format(str(note.num))]
+        for head, always, blank, entry in zip(_SAVE_HEADS, _SAVE_ALWAYS, _SAVE_BLANK, _get_save_entries(note)):
+            if entry.hasValue or always:
+                lines.append(head + str(entry) + "\n")
+            elif blank:
+                lines.append(head + "\n")
+        return "".join(lines)
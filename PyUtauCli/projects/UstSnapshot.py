@@ -0,0 +1,425 @@
+﻿'''UstSnapshot
+| Ustのヘッダと全ノートのパラメータを、再解析せずに読み込めるバイナリ形式に変換します。
+| 各パラメータは列ごとのnumpy配列として保存し、pickleは使用しません。
+
+| ファイルの構成は次の通りです。数値は全てリトルエンディアンです。
+| ・MAGIC(8byte)、SNAPSHOT_VERSION(uint32)
+| ・配列の並び。各配列は型(1byte)、要素数(uint64)、データの順
+| 配列は文字列表、listの要素数、listの要素、列名、ヘッダ、ノート数、各列の順に並びます。
+
+| Entryの各属性は、型を表すタグ(uint8)の配列と、タグごとの値の配列で保存します。
+| 全ての値のタグが同じ列は、タグの配列の要素数を1にします。
+| 値の配列は、タグの小さい順に、そのタグの値だけを並べます。Noneと未設定の値は配列を持ちません。
+| 値はint,boolはそのまま、strは文字列表の番号、listは要素数で、全ての値を表せる最小の幅の整数型にします。
+| floatはfloat32で表せる場合はfloat32、そうでなければfloat64にします。
+| listの要素は、全ての列で共通の配列に順に格納します。
+'''
+
+import gc
+import struct
+from itertools import compress, repeat
+
+import numpy as np
+
+from .EntryBase import EntryBase
+from .Note import Note
+
+MAGIC: bytes = b"UTAUSNAP"
+'''スナップショットの先頭を表すバイト列'''
+
+SNAPSHOT_VERSION: int = 2
+'''形式を変更した場合に増やします。異なる版のスナップショットは読み込めません。'''
+
+HEADER_FIELDS: list = ["filepath", "_version", "project_name", "voice_dir", "cache_dir", "output_file",
+                       "tempo", "wavtool", "resamp", "flags", "mode2", "utf8"]
+'''保存するUstの属性'''
+
+TAG_UNSET: int = 0
+TAG_INT: int = 1
+TAG_FLOAT: int = 2
+TAG_STR: int = 3
+TAG_BOOL: int = 4
+TAG_LIST: int = 5
+TAG_NONE: int = 6
+
+_DTYPES: dict = {b"B": np.dtype("<u1"), b"b": np.dtype("<i1"), b"h": np.dtype("<i2"), b"i": np.dtype("<i4"),
+                  b"q": np.dtype("<i8"), b"f": np.dtype("<f4"), b"d": np.dtype("<f8")}
+_CODES: dict = {dtype.str[1:]: code for code, dtype in _DTYPES.items()}
+_INT_DTYPES: list = [np.dtype("<i1"), np.dtype("<i2"), np.dtype("<i4")]
+_FLAG_HAS_VALUE: int = 1
+_FLAG_IS_UPDATE: int = 2
+
+
+def _get_schema() -> list:
+    '''
+    Noteの属性と、各属性を保存する列の対応を求めます。
+
+    Returns
+    -------
+    schema: list of tuple
+        | (Noteの属性名, Entryのクラス, Entryの属性名のリスト)のリスト。
+        | Entryでない属性のクラスはNoneで、属性名のリストは空です。
+    '''
+    note: Note = Note()
+    schema: list = []
+    for attr in Note.__slots__:
+        if attr in ("prev", "next", "__weakref__"):
+            continue
+        value = getattr(note, attr)
+        if isinstance(value, EntryBase):
+            slots: list = []
+            for cls in reversed(type(value).__mro__):
+                slots += [slot for slot in getattr(cls, "__slots__", ()) if slot not in ("_isUpdate", "_hasValue")]
+            schema.append((attr, type(value), slots))
+        else:
+            schema.append((attr, None, []))
+    return schema
+
+
+SCHEMA: list = _get_schema()
+'''スナップショットに保存するNoteの属性と、Entryの属性'''
+
+COLUMNS: list = [attr if cls is None else attr + "." + slot for attr, cls, slots in SCHEMA for slot in (slots or [""])]
+'''保存する列の名前。スナップショットに保存し、読込時にNoteの定義と一致するか確認します。'''
+
+
+def _narrow(datas: np.ndarray) -> np.ndarray:
+    '''
+    int64の配列を、全ての値を表せる最小の幅の整数型に変換します。
+    '''
+    if datas.shape[0] == 0:
+        return datas.astype(_INT_DTYPES[0])
+    low: int = int(datas.min())
+    high: int = int(datas.max())
+    for dtype in _INT_DTYPES:
+        info: np.iinfo = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return datas.astype(dtype)
+    return datas
+
+
+class _Unset:
+    '''未設定の属性を表す値'''
+
+
+_UNSET: _Unset = _Unset()
+
+
+class _Writer:
+    '''
+    スナップショットの各配列を組み立てます。
+    '''
+    arrays: list
+    strings: dict
+    item_tags: list
+    item_values: list
+
+    def __init__(self):
+        self.arrays = []
+        self.strings = {}
+        self.item_tags = []
+        self.item_values = []
+
+    def encode(self, value) -> tuple:
+        '''
+        値をタグと64bitの整数に変換します。listの要素はself.item_tags,self.item_valuesに追加します。
+
+        Parameters
+        ----------
+        value: int, float, str, bool, list or None
+
+        Returns
+        -------
+        tag: int
+
+        data: int
+
+        Raises
+        ------
+        ValueError
+            保存できない型の値のとき
+        '''
+        if value is None:
+            return TAG_NONE, 0
+        if isinstance(value, bool):
+            return TAG_BOOL, int(value)
+        if isinstance(value, int):
+            return TAG_INT, value
+        if isinstance(value, float):
+            return TAG_FLOAT, struct.unpack("<q", struct.pack("<d", value))[0]
+        if isinstance(value, str):
+            return TAG_STR, self.strings.setdefault(value, len(self.strings))
+        if isinstance(value, list):
+            for item in value:
+                if isinstance(item, list):
+                    raise ValueError("nested list is not supported")
+                tag, data = self.encode(item)
+                self.item_tags.append(tag)
+                self.item_values.append(data)
+            return TAG_LIST, len(value)
+        raise ValueError("{} can't be saved in snapshot".format(type(value).__name__))
+
+    @staticmethod
+    def pack(tags: list, datas: list) -> list:
+        '''
+        タグと値のリストを、保存するタグの配列とタグごとの値の配列に変換します。
+
+        Parameters
+        ----------
+        tags: list of int
+
+        datas: list of int
+            encodeで変換した値
+
+        Returns
+        -------
+        arrays: list of np.ndarray
+            | タグの配列と、タグの小さい順に並べたタグごとの値の配列。
+            | 全てのタグが同じ場合、タグの配列は要素数1です。
+        '''
+        tag_array: np.ndarray = np.array(tags, dtype=np.uint8)
+        values: np.ndarray = np.array(datas, dtype=np.int64)
+        unique: list = sorted(set(tags))
+        arrays: list = [tag_array[:1] if len(unique) == 1 else tag_array]
+        for tag in unique:
+            if tag in (TAG_NONE, TAG_UNSET):
+                continue
+            selected: np.ndarray = values if len(unique) == 1 else values[tag_array == tag]
+            if tag != TAG_FLOAT:
+                arrays.append(_narrow(selected))
+                continue
+            floats: np.ndarray = selected.view(np.float64)
+            with np.errstate(over="ignore"):
+                narrow: np.ndarray = floats.astype(np.float32)
+            arrays.append(narrow if np.array_equal(narrow, floats, equal_nan=True) else floats)
+        return arrays
+
+    def add_values(self, values: list):
+        '''
+        valuesの各値を、タグの配列と値の配列として追加します。属性が未設定の値はTAG_UNSETにします。
+        '''
+        tags: list = []
+        datas: list = []
+        for value in values:
+            if value is _UNSET:
+                tags.append(TAG_UNSET)
+                datas.append(0)
+            else:
+                tag, data = self.encode(value)
+                tags.append(tag)
+                datas.append(data)
+        self.arrays += self.pack(tags, datas)
+
+    def tobytes(self) -> bytes:
+        '''
+        文字列表とlistの要素を加えて、スナップショット全体のバイト列を返します。
+        '''
+        blobs: list = [value.encode("utf-8") for value in self.strings]
+        offsets: np.ndarray = np.zeros(len(blobs) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(blob) for blob in blobs])
+        arrays: list = ([np.frombuffer(b"".join(blobs), dtype=np.uint8), offsets, np.array([len(self.item_tags)], dtype=np.int64)]
+                        + self.pack(self.item_tags, self.item_values) + self.arrays)
+        chunks: list = [MAGIC, struct.pack("<I", SNAPSHOT_VERSION)]
+        for array in arrays:
+            chunks.append(_CODES[array.dtype.str[1:]])
+            chunks.append(struct.pack("<Q", array.shape[0]))
+            chunks.append(array.astype(array.dtype.newbyteorder("<"), copy=False).tobytes())
+        return b"".join(chunks)
+
+
+def dumps(ust) -> bytes:
+    '''
+    ustのヘッダと全ノートをスナップショットに変換します。
+
+    Parameters
+    ----------
+    ust: Ust
+
+    Returns
+    -------
+    data: bytes
+
+    Raises
+    ------
+    ValueError
+        パラメータに保存できない型の値があるとき
+    '''
+    writer: _Writer = _Writer()
+    notes: list = ust.notes
+    writer.strings = {column: i for i, column in enumerate(COLUMNS)}
+    writer.arrays.append(np.arange(len(COLUMNS), dtype=np.int64))
+    writer.add_values([getattr(ust, attr) for attr in HEADER_FIELDS])
+    writer.arrays.append(np.array([len(notes)], dtype=np.int64))
+    for attr, cls, slots in SCHEMA:
+        values: list = [getattr(note, attr) for note in notes]
+        if cls is None:
+            writer.add_values(values)
+            continue
+        writer.arrays.append(np.array([entry._hasValue * _FLAG_HAS_VALUE + entry._isUpdate * _FLAG_IS_UPDATE
+                                       for entry in values], dtype=np.uint8))
+        for slot in slots:
+            writer.add_values([getattr(entry, slot, _UNSET) for entry in values])
+    return writer.tobytes()
+
+
+class _Reader:
+    '''
+    スナップショットの配列を先頭から順に読み込みます。
+    '''
+    data: memoryview
+    seek: int
+    strings: list
+    item_values: list
+    item_offset: int
+
+    def __init__(self, data: bytes):
+        '''
+        Raises
+        ------
+        ValueError
+            スナップショットではないか、版が異なるとき
+        '''
+        self.data = memoryview(data)
+        if bytes(self.data[:len(MAGIC)]) != MAGIC:
+            raise ValueError("data is not ust snapshot")
+        version: int = struct.unpack_from("<I", self.data, len(MAGIC))[0]
+        if version != SNAPSHOT_VERSION:
+            raise ValueError("snapshot version {} is not supported".format(version))
+        self.seek = len(MAGIC) + 4
+        blob: bytes = self.read().tobytes()
+        offsets: list = self.read().tolist()
+        self.strings = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+        self.item_offset = 0
+        self.item_values = self.read_values(int(self.read()[0]))
+
+    def read(self) -> np.ndarray:
+        '''
+        次の配列を返します。
+
+        Raises
+        ------
+        ValueError
+            データが途中で終わっているとき
+        '''
+        try:
+            dtype: np.dtype = _DTYPES[bytes(self.data[self.seek:self.seek + 1])]
+            count: int = struct.unpack_from("<Q", self.data, self.seek + 1)[0]
+        except (KeyError, struct.error):
+            raise ValueError("snapshot is broken")
+        start: int = self.seek + 9
+        self.seek = start + count * dtype.itemsize
+        if self.seek > len(self.data):
+            raise ValueError("snapshot is broken")
+        return np.frombuffer(self.data, dtype=dtype, count=count, offset=start)
+
+    def decode(self, tags: np.ndarray, count: int) -> list:
+        '''
+        | タグの配列に続くタグごとの値の配列を読み込み、Pythonの値のリストに戻します。
+        | タグの配列の要素数が1の場合、count個の値が全てそのタグです。
+        | listは要素数だけself.item_valuesから取り出します。
+        '''
+        if tags.shape[0] == 1:
+            return self._decode_same(int(tags[0]), count)
+        if tags.shape[0] != count:
+            raise ValueError("snapshot is broken")
+        values: np.ndarray = np.empty(count, dtype=object)
+        for tag in np.unique(tags).tolist():
+            mask: np.ndarray = tags == tag
+            decoded: list = self._decode_same(tag, int(np.count_nonzero(mask)))
+            if tag == TAG_LIST:
+                for index, value in zip(np.flatnonzero(mask).tolist(), decoded):
+                    values[index] = value
+            else:
+                values[mask] = decoded
+        return values.tolist()
+
+    def _decode_same(self, tag: int, count: int) -> list:
+        '''
+        タグがtagのcount個の値を、値の配列を読み込んでPythonの値のリストに戻します。
+        '''
+        if tag == TAG_NONE:
+            return [None] * count
+        if tag == TAG_UNSET:
+            return [_UNSET] * count
+        datas: np.ndarray = self.read()
+        if datas.shape[0] != count:
+            raise ValueError("snapshot is broken")
+        if tag == TAG_INT:
+            return datas.astype(np.int64).tolist()
+        if tag == TAG_FLOAT:
+            return datas.astype(np.float64).tolist()
+        if tag == TAG_STR:
+            strings: list = self.strings
+            return [strings[i] for i in datas.tolist()]
+        if tag == TAG_BOOL:
+            return datas.astype(bool).tolist()
+        if tag == TAG_LIST:
+            offsets: list = (np.cumsum(datas, dtype=np.int64) + self.item_offset).tolist()
+            items: list = self.item_values
+            values: list = [items[start:end] for start, end in zip([self.item_offset] + offsets[:-1], offsets)]
+            if len(offsets) != 0:
+                self.item_offset = offsets[-1]
+            return values
+        raise ValueError("snapshot is broken")
+
+    def read_values(self, count: int) -> list:
+        '''
+        count個の値の列を読み込みます。
+        '''
+        return self.decode(self.read(), count)
+
+
+def loads(ust, data: bytes):
+    '''
+    スナップショットのヘッダと全ノートをustに読み込みます。
+
+    Parameters
+    ----------
+    ust: Ust
+
+    data: bytes
+        dumpsで作成したスナップショット
+
+    Raises
+    ------
+    ValueError
+        | スナップショットではないか、版が異なるとき。
+        | もしくは、Noteの定義がスナップショットを作成したときと異なるとき。
+    '''
+    gc_enabled: bool = gc.isenabled()
+    # 大量のEntryを生成する間は、循環参照の検出を止める
+    gc.disable()
+    try:
+        _loads(ust, data)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _loads(ust, data: bytes):
+    reader: _Reader = _Reader(data)
+    columns: list = [reader.strings[i] for i in reader.read().tolist()]
+    if columns != COLUMNS:
+        raise ValueError("snapshot columns do not match Note")
+    for attr, value in zip(HEADER_FIELDS, reader.read_values(len(HEADER_FIELDS))):
+        setattr(ust, attr, value)
+    count: int = int(reader.read()[0])
+    notes: list = list(map(Note.__new__, repeat(Note, count)))
+    for attr, cls, slots in SCHEMA:
+        if cls is None:
+            values: list = reader.read_values(count)
+            list(map(setattr, notes, repeat(attr), values))
+            continue
+        flags: np.ndarray = reader.read()
+        entries: list = list(map(cls.__new__, repeat(cls, count)))
+        list(map(setattr, entries, repeat("_hasValue"), (flags & _FLAG_HAS_VALUE).astype(bool).tolist()))
+        list(map(setattr, entries, repeat("_isUpdate"), (flags & _FLAG_IS_UPDATE).astype(bool).tolist()))
+        for slot in slots:
+            tags: np.ndarray = reader.read()
+            values: list = reader.decode(tags, count)
+            mask: list = np.broadcast_to(tags != TAG_UNSET, len(values)).tolist()
+            list(map(setattr, compress(entries, mask), repeat(slot), compress(values, mask)))
+        list(map(setattr, notes, repeat(attr), entries))
+    list(map(setattr, notes, repeat("prev"), [None] + notes[:-1]))
+    list(map(setattr, notes, repeat("next"), notes[1:] + [None]))
+    ust.notes = notes
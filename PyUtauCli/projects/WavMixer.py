@@ -0,0 +1,438 @@
+﻿'''WavMixer
+wavtoolの一時ファイルを使用せず、メモリ上で波形を合成します。
+'''
+
+import os
+import os.path
+import math
+import wave
+from typing import Tuple
+
+import numpy as np
+
+import common.wavfile as wavfile
+
+ARROW_ENVELOPE_VALUES = [2, 7, 8, 9, 11]
+HEADER_SIZE: int = 44
+'''writeが出力するRIFFヘッダのバイト数'''
+
+
+class WavMixer:
+    '''
+    | PyWavTool.WavToolと同じインタフェースで、波形を事前に確保したnp.ndarrayに直接合成します。
+    | .whdと.datの一時ファイルを経由せず、writeの際にRIFFヘッダと波形データを1度だけ書き込みます。
+
+    Attributes
+    ----------
+    output: str
+        出力するwavのパス
+
+    framerate: int, default 44100
+        出力するwavのサンプリング周波数
+
+    samplewidth: int, default 16
+        出力するwavのビット深度
+
+    nframes: int
+        合成済みのフレーム数
+
+    error: bool
+        直前に読み込んだ入力ファイルもしくはエンベロープが不正だった場合True
+    '''
+    _output: str
+    _framerate: int
+    _samplewidth: int
+    _buffer: np.ndarray
+    _nframes: int
+    _data: np.ndarray
+    _envelope: list
+    _error: bool = False
+
+    @property
+    def output(self) -> str:
+        return self._output
+
+    @property
+    def framerate(self) -> int:
+        return self._framerate
+
+    @property
+    def samplewidth(self) -> int:
+        return self._samplewidth
+
+    @property
+    def nframes(self) -> int:
+        return self._nframes
+
+    @property
+    def error(self) -> bool:
+        return self._error
+
+    def __init__(self, output: str, total_ms: float = 0, framerate: int = 44100, samplewidth: int = 16):
+        '''
+        Parameters
+        ----------
+        output: str
+            出力するwavのパス
+
+        total_ms: float, default 0
+            | 出力するwavの長さの見込み(ms)。各ノートのoutput_msの合計を与えます。
+            | 合成中に不足した場合は自動で拡張します。
+
+        framerate: int, default 44100
+            出力するwavのサンプリング周波数
+
+        samplewidth: int, default 16
+            出力するwavのビット深度
+        '''
+        self._output = output
+        self._framerate = framerate
+        self._samplewidth = samplewidth
+        self._buffer = np.zeros(math.ceil(total_ms * framerate / 1000), dtype=np.float64)
+        self._nframes = 0
+        self._data = np.zeros(0, dtype=np.float64)
+        self._envelope = []
+        self._error = False
+
+    def inputCheck(self, input: str):
+        '''
+        | 入力ファイルを読み込み、最大1に正規化したfloatをself._dataに代入します。
+        | ファイルが存在しないかwavではない場合、self._errorをTrueにします。
+
+        Parameters
+        ----------
+        input: str
+            入力するwavのパス
+        '''
+        self._error = False
+        if not os.path.isfile(input):
+            self._error = True
+            return
+        try:
+            self._data = self._wave_load(input)
+        except (wave.Error, EOFError):
+            self._error = True
+
+    @staticmethod
+    def _wave_load(input_path: str) -> np.ndarray:
+        '''
+        wavファイルを読み込み、最大1に正規化したデータを返します。ステレオの場合、左チャンネルのみを返します。
+
+        Parameters
+        ----------
+        input_path: str
+            入力するwavのパス
+
+        Returns
+        -------
+        data: np.ndarray of np.float64
+
+        Raises
+        ------
+        wave.Error
+            input_pathがwavではなかったとき
+        '''
+        return wavfile.read(input_path)[0]
+
+    def setEnvelope(self, envelope: list):
+        '''
+        | 入力されたエンベロープが正しいかチェックします。
+        | 正常値であれば、self._envelopeを更新します。
+        | 異常値であれば、self._errorをTrueにします。
+
+        Parameters
+        ----------
+        envelope : list
+            エンベロープのパターンは以下のいずれかです。
+                >>> p1 p2
+                >>> p1 p2 p3 v1 v2 v3 v4
+                >>> p1 p2 p3 v1 v2 v3 v4 ove
+                >>> p1 p2 p3 v1 v2 v3 v4 ove p4
+                >>> p1 p2 p3 v1 v2 v3 v4 ove p4 p5 v5
+            | p1,p2,p3,p4,p5,ove : float
+            | v1,v2,v3,v4,v5 : int
+        '''
+        if len(envelope) in ARROW_ENVELOPE_VALUES:
+            self._envelope = envelope
+        else:
+            self._envelope = []
+            self._error = True
+
+    def applyData(self, stp: float, length: float) -> Tuple[int, int]:
+        '''
+        | stp,length,エンベロープを適用したself._dataをバッファ末尾に合成します。
+        | オーバーラップの範囲は既存のデータに加算します。
+
+        Parameters
+        ----------
+        stp : float
+            入力wavの先頭のオフセットをmsで指定する。
+
+        length : float
+            追加する長さ(ms)
+
+        Returns
+        -------
+        start: int
+            合成したデータの先頭のフレーム位置
+
+        nframes: int
+            合成したデータのフレーム数
+        '''
+        apply_data: np.ndarray = self.makeData(stp, length)
+        start: int = self.getStart(self._nframes, self.getOverlap(), apply_data.shape[0])
+        end: int = start + apply_data.shape[0]
+        self._reserve(end)
+        self._mix(start, apply_data)
+        self._nframes = end
+        return start, apply_data.shape[0]
+
+    def makeData(self, stp: float, length: float) -> np.ndarray:
+        '''
+        | stp,length,エンベロープを適用したself._dataを、バッファに合成せずに返します。
+        | 入力ファイルもしくはエンベロープが不正だった場合、無音を返します。
+
+        Parameters
+        ----------
+        stp : float
+            入力wavの先頭のオフセットをmsで指定する。
+
+        length : float
+            追加する長さ(ms)
+
+        Returns
+        -------
+        data: np.ndarray of np.float64
+            出力するビット深度に合わせて拡大した、切り捨て前の波形
+        '''
+        if not self._error:
+            stp_frames: int = int(stp * self._framerate / 1000)
+            length_frames: int = int(length * self._framerate / 1000)
+            range_data: np.ndarray = self._data[stp_frames:stp_frames + length_frames]
+            p, v = self._getEnvelopes(length)
+            if len(p) == 0:
+                apply_data: np.ndarray = np.zeros_like(range_data)
+            else:
+                apply_data: np.ndarray = range_data * np.interp(np.arange(range_data.shape[0]), p, v[:len(p)]) / 100
+        else:
+            apply_data: np.ndarray = np.zeros(math.ceil(length * self._framerate / 1000))
+        return apply_data * (2 ** self._samplewidth / 2)
+
+    def getOverlap(self) -> int:
+        '''
+        現在のエンベロープのoveをフレーム数で返します。
+
+        Returns
+        -------
+        ove_frames: int
+        '''
+        ove: float = self._envelope[7] if len(self._envelope) >= 8 else 0
+        return int(ove * self._framerate / 1000)
+
+    @staticmethod
+    def getStart(nframes: int, ove_frames: int, length_frames: int) -> int:
+        '''
+        合成済みのフレーム数がnframesのとき、次に追記するデータの先頭のフレーム位置を返します。
+
+        Parameters
+        ----------
+        nframes: int
+            合成済みのフレーム数
+
+        ove_frames: int
+            追記するデータのoveのフレーム数
+
+        length_frames: int
+            追記するデータのフレーム数
+
+        Returns
+        -------
+        start: int
+        '''
+        return nframes - min(ove_frames, nframes, length_frames)
+
+    def _mix(self, start: int, data: np.ndarray):
+        '''
+        バッファのstartからdataを加算します。
+
+        Parameters
+        ----------
+        start: int
+            加算する先頭のフレーム位置
+
+        data: np.ndarray
+            makeDataが返した波形
+        '''
+        end: int = start + data.shape[0]
+        # PyWavToolと同様、追記のたびに整数に切り捨てる
+        self._buffer[start:end] = np.trunc(self._buffer[start:end] + data)
+
+    def _reserve(self, nframes: int):
+        '''
+        バッファがnframesより短ければ、倍以上の長さに拡張します。
+
+        Parameters
+        ----------
+        nframes: int
+        '''
+        if nframes > self._buffer.shape[0]:
+            self._buffer = np.concatenate([self._buffer, np.zeros(max(nframes, self._buffer.shape[0] * 2) - self._buffer.shape[0])])
+
+    def resize(self, nframes: int):
+        '''
+        | 合成済みのフレーム数をnframesにします。
+        | 縮める場合は末尾のデータを破棄し、伸ばす場合は無音で埋めます。
+
+        Parameters
+        ----------
+        nframes: int
+        '''
+        self._reserve(nframes)
+        self._buffer[nframes:] = 0
+        self._nframes = nframes
+
+    def remix(self, start: int, end: int, segments: list):
+        '''
+        | バッファのstart～endを無音に戻し、segmentsを先頭から順に合成し直します。
+        | 合成済みのフレーム数より後ろは合成しません。
+
+        Parameters
+        ----------
+        start: int
+            合成し直す範囲の先頭のフレーム位置
+
+        end: int
+            合成し直す範囲の末尾のフレーム位置(この位置は含まない)
+
+        segments: list of tuple
+            | (先頭のフレーム位置, makeDataが返した波形)の組を、追記した順に並べたもの。
+            | start～endと重なる部分のみを合成します。
+        '''
+        end = min(end, self._nframes)
+        self._buffer[start:end] = 0
+        for segment_start, data in segments:
+            head: int = max(start, segment_start)
+            tail: int = min(end, segment_start + data.shape[0])
+            if head < tail:
+                self._mix(head, data[head - segment_start:tail - segment_start])
+
+    def _getEnvelopes(self, length: float) -> Tuple[list, list]:
+        '''
+        | エンベロープをノート頭からのフレーム順に並べ、pとvのリストを返します。
+        | PyWavTool.WavTool._getEnvelopesと同じ値を返します。
+
+        Parameters
+        ----------
+        length : float
+            追加する長さ(ms)
+
+        Returns
+        -------
+        p :list of int
+            Pstart P1 P2 P3 (P5) P4 Pendの順に並べたポルタメント。エンベロープが2点の場合空配列
+
+        v: list of int
+            ノート頭からms順に並べたポルタメントの音量値。エンベロープが2点の場合空配列
+        '''
+        if len(self._envelope) == 2:
+            return [], []
+        p: list = [0]
+        v: list = [0]
+        frame_per_ms: float = self._framerate / 1000
+        p.append(int(float(self._envelope[0]) * frame_per_ms))
+        p.append(int((float(self._envelope[0]) + float(self._envelope[1])) * frame_per_ms))
+        v.append(int(self._envelope[3]))
+        v.append(int(self._envelope[4]))
+        if len(self._envelope) >= 11:
+            p.append(int((float(self._envelope[0]) + float(self._envelope[1]) + float(self._envelope[9])) * frame_per_ms))
+            v.append(int(self._envelope[10]))
+        v.append(int(self._envelope[5]))
+        v.append(int(self._envelope[6]))
+        if len(self._envelope) >= 9:
+            p.append(int((length - float(self._envelope[8]) - float(self._envelope[2])) * frame_per_ms))
+            p.append(int((length - float(self._envelope[8])) * frame_per_ms))
+        else:
+            p.append(int((length - float(self._envelope[2])) * frame_per_ms))
+        p.append(length * frame_per_ms)
+        v.append(0)
+        return p, v
+
+    def get_data(self) -> np.ndarray:
+        '''
+        合成済みの波形を、出力するビット深度の整数に変換して返します。
+
+        Returns
+        -------
+        data: np.ndarray
+        '''
+        max_amp: int = 2 ** self._samplewidth // 2
+        data: np.ndarray = np.clip(self._buffer[:self._nframes], -max_amp, max_amp - 1)
+        if self._samplewidth == 8:
+            return (data + 128).astype(np.uint8)
+        elif self._samplewidth == 16:
+            return data.astype("<i2")
+        elif self._samplewidth == 24:
+            data = data.astype("<i4")
+            return data.view(np.uint8).reshape(-1, 4)[:, :3]
+        return data.astype("<i4")
+
+    def write(self):
+        '''
+        RIFFヘッダと合成済みの波形をself.outputに書き込みます。
+        '''
+        if os.path.split(self._output)[0] != "":
+            os.makedirs(os.path.split(self._output)[0], exist_ok=True)
+        data: np.ndarray = np.ascontiguousarray(self.get_data())
+        data_size: int = data.nbytes
+        with open(self._output, "wb") as fw:
+            self._write_header(fw, data_size)
+            fw.write(memoryview(data).cast("B"))
+
+    def patch(self, start: int, end: int):
+        '''
+        | self.outputのうち、start～endのフレームだけを書き換えます。
+        | self.outputが存在しないか、合成済みのフレーム数と長さが異なる場合はwriteと同じく全体を書き込みます。
+
+        Parameters
+        ----------
+        start: int
+            書き換える先頭のフレーム位置
+
+        end: int
+            書き換える末尾のフレーム位置(この位置は含まない)
+        '''
+        block_align: int = self._samplewidth // 8
+        if not os.path.isfile(self._output) or os.path.getsize(self._output) != HEADER_SIZE + self._nframes * block_align:
+            self.write()
+            return
+        data: np.ndarray = np.ascontiguousarray(self.get_data()[start:end])
+        with open(self._output, "r+b") as fw:
+            fw.seek(HEADER_SIZE + start * block_align)
+            fw.write(memoryview(data).cast("B"))
+
+    def _write_header(self, fw, data_size: int):
+        '''
+        RIFFヘッダを書き込みます。
+
+        Parameters
+        ----------
+        fw: BinaryIO
+            書き込み先のファイル
+
+        data_size: int
+            波形データのバイト数
+        '''
+        block_align: int = self._samplewidth // 8
+        fw.write(b"RIFF")
+        fw.write((data_size + 36).to_bytes(4, "little"))
+        fw.write(b"WAVE")
+        fw.write(b"fmt ")
+        fw.write((16).to_bytes(4, "little"))
+        fw.write((1).to_bytes(2, "little"))
+        fw.write((1).to_bytes(2, "little"))
+        fw.write(self._framerate.to_bytes(4, "little"))
+        fw.write((self._framerate * block_align).to_bytes(4, "little"))
+        fw.write(block_align.to_bytes(2, "little"))
+        fw.write(self._samplewidth.to_bytes(2, "little"))
+        fw.write(b"data")
+        fw.write(data_size.to_bytes(4, "little"))
@@ -14,6 +14,8 @@ for pathname, dirnames, filenames in os.walk("."):
         continue
     if "tests" in pathname:
         continue
+    if "benchmarks" in pathname:
+        continue
     for filename in filenames:
         if not filename.endswith(".py"):
             continue
@@ -0,0 +1,46 @@
+﻿'''
+projects.Renderを使用するテストで共通の、ノートとキャッシュファイルを作成します。
+'''
+
+import os.path
+
+from tests.wavutil import write_wav
+
+
+class DummyRenderNote:
+    '''
+    RenderやRenderSessionが参照する属性だけを持つ、RenderNoteの代わりのノート。
+    '''
+    def __init__(self, num: int, require_resamp: bool = True):
+        self.input_path = "input{}.wav".format(num)
+        self.cache_key = "key{}".format(num)
+        self.cache_path = os.path.join("testdata", "cache", "{}.wav".format(num))
+        self.target_tone = "C4"
+        self.velocity = 100
+        self.flags = ""
+        self.offset = 0
+        self.target_ms = 500
+        self.fixed_ms = 0
+        self.end_ms = 0
+        self.intensity = 100
+        self.modulation = 0
+        self.tempo = "!120.00"
+        self.pitchbend = ""
+        self.require_resamp = require_resamp
+        self.direct = False
+        self.envelope = "0 5 35 0 100 100 0 10"
+        self.stp = 0
+        self.output_ms = 500
+
+
+def write_cache(note, frequency: float):
+    '''
+    note.cache_pathに、frequencyの正弦波を1秒間記録したキャッシュファイルを作成します。
+
+    Parameters
+    ----------
+    note: RenderNote or DummyRenderNote
+
+    frequency: float
+    '''
+    write_wav(note.cache_path, frequency, 1, harmonics=1, amplitude=0.5)
@@ -41,7 +41,7 @@ class CharacterReadTest(unittest.TestCase):
                  "web=https://sample.co.jp/",
                  "version=単独音1"]
         character = voicebank.character.Character()
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("cp932"))
         with mock.patch("builtins.open", mock_io):
             character.load("samplepath")
         self.assertEqual(character.name, "名前")
@@ -64,7 +64,7 @@ class CharacterReadTest(unittest.TestCase):
                  "web:https://sample.co.jp/",
                  "version:単独音1"]
         character = voicebank.character.Character()
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("cp932"))
         with mock.patch("builtins.open", mock_io):
             character.load("samplepath")
         self.assertEqual(character.name, "名前")
@@ -87,7 +87,7 @@ class CharacterReadTest(unittest.TestCase):
                  "web:https://sample.co.jp/",
                  "version:単独音1"]
         character = voicebank.character.Character()
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("cp932"))
         with mock.patch("builtins.open", mock_io):
             character.load("samplepath")
         self.assertEqual(character.name, "名前")
@@ -106,7 +106,7 @@ class CharacterReadTest(unittest.TestCase):
         mock_isfile.return_value = True
         lines = [""]
         character = voicebank.character.Character()
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("cp932"))
         with mock.patch("builtins.open", mock_io):
             character.load(os.path.join("voice", "sample1"))
         self.assertEqual(character.name, "sample1")
@@ -124,7 +124,7 @@ class CharacterReadTest(unittest.TestCase):
         mock_isfile.return_value = False
         lines = [""]
         character = voicebank.character.Character()
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("cp932"))
         
         with self.assertRaises(FileNotFoundError) as cm:
             character.load(os.path.join("voice", "sample1"))
@@ -133,23 +133,22 @@ class CharacterReadTest(unittest.TestCase):
     @mock.patch("os.path.isfile")
     def test_load_raise_unicode_decode_error(self, mock_isfile):
         '''
-        | character.txtシステムデフォルトでもcp932でも開けなかったとき
+        | character.txtがutf-8でもcp932でも開けなかったとき
         '''
         mock_isfile.return_value = True
-        lines = [""]
         character = voicebank.character.Character()
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data=b"name=\x82\xff")
         
         with self.assertRaises(UnicodeDecodeError) as cm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
-                mocked_open.side_effect = UnicodeDecodeError("cp932", b"\x00\x00", 1, 2, "reason")
                 character.load(os.path.join("voice", "sample1"))
-        self.assertEqual(cm.exception.reason, "can't read character.txt. because required character encoding is system default or cp932")
+        self.assertEqual(cm.exception.reason, "can't read character.txt. because required character encoding is utf-8 or cp932")
         
     @mock.patch("os.path.isfile")
     def test_load_raise_unicode_decode_error_once(self, mock_isfile):
         '''
-        | character.txtシステムデフォルトで開けなかったがcp932で開けたとき
+        | character.txtがutf-8で開けなかったがcp932で開けたとき
+        | ファイルは1度だけ開く
         '''
         mock_isfile.return_value = True
         lines = ["name=名前",
@@ -159,11 +158,12 @@ class CharacterReadTest(unittest.TestCase):
                  "web=https://sample.co.jp/",
                  "version=単独音1"]
         character = voicebank.character.Character()
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("cp932"))
         
         with mock.patch("builtins.open", mock_io) as mocked_open:
-            mocked_open.side_effect = [UnicodeDecodeError("cp932", b"\x00\x00", 1, 2, "reason"), mock.DEFAULT]
             character.load(os.path.join("voice", "sample1"))
+        mocked_open.assert_called_once_with(os.path.join("voice", "sample1", "character.txt"), "rb")
+        self.assertEqual(character.encoding, "cp932")
         self.assertEqual(character.name, "名前")
         self.assertEqual(character.image, "画像")
         self.assertEqual(character.sample, "サンプル音声")
@@ -183,7 +183,7 @@ class CharacterReadTest(unittest.TestCase):
                  "author=管理者",
                  "web=https://sample.co.jp/",
                  "version=単独音1"]
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("cp932"))
         with mock.patch("builtins.open", mock_io):
             character = voicebank.character.Character("samplepath")
         self.assertEqual(character.name, "名前")
@@ -26,6 +26,12 @@ class TestEntryBase(unittest.TestCase):
         e = self.TestClass()
         self.assertFalse(e.hasValue)
 
+    def test_slots(self):
+        e = self.TestClass()
+        self.assertFalse(hasattr(e, "__dict__"))
+        with self.assertRaises(AttributeError):
+            e.undefined = 1
+
 
 class TestStringEntry(TestEntryBase):
     TestClass = StringEntry
@@ -225,6 +231,12 @@ class TestListEntry(TestEntryBase):
         self.assertFalse(e.isUpdate)
         self.assertEqual(str(e), self.base_str)
 
+    def test_default_not_shared(self):
+        e = self.TestClass()
+        e2 = self.TestClass()
+        e.append(self.add_value)
+        self.assertEqual(len(e2.value), 0)
+
     def test_init_from_str(self):
         e = self.TestClass()
         e.init_from_str(self.base_str)
@@ -0,0 +1,225 @@
+﻿'''
+projects.FeatureCacheモジュールのテスト
+'''
+
+import unittest
+from unittest import mock
+
+import os
+import os.path
+import shutil
+import pickle
+import logging
+
+import numpy as np
+import PyRwu
+
+import projects.Render
+import projects.FeatureCache
+import settings.logger
+from tests.wavutil import write_wav
+
+
+def _features(frames: int = 10, value: float = 1.0) -> tuple:
+    return 44100, np.full(frames, value), np.full((frames, 4), value), np.full((frames, 4), value)
+
+
+class TestFeatureCache(unittest.TestCase):
+    def setUp(self):
+        self.test_logger = settings.logger.get_logger("TEST", True)
+        self.root = os.path.join("testdata", "features")
+        self.input_path = os.path.join("testdata", "voice", "a.wav")
+        write_wav(self.input_path, harmonics=1)
+
+    def tearDown(self):
+        if hasattr(self, "cache"):
+            self.cache.close()
+        if os.path.isdir(os.path.join("testdata")):
+            shutil.rmtree(os.path.join("testdata"))
+
+    def _make_resamp(self, resamp_class: type = projects.Render.FastResamp, output: str = "out.wav", tone: str = "A3",
+                     target_ms: float = 200, offset: float = 0, end_ms: float = 0):
+        return resamp_class(self.input_path, os.path.join("testdata", "cache", output), tone, 100, "",
+                            offset, target_ms, 50, end_ms, logger=self.test_logger)
+
+    def test_get_key(self):
+        key = projects.FeatureCache.FeatureCache.get_key(self._make_resamp())
+        self.assertEqual(len(key), 64)
+        # 音高や長さが違っても同じキー
+        self.assertEqual(key, projects.FeatureCache.FeatureCache.get_key(self._make_resamp(tone="C4", target_ms=500)))
+        self.assertNotEqual(key, projects.FeatureCache.FeatureCache.get_key(self._make_resamp(offset=10)))
+        self.assertNotEqual(key, projects.FeatureCache.FeatureCache.get_key(self._make_resamp(end_ms=-100)))
+        self.assertNotEqual(key, projects.FeatureCache.FeatureCache.get_key(self._make_resamp(PyRwu.Resamp)))
+        with mock.patch.object(PyRwu.settings, "PYWORLD_THRESHOLD", 0.5):
+            self.assertNotEqual(key, projects.FeatureCache.FeatureCache.get_key(self._make_resamp()))
+
+    def test_get_key_changed(self):
+        key = projects.FeatureCache.FeatureCache.get_key(self._make_resamp())
+        write_wav(self.input_path, 440, 0.4, harmonics=1)
+        self.assertNotEqual(key, projects.FeatureCache.FeatureCache.get_key(self._make_resamp()))
+
+    def test_get_key_not_found(self):
+        with self.assertRaises(FileNotFoundError):
+            projects.FeatureCache.FeatureCache.get_key(projects.Render.FastResamp("notfound.wav", "out.wav", "A3", 100))
+
+    def test_memory(self):
+        self.cache = projects.FeatureCache.FeatureCache(logger=self.test_logger)
+        self.assertIsNone(self.cache.fetch("key1"))
+        self.cache.store("key1", *_features())
+        features = self.cache.fetch("key1")
+        self.assertEqual(features[0], 44100)
+        np.testing.assert_array_equal(features[2], np.ones((10, 4)))
+        self.assertFalse(features[1].flags.writeable)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        self.assertEqual(self.cache.memory_bytes, 720)
+        self.assertEqual(self.cache.total_bytes, 0)
+
+    def test_memory_evict(self):
+        self.cache = projects.FeatureCache.FeatureCache(max_memory_bytes=1500, logger=self.test_logger)
+        self.cache.store("key1", *_features())
+        self.cache.store("key2", *_features())
+        self.cache.fetch("key1")
+        self.cache.store("key3", *_features())
+        self.assertIsNotNone(self.cache.fetch("key1"))
+        self.assertIsNone(self.cache.fetch("key2"))
+        self.assertIsNotNone(self.cache.fetch("key3"))
+        self.assertEqual(self.cache.memory_bytes, 1440)
+
+    def test_file(self):
+        '''
+        rootに保存した解析結果は、別のインスタンスからmemmapとして読み込める
+        '''
+        self.cache = projects.FeatureCache.FeatureCache(self.root, logger=self.test_logger)
+        self.cache.store("key1", *_features(value=2.0))
+        self.assertEqual(self.cache.total_bytes, 720)
+        self.cache.close()
+        self.cache = projects.FeatureCache.FeatureCache(self.root, logger=self.test_logger)
+        features = self.cache.fetch("key1")
+        self.assertIsInstance(features[3], np.memmap)
+        np.testing.assert_array_equal(features[3], np.full((10, 4), 2.0))
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_file_evict(self):
+        self.cache = projects.FeatureCache.FeatureCache(self.root, max_bytes=1500, logger=self.test_logger)
+        self.cache.store("key1", *_features())
+        self.cache.store("key2", *_features())
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
+            self.cache.store("key3", *_features())
+        self.assertEqual(logcm.output, ["DEBUG:TEST:1 feature caches are evicted."])
+        self.assertEqual(self.cache.total_bytes, 1440)
+        self.assertFalse(os.path.isdir(self.cache._get_dir("key1")))
+        self.assertTrue(os.path.isdir(self.cache._get_dir("key3")))
+
+    def test_file_removed(self):
+        '''
+        ファイルが削除されていた場合、見つからなかったものとして扱う
+        '''
+        self.cache = projects.FeatureCache.FeatureCache(self.root, logger=self.test_logger)
+        self.cache.store("key1", *_features())
+        shutil.rmtree(self.cache._get_dir("key1"))
+        self.cache._memory.clear()
+        self.assertIsNone(self.cache.fetch("key1"))
+        self.assertEqual(self.cache.total_bytes, 0)
+
+    def test_total_bytes_replace(self):
+        '''
+        同じキーを保存し直した場合、合計サイズは置き換えた後のサイズになる
+        '''
+        self.cache = projects.FeatureCache.FeatureCache(self.root, logger=self.test_logger)
+        self.cache.store("key1", *_features())
+        self.cache.store("key1", *_features(frames=20))
+        self.assertEqual(self.cache.total_bytes, 1440)
+        self.cache.close()
+        self.cache = projects.FeatureCache.FeatureCache(self.root, logger=self.test_logger)
+        self.assertEqual(self.cache.total_bytes, 1440)
+
+    def test_clear(self):
+        self.cache = projects.FeatureCache.FeatureCache(self.root, logger=self.test_logger)
+        self.cache.store("key1", *_features())
+        self.cache.clear()
+        self.assertEqual((self.cache.memory_bytes, self.cache.total_bytes), (0, 0))
+        self.assertFalse(os.path.isdir(self.cache._get_dir("key1")))
+
+    def test_pickle(self):
+        '''
+        workerに渡した場合、メモリ上の解析結果は引き継がず、rootのファイルを共有する
+        '''
+        self.cache = projects.FeatureCache.FeatureCache(self.root, logger=self.test_logger)
+        self.cache.store("key1", *_features())
+        copied = pickle.loads(pickle.dumps(self.cache))
+        self.assertEqual(copied.memory_bytes, 0)
+        self.assertIsNotNone(copied.fetch("key1"))
+        copied.close()
+
+    def test_attach(self):
+        '''
+        同じ入力wavの2回目以降のresampは解析を省略し、同じ出力を得る
+        '''
+        self.cache = projects.FeatureCache.FeatureCache(self.root, logger=self.test_logger)
+        resamp = self._make_resamp(output="1.wav")
+        self.cache.attach(resamp)
+        resamp.resamp()
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+
+        resamp = self._make_resamp(output="2.wav")
+        self.cache.attach(resamp)
+        with mock.patch("PyRwu.resamp.pw.harvest") as mock_harvest:
+            with mock.patch("PyRwu.resamp.pw.cheaptrick") as mock_cheaptrick:
+                resamp.resamp()
+        mock_harvest.assert_not_called()
+        mock_cheaptrick.assert_not_called()
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+        with open(os.path.join("testdata", "cache", "1.wav"), "rb") as fr1:
+            with open(os.path.join("testdata", "cache", "2.wav"), "rb") as fr2:
+                self.assertEqual(fr1.read(), fr2.read())
+
+    def test_attach_copy(self):
+        '''
+        resampに渡した配列を書き換えても、保持している解析結果は変わらない
+        '''
+        self.cache = projects.FeatureCache.FeatureCache(logger=self.test_logger)
+        resamp = self._make_resamp()
+        self.cache.store(self.cache.get_key(resamp), *_features())
+        self.cache.attach(resamp)
+        resamp.getInputData()
+        resamp._sp[0, 0] = 5
+        np.testing.assert_array_equal(self.cache.fetch(self.cache.get_key(resamp))[2], np.ones((10, 4)))
+
+    def test_run_resamp(self):
+        '''
+        workerでもfeature_cacheを使用する
+        '''
+        self.cache = projects.FeatureCache.FeatureCache(logger=self.test_logger)
+        params = (self.input_path, os.path.join("testdata", "cache", "out.wav"), "A3", 100, "", 0, 200, 50, 0)
+        error, messages = projects.Render._run_resamp(projects.Render.FastResamp, params, self.cache)
+        self.assertEqual(error, "")
+        error, messages = projects.Render._run_resamp(projects.Render.FastResamp, params, self.cache)
+        self.assertEqual(error, "")
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_init_worker(self):
+        '''
+        ProcessPoolExecutorのworkerは、起動時に受け取ったキャッシュを全てのノートで共有する
+        '''
+        self.cache = projects.FeatureCache.FeatureCache(logger=self.test_logger)
+        with mock.patch("projects.Render._worker_feature_cache"):
+            projects.Render._init_worker(pickle.dumps(self.cache))
+            worker_cache = projects.Render._worker_feature_cache
+            self.assertIsInstance(worker_cache, projects.FeatureCache.FeatureCache)
+            for name in ["out1.wav", "out2.wav"]:
+                params = (self.input_path, os.path.join("testdata", "cache", name), "A3", 100, "", 0, 200, 50, 0)
+                error, messages = projects.Render._run_resamp(projects.Render.FastResamp, params)
+                self.assertEqual(error, "")
+        self.assertEqual((worker_cache.hits, worker_cache.misses), (1, 1))
+        self.assertIsNone(projects.Render._worker_feature_cache)
+
+    def test_process_pool(self):
+        '''
+        ProcessPoolExecutorにはキャッシュをノートごとではなく、workerの起動時に渡す
+        '''
+        self.cache = projects.FeatureCache.FeatureCache(logger=self.test_logger)
+        with mock.patch("projects.Render.ProcessPoolExecutor") as mock_pool:
+            projects.Render.Render._get_pool(2, False, self.cache)
+        self.assertIs(mock_pool.call_args[1]["initializer"], projects.Render._init_worker)
+        copied = pickle.loads(mock_pool.call_args[1]["initargs"][0])
+        self.assertIsInstance(copied, projects.FeatureCache.FeatureCache)
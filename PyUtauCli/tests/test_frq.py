@@ -0,0 +1,73 @@
+﻿'''
+voicebank.frqモジュールのテスト
+'''
+
+import unittest
+
+import os
+import os.path
+import shutil
+
+import numpy as np
+
+import voicebank.frq
+from tests.wavutil import write_wav
+
+
+class TestFrq(unittest.TestCase):
+    def setUp(self):
+        self.wavpath = os.path.join("testdata", "a.wav")
+        write_wav(self.wavpath, 220, 0.5)
+
+    def tearDown(self):
+        if os.path.isdir(os.path.join("testdata")):
+            shutil.rmtree(os.path.join("testdata"))
+
+    def test_make(self):
+        for f0_method in voicebank.frq.F0_METHODS:
+            with self.subTest(f0_method=f0_method):
+                frq = voicebank.frq.Frq()
+                frq.make(self.wavpath, f0_method)
+                self.assertEqual(frq.frqpath, os.path.join("testdata", "a_wav.frq"))
+                self.assertEqual(frq.f0.shape[0], 87)
+                self.assertEqual(frq.amp.shape[0], 87)
+                self.assertAlmostEqual(frq.f0_avg, 220, delta=5)
+
+    def test_make_default(self):
+        '''
+        f0_methodを省略した場合harvestを使用する
+        '''
+        frq = voicebank.frq.Frq()
+        frq.make(self.wavpath)
+        expected = voicebank.frq.Frq()
+        expected.make(self.wavpath, "harvest")
+        np.testing.assert_array_equal(frq.f0, expected.f0)
+
+    def test_make_invalid_method(self):
+        with self.assertRaises(ValueError):
+            voicebank.frq.Frq().make(self.wavpath, "crepe")
+
+    def test_save_load(self):
+        frq = voicebank.frq.Frq()
+        frq.make(self.wavpath, "fast")
+        frq.save()
+        loaded = voicebank.frq.Frq(frq.frqpath)
+        np.testing.assert_array_equal(loaded.f0, frq.f0)
+        np.testing.assert_array_equal(loaded.amp, frq.amp)
+        self.assertEqual(loaded.f0_avg, frq.f0_avg)
+
+    def test_get_amp(self):
+        '''
+        256sampleごとの平均と一致し、末尾の端数は範囲内のsampleだけで平均する
+        '''
+        datas = np.random.RandomState(0).uniform(-1, 1, 256 * 3 + 100)
+        amp = voicebank.frq.Frq._get_amp(datas, 4)
+        expected = [np.average(np.abs(datas[i * 256:(i + 1) * 256])) for i in range(4)]
+        np.testing.assert_allclose(amp, expected)
+
+    def test_get_amp_empty_frame(self):
+        '''
+        sampleが1つもないフレームは0
+        '''
+        datas = np.full(256 * 2, -0.5)
+        np.testing.assert_array_equal(voicebank.frq.Frq._get_amp(datas, 3), [0.5, 0.5, 0])
@@ -56,6 +56,13 @@ class TestNote(unittest.TestCase):
         self.assertEqual(n.intensity.value, 100)
         self.assertEqual(n.modulation.value, 100)
 
+    def test_slots(self):
+        n = projects.Note.Note()
+        self.assertFalse(hasattr(n, "__dict__"))
+        self.assertIsNone(n.prev)
+        self.assertIsNone(n.next)
+        self.assertFalse(n.autoren)
+
     def test_msLength(self):
         n = projects.Note.Note()
         n.length.value = 480
@@ -407,6 +407,31 @@ class TestConvertPitch(unittest.TestCase):
         self.assertEqual(25, round(result[120]))
         self.assertEqual(0, round(result[160]))
 
+    def test_interp_param_indexes(self):
+        self.ust.notes[1].pre.value = 300
+        self.ust.notes[1].apply_oto(self.vb.oto, self.vb.prefix)
+        self.ust.notes[1].pbs.value = "-150;-10"
+        self.ust.notes[1].pbw.value = [100, 150, 50]
+        self.ust.notes[1].pby.value = [3.5, -12.1]
+        self.ust.notes[1].pbm.value = ["s","r","j"]
+        t = PyRwu.pitch.getPitchRange(100, 950, 44100)
+        r_note = projects.RenderNote.RenderNote(self.ust.notes[1], self.vb, "cache", "output", True)
+        x, y, mode = r_note._get_interp_base(self.ust.notes[1], 300)
+        indexes = np.searchsorted(t, x)
+        for i in range(1, len(x)):
+            s1,e1,c1,h1,p1 = r_note._get_interp_param(x, y, t, i)
+            s2,e2,c2,h2,p2 = r_note._get_interp_param(x, y, t, i, indexes)
+            self.assertEqual((s1, e1, c1, h1), (s2, e2, c2, h2))
+            np.testing.assert_array_equal(p1, p2)
+
+    def test_vibrato_fade_no_fadeout_time(self):
+        self.ust.notes[1].pre.value = 300
+        self.ust.notes[1].apply_oto(self.vb.oto, self.vb.prefix)
+        self.ust.notes[1].vibrato.value = "50,100,100,50,0,0,0,0"
+        r_note = projects.RenderNote.RenderNote(self.ust.notes[1], self.vb, "cache", "output", True)
+        fade = r_note._get_vibrato_fade(self.ust.notes[1], np.array([0, 150, 299, 300]))
+        np.testing.assert_array_equal(fade, np.array([0, 1, 1, 1]))
+
     def test_base64(self):
         result = projects.RenderNote.RenderNote.encodeBase64(np.array([0,63,2047,-2048,-1]))
         self.assertEqual(result,["AA","A/","f/","gA","//"])
@@ -415,6 +440,26 @@ class TestConvertPitch(unittest.TestCase):
         self.assertEqual(projects.RenderNote.RenderNote.encodeRunLength(["AA","AB","AC"]),"AAABAC")
         self.assertEqual(projects.RenderNote.RenderNote.encodeRunLength(["AA","AA","AB","AC","AC","AC","AB"]),"AA#1#ABAC#2#AB")
 
+    def test_base64_empty(self):
+        self.assertEqual(projects.RenderNote.RenderNote.encodeBase64(np.array([], dtype=np.int16)), [])
+        self.assertEqual(projects.RenderNote.RenderNote.encodeRunLength([]), "")
+        self.assertEqual(projects.RenderNote.RenderNote.encodePitches(np.array([], dtype=np.int16)), "")
+        self.assertEqual(projects.RenderNote.RenderNote.decodePitches("").shape[0], 0)
+
+    def test_encode_pitches(self):
+        values = np.array([0, 0, 63, 2047, 2047, 2047, -2048, -1, -1, 0], dtype=np.int16)
+        result = projects.RenderNote.RenderNote.encodePitches(values)
+        self.assertEqual(result, "AA#1#A/f/#2#gA//#1#AA")
+        self.assertEqual(result, projects.RenderNote.RenderNote.encodeRunLength(projects.RenderNote.RenderNote.encodeBase64(values)))
+
+    def test_decode_pitches(self):
+        values = np.round(np.sin(np.arange(2000) / 50) * 300).astype(np.int16)
+        values[100:400] = -2048
+        encoded = projects.RenderNote.RenderNote.encodePitches(values)
+        np.testing.assert_array_equal(projects.RenderNote.RenderNote.decodePitches(encoded), values)
+        np.testing.assert_array_equal(projects.RenderNote.RenderNote.decodePitches(encoded),
+                                      PyRwu.pitch.decodeBase64(PyRwu.pitch.decodeRunLength(encoded)))
+
     def test_vibrato_fade_no_fade(self):
         self.ust.notes[1].pre.value = 300
         self.ust.notes[1].apply_oto(self.vb.oto, self.vb.prefix)
@@ -473,7 +518,7 @@ class TestConvertPitch(unittest.TestCase):
         end: int = np.where(t<900)[0][-1]
         phase: np.ndarray = t[start:end + 1] - 600
         fade = r_note._get_vibrato_fade(self.ust.notes[1],phase)
-        answer = np.ndarray = np.ones_like(fade,dtype=np.float64)
+        answer: np.ndarray = np.ones_like(fade,dtype=np.float64)
         answer[0:30] = np.arange(0,1,1/30)
         answer[30:60] = np.arange(1,0,-1/30)
         for i in range(len(fade)):
@@ -766,4 +811,19 @@ class TestConvertPitch(unittest.TestCase):
         self.assertEqual(result[160],67)
         self.assertEqual(result[165],100)
         self.assertEqual(result[170],33)
-        self.assertEqual(result[175],0)
\ No newline at end of file
+        self.assertEqual(result[175],0)
+
+    def test_cache_key(self):
+        self.ust.notes[1].apply_oto(self.vb.oto, self.vb.prefix)
+        r_note = projects.RenderNote.RenderNote(self.ust.notes[1], self.vb, "cache", "output", True)
+        self.assertEqual(len(r_note.cache_key), 64)
+        self.assertTrue(r_note.cache_path.endswith("_{}.wav".format(r_note.cache_key)))
+        same_note = projects.RenderNote.RenderNote(self.ust.notes[1], self.vb, "cache", "output", True)
+        self.assertEqual(r_note.cache_key, same_note.cache_key)
+        self.ust.notes[1].flags.value = "g-5"
+        flag_note = projects.RenderNote.RenderNote(self.ust.notes[1], self.vb, "cache", "output", True)
+        self.assertNotEqual(r_note.cache_key, flag_note.cache_key)
+        self.ust.notes[1].flags.value = ""
+        self.ust.notes[1].velocity.value = 150
+        velocity_note = projects.RenderNote.RenderNote(self.ust.notes[1], self.vb, "cache", "output", True)
+        self.assertNotEqual(r_note.cache_key, velocity_note.cache_key)
@@ -0,0 +1,118 @@
+﻿'''
+projects.NoteColumnsモジュールのテスト
+'''
+
+import unittest
+
+import numpy as np
+
+import projects.Ust
+from projects.Note import Note
+from projects.NoteColumns import NoteColumns
+import settings.logger
+
+
+def _make_note(length: int, tempo: float, lyric: str = "あ") -> Note:
+    note = Note()
+    note.length.init(length)
+    note.lyric.init(lyric)
+    note.notenum.init(60)
+    note.tempo.init(tempo)
+    return note
+
+
+class TestNoteColumns(unittest.TestCase):
+    def setUp(self):
+        self.notes = [_make_note(480, 120), _make_note(960, 120), _make_note(240, 150, "R"), _make_note(480, 90)]
+        self.columns = NoteColumns(self.notes)
+
+    def test_init(self):
+        self.assertEqual(len(self.columns), 4)
+        np.testing.assert_array_equal(self.columns["length"], [480, 960, 240, 480])
+        np.testing.assert_array_equal(self.columns["tempo"], [120, 120, 150, 90])
+        np.testing.assert_array_equal(self.columns["velocity"], [100, 100, 100, 100])
+        self.assertEqual(self.columns.data.shape, (4,))
+
+    def test_empty(self):
+        columns = NoteColumns([])
+        self.assertEqual(len(columns), 0)
+        self.assertEqual(columns.total_ms(), 0)
+        self.assertEqual(columns.positions()[0].shape, (0,))
+
+    def test_unknown_field(self):
+        with self.assertRaises(KeyError):
+            self.columns["lyric"]
+        with self.assertRaises(KeyError):
+            self.columns.set("lyric", 0, "い")
+
+    def test_read_only(self):
+        with self.assertRaises(ValueError):
+            self.columns["length"][0] = 1
+        with self.assertRaises(ValueError):
+            self.columns.data["length"][0] = 1
+
+    def test_positions(self):
+        tick_starts, ms_starts, ms_lengths = self.columns.positions()
+        np.testing.assert_array_equal(tick_starts, [0, 480, 1440, 1680])
+        self.assertListEqual(ms_lengths.tolist(), [note.msLength for note in self.notes])
+        np.testing.assert_allclose(ms_starts, [0, 500, 1500, 1700])
+        np.testing.assert_array_equal(self.columns.ms_starts(), ms_starts)
+        self.assertAlmostEqual(self.columns.total_ms(), 2366.6666666666665)
+
+    def test_set(self):
+        self.columns.set("length", 1, "480")
+        self.assertEqual(self.notes[1].length.value, 480)
+        self.assertTrue(self.notes[1].length.isUpdate)
+        self.assertEqual(self.columns["length"][1], 480)
+        np.testing.assert_array_equal(self.columns.tick_starts(), [0, 480, 960, 1200])
+
+    def test_set_bad_value(self):
+        with self.assertRaises(ValueError):
+            self.columns.set("length", 1, "a")
+        self.assertEqual(self.columns["length"][1], 960)
+
+    def test_refresh(self):
+        self.notes[0].pre.value = 10
+        self.assertEqual(self.columns["pre"][0], 0)
+        self.columns.refresh()
+        self.assertEqual(self.columns["pre"][0], 10)
+
+
+class TestUstColumns(unittest.TestCase):
+    def setUp(self):
+        self.test_logger = settings.logger.get_logger("TEST", True)
+        self.ust = projects.Ust.Ust("testpath", logger=self.test_logger)
+        self.ust.notes = [_make_note(480, 120), _make_note(960, 120)]
+
+    def test_columns(self):
+        columns = self.ust.columns
+        self.assertIs(self.ust.columns, columns)
+        np.testing.assert_array_equal(columns["length"], [480, 960])
+
+    def test_columns_notes_changed(self):
+        columns = self.ust.columns
+        self.ust.notes.append(_make_note(240, 120))
+        self.assertIsNot(self.ust.columns, columns)
+        np.testing.assert_array_equal(self.ust.columns["length"], [480, 960, 240])
+        self.ust.notes = [_make_note(120, 120)]
+        np.testing.assert_array_equal(self.ust.columns["length"], [120])
+
+    def test_columns_note_edited(self):
+        '''
+        Noteを直接変更した場合は読み直す
+        '''
+        columns = self.ust.columns
+        self.ust.notes[0].atPre.value = 300
+        self.assertFalse(columns.is_current)
+        self.assertIs(self.ust.columns, columns)
+        np.testing.assert_array_equal(self.ust.columns["atPre"], [300, 0])
+        self.assertTrue(columns.is_current)
+
+    def test_columns_set(self):
+        '''
+        setで変更した場合は読み直さない
+        '''
+        columns = self.ust.columns
+        columns.set("length", 1, 240)
+        self.assertTrue(columns.is_current)
+        np.testing.assert_array_equal(self.ust.columns["length"], [480, 240])
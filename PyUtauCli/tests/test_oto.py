@@ -7,8 +7,11 @@ from unittest import mock
 
 import os
 import os.path
+import shutil
 import wave
 
+import numpy as np
+
 import voicebank.oto
 
 
@@ -63,10 +66,9 @@ class OtoRecordTest(unittest.TestCase):
         '''
         mock_isfile.return_value = True
         oto = voicebank.oto.OtoRecord("subdir", "foo.wav", "bar", 100, 600, 200, 900, -1000)
-        mock_io = mock.mock_open(read_data=b"test")
         with self.assertRaises(wave.Error) as cm:
-            with mock.patch("wave.open", mock_io) as mocked_open:
-                mocked_open.side_effect = wave.Error("file does not start with RIFF id")
+            with mock.patch("common.wavfile.WavFile") as mocked_wavfile:
+                mocked_wavfile.side_effect = wave.Error("file does not start with RIFF id")
                 oto.invert_blank("voice")
         self.assertEqual(cm.exception.args[0], "file does not start with RIFF id")
 
@@ -77,11 +79,8 @@ class OtoRecordTest(unittest.TestCase):
         '''
         mock_isfile.return_value = True
         oto = voicebank.oto.OtoRecord("subdir", "foo.wav", "bar", 100, 600, 200, 900, -1000)
-        mock_io = mock.MagicMock(name="open", spec=open)
-        mock_io().__enter__().getnframes = mock.Mock(return_value=88200)
-        mock_io().__enter__().getframerate = mock.Mock(return_value=44100)
-
-        with mock.patch("wave.open", mock_io) as mocked_open:
+        with mock.patch("common.wavfile.WavFile") as mocked_wavfile:
+            mocked_wavfile().__enter__().length_ms = 2000.0
             oto.invert_blank("voice")
         self.assertEqual(oto.blank, 900)
 
@@ -92,14 +91,30 @@ class OtoRecordTest(unittest.TestCase):
         '''
         mock_isfile.return_value = True
         oto = voicebank.oto.OtoRecord("subdir", "foo.wav", "bar", 100, 600, 200, 900, 900)
-        mock_io = mock.MagicMock(name="open", spec=open)
-        mock_io().__enter__().getnframes = mock.Mock(return_value=88200)
-        mock_io().__enter__().getframerate = mock.Mock(return_value=44100)
-
-        with mock.patch("wave.open", mock_io) as mocked_open:
+        with mock.patch("common.wavfile.WavFile") as mocked_wavfile:
+            mocked_wavfile().__enter__().length_ms = 2000.0
             oto.invert_blank("voice")
         self.assertEqual(oto.blank, -1000)
 
+    def test_read_wav(self):
+        '''
+        offsetからblankまでの区間だけを読み込む
+        '''
+        os.makedirs(os.path.join("testdata", "subdir"))
+        self.addCleanup(shutil.rmtree, "testdata")
+        samples = np.arange(44100) - 22050
+        with wave.open(os.path.join("testdata", "subdir", "foo.wav"), "wb") as ww:
+            ww.setnchannels(1)
+            ww.setsampwidth(2)
+            ww.setframerate(44100)
+            ww.writeframes(samples.astype("<i2").tobytes())
+        for blank, end_frame in [(-500, 26460), (300, 30870)]:
+            with self.subTest(blank=blank):
+                oto = voicebank.oto.OtoRecord("subdir", "foo.wav", "bar", 100, 600, 200, 900, blank)
+                data, framerate = oto.read_wav("testdata")
+                self.assertEqual(framerate, 44100)
+                np.testing.assert_array_equal(data, samples[4410:end_frame] / 2 ** 15)
+
 
 class OtoTest(unittest.TestCase):
     '''
@@ -142,12 +157,10 @@ class OtoTest(unittest.TestCase):
         '''
         oto.iniがutf-8でもcp932でも開けなかったとき
         '''
-        lines = [""]
         oto = voicebank.oto.Oto()
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data=b"\x82\xff.wav=,0,0,0,0,0")
         with self.assertRaises(UnicodeDecodeError) as cm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
-                mocked_open.side_effect = UnicodeDecodeError("cp932", b"\x00\x00", 1, 2, "reason")
                 oto._loadFile(os.path.join("voice", "subdir", "oto.ini"), "subdir")
         self.assertEqual(cm.exception.reason, "can't read {}. because required character encoding is utf-8 or cp932".format(os.path.join("voice", "subdir", "oto.ini")))
 
@@ -157,7 +170,7 @@ class OtoTest(unittest.TestCase):
         '''
         lines = ["", "a", "b=1,2", "foo.wav=bar,100,600,200,900,-1000"]
         oto = voicebank.oto.Oto()
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("cp932"))
         with mock.patch("builtins.open", mock_io) as mocked_open:
             oto._loadFile(os.path.join("voice", "subdir", "oto.ini"), "subdir")
 
@@ -170,16 +183,19 @@ class OtoTest(unittest.TestCase):
 
     def test_load_file_unicode_decode_error_once(self):
         '''
-        oto.iniがcp932で開けなかったがutf-8で開けたとき
+        | oto.iniがutf-8で保存されていたとき
+        | ファイルは1度だけ開く
         '''
-        lines = ["", "a", "b=1,2", "foo.wav=bar,100,600,200,900,-1000"]
+        lines = ["", "a", "b=1,2", "foo.wav=bar,100,600,200,900,-1000", "あ.wav=あ,100,600,200,900,-1000"]
         oto = voicebank.oto.Oto()
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("utf-8"))
         with mock.patch("builtins.open", mock_io) as mocked_open:
-            mocked_open.side_effect = [UnicodeDecodeError("cp932", b"\x00\x00", 1, 2, "reason"), mock.DEFAULT]
             oto._loadFile(os.path.join("voice", "subdir", "oto.ini"), "subdir")
+        mocked_open.assert_called_once_with(os.path.join("voice", "subdir", "oto.ini"), "rb")
+        self.assertEqual(oto.encodings["subdir"], "utf-8")
         self.assertEqual(oto._datas_by_file["subdir"][0].alias, "bar")
-        self.assertEqual(len(oto._datas_by_file["subdir"]), 1)
+        self.assertEqual(oto._datas_by_file["subdir"][1].alias, "あ")
+        self.assertEqual(len(oto._datas_by_file["subdir"]), 2)
         self.assertEqual(oto["bar"].offset, 100)
         self.assertEqual(oto["subdir\\foo"].pre, 900)
 
@@ -190,7 +206,7 @@ class OtoTest(unittest.TestCase):
         mock_listdir.return_value = []
         lines = ["", "a", "b=1,2", "foo.wav=bar,100,600,200,900,-1000"]
         oto = voicebank.oto.Oto()
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("cp932"))
         with mock.patch("builtins.open", mock_io) as mocked_open:
             oto.load("voice")
         self.assertEqual(oto._datas_by_file[""][0].alias, "bar")
@@ -207,7 +223,7 @@ class OtoTest(unittest.TestCase):
         mock_isdir.side_effect = [True, True, False, False, False, False]
         lines = ["", "a", "b=1,2", "foo.wav=bar,100,600,200,900,-1000"]
         oto = voicebank.oto.Oto()
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("cp932"))
         with mock.patch("builtins.open", mock_io) as mocked_open:
             oto.load("voice")
         self.assertEqual(oto._datas_by_file[""][0].alias, "bar")
@@ -228,7 +244,7 @@ class OtoTest(unittest.TestCase):
         mock_isdir.side_effect = [True, True, False, False, False, False]
         lines = ["", "a", "b=1,2", "foo.wav=bar,100,600,200,900,-1000"]
         oto = voicebank.oto.Oto()
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("cp932"))
         with mock.patch("builtins.open", mock_io) as mocked_open:
             oto.load("voice", True)
         self.assertEqual(oto._datas_by_file[""][0].alias, "bar")
@@ -252,7 +268,7 @@ class OtoTest(unittest.TestCase):
         mock_isdir.side_effect = [True, False, False, False, False]
         lines = ["", "a", "b=1,2", "foo.wav=bar,100,600,200,900,-1000"]
         oto = voicebank.oto.Oto()
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("cp932"))
         with mock.patch("builtins.open", mock_io) as mocked_open:
             oto.load("voice")
         self.assertFalse("" in oto._datas_by_file)
@@ -272,7 +288,7 @@ class OtoTest(unittest.TestCase):
         mock_isdir.side_effect = [True, True, False, False, False, False]
         lines = ["", "a", "b=1,2", "foo.wav=bar,100,600,200,900,-1000"]
         oto = voicebank.oto.Oto()
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("cp932"))
         with mock.patch("builtins.open", mock_io) as mocked_open:
             oto.load("voice", True)
         self.assertFalse("" in oto._datas_by_file)
@@ -290,7 +306,7 @@ class OtoTest(unittest.TestCase):
         mock_isfile.return_value = True
         mock_listdir.return_value = []
         lines = ["", "a", "b=1,2", "foo.wav=bar,100,600,200,900,-1000"]
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("cp932"))
         with mock.patch("builtins.open", mock_io) as mocked_open:
             oto = voicebank.oto.Oto("voice")
         self.assertEqual(oto._datas_by_file[""][0].alias, "bar")
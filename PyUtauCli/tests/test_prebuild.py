@@ -0,0 +1,154 @@
+﻿'''
+voicebank.prebuildモジュールのテスト
+'''
+
+import unittest
+from unittest import mock
+
+import os
+import os.path
+import shutil
+import time
+import logging
+
+import projects.Render
+import projects.FeatureCache
+import voicebank
+import voicebank.frq
+import voicebank.prebuild
+import settings.logger
+from tests.wavutil import write_wav
+
+
+def _make_vb(dirpath: str):
+    os.makedirs(os.path.join(dirpath, "sub"), exist_ok=True)
+    with open(os.path.join(dirpath, "character.txt"), "w", encoding="cp932") as fw:
+        fw.write("name=prebuild\r\n")
+    with open(os.path.join(dirpath, "oto.ini"), "w", encoding="cp932") as fw:
+        fw.write("a.wav=a,10,50,-200,30,10\r\n")
+        fw.write("a.wav=a2,50,50,-200,30,10\r\n")
+        fw.write("a.wav=a3,50,50,-200,30,10\r\n")
+        fw.write("missing.wav=m,10,50,-200,30,10\r\n")
+    with open(os.path.join(dirpath, "sub", "oto.ini"), "w", encoding="cp932") as fw:
+        fw.write("i.wav=i,10,50,-200,30,10\r\n")
+    write_wav(os.path.join(dirpath, "a.wav"), 220)
+    write_wav(os.path.join(dirpath, "sub", "i.wav"), 330)
+
+
+class TestPrebuild(unittest.TestCase):
+    def setUp(self):
+        self.test_logger = settings.logger.get_logger("TEST", True)
+        self.dirpath = os.path.join("testdata", "vb")
+        _make_vb(self.dirpath)
+        with self.assertLogs(logger=self.test_logger):
+            self.vb = voicebank.VoiceBank(self.dirpath, logger=self.test_logger)
+
+    def tearDown(self):
+        if hasattr(self, "cache"):
+            self.cache.close()
+        if os.path.isdir(os.path.join("testdata")):
+            shutil.rmtree(os.path.join("testdata"))
+
+    def _prebuild(self, **kwargs) -> voicebank.prebuild.PrebuildReport:
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
+            report = voicebank.prebuild.prebuild(self.vb, resamp_class=projects.Render.FastResamp, workers=2, use_thread=True,
+                                                 logger=self.test_logger, **kwargs)
+        self.logs = logcm.output
+        return report
+
+    def test_get_tasks(self):
+        tasks, files = voicebank.prebuild._get_tasks(self.vb)
+        self.assertEqual(files, 2)
+        self.assertEqual(tasks, [(os.path.join(self.dirpath, "", "a.wav"), True, []),
+                                 (os.path.join(self.dirpath, "sub", "i.wav"), True, [])])
+        self.cache = projects.FeatureCache.FeatureCache(logger=self.test_logger)
+        tasks, files = voicebank.prebuild._get_tasks(self.vb, self.cache)
+        self.assertEqual(tasks[0][2], [(10, -200), (50, -200)])
+
+    def test_get_records_index(self):
+        '''
+        インデックスから読み込んだ音源でも、全てのwavを対象にする
+        '''
+        with self.assertLogs(logger=self.test_logger):
+            voicebank.VoiceBank(self.dirpath, logger=self.test_logger, use_index=True)
+            vb = voicebank.VoiceBank(self.dirpath, logger=self.test_logger, use_index=True)
+        self.assertEqual([(record.otopath, record.filename, record.alias) for record in vb.oto.get_records()],
+                         [(record.otopath, record.filename, record.alias) for record in self.vb.oto.get_records()])
+
+    def test_frq(self):
+        report = self._prebuild()
+        self.assertTrue(os.path.isfile(os.path.join(self.dirpath, "a_wav.frq")))
+        self.assertTrue(os.path.isfile(os.path.join(self.dirpath, "sub", "i_wav.frq")))
+        self.assertAlmostEqual(voicebank.frq.Frq(os.path.join(self.dirpath, "a_wav.frq")).f0_avg, 220, delta=5)
+        self.assertEqual((report.files, report.built, report.skipped, report.frqs, report.features), (2, 2, 0, 2, 0))
+        self.assertAlmostEqual(report.audio_sec, 0.6)
+        self.assertGreater(report.files_per_sec, 0)
+        self.assertGreater(report.audio_sec_per_sec, 0)
+
+        report = self._prebuild()
+        self.assertEqual((report.built, report.skipped), (0, 2))
+        self.assertEqual(report.files_per_sec, 0)
+
+    def test_frq_updated(self):
+        '''
+        wavがfrqより新しい場合は作り直す
+        '''
+        self._prebuild()
+        time.sleep(0.01)
+        write_wav(os.path.join(self.dirpath, "a.wav"), 440)
+        report = self._prebuild()
+        self.assertEqual((report.built, report.skipped), (1, 1))
+
+    def test_features(self):
+        '''
+        生成した解析結果は、出力時のresampで使用される
+        '''
+        self.cache = projects.FeatureCache.FeatureCache(os.path.join("testdata", "features"), logger=self.test_logger)
+        report = self._prebuild(feature_cache=self.cache)
+        self.assertEqual((report.built, report.frqs, report.features), (2, 2, 3))
+
+        with self.assertLogs(logger=self.test_logger):
+            resamp = projects.Render.FastResamp(os.path.join(self.dirpath, "a.wav"), os.path.join("testdata", "cache", "a.wav"),
+                                                "A3", 100, "", 50, 200, 30, -200, logger=self.test_logger)
+        self.cache.attach(resamp)
+        with mock.patch("PyRwu.resamp.pw.cheaptrick") as mock_cheaptrick:
+            resamp.resamp()
+        mock_cheaptrick.assert_not_called()
+
+        report = self._prebuild(feature_cache=self.cache)
+        self.assertEqual((report.built, report.skipped), (0, 2))
+        report = self._prebuild(feature_cache=self.cache, force=True)
+        self.assertEqual((report.built, report.features), (2, 3))
+
+    def test_features_missing(self):
+        '''
+        frqが生成済みでも、解析結果がなければ生成する
+        '''
+        self._prebuild()
+        self.cache = projects.FeatureCache.FeatureCache(logger=self.test_logger)
+        report = self._prebuild(feature_cache=self.cache)
+        self.assertEqual((report.built, report.frqs, report.features), (2, 0, 3))
+
+    def test_failed(self):
+        with open(os.path.join(self.dirpath, "sub", "i.wav"), "wb") as fw:
+            fw.write(b"broken")
+        report = self._prebuild()
+        self.assertEqual(report.failed, [os.path.join(self.dirpath, "sub", "i.wav")])
+        self.assertEqual(report.built, 1)
+        self.assertTrue(any([line.startswith("ERROR:TEST:{} can't prebuild.".format(os.path.join(self.dirpath, "sub", "i.wav")))
+                             for line in self.logs]))
+
+    def test_process_pool(self):
+        self.cache = projects.FeatureCache.FeatureCache(logger=self.test_logger)
+        with self.assertLogs(logger=self.test_logger):
+            report = voicebank.prebuild.prebuild(self.vb, feature_cache=self.cache, resamp_class=projects.Render.FastResamp,
+                                                 workers=2, logger=self.test_logger)
+        self.assertEqual((report.built, report.features), (2, 3))
+        self.assertGreater(self.cache.memory_bytes, 0)
+
+    def test_f0_method(self):
+        report = self._prebuild(f0_method="fast")
+        self.assertEqual(report.frqs, 2)
+        self.assertAlmostEqual(voicebank.frq.Frq(os.path.join(self.dirpath, "a_wav.frq")).f0_avg, 220, delta=5)
+        with self.assertRaises(ValueError):
+            voicebank.prebuild.prebuild(self.vb, f0_method="crepe", logger=self.test_logger)
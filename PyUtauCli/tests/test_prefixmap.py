@@ -84,11 +84,9 @@ class PrefixMapTest(unittest.TestCase):
         prefix.mapがutf-8でもcp932でも開けなかったとき
         '''
         mock_isfile.return_value = True
-        lines = [""]
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data=b"C1\t\x82\xff\t")
         with self.assertRaises(UnicodeDecodeError) as cm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
-                mocked_open.side_effect = UnicodeDecodeError("cp932", b"\x00\x00", 1, 2, "reason")
                 prefix = voicebank.prefixmap.PrefixMap(os.path.join("voice", "sample"))
         self.assertEqual(cm.exception.reason, "can't read prefix.map. because required character encoding is utf-8 or cp932")
 
@@ -102,7 +100,7 @@ class PrefixMapTest(unittest.TestCase):
                  "",
                  "a",
                  "C4\t_preC4\t_suC4"]
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("cp932"))
         with mock.patch("builtins.open", mock_io) as mocked_open:
             prefix = voicebank.prefixmap.PrefixMap(os.path.join("voice", "sample"))
         self.assertEqual(prefix["C1"].prefix, "_preC1")
@@ -113,20 +111,22 @@ class PrefixMapTest(unittest.TestCase):
     @mock.patch("os.path.isfile")
     def test_load_raise_unicode_decode_error_once(self, mock_isfile):
         '''
-        prefix.mapがcp932で開けなかったがutf-8で開けたとき
+        | prefix.mapがutf-8で保存されていたとき
+        | ファイルは1度だけ開く
         '''
         mock_isfile.return_value = True
         lines = ["C1\t_preC1\t_suC1",
                  "",
                  "a",
-                 "C4\t_preC4\t_suC4"]
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+                 "C4\tあ\t_suC4"]
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("utf-8"))
         with mock.patch("builtins.open", mock_io) as mocked_open:
-            mocked_open.side_effect = [UnicodeDecodeError("cp932", b"\x00\x00", 1, 2, "reason"), mock.DEFAULT]
             prefix = voicebank.prefixmap.PrefixMap(os.path.join("voice", "sample"))
+        mocked_open.assert_called_once_with(os.path.join("voice", "sample", "prefix.map"), "rb")
+        self.assertEqual(prefix.encoding, "utf-8")
         self.assertEqual(prefix["C1"].prefix, "_preC1")
         self.assertEqual(prefix["C1"].suffix, "_suC1")
-        self.assertEqual(prefix["C4"].prefix, "_preC4")
+        self.assertEqual(prefix["C4"].prefix, "あ")
         self.assertEqual(prefix["C4"].suffix, "_suC4")
 
     @mock.patch("os.path.isfile")
@@ -140,7 +140,7 @@ class PrefixMapTest(unittest.TestCase):
                  "",
                  "a",
                  "C4\t_preC4\t_suC4"]
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("cp932"))
         with mock.patch("builtins.open", mock_io) as mocked_open:
             prefix = voicebank.prefixmap.PrefixMap(os.path.join("voice", "sample"))
             prefix.save(os.path.join("voice", "sample"))
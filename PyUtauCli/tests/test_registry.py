@@ -0,0 +1,179 @@
+﻿'''
+voicebank.registryモジュールのテスト
+'''
+
+import unittest
+from unittest import mock
+
+import os
+import os.path
+import shutil
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import voicebank
+import voicebank.registry
+import settings.logger
+
+
+def _make_vb(dirpath: str, records: int):
+    os.makedirs(dirpath, exist_ok=True)
+    with open(os.path.join(dirpath, "character.txt"), "w", encoding="cp932") as fw:
+        fw.write("name={}\r\n".format(os.path.split(dirpath)[1]))
+    with open(os.path.join(dirpath, "oto.ini"), "w", encoding="cp932") as fw:
+        for i in range(records):
+            fw.write("{0}.wav=a{0},100,200,-500,50,20\r\n".format(i))
+
+
+class TestVoiceBankRegistry(unittest.TestCase):
+    def setUp(self):
+        self.test_logger = settings.logger.get_logger("TEST", True)
+        _make_vb(os.path.join("testdata", "vb1"), 2)
+        _make_vb(os.path.join("testdata", "vb2"), 3)
+        _make_vb(os.path.join("testdata", "vb3"), 4)
+
+    def tearDown(self):
+        if os.path.isdir(os.path.join("testdata")):
+            shutil.rmtree(os.path.join("testdata"))
+
+    def _get(self, registry: voicebank.registry.VoiceBankRegistry, dirpath: str):
+        with self.assertLogs(logger=self.test_logger):
+            return registry.get(dirpath)
+
+    def test_shared(self):
+        '''
+        同じフォルダには同じVoiceBankを返す
+        '''
+        registry = voicebank.registry.VoiceBankRegistry(logger=self.test_logger)
+        vb = self._get(registry, os.path.join("testdata", "vb1"))
+        self.assertIs(registry.get(os.path.join("testdata", "vb2", "..", "vb1")), vb)
+        self.assertIs(registry.get(os.path.abspath(os.path.join("testdata", "vb1"))), vb)
+        self.assertEqual(vb.oto.records(), 4)
+        self.assertEqual((registry.hits, registry.misses), (2, 1))
+        self.assertIn(os.path.join("testdata", "vb1"), registry)
+        self.assertEqual(len(registry), 1)
+
+    def test_reload(self):
+        '''
+        ファイルが変更されていれば読み込み直す
+        '''
+        registry = voicebank.registry.VoiceBankRegistry(check_interval=0, logger=self.test_logger)
+        vb = self._get(registry, os.path.join("testdata", "vb1"))
+        time.sleep(0.01)
+        _make_vb(os.path.join("testdata", "vb1"), 5)
+        reloaded = self._get(registry, os.path.join("testdata", "vb1"))
+        self.assertIsNot(reloaded, vb)
+        self.assertEqual(reloaded.oto.records(), 10)
+        self.assertEqual((registry.hits, registry.misses), (0, 2))
+
+    def test_check_interval(self):
+        '''
+        check_intervalが経過するまでは変更を確認しない
+        '''
+        registry = voicebank.registry.VoiceBankRegistry(check_interval=60, logger=self.test_logger)
+        vb = self._get(registry, os.path.join("testdata", "vb1"))
+        _make_vb(os.path.join("testdata", "vb1"), 5)
+        self.assertIs(registry.get(os.path.join("testdata", "vb1")), vb)
+
+    def test_evict(self):
+        '''
+        合計行数が上限を超えると、最後に使用した日時が古いものから破棄する
+        '''
+        registry = voicebank.registry.VoiceBankRegistry(max_records=14, logger=self.test_logger)
+        self._get(registry, os.path.join("testdata", "vb1"))
+        self._get(registry, os.path.join("testdata", "vb2"))
+        registry.get(os.path.join("testdata", "vb1"))
+        with self.assertLogs(logger=self.test_logger) as logcm:
+            registry.get(os.path.join("testdata", "vb3"))
+        self.assertIn("vb2 is evicted", logcm.output[-1])
+        self.assertIn(os.path.join("testdata", "vb1"), registry)
+        self.assertNotIn(os.path.join("testdata", "vb2"), registry)
+        self.assertIn(os.path.join("testdata", "vb3"), registry)
+
+    def test_evict_close(self):
+        '''
+        破棄した音源と、読み込み直す前の音源はcloseする
+        '''
+        registry = voicebank.registry.VoiceBankRegistry(max_records=6, check_interval=0, logger=self.test_logger)
+        vb1 = self._get(registry, os.path.join("testdata", "vb1"))
+        with mock.patch.object(vb1, "close") as mock_close:
+            self._get(registry, os.path.join("testdata", "vb2"))
+            mock_close.assert_called_once_with()
+        vb2 = registry.get(os.path.join("testdata", "vb2"))
+        time.sleep(0.01)
+        _make_vb(os.path.join("testdata", "vb2"), 1)
+        with mock.patch.object(vb2, "close") as mock_close:
+            self._get(registry, os.path.join("testdata", "vb2"))
+            mock_close.assert_called_once_with()
+        vb2 = registry.get(os.path.join("testdata", "vb2"))
+        with mock.patch.object(vb2, "close") as mock_close:
+            registry.clear()
+            mock_close.assert_called_once_with()
+
+    def test_evict_keep_last(self):
+        '''
+        上限を超える音源でも、直前に使用したものは保持する
+        '''
+        registry = voicebank.registry.VoiceBankRegistry(max_records=1, logger=self.test_logger)
+        self._get(registry, os.path.join("testdata", "vb1"))
+        self._get(registry, os.path.join("testdata", "vb2"))
+        self.assertEqual(len(registry), 1)
+        self.assertIn(os.path.join("testdata", "vb2"), registry)
+
+    def test_threads(self):
+        '''
+        複数のスレッドから同時に呼び出しても、読み込みは1回だけ
+        '''
+        registry = voicebank.registry.VoiceBankRegistry(logger=self.test_logger)
+        with self.assertLogs(logger=self.test_logger):
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                result = list(executor.map(registry.get, [os.path.join("testdata", "vb1")] * 32))
+        self.assertTrue(all([vb is result[0] for vb in result]))
+        self.assertEqual((registry.hits, registry.misses), (31, 1))
+
+    def test_hit_while_loading(self):
+        '''
+        他の音源の読み込み中も、読み込み済みの音源は待たずに返す
+        '''
+        registry = voicebank.registry.VoiceBankRegistry(logger=self.test_logger)
+        vb = self._get(registry, os.path.join("testdata", "vb1"))
+        loading = threading.Event()
+        release = threading.Event()
+
+        def slow_voicebank(*args, **kwargs):
+            loading.set()
+            release.wait(5)
+            return voicebank.VoiceBank(*args, **kwargs)
+
+        with self.assertLogs(logger=self.test_logger):
+            with mock.patch("voicebank.registry.VoiceBank", side_effect=slow_voicebank):
+                with ThreadPoolExecutor(max_workers=1) as executor:
+                    future = executor.submit(registry.get, os.path.join("testdata", "vb2"))
+                    self.assertTrue(loading.wait(5))
+                    self.assertIs(registry.get(os.path.join("testdata", "vb1")), vb)
+                    self.assertFalse(future.done())
+                    release.set()
+                    future.result()
+        self.assertEqual((registry.hits, registry.misses), (1, 2))
+
+    def test_resolve_alias_threads(self):
+        '''
+        共有したVoiceBankのresolve_aliasを複数のスレッドから呼び出しても、回数を失わない
+        '''
+        registry = voicebank.registry.VoiceBankRegistry(logger=self.test_logger)
+        vb = self._get(registry, os.path.join("testdata", "vb3"))
+        lyrics = ["a{}".format(i % 5) for i in range(400)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            result = list(executor.map(lambda lyric: vb.resolve_alias(lyric, 60), lyrics))
+        self.assertEqual(result, [vb.find_alias(lyric, 60, False, vb.oto, vb.prefix) for lyric in lyrics])
+        self.assertEqual(vb.alias_hits + vb.alias_misses, 400)
+
+    def test_remove_and_clear(self):
+        registry = voicebank.registry.VoiceBankRegistry(logger=self.test_logger)
+        self._get(registry, os.path.join("testdata", "vb1"))
+        self._get(registry, os.path.join("testdata", "vb2"))
+        registry.remove(os.path.join("testdata", "vb1"))
+        self.assertNotIn(os.path.join("testdata", "vb1"), registry)
+        registry.clear()
+        self.assertEqual(len(registry), 0)
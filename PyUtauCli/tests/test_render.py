@@ -0,0 +1,333 @@
+﻿'''
+projects.Renderモジュールのテスト
+'''
+
+import unittest
+from unittest import mock
+
+import os
+import os.path
+import shutil
+import logging
+import wave
+
+import projects.Render
+import projects.Note
+import projects.Ust
+import settings.logger
+from tests.renderutil import DummyRenderNote, write_cache
+
+
+def _make_render(notes: list, logger: logging.Logger) -> projects.Render.Render:
+    render = projects.Render.Render.__new__(projects.Render.Render)
+    render.logger = logger
+    render.notes = notes
+    render._cache_dir = os.path.join("testdata", "cache")
+    render._output_file = os.path.join("testdata", "output.wav")
+    return render
+
+
+class TestParallelResamp(unittest.TestCase):
+    def setUp(self):
+        self.test_logger = settings.logger.get_logger("TEST", True)
+
+    def tearDown(self):
+        if os.path.isdir(os.path.join("testdata")):
+            shutil.rmtree(os.path.join("testdata"))
+
+    @mock.patch("projects.Render._run_resamp")
+    def test_pool_result_order(self, mock_run):
+        '''
+        workerのログはノート順に出力され、resampが不要なノートは送られない
+        '''
+        mock_run.side_effect = lambda resamp_class, params: ("", ["done " + params[0]])
+        notes = [DummyRenderNote(0), DummyRenderNote(1, False), DummyRenderNote(2)]
+        render = _make_render(notes, self.test_logger)
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
+            failed = render.resamp(workers=2, use_thread=True)
+        self.assertEqual(failed, [])
+        self.assertEqual(mock_run.call_count, 2)
+        self.assertEqual(logcm.output[1], "INFO:TEST:done input0.wav")
+        self.assertEqual(logcm.output[3], "INFO:TEST:done input2.wav")
+
+    @mock.patch("projects.Render._run_resamp")
+    def test_pool_failure(self, mock_run):
+        '''
+        一部のノートが失敗しても、残りのノートは処理される
+        '''
+        mock_run.side_effect = lambda resamp_class, params: ("ValueError: bad", []) if params[0] == "input1.wav" else ("", [])
+        notes = [DummyRenderNote(0), DummyRenderNote(1), DummyRenderNote(2)]
+        render = _make_render(notes, self.test_logger)
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
+            failed = render.fast_resamp(workers=2, use_thread=True)
+        self.assertEqual(failed, [notes[1]])
+        self.assertEqual(mock_run.call_count, 3)
+        self.assertEqual(mock_run.call_args_list[0][0][0], projects.Render.FastResamp)
+        self.assertIn("ERROR:TEST:{} can't resamp. because ValueError: bad".format(notes[1].cache_path), logcm.output)
+
+    @mock.patch("projects.Render.FastResamp")
+    def test_sequential_failure(self, mock_resamp):
+        '''
+        workersが1の場合も、一部のノートが失敗しても残りのノートは処理される
+        '''
+        def make_resamp(*params, logger):
+            resamp = mock.Mock()
+            if params[0] == "input1.wav":
+                resamp.resamp.side_effect = ValueError("bad")
+            return resamp
+        mock_resamp.side_effect = make_resamp
+        notes = [DummyRenderNote(0), DummyRenderNote(1), DummyRenderNote(2)]
+        render = _make_render(notes, self.test_logger)
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
+            failed = render.fast_resamp()
+        self.assertEqual(failed, [notes[1]])
+        self.assertEqual(mock_resamp.call_count, 3)
+        self.assertIn("ERROR:TEST:{} can't resamp. because ValueError: bad".format(notes[1].cache_path), logcm.output)
+
+    @mock.patch("projects.Render._run_resamp")
+    def test_pool_cached(self, mock_run):
+        '''
+        キャッシュファイルが存在するノートはworkerに送られない
+        '''
+        mock_run.return_value = ("", [])
+        notes = [DummyRenderNote(0), DummyRenderNote(1)]
+        os.makedirs(os.path.join("testdata", "cache"), exist_ok=True)
+        with open(notes[0].cache_path, "wb") as fw:
+            fw.write(b"")
+        render = _make_render(notes, self.test_logger)
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
+            render.resamp(workers=2, use_thread=True)
+        self.assertEqual(mock_run.call_count, 1)
+        self.assertEqual(logcm.output[0], "INFO:TEST:{} have be cached".format(notes[0].cache_path))
+
+    def test_run_resamp_error(self):
+        '''
+        worker内の例外はエラーメッセージとして返される
+        '''
+        error, messages = projects.Render._run_resamp(projects.Render.FastResamp,
+                                                      ("notfound.wav", os.path.join("testdata", "cache", "a.wav"), "C4", 100))
+        self.assertEqual(error, "FileNotFoundError: notfound.wav not found.")
+        self.assertEqual(messages[0], "input:notfound.wav")
+
+    @mock.patch("projects.Render.ResampCache.get_key")
+    @mock.patch("projects.Render._run_resamp")
+    def test_pool_resamp_cache(self, mock_run, mock_key):
+        '''
+        共有キャッシュにあるノートはworkerに送られず、生成したキャッシュファイルは共有キャッシュに保存される
+        '''
+        def run(resamp_class, params):
+            with open(params[1], "wb") as fw:
+                fw.write(b"")
+            return "", []
+        mock_run.side_effect = run
+        mock_key.side_effect = lambda note, resamp_class: note.input_path
+        notes = [DummyRenderNote(0), DummyRenderNote(1)]
+        render = _make_render(notes, self.test_logger)
+        render.resamp_cache = mock.MagicMock()
+        render.resamp_cache.fetch.side_effect = lambda key, dst: key == "input0.wav"
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
+            render.resamp(workers=2, use_thread=True)
+        self.assertEqual(mock_run.call_count, 1)
+        self.assertEqual(mock_run.call_args[0][1][0], "input1.wav")
+        self.assertEqual(logcm.output[0], "INFO:TEST:{} have be cached".format(notes[0].cache_path))
+        render.resamp_cache.store.assert_called_once_with("input1.wav", notes[1].cache_path)
+
+    @mock.patch("projects.Render.Render._close_wavtool")
+    @mock.patch("projects.Render.Render._open_wavtool")
+    @mock.patch("projects.Render.Render._append_note")
+    @mock.patch("projects.Render._run_resamp")
+    def test_render_pipeline(self, mock_run, mock_append, mock_open, mock_close):
+        '''
+        renderはノート順にappendし、失敗したノートも追記される
+        '''
+        mock_run.side_effect = lambda resamp_class, params: ("ValueError: bad", []) if params[0] == "input1.wav" else ("", [])
+        notes = [DummyRenderNote(0), DummyRenderNote(1), DummyRenderNote(2, False)]
+        render = _make_render(notes, self.test_logger)
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG):
+            failed = render.render(workers=2, use_thread=True, fast=True)
+        self.assertEqual(failed, [notes[1]])
+        self.assertEqual([c[0][1] for c in mock_append.call_args_list], notes)
+        self.assertEqual(mock_run.call_args_list[0][0][0], projects.Render.FastResamp)
+        mock_close.assert_called_once()
+
+    @mock.patch("projects.Render.Render._trim_output")
+    @mock.patch("projects.Render.Render._close_wavtool")
+    @mock.patch("projects.Render.Render._open_wavtool")
+    @mock.patch("projects.Render.Render._append_note")
+    @mock.patch("projects.Render.FastResamp")
+    def test_render_sequential_failure(self, mock_resamp, mock_append, mock_open, mock_close, mock_trim):
+        '''
+        workersが1の場合も、失敗したノートを返し、全てのノートを追記する
+        '''
+        mock_resamp.return_value.resamp.side_effect = [None, ValueError("bad"), None]
+        notes = [DummyRenderNote(0), DummyRenderNote(1), DummyRenderNote(2)]
+        render = _make_render(notes, self.test_logger)
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG):
+            failed = render.render(workers=1, fast=True)
+        self.assertEqual(failed, [notes[1]])
+        self.assertEqual([c[0][1] for c in mock_append.call_args_list], notes)
+        mock_close.assert_called_once()
+
+
+class TestInMemoryAppend(unittest.TestCase):
+    def setUp(self):
+        self.test_logger = settings.logger.get_logger("TEST", True)
+
+    def tearDown(self):
+        if os.path.isdir(os.path.join("testdata")):
+            shutil.rmtree(os.path.join("testdata"))
+
+    def test_same_as_wavtool(self):
+        '''
+        in_memoryの場合もPyWavToolと同じ出力が得られ、一時ファイルが作られない
+        '''
+        notes = [DummyRenderNote(0), DummyRenderNote(1), DummyRenderNote(2)]
+        for i, note in enumerate(notes):
+            write_cache(note, 220 * (i + 1))
+        render = _make_render(notes, self.test_logger)
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG):
+            render.append()
+        with open(render._output_file, "rb") as fr:
+            expected = fr.read()
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG):
+            with mock.patch("PyWavTool.WavTool") as mock_wavtool:
+                render.append(in_memory=True)
+        mock_wavtool.assert_not_called()
+        with open(render._output_file, "rb") as fr:
+            self.assertEqual(fr.read(), expected)
+        self.assertFalse(os.path.isfile(render._output_file + ".whd"))
+        self.assertFalse(os.path.isfile(render._output_file + ".dat"))
+
+
+def _make_window_ust(pres: list, oves: list) -> projects.Ust.Ust:
+    ust = projects.Ust.Ust("testpath")
+    for i, (pre, ove) in enumerate(zip(pres, oves)):
+        note = projects.Note.Note()
+        note.num.init("#{:04}".format(i))
+        note.length.init(480)
+        note.tempo.init(120)
+        note.atPre.init(pre)
+        note.atOve.init(ove)
+        ust.notes.append(note)
+    return ust
+
+
+class TestWindow(unittest.TestCase):
+    def setUp(self):
+        self.test_logger = settings.logger.get_logger("TEST", True)
+        # 各ノートは500ms
+        self.ust = _make_window_ust([0, 100, 100, 600, 100, 100], [0, 50, 50, 50, 150, 50])
+
+    def tearDown(self):
+        if os.path.isdir(os.path.join("testdata")):
+            shutil.rmtree(os.path.join("testdata"))
+
+    def test_init_window(self):
+        self.assertEqual(projects.Render.Render._init_window(self.ust, 1000, 2000, False), (1000, 2000))
+        self.assertEqual(projects.Render.Render._init_window(self.ust, None, 2000, False), (0, 2000))
+        self.assertEqual(projects.Render.Render._init_window(self.ust, 1000, None, False), (1000, 3000))
+        self.assertEqual(projects.Render.Render._init_window(self.ust, -100, 5000, False), (0, 3000))
+        self.assertEqual(projects.Render.Render._init_window(self.ust, 960, 1920, True), (1000, 2000))
+        self.assertEqual(projects.Render.Render._init_window(self.ust, 5000, None, False), (3000, 3000))
+        self.assertEqual(projects.Render.Render._init_window(self.ust, 5000, 6000, False), (3000, 3000))
+        with self.assertRaises(ValueError):
+            projects.Render.Render._init_window(self.ust, 2000, 1000, False)
+
+    def test_window_notes(self):
+        self.assertEqual(projects.Render.Render._get_window_notes(self.ust, 0, 500), (range(0, 2), 0))
+        self.assertEqual(projects.Render.Render._get_window_notes(self.ust, 500, 800), (range(1, 2), 400))
+        self.assertEqual(projects.Render.Render._get_window_notes(self.ust, 500, 1000), (range(1, 4), 400))
+
+    def test_window_notes_long_preutterance(self):
+        '''
+        先行発声がノートより長い場合、さらに後ろのノートも含む
+        '''
+        self.assertEqual(projects.Render.Render._get_window_notes(self.ust, 0, 950), (range(0, 4), 0))
+
+    def test_window_notes_long_overlap(self):
+        '''
+        オーバーラップが先行発声より長い場合、前のノートも含む
+        '''
+        self.assertEqual(projects.Render.Render._get_window_notes(self.ust, 2020, 2400), (range(3, 5), 900))
+        self.assertEqual(projects.Render.Render._get_window_notes(self.ust, 2060, 2400), (range(4, 5), 1900))
+
+    def test_window_after_edit(self):
+        '''
+        ノートの長さを直接変更した後は、変更後の位置でノートと合成の開始位置を求める
+        '''
+        self.assertEqual(projects.Render.Render._get_window_notes(self.ust, 1000, 1400), (range(2, 4), 900))
+        self.ust.notes[0].length.value = 960
+        self.assertEqual(projects.Render.Render._init_window(self.ust, None, None, False), (0, 3500))
+        self.assertEqual(projects.Render.Render._init_window(self.ust, 960, 1920, True), (1000, 2000))
+        self.assertEqual(projects.Render.Render._get_window_notes(self.ust, 1000, 1400), (range(1, 2), 900))
+        self.assertEqual(projects.Render.Render._get_window_notes(self.ust, 2020, 2400), (range(3, 4), 1400))
+
+    def test_window_notes_empty(self):
+        self.assertEqual(projects.Render.Render._get_window_notes(self.ust, 1000, 1000), (range(0), 1000))
+        self.assertEqual(projects.Render.Render._get_window_notes(projects.Ust.Ust("empty"), 0, 0), (range(0), 0))
+
+    def test_trim_output(self):
+        '''
+        範囲内のノートだけを合成した出力が、全体を合成した出力の該当範囲と一致する
+        '''
+        notes = [DummyRenderNote(i) for i in range(4)]
+        for i, note in enumerate(notes):
+            write_cache(note, 220 * (i + 1))
+        render = _make_render(notes, self.test_logger)
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG):
+            render.append(in_memory=True)
+        with wave.open(render._output_file, "rb") as wr:
+            wr.setpos(44100)
+            expected = wr.readframes(17640)
+
+        render = _make_render(notes[2:], self.test_logger)
+        # 2番目のノートは、500msのノートが10msずつ重なった980msから始まる
+        render._window = (1000, 1400)
+        render._window_origin = 980
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG):
+            render.append(in_memory=True)
+        with wave.open(render._output_file, "rb") as wr:
+            self.assertEqual(wr.getnframes(), 17640)
+            self.assertEqual(wr.readframes(17640), expected)
+
+    def test_empty_window(self):
+        '''
+        範囲内にノートが無い場合、範囲の長さの無音を出力する
+        '''
+        for in_memory in [False, True]:
+            with self.subTest(in_memory=in_memory):
+                render = _make_render([], self.test_logger)
+                render._window = (1000, 1500)
+                render._window_origin = 1000
+                render.append(in_memory=in_memory)
+                with wave.open(render._output_file, "rb") as wr:
+                    self.assertEqual((wr.getnchannels(), wr.getsampwidth(), wr.getframerate()), (1, 2, 44100))
+                    self.assertEqual(wr.readframes(wr.getnframes()), b"\x00\x00" * 22050)
+                self.assertFalse(os.path.isfile(render._output_file + ".whd"))
+
+    def test_empty_window_render(self):
+        '''
+        末尾以降を範囲に指定したustも、renderで無音を出力できる
+        '''
+        render = projects.Render.Render.__new__(projects.Render.Render)
+        render.logger = self.test_logger
+        render._cache_dir = os.path.join("testdata", "cache")
+        render._output_file = os.path.join("testdata", "output.wav")
+        render._window = projects.Render.Render._init_window(self.ust, 5000, None, False)
+        indexes, render._window_origin = projects.Render.Render._get_window_notes(self.ust, *render._window)
+        render.notes = [DummyRenderNote(i) for i in indexes]
+        self.assertEqual(render.render(workers=1), [])
+        with wave.open(render._output_file, "rb") as wr:
+            self.assertEqual(wr.getnframes(), 0)
+
+    def test_trim_output_pad(self):
+        '''
+        合成した波形が範囲より短い場合、末尾を無音で埋める
+        '''
+        render = _make_render([DummyRenderNote(0)], self.test_logger)
+        render._window = (0, 1000)
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG):
+            render.append(in_memory=True)
+        with wave.open(render._output_file, "rb") as wr:
+            self.assertEqual(wr.getnframes(), 44100)
+            self.assertEqual(wr.readframes(44100)[-2:], b"\x00\x00")
@@ -0,0 +1,152 @@
+﻿'''
+projects.RenderSessionモジュールのテスト
+'''
+
+import unittest
+from unittest import mock
+
+import os
+import os.path
+import shutil
+import logging
+
+import numpy as np
+
+import projects.Render
+import projects.RenderSession
+import settings.logger
+from tests.renderutil import DummyRenderNote, write_cache
+
+
+def _make_session(notes: list, logger: logging.Logger) -> projects.RenderSession.RenderSession:
+    session = projects.RenderSession.RenderSession.__new__(projects.RenderSession.RenderSession)
+    session.logger = logger
+    session.notes = notes
+    session.dirty_notes = list(notes)
+    session.dirty_ranges = []
+    session._layout = []
+    session._segments = {}
+    session._song_pitch_enabled = False
+    session._cache_dir = os.path.join("testdata", "cache")
+    session._output_file = os.path.join("testdata", "session.wav")
+    return session
+
+
+def _append(notes: list, logger: logging.Logger) -> bytes:
+    render = projects.Render.Render.__new__(projects.Render.Render)
+    render.logger = logger
+    render.notes = notes
+    render._output_file = os.path.join("testdata", "full.wav")
+    render.append(in_memory=True)
+    with open(render._output_file, "rb") as fr:
+        return fr.read()
+
+
+class TestRenderSession(unittest.TestCase):
+    def setUp(self):
+        self.test_logger = settings.logger.get_logger("TEST", True)
+        self.notes = [DummyRenderNote(i) for i in range(4)]
+        for i, note in enumerate(self.notes):
+            write_cache(note, 220 * (i + 1))
+
+    def tearDown(self):
+        if os.path.isdir(os.path.join("testdata")):
+            shutil.rmtree(os.path.join("testdata"))
+
+    def _render(self, session: projects.RenderSession.RenderSession) -> bytes:
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG):
+            with mock.patch.object(session, "_resamp_notes", return_value=[]) as mock_resamp:
+                session.render(workers=1)
+        self.resamp_notes = mock_resamp.call_args[0][4]
+        with open(session._output_file, "rb") as fr:
+            return fr.read()
+
+    def _update(self, session: projects.RenderSession.RenderSession, notes: list):
+        def load_notes(ust, song_pitch):
+            session.notes = notes
+        with mock.patch.object(session, "_load_notes", side_effect=load_notes):
+            with self.assertLogs(logger=self.test_logger, level=logging.DEBUG):
+                return session.update(None)
+
+    def test_first_render(self):
+        '''
+        初回は全てのノートを合成し、Render.appendと同じ出力が得られる
+        '''
+        session = _make_session(self.notes, self.test_logger)
+        result = self._render(session)
+        self.assertEqual(self.resamp_notes, self.notes)
+        self.assertEqual(session.dirty_ranges, [(0, session._layout[-1][1] + session._layout[-1][2].shape[0])])
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG):
+            self.assertEqual(result, _append(self.notes, self.test_logger))
+
+    def test_update_one_note(self):
+        '''
+        変更したノートだけをresampし、その範囲だけを合成し直す
+        '''
+        session = _make_session(self.notes, self.test_logger)
+        self._render(session)
+        notes = [DummyRenderNote(i) for i in range(4)]
+        notes[2].cache_key = "changed"
+        notes[2].cache_path = os.path.join("testdata", "cache", "changed.wav")
+        write_cache(notes[2], 1000)
+        self.assertEqual(self._update(session, notes), [notes[2]])
+        result = self._render(session)
+        self.assertEqual(self.resamp_notes, [notes[2]])
+        self.assertEqual(session.dirty_ranges, [(session._layout[2][1], session._layout[2][1] + session._layout[2][2].shape[0])])
+        self.assertEqual(session.dirty_notes, [])
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG):
+            self.assertEqual(result, _append(notes, self.test_logger))
+
+    def test_update_length(self):
+        '''
+        長さが変わったノートより後ろのノートは、resampせずに再配置する
+        '''
+        session = _make_session(self.notes, self.test_logger)
+        self._render(session)
+        notes = [DummyRenderNote(i) for i in range(4)]
+        notes[1].output_ms = 300
+        self.assertEqual(self._update(session, notes), [notes[1]])
+        result = self._render(session)
+        self.assertEqual(self.resamp_notes, [notes[1]])
+        self.assertEqual(session.dirty_ranges[0][0], session._layout[1][1])
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG):
+            self.assertEqual(result, _append(notes, self.test_logger))
+
+    def test_update_no_change(self):
+        '''
+        変更がなければ出力ファイルを書き換えない
+        '''
+        session = _make_session(self.notes, self.test_logger)
+        self._render(session)
+        mtime = os.stat(session._output_file).st_mtime_ns
+        self.assertEqual(self._update(session, [DummyRenderNote(i) for i in range(4)]), [])
+        with mock.patch.object(session._mixer, "patch") as mock_patch:
+            with mock.patch.object(session._mixer, "write") as mock_write:
+                with mock.patch.object(session, "_resamp_notes", return_value=[]):
+                    session.render(workers=1)
+        mock_patch.assert_not_called()
+        mock_write.assert_not_called()
+        self.assertEqual(session.dirty_ranges, [])
+        self.assertEqual(os.stat(session._output_file).st_mtime_ns, mtime)
+
+    def test_failed_note(self):
+        '''
+        キャッシュファイルが無いノートは無音で合成し、次回も作り直す対象にする
+        '''
+        os.remove(self.notes[1].cache_path)
+        session = _make_session(self.notes, self.test_logger)
+        self._render(session)
+        self.assertEqual(self._update(session, [DummyRenderNote(i) for i in range(4)])[0].cache_key, "key1")
+        write_cache(self.notes[1], 440)
+        result = self._render(session)
+        self.assertEqual(session.dirty_ranges, [(session._layout[1][1], session._layout[1][1] + session._layout[1][2].shape[0])])
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG):
+            self.assertEqual(result, _append(self.notes, self.test_logger))
+
+    def test_dirty_ranges(self):
+        data = np.zeros(10)
+        old_layout = [("a", 0, data), ("b", 8, data), ("c", 16, data)]
+        new_layout = [("a", 0, data), ("x", 8, data), ("c", 16, data), ("d", 24, data)]
+        self.assertEqual(projects.RenderSession.RenderSession._get_dirty_ranges(old_layout, new_layout),
+                         [(8, 18), (24, 34)])
+        self.assertEqual(projects.RenderSession.RenderSession._get_dirty_ranges(old_layout, old_layout), [])
@@ -0,0 +1,136 @@
+﻿'''
+projects.ResampCacheモジュールのテスト
+'''
+
+import unittest
+from unittest import mock
+
+import os
+import os.path
+import shutil
+
+import PyRwu
+
+import projects.Render
+import projects.ResampCache
+import settings.logger
+from tests.renderutil import DummyRenderNote
+
+
+def _write_file(path: str, size: int):
+    os.makedirs(os.path.split(path)[0], exist_ok=True)
+    with open(path, "wb") as fw:
+        fw.write(b"\0" * size)
+
+
+class TestResampCache(unittest.TestCase):
+    def setUp(self):
+        self.test_logger = settings.logger.get_logger("TEST", True)
+        self.root = os.path.join("testdata", "shared")
+        self.src = os.path.join("testdata", "src.wav")
+        _write_file(self.src, 100)
+
+    def tearDown(self):
+        if hasattr(self, "cache"):
+            self.cache.close()
+        if os.path.isdir(os.path.join("testdata")):
+            shutil.rmtree(os.path.join("testdata"))
+
+    def test_get_key(self):
+        note = DummyRenderNote(0)
+        key = projects.ResampCache.ResampCache.get_key(note, PyRwu.Resamp)
+        self.assertEqual(len(key), 64)
+        self.assertEqual(key, projects.ResampCache.ResampCache.get_key(DummyRenderNote(0), PyRwu.Resamp))
+        self.assertNotEqual(key, projects.ResampCache.ResampCache.get_key(DummyRenderNote(1), PyRwu.Resamp))
+        self.assertNotEqual(key, projects.ResampCache.ResampCache.get_key(note, projects.Render.FastResamp))
+
+    def test_store_fetch(self):
+        self.cache = projects.ResampCache.ResampCache(self.root, logger=self.test_logger)
+        dst = os.path.join("testdata", "cache", "dst.wav")
+        self.assertFalse(self.cache.fetch("key1", dst))
+        self.cache.store("key1", self.src)
+        self.assertEqual(self.cache.total_bytes, 100)
+        self.assertTrue(self.cache.fetch("key1", dst))
+        self.assertEqual(os.path.getsize(dst), 100)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_persistent_index(self):
+        self.cache = projects.ResampCache.ResampCache(self.root, logger=self.test_logger)
+        self.cache.store("key1", self.src)
+        self.cache.close()
+        self.cache = projects.ResampCache.ResampCache(self.root, logger=self.test_logger)
+        self.assertEqual(self.cache.total_bytes, 100)
+        self.assertTrue(self.cache.fetch("key1", os.path.join("testdata", "dst.wav")))
+
+    def test_missing_file(self):
+        '''
+        インデックスにあってもファイルが削除されていればmissになり、インデックスからも削除される
+        '''
+        self.cache = projects.ResampCache.ResampCache(self.root, logger=self.test_logger)
+        self.cache.store("key1", self.src)
+        os.remove(self.cache._get_path("key1"))
+        self.assertFalse(self.cache.fetch("key1", os.path.join("testdata", "dst.wav")))
+        self.assertEqual(self.cache.total_bytes, 0)
+
+    @mock.patch("projects.ResampCache.time.time")
+    def test_evict_size(self, mock_time):
+        '''
+        合計サイズが上限を超えた場合、最後に使用した日時が古いものから削除する
+        '''
+        self.cache = projects.ResampCache.ResampCache(self.root, max_bytes=250, logger=self.test_logger)
+        mock_time.return_value = 1
+        self.cache.store("key1", self.src)
+        mock_time.return_value = 2
+        self.cache.store("key2", self.src)
+        mock_time.return_value = 3
+        self.assertTrue(self.cache.fetch("key1", os.path.join("testdata", "dst.wav")))
+        mock_time.return_value = 4
+        self.cache.store("key3", self.src)
+        self.assertEqual(self.cache.total_bytes, 200)
+        self.assertFalse(os.path.isfile(self.cache._get_path("key2")))
+        self.assertTrue(os.path.isfile(self.cache._get_path("key1")))
+        self.assertTrue(os.path.isfile(self.cache._get_path("key3")))
+
+    @mock.patch("projects.ResampCache.time.time")
+    def test_evict_age(self, mock_time):
+        '''
+        最後に使用してからmax_ageを超えたものを削除する
+        '''
+        self.cache = projects.ResampCache.ResampCache(self.root, max_age=10, logger=self.test_logger)
+        mock_time.return_value = 1
+        self.cache.store("key1", self.src)
+        mock_time.return_value = 5
+        self.cache.store("key2", self.src)
+        mock_time.return_value = 14
+        self.assertEqual(self.cache.evict(), 1)
+        self.assertFalse(self.cache.fetch("key1", os.path.join("testdata", "dst.wav")))
+        self.assertTrue(self.cache.fetch("key2", os.path.join("testdata", "dst.wav")))
+
+    def test_total_bytes_replace(self):
+        '''
+        同じキーを保存し直した場合、合計サイズは置き換えた後のサイズになる
+        '''
+        self.cache = projects.ResampCache.ResampCache(self.root, logger=self.test_logger)
+        self.cache.store("key1", self.src)
+        _write_file(self.src, 30)
+        self.cache.store("key1", self.src)
+        self.cache.store("key2", self.src)
+        self.assertEqual(self.cache.total_bytes, 60)
+        os.remove(self.cache._get_path("key2"))
+        self.assertFalse(self.cache.fetch("key2", os.path.join("testdata", "dst.wav")))
+        self.assertEqual(self.cache.total_bytes, 30)
+
+    def test_total_bytes_old_index(self):
+        '''
+        合計サイズを保持していないインデックスを開いた場合、entriesから合計サイズを求める
+        '''
+        self.cache = projects.ResampCache.ResampCache(self.root, logger=self.test_logger)
+        self.cache.store("key1", self.src)
+        self.cache.store("key2", self.src)
+        with self.cache._conn:
+            for name in ["entries_insert", "entries_delete", "entries_update"]:
+                self.cache._conn.execute("DROP TRIGGER {}".format(name))
+            self.cache._conn.execute("DROP TABLE meta")
+        self.cache.close()
+        self.cache = projects.ResampCache.ResampCache(self.root, logger=self.test_logger)
+        self.assertEqual(self.cache.total_bytes, 200)
@@ -0,0 +1,125 @@
+﻿'''
+projects.SongPitchモジュールのテスト
+'''
+
+import unittest
+from unittest import mock
+
+import numpy as np
+import PyRwu.pitch
+
+import projects.Ust
+import projects.Note
+import projects.RenderNote
+import projects.SongPitch
+import voicebank
+import voicebank.oto
+
+
+class TestSongPitch(unittest.TestCase):
+    @mock.patch("voicebank.VoiceBank.is_utau_voicebank")
+    def vb_load(self, dirpath, is_vb):
+        is_vb.return_value = True
+        return voicebank.VoiceBank("voice")
+
+    def setUp(self):
+        self.ust = projects.Ust.Ust("test")
+        self.vb = self.vb_load("voice")
+        self.oto = voicebank.oto.Oto()
+        self.vb._oto = self.oto
+        self.oto._setValue("zero", voicebank.oto.OtoRecord("", "foo.wav", "zero", 100, 0, 0, 900, -1000))
+        for i, notenum in enumerate([58, 60, 62]):
+            note = projects.Note.Note()
+            note.num.value = "#{:04}".format(i + 1)
+            note.length.value = 480
+            note.tempo.value = 100.0
+            note.lyric.value = "zero"
+            note.notenum.value = notenum
+            note.envelope.value = "0,5,35,0,100,100,0"
+            if i != 0:
+                note.prev = self.ust.notes[-1]
+                self.ust.notes[-1].next = note
+            self.ust.notes.append(note)
+
+    def apply_oto(self):
+        for note in self.ust.notes:
+            note.apply_oto(self.vb.oto, self.vb.prefix)
+
+    def test_starts(self):
+        self.apply_oto()
+        song_pitch = projects.SongPitch.SongPitch(self.ust.notes)
+        np.testing.assert_array_equal(song_pitch.starts, np.array([0, 600, 1200]))
+        self.assertEqual(song_pitch.ms[0], -1000)
+        self.assertGreaterEqual(song_pitch.ms[-1], 1800 + 1000 - 5 * 1.25)
+        self.assertTrue(np.all(np.diff(song_pitch.ms) > 0))
+
+    def test_cents_no_pbs(self):
+        self.apply_oto()
+        song_pitch = projects.SongPitch.SongPitch(self.ust.notes)
+        np.testing.assert_array_equal(song_pitch.get_cents(np.array([-500, 0, 599, 600, 1199, 1200, 2000])),
+                                      np.array([5800, 5800, 5800, 6000, 6000, 6200, 6200]))
+
+    def test_cents_rest(self):
+        '''
+        休符は先頭で次のノートの音高に切り替わる
+        '''
+        self.ust.notes[1].lyric.value = "R"
+        self.apply_oto()
+        song_pitch = projects.SongPitch.SongPitch(self.ust.notes)
+        np.testing.assert_array_equal(song_pitch.get_cents(np.array([599, 600, 1200])),
+                                      np.array([5800, 6200, 6200]))
+
+    def test_get_pitches_no_pbs(self):
+        '''
+        ノート単位の計算と異なり、ノート開始直前の点も前のノートの音高になる
+        '''
+        self.ust.notes[1].pre.value = 300
+        self.apply_oto()
+        song_pitch = projects.SongPitch.SongPitch(self.ust.notes)
+        r_note = projects.RenderNote.RenderNote(self.ust.notes[1], self.vb, "cache", "output", True)
+        t = PyRwu.pitch.getPitchRange(100, r_note._target_ms, 44100)
+        logical_result = np.zeros_like(t)
+        logical_result[0:48] = -200
+        logical_result[48+96:] = 200
+        np.testing.assert_array_equal(song_pitch.get_pitches(self.ust.notes[1], t, 300), logical_result)
+        self.assertEqual(r_note._get_base_pitches(self.ust.notes[1], t)[47], 0)
+
+    def test_get_pitches_interp(self):
+        '''
+        ポルタメントはノート単位の計算と±1centの差に収まる
+        '''
+        self.ust.notes[1].pre.value = 300
+        self.ust.notes[1].pbs.value = "-150;-10"
+        self.ust.notes[1].pbw.value = [100, 150, 50]
+        self.ust.notes[1].pbm.value = ["", "s", "r"]
+        self.apply_oto()
+        song_pitch = projects.SongPitch.SongPitch(self.ust.notes)
+        r_note = projects.RenderNote.RenderNote(self.ust.notes[1], self.vb, "cache", "output", True)
+        t = PyRwu.pitch.getPitchRange(100, r_note._target_ms, 44100)
+        expected = r_note._get_base_pitches(self.ust.notes[1], t)
+        expected += r_note._interp_pitches(self.ust.notes[1], t, 300)
+        expected[23] = -200
+        np.testing.assert_allclose(song_pitch.get_pitches(self.ust.notes[1], t, 300), expected[:t.shape[0]], atol=1)
+
+    def test_get_pitches_vibrato(self):
+        '''
+        ビブラートはノート単位の計算と一致する
+        '''
+        self.ust.notes[1].vibrato.value = "50,100,100,20,20,0,0,0"
+        self.apply_oto()
+        song_pitch = projects.SongPitch.SongPitch(self.ust.notes)
+        r_note = projects.RenderNote.RenderNote(self.ust.notes[1], self.vb, "cache", "output", True)
+        t = PyRwu.pitch.getPitchRange(100, r_note._target_ms, 44100)
+        expected = r_note._get_base_pitches(self.ust.notes[1], t)
+        expected += r_note._get_vibrato_pitches(self.ust.notes[1], t, 0)
+        np.testing.assert_allclose(song_pitch.get_pitches(self.ust.notes[1], t, 0), expected[:t.shape[0]], atol=1)
+
+    def test_get_pitches_unknown_note(self):
+        self.apply_oto()
+        song_pitch = projects.SongPitch.SongPitch(self.ust.notes[:2])
+        with self.assertRaises(KeyError):
+            song_pitch.get_pitches(self.ust.notes[2], np.zeros(1), 0)
+
+    def test_empty(self):
+        song_pitch = projects.SongPitch.SongPitch([])
+        self.assertEqual(song_pitch.ms.shape[0], 0)
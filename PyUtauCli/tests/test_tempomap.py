@@ -0,0 +1,180 @@
+﻿'''
+projects.TempoMapモジュールのテスト
+'''
+
+import unittest
+
+import numpy as np
+
+import projects.Ust
+from projects.Note import Note
+from projects.NoteColumns import NoteColumns
+from projects.TempoMap import TempoMap
+import settings.logger
+
+
+def _make_note(length: int, tempo: float, has_tempo: bool = True) -> Note:
+    note = Note()
+    note.length.init(length)
+    note.lyric.init("あ")
+    note.notenum.init(60)
+    note.tempo.init(tempo)
+    note.tempo.hasValue = has_tempo
+    return note
+
+
+class TestTempoMap(unittest.TestCase):
+    def setUp(self):
+        self.notes = [_make_note(480, 120), _make_note(960, 120, False), _make_note(240, 150), _make_note(480, 90)]
+        self.tempo_map = TempoMap(self.notes)
+
+    def test_init(self):
+        self.assertEqual(len(self.tempo_map), 4)
+        np.testing.assert_array_equal(self.tempo_map.tick_starts, [0, 480, 1440, 1680, 2160])
+        np.testing.assert_array_equal(self.tempo_map.ms_starts[:-1], NoteColumns(self.notes).ms_starts())
+        self.assertEqual(self.tempo_map.total_ticks(), 2160)
+        self.assertEqual(self.tempo_map.total_ms(), NoteColumns(self.notes).total_ms())
+
+    def test_read_only(self):
+        with self.assertRaises(ValueError):
+            self.tempo_map.tick_starts[0] = 1
+        with self.assertRaises(ValueError):
+            self.tempo_map.ms_starts[0] = 1
+
+    def test_empty(self):
+        tempo_map = TempoMap([], 150)
+        self.assertEqual(len(tempo_map), 0)
+        self.assertEqual(tempo_map.total_ms(), 0)
+        self.assertEqual(tempo_map.tick_to_ms(480), 400)
+        self.assertEqual(tempo_map.ms_to_tick(400), 480)
+        self.assertEqual(tempo_map.note_at(0), -1)
+        self.assertEqual(tempo_map.notes_between(0, 1000), range(0))
+
+    def test_tick_to_ms(self):
+        self.assertEqual(self.tempo_map.tick_to_ms(0), 0)
+        self.assertEqual(self.tempo_map.tick_to_ms(240), 250)
+        self.assertEqual(self.tempo_map.tick_to_ms(1440), 1500)
+        self.assertAlmostEqual(self.tempo_map.tick_to_ms(1560), 1600)
+        self.assertAlmostEqual(self.tempo_map.tick_to_ms(2160 + 480), self.tempo_map.total_ms() + 60000 / 90)
+        self.assertEqual(self.tempo_map.tick_to_ms(-480), -500)
+        np.testing.assert_allclose(self.tempo_map.tick_to_ms(np.array([0, 480, 1440])), [0, 500, 1500])
+
+    def test_ms_to_tick(self):
+        self.assertEqual(self.tempo_map.ms_to_tick(0), 0)
+        self.assertEqual(self.tempo_map.ms_to_tick(250), 240)
+        self.assertAlmostEqual(self.tempo_map.ms_to_tick(1600), 1560)
+        ticks = np.array([0, 100, 480, 1000, 1440, 1500, 1680, 2000, 2160])
+        np.testing.assert_allclose(self.tempo_map.ms_to_tick(self.tempo_map.tick_to_ms(ticks)), ticks)
+
+    def test_note_at(self):
+        self.assertEqual(self.tempo_map.note_at(-1), -1)
+        self.assertEqual(self.tempo_map.note_at(0), 0)
+        self.assertEqual(self.tempo_map.note_at(499.9), 0)
+        self.assertEqual(self.tempo_map.note_at(500), 1)
+        self.assertEqual(self.tempo_map.note_at(1600), 2)
+        self.assertEqual(self.tempo_map.note_at(self.tempo_map.total_ms() - 1), 3)
+        self.assertEqual(self.tempo_map.note_at(self.tempo_map.total_ms()), -1)
+        self.assertEqual(self.tempo_map.note_at_tick(1439), 1)
+        self.assertEqual(self.tempo_map.note_at_tick(1440), 2)
+        self.assertEqual(self.tempo_map.note_at_tick(2160), -1)
+
+    def test_note_at_zero_length(self):
+        notes = [_make_note(480, 120), _make_note(0, 120), _make_note(480, 120)]
+        tempo_map = TempoMap(notes)
+        self.assertEqual(tempo_map.note_at(500), 2)
+        self.assertEqual(tempo_map.notes_between(400, 600), range(0, 3))
+        self.assertEqual(tempo_map.notes_between(500, 600), range(2, 3))
+
+    def test_notes_between(self):
+        self.assertEqual(self.tempo_map.notes_between(0, 500), range(0, 1))
+        self.assertEqual(self.tempo_map.notes_between(100, 501), range(0, 2))
+        self.assertEqual(self.tempo_map.notes_between(500, 1500), range(1, 2))
+        self.assertEqual(self.tempo_map.notes_between(-100, 100000), range(0, 4))
+        self.assertEqual(self.tempo_map.notes_between(100000, 200000), range(4, 4))
+        self.assertEqual(self.tempo_map.notes_between(600, 600), range(0))
+
+    def test_set_length(self):
+        self.tempo_map.set_length(1, 480)
+        self.assertEqual(self.notes[1].length.value, 480)
+        self.assertTrue(self.notes[1].length.isUpdate)
+        np.testing.assert_array_equal(self.tempo_map.tick_starts, [0, 480, 960, 1200, 1680])
+        np.testing.assert_array_equal(self.tempo_map.ms_starts, TempoMap(self.notes).ms_starts)
+
+    def test_set_length_bad_value(self):
+        with self.assertRaises(ValueError):
+            self.tempo_map.set_length(1, "a")
+        self.assertEqual(self.tempo_map.total_ticks(), 2160)
+
+    def test_set_tempo(self):
+        self.tempo_map.set_tempo(0, 60)
+        self.assertEqual(self.notes[0].tempo.value, 60)
+        self.assertTrue(self.notes[0].tempo.isUpdate)
+        self.assertEqual(self.notes[1].tempo.value, 60)
+        self.assertFalse(self.notes[1].tempo.hasValue)
+        self.assertEqual(self.notes[2].tempo.value, 150)
+        self.assertEqual(self.tempo_map.tick_to_ms(1440), 3000)
+        np.testing.assert_array_equal(self.tempo_map.ms_starts, TempoMap(self.notes).ms_starts)
+
+    def test_refresh(self):
+        self.notes.insert(2, _make_note(480, 120))
+        self.tempo_map.refresh(2)
+        self.assertEqual(len(self.tempo_map), 5)
+        np.testing.assert_array_equal(self.tempo_map.tick_starts, [0, 480, 1440, 1920, 2160, 2640])
+        np.testing.assert_array_equal(self.tempo_map.ms_starts, TempoMap(self.notes).ms_starts)
+        del self.notes[0]
+        self.tempo_map.refresh(0)
+        np.testing.assert_array_equal(self.tempo_map.tick_starts, [0, 960, 1440, 1680, 2160])
+        del self.notes[3]
+        self.tempo_map.refresh(3)
+        np.testing.assert_array_equal(self.tempo_map.tick_starts, [0, 960, 1440, 1680])
+        np.testing.assert_array_equal(self.tempo_map.ms_starts, TempoMap(self.notes).ms_starts)
+
+
+class TestUstTempoMap(unittest.TestCase):
+    def setUp(self):
+        self.test_logger = settings.logger.get_logger("TEST", True)
+        self.ust = projects.Ust.Ust("testpath", logger=self.test_logger)
+        self.ust.notes = [_make_note(480, 120), _make_note(960, 120)]
+
+    def test_tempo_map(self):
+        tempo_map = self.ust.tempo_map
+        self.assertIs(self.ust.tempo_map, tempo_map)
+        self.assertEqual(tempo_map.total_ticks(), 1440)
+
+    def test_tempo_map_notes_changed(self):
+        tempo_map = self.ust.tempo_map
+        self.ust.notes.append(_make_note(240, 120))
+        self.assertIsNot(self.ust.tempo_map, tempo_map)
+        self.assertEqual(self.ust.tempo_map.total_ticks(), 1680)
+        self.ust.notes = [_make_note(120, 120)]
+        self.assertEqual(self.ust.tempo_map.total_ticks(), 120)
+
+    def test_tempo_map_note_edited(self):
+        '''
+        Noteを直接変更した場合は読み直す
+        '''
+        tempo_map = self.ust.tempo_map
+        self.ust.notes[0].length.value = 960
+        self.ust.notes[1].tempo.value = 60
+        self.assertFalse(tempo_map.is_current)
+        self.assertIs(self.ust.tempo_map, tempo_map)
+        self.assertEqual(tempo_map.total_ticks(), 1920)
+        self.assertEqual(tempo_map.total_ms(), 3000)
+        self.assertEqual(tempo_map.note_at(900), 0)
+        self.assertTrue(tempo_map.is_current)
+
+    def test_tempo_map_set_length(self):
+        '''
+        set_length,set_tempoで変更した場合は読み直さない
+        '''
+        tempo_map = self.ust.tempo_map
+        tempo_map.set_length(0, 240)
+        tempo_map.set_tempo(1, 60)
+        self.assertTrue(tempo_map.is_current)
+        self.assertEqual(self.ust.tempo_map.total_ms(), 2250)
+
+    def test_tempo_map_ust_tempo_changed(self):
+        tempo_map = self.ust.tempo_map
+        self.ust.tempo = 60
+        self.assertIsNot(self.ust.tempo_map, tempo_map)
+        self.assertEqual(self.ust.tempo_map.tempo, 60)
@@ -0,0 +1,93 @@
+﻿'''
+common.textfileモジュールのテスト
+'''
+
+import unittest
+from unittest import mock
+
+import os
+import os.path
+import shutil
+
+import common.textfile
+import projects.Ust
+import settings.logger
+
+
+class TestDecode(unittest.TestCase):
+    def test_ascii(self):
+        self.assertEqual(common.textfile.decode(b"Lyric=a"), ("Lyric=a", "utf-8"))
+
+    def test_utf8(self):
+        self.assertEqual(common.textfile.decode("Lyric=あ".encode("utf-8")), ("Lyric=あ", "utf-8"))
+
+    def test_utf8_bom(self):
+        self.assertEqual(common.textfile.decode(b"\xef\xbb\xbf" + "Lyric=あ".encode("utf-8")), ("Lyric=あ", "utf-8-sig"))
+
+    def test_bom_without_utf8(self):
+        with self.assertRaises(UnicodeDecodeError):
+            common.textfile.decode(b"\xef\xbb\xbf" + "Lyric=あ".encode("utf-8"), ("ascii",))
+
+    def test_cp932(self):
+        self.assertEqual(common.textfile.decode("Length=480\nLyric=あ\nLabel=い".encode("cp932")),
+                         ("Length=480\nLyric=あ\nLabel=い", "cp932"))
+
+    def test_non_ascii_before_error(self):
+        data: bytes = "あ".encode("utf-8") + "い".encode("cp932")
+        self.assertEqual(common.textfile.decode(data), (data.decode("cp932"), "cp932"))
+
+    def test_encodings(self):
+        self.assertEqual(common.textfile.decode("Lyric=あ".encode("cp932"), ("cp932", "utf-8")), ("Lyric=あ", "cp932"))
+        self.assertEqual(common.textfile.decode("Lyric=あ".encode("cp932"), (None, "unknown", "cp932")), ("Lyric=あ", "cp932"))
+        self.assertEqual(common.textfile.decode(b"Lyric=a", ("UTF8",)), ("Lyric=a", "utf-8"))
+
+    def test_error(self):
+        with self.assertRaises(UnicodeDecodeError) as cm:
+            common.textfile.decode(b"Lyric=\x82\xff")
+        self.assertEqual(cm.exception.encoding, "cp932")
+        self.assertEqual(cm.exception.start, 6)
+        self.assertEqual(cm.exception.object, b"Lyric=\x82\xff")
+
+    def test_no_encodings(self):
+        with self.assertRaises(UnicodeDecodeError):
+            common.textfile.decode(b"Lyric=a", (None,))
+
+    def test_split_lines(self):
+        self.assertEqual(common.textfile.split_lines("a\r\nb\nc"), ["a", "b", "c"])
+
+    def test_read_lines(self):
+        mock_io = mock.mock_open(read_data="a\r\nあ".encode("cp932"))
+        with mock.patch("builtins.open", mock_io) as mocked_open:
+            self.assertEqual(common.textfile.read_lines("test.txt"), (["a", "あ"], "cp932"))
+        mocked_open.assert_called_once_with("test.txt", "rb")
+
+
+class TestUstBodyEncoding(unittest.TestCase):
+    def setUp(self):
+        os.makedirs(os.path.join("testdata", "ust"), exist_ok=True)
+        self.test_logger = settings.logger.get_logger("TEST", True)
+
+    def _write(self, filename: str, encoding: str) -> str:
+        filepath: str = os.path.join("testdata", "ust", filename)
+        with open(filepath, "w", encoding=encoding) as fw:
+            fw.write("[#SETTING]\nTempo=120.00\n[#0000]\nLength=480\nLyric=あ\nNoteNum=60\n[#0001]\nLength=480\nLyric=R\nNoteNum=60\n[#TRACKEND]\n")
+        return filepath
+
+    def test_load(self):
+        for encoding, expected, utf8 in [("cp932", "cp932", False), ("utf-8", "utf-8", True)]:
+            ust = projects.Ust.Ust(self._write(encoding + ".ust", encoding), logger=self.test_logger)
+            ust.load()
+            self.assertEqual(ust.body_encoding, expected)
+            self.assertEqual(ust.utf8, utf8)
+            self.assertEqual(ust.notes[0].lyric.value, "あ")
+
+    def test_iter_notes(self):
+        for encoding, expected, utf8 in [("cp932", "cp932", False), ("utf-8", "utf-8", True)]:
+            ust = projects.Ust.Ust(self._write(encoding + ".ust", encoding), logger=self.test_logger)
+            self.assertEqual([note.lyric.value for note in ust.iter_notes()], ["あ", "R"])
+            self.assertEqual(ust.body_encoding, expected)
+            self.assertEqual(ust.utf8, utf8)
+
+    def tearDown(self):
+        if os.path.isdir(os.path.join("testdata")):
+            shutil.rmtree(os.path.join("testdata"))
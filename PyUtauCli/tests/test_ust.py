@@ -10,11 +10,15 @@ from unittest import mock
 import os
 import os.path
 import shutil
+import gc
 import logging
 import locale
+import weakref
 
 import projects.Ust
+import projects.Note
 import settings.logger
+import voicebank
 
 
 def _make_test_ust(filename, header_encoding, body_encoding, lyric="あ", voice="音源名"):
@@ -741,6 +745,70 @@ class TestLoadNote(unittest.TestCase):
         self.assertEqual(self.ust.notes[2].flags.value, "B50")
         self.assertFalse(self.ust.notes[2].flags.hasValue)
 
+    def test_unknown_key(self):
+        test_note = ["[#0000]",
+                     "Length=1920",
+                     "Lyric=Lyric=あ",
+                     "LengthX=960",
+                     "$patch=a.wav",
+                     "NoteNum=60"]
+        data = "\n".join(test_note + ["[#TRACKEND]"]).encode("cp932")
+        self.ust._load_note(data)
+        self.assertEqual(len(self.ust.notes), 1)
+        self.assertEqual(self.ust.notes[0].length.value, 1920)
+        self.assertEqual(self.ust.notes[0].lyric.value, "Lyric=あ")
+        self.assertEqual(self.ust.notes[0].notenum.value, 60)
+
+    def test_out_of_note(self):
+        test_note = ["Length=960",
+                     "[#0000]",
+                     "Length=1920"]
+        data = "\n".join(test_note + ["[#TRACKEND]"]).encode("cp932")
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
+            self.ust._load_note(data)
+        self.assertEqual(logcm.output[0], "WARNING:TEST:Length=960 is out of note")
+        self.assertEqual(len(self.ust.notes), 1)
+        self.assertEqual(self.ust.notes[0].length.value, 1920)
+
+    def test_strict_error_note(self):
+        self.ust.strict = True
+        test_note = ["[#0000]",
+                     "Length=1920",
+                     "NoteNum=b",
+                     "Tempo=c"]
+        data = "\n".join(test_note + ["[#TRACKEND]"]).encode("cp932")
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
+            with self.assertRaises(ValueError) as cm:
+                self.ust._load_note(data)
+        self.assertEqual(str(cm.exception), "#0000 notenum can't init. because ValueError: b is not int")
+        self.assertEqual(logcm.output[0], "ERROR:TEST:#0000 notenum can't init. because ValueError: b is not int")
+        self.assertEqual(len(logcm.output), 1)
+
+    def test_strict_not_ust_line(self):
+        self.ust.strict = True
+        test_note = ["[#0000]",
+                     "Length=1920",
+                     "NoteNum"]
+        data = "\n".join(test_note + ["[#TRACKEND]", ""]).encode("cp932")
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
+            with self.assertRaises(ValueError):
+                self.ust._load_note(data)
+        self.assertEqual(logcm.output[0], "ERROR:TEST:NoteNum is not ust line")
+
+    def test_strict_note(self):
+        self.ust.strict = True
+        test_note = ["[#0000]",
+                     "Length=1920",
+                     "Lyric={}".format("あ"),
+                     "NoteNum=60",
+                     "PreUtterance=",
+                     "$patch=a.wav"]
+        data = "\n".join(test_note + ["[#TRACKEND]", ""]).encode("cp932")
+        self.ust._load_note(data)
+        self.assertEqual(len(self.ust.notes), 1)
+        self.assertEqual(self.ust.notes[0].length.value, 1920)
+        self.assertFalse(self.ust.notes[0].pre.hasValue)
+
 class TestLoadAll(unittest.TestCase):
     @mock.patch("os.path.isfile")
     def test_write(self, mock_isfile):
@@ -789,6 +857,10 @@ class TestLoadAll(unittest.TestCase):
         self.assertEqual(self.ust.notes[0].next, self.ust.notes[1])
 
 class TestWrite(unittest.TestCase):
+    def _written_lines(self, mock_io) -> list:
+        self.assertEqual(len(mock_io().write.call_args_list), 1)
+        return mock_io().write.call_args_list[0][0][0].splitlines(keepends=True)
+
     @mock.patch("os.path.isfile")
     def test_write(self, mock_isfile):
         mock_isfile.return_value = True
@@ -853,53 +925,246 @@ class TestWrite(unittest.TestCase):
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.ust.load()
                 self.ust.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#VERSION]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "UST Version1.2\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "[#SETTING]\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "Tempo=150.00\n")
-        self.assertEqual(mock_io().write.call_args_list[4][0][0], "Tracks=1\n")
-        self.assertEqual(mock_io().write.call_args_list[5][0][0], "Project=test\n")
-        self.assertEqual(mock_io().write.call_args_list[6][0][0], "VoiceDir=%VOICE%aaa\n")
-        self.assertEqual(mock_io().write.call_args_list[7][0][0], "OutFile=output.wav\n")
-        self.assertEqual(mock_io().write.call_args_list[8][0][0], "CacheDir=main__.cache\n")
-        self.assertEqual(mock_io().write.call_args_list[9][0][0], "Tool1=wavtool.exe\n")
-        self.assertEqual(mock_io().write.call_args_list[10][0][0], "Tool2=resamp.exe\n")
-        self.assertEqual(mock_io().write.call_args_list[11][0][0], "Flags=B50\n")
-        self.assertEqual(mock_io().write.call_args_list[12][0][0], "Mode2=True\n")
-        self.assertEqual(mock_io().write.call_args_list[13][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[14][0][0], "Length=1920\n")
-        self.assertEqual(mock_io().write.call_args_list[15][0][0], "Lyric=あ\n")
-        self.assertEqual(mock_io().write.call_args_list[16][0][0], "NoteNum=60\n")
-        self.assertEqual(mock_io().write.call_args_list[17][0][0], "PreUtterance=\n")
-        self.assertEqual(mock_io().write.call_args_list[18][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[19][0][0], "Length=1920\n")
-        self.assertEqual(mock_io().write.call_args_list[20][0][0], "Lyric=あ\n")
-        self.assertEqual(mock_io().write.call_args_list[21][0][0], "NoteNum=60\n")
-        self.assertEqual(mock_io().write.call_args_list[22][0][0], "Tempo=120.00\n")
-        self.assertEqual(mock_io().write.call_args_list[23][0][0], "PreUtterance=1.000\n")
-        self.assertEqual(mock_io().write.call_args_list[24][0][0], "VoiceOverlap=3.000\n")
-        self.assertEqual(mock_io().write.call_args_list[25][0][0], "StartPoint=5.000\n")
-        self.assertEqual(mock_io().write.call_args_list[26][0][0], "Velocity=150\n")
-        self.assertEqual(mock_io().write.call_args_list[27][0][0], "Intensity=80\n")
-        self.assertEqual(mock_io().write.call_args_list[28][0][0], "Modulation=30\n")
-        self.assertEqual(mock_io().write.call_args_list[29][0][0], "PitchBend=0,1,2,3\n")
-        self.assertEqual(mock_io().write.call_args_list[30][0][0], "PBStart=-10.000\n")
-        self.assertEqual(mock_io().write.call_args_list[31][0][0], "PBS=-5;3\n")
-        self.assertEqual(mock_io().write.call_args_list[32][0][0], "PBY=1.0,2.0,3.0\n")
-        self.assertEqual(mock_io().write.call_args_list[33][0][0], "PBM=,s,r,j,\n")
-        self.assertEqual(mock_io().write.call_args_list[34][0][0], "PBW=10.0,20.0,30.0,40.0\n")
-        self.assertEqual(mock_io().write.call_args_list[35][0][0], "Flags=g-5\n")
-        self.assertEqual(mock_io().write.call_args_list[36][0][0], "VBR=1.00,2.00,3.00,4.00,5.00,6.00,7.00,8.00\n")
-        self.assertEqual(mock_io().write.call_args_list[37][0][0], "Envelope=9.00,10.00,11.00,12,13,14,15,%,16.00,17.00,18\n")
-        self.assertEqual(mock_io().write.call_args_list[38][0][0], "Label=aa\n")
-        self.assertEqual(mock_io().write.call_args_list[39][0][0], "$direct=True\n")
-        self.assertEqual(mock_io().write.call_args_list[40][0][0], "$region=1番\n")
-        self.assertEqual(mock_io().write.call_args_list[41][0][0], "$region_end=イントロ\n")
-        self.assertEqual(mock_io().write.call_args_list[42][0][0], "[#0002]\n")
-        self.assertEqual(mock_io().write.call_args_list[43][0][0], "Length=1920\n")
-        self.assertEqual(mock_io().write.call_args_list[44][0][0], "Lyric=あ\n")
-        self.assertEqual(mock_io().write.call_args_list[45][0][0], "NoteNum=60\n")
-        self.assertEqual(mock_io().write.call_args_list[46][0][0], "PreUtterance=\n")
-        self.assertEqual(mock_io().write.call_args_list[47][0][0], "[#TRACKEND]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#VERSION]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "UST Version1.2\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "[#SETTING]\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "Tempo=150.00\n")
+        self.assertEqual(self._written_lines(mock_io)[4], "Tracks=1\n")
+        self.assertEqual(self._written_lines(mock_io)[5], "Project=test\n")
+        self.assertEqual(self._written_lines(mock_io)[6], "VoiceDir=%VOICE%aaa\n")
+        self.assertEqual(self._written_lines(mock_io)[7], "OutFile=output.wav\n")
+        self.assertEqual(self._written_lines(mock_io)[8], "CacheDir=main__.cache\n")
+        self.assertEqual(self._written_lines(mock_io)[9], "Tool1=wavtool.exe\n")
+        self.assertEqual(self._written_lines(mock_io)[10], "Tool2=resamp.exe\n")
+        self.assertEqual(self._written_lines(mock_io)[11], "Flags=B50\n")
+        self.assertEqual(self._written_lines(mock_io)[12], "Mode2=True\n")
+        self.assertEqual(self._written_lines(mock_io)[13], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[14], "Length=1920\n")
+        self.assertEqual(self._written_lines(mock_io)[15], "Lyric=あ\n")
+        self.assertEqual(self._written_lines(mock_io)[16], "NoteNum=60\n")
+        self.assertEqual(self._written_lines(mock_io)[17], "PreUtterance=\n")
+        self.assertEqual(self._written_lines(mock_io)[18], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[19], "Length=1920\n")
+        self.assertEqual(self._written_lines(mock_io)[20], "Lyric=あ\n")
+        self.assertEqual(self._written_lines(mock_io)[21], "NoteNum=60\n")
+        self.assertEqual(self._written_lines(mock_io)[22], "Tempo=120.00\n")
+        self.assertEqual(self._written_lines(mock_io)[23], "PreUtterance=1.000\n")
+        self.assertEqual(self._written_lines(mock_io)[24], "VoiceOverlap=3.000\n")
+        self.assertEqual(self._written_lines(mock_io)[25], "StartPoint=5.000\n")
+        self.assertEqual(self._written_lines(mock_io)[26], "Velocity=150\n")
+        self.assertEqual(self._written_lines(mock_io)[27], "Intensity=80\n")
+        self.assertEqual(self._written_lines(mock_io)[28], "Modulation=30\n")
+        self.assertEqual(self._written_lines(mock_io)[29], "PitchBend=0,1,2,3\n")
+        self.assertEqual(self._written_lines(mock_io)[30], "PBStart=-10.000\n")
+        self.assertEqual(self._written_lines(mock_io)[31], "PBS=-5;3\n")
+        self.assertEqual(self._written_lines(mock_io)[32], "PBY=1.0,2.0,3.0\n")
+        self.assertEqual(self._written_lines(mock_io)[33], "PBM=,s,r,j,\n")
+        self.assertEqual(self._written_lines(mock_io)[34], "PBW=10.0,20.0,30.0,40.0\n")
+        self.assertEqual(self._written_lines(mock_io)[35], "Flags=g-5\n")
+        self.assertEqual(self._written_lines(mock_io)[36], "VBR=1.00,2.00,3.00,4.00,5.00,6.00,7.00,8.00\n")
+        self.assertEqual(self._written_lines(mock_io)[37], "Envelope=9.00,10.00,11.00,12,13,14,15,%,16.00,17.00,18\n")
+        self.assertEqual(self._written_lines(mock_io)[38], "Label=aa\n")
+        self.assertEqual(self._written_lines(mock_io)[39], "$direct=True\n")
+        self.assertEqual(self._written_lines(mock_io)[40], "$region=1番\n")
+        self.assertEqual(self._written_lines(mock_io)[41], "$region_end=イントロ\n")
+        self.assertEqual(self._written_lines(mock_io)[42], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[43], "Length=1920\n")
+        self.assertEqual(self._written_lines(mock_io)[44], "Lyric=あ\n")
+        self.assertEqual(self._written_lines(mock_io)[45], "NoteNum=60\n")
+        self.assertEqual(self._written_lines(mock_io)[46], "PreUtterance=\n")
+        self.assertEqual(self._written_lines(mock_io)[47], "[#TRACKEND]\n")
         self.assertEqual(len(logcm.output), 5)
         self.assertEqual(logcm.output[4], "INFO:TEST:saving ust to:{} complete".format(self.ust.filepath))
+
+
+class TestIterNotes(unittest.TestCase):
+    def setUp(self):
+        self.test_logger = settings.logger.get_logger("TEST", True)
+        os.makedirs(os.path.join("testdata", "ust"), exist_ok=True)
+        self.header = ["[#VERSION]",
+                       "UST Version1.2",
+                       "[#SETTING]",
+                       "Tempo=150.00",
+                       "Project=test",
+                       "Flags=B50",
+                       "Mode2=True"]
+
+    def tearDown(self):
+        if os.path.isdir(os.path.join("testdata")):
+            shutil.rmtree(os.path.join("testdata"))
+
+    def _write(self, filename: str, lines: list, encoding: str = "cp932") -> str:
+        path = os.path.join("testdata", "ust", filename)
+        with open(path, "w", encoding=encoding, newline="\r\n") as fw:
+            fw.write("\n".join(lines))
+        return path
+
+    def _notes(self, count: int, start: int = 0) -> list:
+        lines = []
+        for i in range(start, start + count):
+            lines += ["[#{:04}]".format(i),
+                      "Length={}".format(480 + i),
+                      "Lyric=あ",
+                      "NoteNum=60"]
+            if i % 3 == 0:
+                lines.append("Tempo={}".format(100 + i))
+        return lines
+
+    def test_not_found(self):
+        ust = projects.Ust.Ust(os.path.join("testdata", "ust", "notfound.ust"), logger=self.test_logger)
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
+            with self.assertRaises(FileNotFoundError):
+                next(ust.iter_notes())
+
+    def test_same_as_load(self):
+        path = self._write("test.ust", self.header + self._notes(10) + ["[#TRACKEND]", ""])
+        loaded = projects.Ust.Ust(path, logger=self.test_logger)
+        loaded.load()
+        ust = projects.Ust.Ust(path, logger=self.test_logger)
+        notes = []
+        for note in ust.iter_notes():
+            notes.append((note.num.value, note.length.value, note.lyric.value, note.tempo.value, note.tempo.hasValue,
+                          note.flags.value, note.prev and note.prev.num.value, note.next and note.next.num.value))
+        self.assertEqual(notes, [(note.num.value, note.length.value, note.lyric.value, note.tempo.value, note.tempo.hasValue,
+                                  note.flags.value, note.prev and note.prev.num.value, note.next and note.next.num.value)
+                                 for note in loaded.notes])
+        self.assertEqual(ust.tempo, 150)
+        self.assertEqual(ust.flags, "B50")
+        self.assertTrue(ust.mode2)
+        self.assertEqual(ust.notes, [])
+
+    def test_window(self):
+        path = self._write("test.ust", self.header + self._notes(10) + ["[#TRACKEND]"])
+        ust = projects.Ust.Ust(path, logger=self.test_logger)
+        refs = []
+        gc.disable()
+        try:
+            for note in ust.iter_notes():
+                if note.prev is not None:
+                    self.assertIsNone(note.prev.prev)
+                refs.append(weakref.ref(note))
+                self.assertLessEqual(len([ref for ref in refs if ref() is not None]), 3)
+        finally:
+            gc.enable()
+        self.assertEqual(len(refs), 10)
+
+    def test_concatenated(self):
+        header2 = ["[#VERSION]",
+                   "UST Version1.2",
+                   "[#SETTING]",
+                   "Tempo=90.00",
+                   "Flags=g-5"]
+        path = self._write("test.ust", self.header + self._notes(2) + ["[#TRACKEND]"] + header2 + self._notes(2, 2) + ["[#TRACKEND]"])
+        ust = projects.Ust.Ust(path, logger=self.test_logger)
+        notes = []
+        for note in ust.iter_notes():
+            notes.append((note.num.value, note.tempo.value, note.flags.value,
+                          note.prev and note.prev.num.value, note.next and note.next.num.value))
+        self.assertEqual(notes, [("#0000", 100, "B50", None, "#0001"),
+                                 ("#0001", 100, "B50", "#0000", None),
+                                 ("#0002", 90, "g-5", None, "#0003"),
+                                 ("#0003", 103, "g-5", "#0002", None)])
+        self.assertEqual(ust.tempo, 90)
+
+    def test_utf8_body(self):
+        path = os.path.join("testdata", "ust", "test.ust")
+        with open(path, "w", encoding="cp932") as fw:
+            fw.write("\n".join(self.header) + "\n")
+        with open(path, "a", encoding="utf-8") as fw:
+            fw.write("[#0000]\nLyric=音源\n[#TRACKEND]\n")
+        ust = projects.Ust.Ust(path, logger=self.test_logger)
+        self.assertEqual([note.lyric.value for note in ust.iter_notes()], ["音源"])
+
+
+class TestApplyOtoAll(unittest.TestCase):
+    def setUp(self):
+        self.test_logger = settings.logger.get_logger("TEST", True)
+        dirpath = os.path.join("testdata", "vb")
+        os.makedirs(os.path.join(dirpath, "subdir"), exist_ok=True)
+        with open(os.path.join(dirpath, "oto.ini"), "w", encoding="cp932") as fw:
+            fw.write("foo1.wav=test2,100,900,-1000,300,100\r\n")
+        with open(os.path.join(dirpath, "subdir", "oto.ini"), "w", encoding="cp932") as fw:
+            fw.write("foo.wav=test1,100,900,-1000,600,200\r\n")
+            fw.write("foo2.wav=test1_C4,100,900,-1000,1200,400\r\n")
+        with open(os.path.join(dirpath, "prefix.map"), "w", encoding="cp932") as fw:
+            fw.write("C4\t\t_C4\r\n")
+        with self.assertLogs(logger=self.test_logger):
+            self.vb = voicebank.VoiceBank(dirpath, logger=self.test_logger)
+
+    def tearDown(self):
+        if os.path.isdir(os.path.join("testdata")):
+            shutil.rmtree(os.path.join("testdata"))
+
+    def _make_ust(self) -> projects.Ust.Ust:
+        ust = projects.Ust.Ust("test.ust", logger=self.test_logger)
+        params = [("test1", 60, 480, None, None), ("R", 60, 960, None, None), ("test2", 61, 60, 50, None),
+                  ("test1", 60, 15, None, 150), ("test3", 62, 480, None, None), ("test1!", 60, 480, None, 0),
+                  ("?test2", 60, 480, None, None), ("test1", 60, 480, None, None)]
+        for lyric, notenum, length, pre, velocity in params:
+            note = projects.Note.Note()
+            note.lyric.init(lyric)
+            note.notenum.init(notenum)
+            note.length.init(length)
+            note.tempo.init(120)
+            if pre is not None:
+                note.pre.init(pre)
+            if velocity is not None:
+                note.velocity.init(velocity)
+            if len(ust.notes) != 0:
+                note.prev = ust.notes[-1]
+                ust.notes[-1].next = note
+            ust.notes.append(note)
+        return ust
+
+    def _state(self, note: projects.Note.Note) -> tuple:
+        return (note.atAlias.value, note.atFileName.value, note.autoren,
+                note.pre.value, note.pre.hasValue, note.ove.value, note.ove.hasValue,
+                note.atPre.value, note.atOve.value, note.atStp.value)
+
+    def test_same_as_apply_oto(self):
+        expected = self._make_ust()
+        for note in expected.notes:
+            note.apply_oto(self.vb.oto, self.vb.prefix)
+        ust = self._make_ust()
+        ust.apply_oto_all(self.vb)
+        self.assertEqual([self._state(note) for note in ust.notes], [self._state(note) for note in expected.notes])
+
+    def test_columns(self):
+        '''
+        apply_oto_allの結果がUst.columnsに反映される
+        '''
+        ust = self._make_ust()
+        self.assertEqual(ust.columns["atPre"].tolist(), [0] * 8)
+        ust.apply_oto_all(self.vb)
+        self.assertEqual(ust.columns["atPre"].tolist(), [note.atPre.value for note in ust.notes])
+        self.assertNotEqual(ust.columns["atPre"][0], 0)
+
+    def test_alias(self):
+        ust = self._make_ust()
+        ust.apply_oto_all(self.vb)
+        self.assertEqual([note.atAlias.value for note in ust.notes],
+                         ["test1_C4", "", "test2", "test1_C4", "", "", "", "test1_C4"])
+        self.assertTrue(ust.notes[5].autoren)
+        self.assertEqual((self.vb.alias_hits, self.vb.alias_misses), (2, 6))
+
+    def test_not_adjacent_prev(self):
+        expected = self._make_ust()
+        ust = self._make_ust()
+        for target in [expected, ust]:
+            target.notes[3].prev = target.notes[0]
+        for note in expected.notes:
+            note.apply_oto(self.vb.oto, self.vb.prefix)
+        ust.apply_oto_all(self.vb)
+        self.assertEqual([self._state(note) for note in ust.notes], [self._state(note) for note in expected.notes])
+
+    def test_lyric_not_initial(self):
+        ust = self._make_ust()
+        ust.notes[3].lyric = projects.Note.Note().lyric
+        with self.assertRaises(ValueError):
+            ust.apply_oto_all(self.vb)
+        self.assertFalse(ust.notes[0].atPre.hasValue)
+
+    def test_empty(self):
+        ust = projects.Ust.Ust("test.ust", logger=self.test_logger)
+        ust.apply_oto_all(self.vb)
+        self.assertEqual(ust.notes, [])
@@ -0,0 +1,182 @@
+﻿'''
+projects.UstSnapshotモジュールのテスト
+'''
+
+import unittest
+from unittest import mock
+
+import os
+import os.path
+import shutil
+
+import projects.Ust
+import projects.UstSnapshot
+import settings.logger
+
+
+NOTE_LINES: list = ["[#0000]",
+                    "Length=480",
+                    "Lyric=あ",
+                    "NoteNum=60",
+                    "PreUtterance=",
+                    "VoiceOverlap=5",
+                    "Tempo=120",
+                    "PBS=-40;0",
+                    "PBW=80",
+                    "Envelope=5,35,0,100,100,100,100",
+                    "VBR=65,180,35,20,20,0,0,0",
+                    "Label=",
+                    "@alias=あ",
+                    "[#0001]",
+                    "Length=240",
+                    "Lyric=R",
+                    "NoteNum=62",
+                    "Velocity=150",
+                    "[#0002]",
+                    "Length=960",
+                    "Lyric=い",
+                    "NoteNum=64",
+                    "StartPoint=12.5",
+                    "[#TRACKEND]",
+                    ]
+
+
+def _entry_state(entry) -> dict:
+    state: dict = {}
+    for cls in type(entry).__mro__:
+        for key in getattr(cls, "__slots__", ()):
+            if not key.startswith("__") and hasattr(entry, key):
+                state[key] = getattr(entry, key)
+    return state
+
+
+def _note_state(note) -> dict:
+    return {attr: _entry_state(getattr(note, attr)) if cls is not None else getattr(note, attr)
+            for attr, cls, slots in projects.UstSnapshot.SCHEMA}
+
+
+class TestUstSnapshot(unittest.TestCase):
+    def setUp(self):
+        os.makedirs(os.path.join("testdata", "snapshot"), exist_ok=True)
+        self.test_logger = settings.logger.get_logger("TEST", True)
+        self.ust = projects.Ust.Ust(os.path.join("testdata", "snapshot", "test.ust"), logger=self.test_logger)
+        self.ust.project_name = "test"
+        self.ust.tempo = 150.0
+        self.ust.flags = "B50"
+        self.ust.mode2 = True
+        self.ust._load_note_helper(NOTE_LINES)
+        for i in range(1, len(self.ust.notes)):
+            self.ust.notes[i].prev = self.ust.notes[i - 1]
+            self.ust.notes[i - 1].next = self.ust.notes[i]
+
+    def test_round_trip(self):
+        with self.assertLogs(logger=self.test_logger, level="INFO") as logcm:
+            loaded = projects.Ust.Ust.from_snapshot(self.ust.to_snapshot(), logger=self.test_logger)
+        self.assertEqual(logcm.output[-1], "INFO:TEST:loading snapshot complete.notes:3")
+        for attr in projects.UstSnapshot.HEADER_FIELDS:
+            self.assertEqual(getattr(loaded, attr), getattr(self.ust, attr))
+        self.assertEqual(len(loaded.notes), 3)
+        for expected, actual in zip(self.ust.notes, loaded.notes):
+            self.assertEqual(_note_state(actual), _note_state(expected))
+        self.assertFalse(loaded.notes[1].pbs.hasValue)
+        self.assertEqual(loaded.notes[0].vibrato.value, self.ust.notes[0].vibrato.value)
+        self.assertEqual(loaded.notes[2].stp.value, 12.5)
+
+    def test_flags(self):
+        self.ust.notes[1].lyric.value = "う"
+        loaded = projects.Ust.Ust.from_snapshot(self.ust.to_snapshot(), logger=self.test_logger)
+        self.assertTrue(loaded.notes[1].lyric.isUpdate)
+        self.assertFalse(loaded.notes[0].lyric.isUpdate)
+        self.assertTrue(loaded.notes[0].ove.hasValue)
+        self.assertFalse(loaded.notes[1].ove.hasValue)
+        self.assertFalse(loaded.notes[0].pre.hasValue)
+
+    def test_links(self):
+        loaded = projects.Ust.Ust.from_snapshot(self.ust.to_snapshot(), logger=self.test_logger)
+        self.assertIsNone(loaded.notes[0].prev)
+        self.assertIs(loaded.notes[0].next, loaded.notes[1])
+        self.assertIs(loaded.notes[2].prev, loaded.notes[1])
+        self.assertIsNone(loaded.notes[2].next)
+
+    def test_save(self):
+        self.ust.save()
+        with open(self.ust.filepath, "rb") as fr:
+            expected: bytes = fr.read()
+        loaded = projects.Ust.Ust.from_snapshot(self.ust.to_snapshot(), logger=self.test_logger)
+        loaded.save(os.path.join("testdata", "snapshot", "loaded.ust"))
+        with open(os.path.join("testdata", "snapshot", "loaded.ust"), "rb") as fr:
+            self.assertEqual(fr.read(), expected)
+
+    def test_empty(self):
+        ust = projects.Ust.Ust("empty.ust", logger=self.test_logger)
+        loaded = projects.Ust.Ust.from_snapshot(ust.to_snapshot(), logger=self.test_logger)
+        self.assertEqual(loaded.notes, [])
+        self.assertEqual(loaded.filepath, "empty.ust")
+
+    def test_not_snapshot(self):
+        with self.assertRaises(ValueError) as cm:
+            projects.Ust.Ust.from_snapshot(b"[#VERSION]\nUST Version1.2\n", logger=self.test_logger)
+        self.assertEqual(str(cm.exception), "data is not ust snapshot")
+
+    def test_version(self):
+        data: bytes = self.ust.to_snapshot()
+        data = projects.UstSnapshot.MAGIC + (projects.UstSnapshot.SNAPSHOT_VERSION + 1).to_bytes(4, "little") + data[12:]
+        with self.assertRaises(ValueError) as cm:
+            projects.Ust.Ust.from_snapshot(data, logger=self.test_logger)
+        self.assertEqual(str(cm.exception), "snapshot version {} is not supported".format(projects.UstSnapshot.SNAPSHOT_VERSION + 1))
+
+    def test_broken(self):
+        data: bytes = self.ust.to_snapshot()
+        with self.assertRaises(ValueError) as cm:
+            projects.Ust.Ust.from_snapshot(data[:len(data) // 2], logger=self.test_logger)
+        self.assertEqual(str(cm.exception), "snapshot is broken")
+
+    def test_columns(self):
+        data: bytes = self.ust.to_snapshot()
+        with mock.patch.object(projects.UstSnapshot, "COLUMNS", projects.UstSnapshot.COLUMNS[:-1]):
+            with self.assertRaises(ValueError) as cm:
+                projects.Ust.Ust.from_snapshot(data, logger=self.test_logger)
+        self.assertEqual(str(cm.exception), "snapshot columns do not match Note")
+
+    def test_narrow_values(self):
+        '''
+        値は型を狭めて保存しても、元の値に戻る
+        '''
+        self.ust.notes[0].stp.value = 0.1
+        self.ust.notes[1].stp.value = 2.5
+        self.ust.notes[2].stp.value = 1e300
+        self.ust.notes[0].length.value = 2 ** 40
+        self.ust.notes[1].length.value = -1
+        self.ust.notes[0].label._value = None
+        self.ust.notes[1].label._value = 3
+        self.ust.notes[2].label._value = 0.0
+        loaded = projects.Ust.Ust.from_snapshot(self.ust.to_snapshot(), logger=self.test_logger)
+        self.assertEqual([note.stp.value for note in loaded.notes], [0.1, 2.5, 1e300])
+        self.assertEqual([note.length.value for note in loaded.notes], [2 ** 40, -1, 960])
+        self.assertEqual([note.label._value for note in loaded.notes], [None, 3, 0.0])
+        self.assertIsInstance(loaded.notes[2].label._value, float)
+
+    def test_size(self):
+        '''
+        全てのノートで型が同じ列は、値を1セルあたり64bitより狭い型で保存する
+        '''
+        lines: list = []
+        for i in range(1000):
+            lines += ["[#{:04}]".format(i), "Length=480", "Lyric=あ", "NoteNum={}".format(60 + i % 12),
+                      "Velocity=100", "StartPoint={}".format(i % 4 * 0.5)]
+        ust = projects.Ust.Ust("size.ust", logger=self.test_logger)
+        ust._load_note_helper(lines + ["[#TRACKEND]"])
+        data: bytes = ust.to_snapshot()
+        self.assertLess(len(data), 1000 * len(projects.UstSnapshot.COLUMNS) * 3)
+        loaded = projects.Ust.Ust.from_snapshot(data, logger=self.test_logger)
+        self.assertEqual([note.notenum.value for note in loaded.notes[:13]], [60 + i % 12 for i in range(13)])
+        self.assertEqual(loaded.notes[3].stp.value, 1.5)
+
+    def test_unsupported_value(self):
+        self.ust.notes[0].label._value = {"a": 1}
+        with self.assertRaises(ValueError):
+            self.ust.to_snapshot()
+
+    def tearDown(self):
+        if os.path.isdir(os.path.join("testdata")):
+            shutil.rmtree(os.path.join("testdata"))
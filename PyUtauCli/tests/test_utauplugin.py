@@ -15,6 +15,10 @@ import settings.logger
 
 
 class TestWrite(unittest.TestCase):
+    def _written_lines(self, mock_io) -> list:
+        self.assertEqual(len(mock_io().write.call_args_list), 1)
+        return mock_io().write.call_args_list[0][0][0].splitlines(keepends=True)
+
     @mock.patch("os.path.isfile")
     def setUp(self, mock_isfile):
         mock_isfile.return_value = True
@@ -84,9 +88,9 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "[#0002]\n")
         
     def test_write_change_length(self):
         mock_io = mock.mock_open()
@@ -94,10 +98,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "Length=480\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "Length=480\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
         
     def test_write_change_lyric(self):
         mock_io = mock.mock_open()
@@ -105,10 +109,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "Lyric=い\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "Lyric=い\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
 
     def test_write_change_notenum(self):
         mock_io = mock.mock_open()
@@ -116,10 +120,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "NoteNum=61\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "NoteNum=61\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
 
     def test_write_change_tempo(self):
         mock_io = mock.mock_open()
@@ -127,10 +131,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "Tempo=121.00\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "Tempo=121.00\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
 
     def test_write_change_pre(self):
         mock_io = mock.mock_open()
@@ -138,10 +142,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "PreUtterance=3.000\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "PreUtterance=3.000\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
 
     def test_write_change_ove(self):
         mock_io = mock.mock_open()
@@ -149,10 +153,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "VoiceOverlap=5.000\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "VoiceOverlap=5.000\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
 
     def test_write_change_stp(self):
         mock_io = mock.mock_open()
@@ -160,10 +164,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "StartPoint=7.000\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "StartPoint=7.000\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
 
     def test_write_change_velocity(self):
         mock_io = mock.mock_open()
@@ -171,10 +175,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "Velocity=0\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "Velocity=0\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
 
     def test_write_change_intensity(self):
         mock_io = mock.mock_open()
@@ -182,10 +186,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "Intensity=0\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "Intensity=0\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
 
     def test_write_change_modulation(self):
         mock_io = mock.mock_open()
@@ -193,10 +197,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "Modulation=0\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "Modulation=0\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
 
     def test_write_change_pitches(self):
         mock_io = mock.mock_open()
@@ -204,10 +208,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "Pitches=0\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "Pitches=0\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
 
     def test_write_change_pbstart(self):
         mock_io = mock.mock_open()
@@ -215,10 +219,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "PBStart=7.000\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "PBStart=7.000\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
 
     def test_write_change_pbs(self):
         mock_io = mock.mock_open()
@@ -226,10 +230,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "PBS=7.000\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "PBS=7.000\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
 
     def test_write_change_pby(self):
         mock_io = mock.mock_open()
@@ -237,10 +241,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "PBY=7\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "PBY=7\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
 
     def test_write_change_pbw(self):
         mock_io = mock.mock_open()
@@ -248,10 +252,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "PBW=7\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "PBW=7\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
 
     def test_write_change_pbm(self):
         mock_io = mock.mock_open()
@@ -259,10 +263,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "PBM=\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "PBM=\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
 
     def test_write_change_flags(self):
         mock_io = mock.mock_open()
@@ -270,10 +274,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "Flags=B50\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "Flags=B50\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
 
     def test_write_change_vibrato(self):
         mock_io = mock.mock_open()
@@ -281,10 +285,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "VBR=2.00,3.00,4.00,5.00,6.00,7.00,8.00,9.00\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "VBR=2.00,3.00,4.00,5.00,6.00,7.00,8.00,9.00\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
 
     def test_write_change_envelope(self):
         mock_io = mock.mock_open()
@@ -292,10 +296,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "Envelope=1.00,2.00,3.00,4,5,6,7\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "Envelope=1.00,2.00,3.00,4,5,6,7\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
 
     def test_write_change_label(self):
         mock_io = mock.mock_open()
@@ -303,10 +307,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "Label=bb\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "Label=bb\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
         
     def test_write_change_direct(self):
         mock_io = mock.mock_open()
@@ -314,10 +318,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "$direct=False\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "$direct=False\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
         
     def test_write_change_region(self):
         mock_io = mock.mock_open()
@@ -325,10 +329,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "$region=aa\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "$region=aa\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
         
     def test_write_change_region_end(self):
         mock_io = mock.mock_open()
@@ -336,10 +340,10 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "$region_end=aa\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "$region_end=aa\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "[#0002]\n")
         
     def test_write_change_all(self):
         mock_io = mock.mock_open()
@@ -369,32 +373,32 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#0001]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "Length=480\n")
-        self.assertEqual(mock_io().write.call_args_list[3][0][0], "Lyric=い\n")
-        self.assertEqual(mock_io().write.call_args_list[4][0][0], "NoteNum=61\n")
-        self.assertEqual(mock_io().write.call_args_list[5][0][0], "Tempo=121.00\n")
-        self.assertEqual(mock_io().write.call_args_list[6][0][0], "PreUtterance=3.000\n")
-        self.assertEqual(mock_io().write.call_args_list[7][0][0], "VoiceOverlap=5.000\n")
-        self.assertEqual(mock_io().write.call_args_list[8][0][0], "StartPoint=7.000\n")
-        self.assertEqual(mock_io().write.call_args_list[9][0][0], "Velocity=0\n")
-        self.assertEqual(mock_io().write.call_args_list[10][0][0], "Intensity=0\n")
-        self.assertEqual(mock_io().write.call_args_list[11][0][0], "Modulation=0\n")
-        self.assertEqual(mock_io().write.call_args_list[12][0][0], "Pitches=0\n")
-        self.assertEqual(mock_io().write.call_args_list[13][0][0], "PBStart=7.000\n")
-        self.assertEqual(mock_io().write.call_args_list[14][0][0], "PBS=7.000\n")
-        self.assertEqual(mock_io().write.call_args_list[15][0][0], "PBY=7\n")
-        self.assertEqual(mock_io().write.call_args_list[16][0][0], "PBM=\n")
-        self.assertEqual(mock_io().write.call_args_list[17][0][0], "PBW=7\n")
-        self.assertEqual(mock_io().write.call_args_list[18][0][0], "Flags=B50\n")
-        self.assertEqual(mock_io().write.call_args_list[19][0][0], "VBR=2.00,3.00,4.00,5.00,6.00,7.00,8.00,9.00\n")
-        self.assertEqual(mock_io().write.call_args_list[20][0][0], "Envelope=1.00,2.00,3.00,4,5,6,7\n")
-        self.assertEqual(mock_io().write.call_args_list[21][0][0], "Label=bb\n")
-        self.assertEqual(mock_io().write.call_args_list[22][0][0], "$direct=False\n")
-        self.assertEqual(mock_io().write.call_args_list[23][0][0], "$region=aa\n")
-        self.assertEqual(mock_io().write.call_args_list[24][0][0], "$region_end=aa\n")
-        self.assertEqual(mock_io().write.call_args_list[25][0][0], "[#0002]\n")
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#0001]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "Length=480\n")
+        self.assertEqual(self._written_lines(mock_io)[3], "Lyric=い\n")
+        self.assertEqual(self._written_lines(mock_io)[4], "NoteNum=61\n")
+        self.assertEqual(self._written_lines(mock_io)[5], "Tempo=121.00\n")
+        self.assertEqual(self._written_lines(mock_io)[6], "PreUtterance=3.000\n")
+        self.assertEqual(self._written_lines(mock_io)[7], "VoiceOverlap=5.000\n")
+        self.assertEqual(self._written_lines(mock_io)[8], "StartPoint=7.000\n")
+        self.assertEqual(self._written_lines(mock_io)[9], "Velocity=0\n")
+        self.assertEqual(self._written_lines(mock_io)[10], "Intensity=0\n")
+        self.assertEqual(self._written_lines(mock_io)[11], "Modulation=0\n")
+        self.assertEqual(self._written_lines(mock_io)[12], "Pitches=0\n")
+        self.assertEqual(self._written_lines(mock_io)[13], "PBStart=7.000\n")
+        self.assertEqual(self._written_lines(mock_io)[14], "PBS=7.000\n")
+        self.assertEqual(self._written_lines(mock_io)[15], "PBY=7\n")
+        self.assertEqual(self._written_lines(mock_io)[16], "PBM=\n")
+        self.assertEqual(self._written_lines(mock_io)[17], "PBW=7\n")
+        self.assertEqual(self._written_lines(mock_io)[18], "Flags=B50\n")
+        self.assertEqual(self._written_lines(mock_io)[19], "VBR=2.00,3.00,4.00,5.00,6.00,7.00,8.00,9.00\n")
+        self.assertEqual(self._written_lines(mock_io)[20], "Envelope=1.00,2.00,3.00,4,5,6,7\n")
+        self.assertEqual(self._written_lines(mock_io)[21], "Label=bb\n")
+        self.assertEqual(self._written_lines(mock_io)[22], "$direct=False\n")
+        self.assertEqual(self._written_lines(mock_io)[23], "$region=aa\n")
+        self.assertEqual(self._written_lines(mock_io)[24], "$region_end=aa\n")
+        self.assertEqual(self._written_lines(mock_io)[25], "[#0002]\n")
         
     def test_write_change_all_and_delete(self):
         mock_io = mock.mock_open()
@@ -425,6 +429,30 @@ class TestWrite(unittest.TestCase):
         with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
             with mock.patch("builtins.open", mock_io) as mocked_open:
                 self.plugin.save()
-        self.assertEqual(mock_io().write.call_args_list[0][0][0], "[#0000]\n")
-        self.assertEqual(mock_io().write.call_args_list[1][0][0], "[#DELETE]\n")
-        self.assertEqual(mock_io().write.call_args_list[2][0][0], "[#0002]\n")
\ No newline at end of file
+        self.assertEqual(self._written_lines(mock_io)[0], "[#0000]\n")
+        self.assertEqual(self._written_lines(mock_io)[1], "[#DELETE]\n")
+        self.assertEqual(self._written_lines(mock_io)[2], "[#0002]\n")
+
+    def test_write_dirty_only(self):
+        mock_io = mock.mock_open()
+        self.plugin.notes[1].length.value = 480
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
+            with mock.patch("builtins.open", mock_io) as mocked_open:
+                self.plugin.save(dirty_only=True)
+        self.assertEqual(self._written_lines(mock_io), ["[#0001]\n", "Length=480\n"])
+
+    def test_write_dirty_only_nochange(self):
+        mock_io = mock.mock_open()
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
+            with mock.patch("builtins.open", mock_io) as mocked_open:
+                self.plugin.save(dirty_only=True)
+        self.assertEqual(self._written_lines(mock_io), [])
+
+    def test_write_dirty_only_insert_and_delete(self):
+        mock_io = mock.mock_open()
+        self.plugin.notes[0].num.value = "#DELETE"
+        self.plugin.notes[2].num.value = "#INSERT"
+        with self.assertLogs(logger=self.test_logger, level=logging.DEBUG) as logcm:
+            with mock.patch("builtins.open", mock_io) as mocked_open:
+                self.plugin.save(dirty_only=True)
+        self.assertEqual(self._written_lines(mock_io), ["[#DELETE]\n", "[#INSERT]\n"])
@@ -8,6 +8,7 @@ from unittest import mock
 
 import os
 import os.path
+import shutil
 import logging
 
 import voicebank
@@ -118,7 +119,7 @@ class VoiceBankInitTest(unittest.TestCase):
                  "author:管理者",
                  "web:https://sample.co.jp/",
                  "version:単独音1"]
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("cp932"))
         with mock.patch("builtins.open", mock_io):
             with self.assertLogs(logger=test_logger, level=logging.DEBUG) as cm:
                 v = voicebank.VoiceBank("a", logger=test_logger)
@@ -139,7 +140,7 @@ class VoiceBankInitTest(unittest.TestCase):
         mock_isfile.side_effect = [False, True, False]
         
         lines = ["", "a", "b=1,2", "foo.wav=bar,100,600,200,900,-1000"]
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("cp932"))
         with mock.patch("builtins.open", mock_io):
             with self.assertLogs(logger=test_logger, level=logging.DEBUG) as cm:
                 v = voicebank.VoiceBank("a", logger=test_logger)
@@ -160,10 +161,70 @@ class VoiceBankInitTest(unittest.TestCase):
         mock_isfile.side_effect = [False, False, True]
         
         lines = ["", "a", "b=1,2", "foo.wav=bar,100,600,200,900,-1000"]
-        mock_io = mock.mock_open(read_data="\r\n".join(lines))
+        mock_io = mock.mock_open(read_data="\r\n".join(lines).encode("cp932"))
         with mock.patch("builtins.open", mock_io):
             with self.assertLogs(logger=test_logger, level=logging.DEBUG) as cm:
                 v = voicebank.VoiceBank("a", logger=test_logger)
         self.assertEqual(cm.output[0], ("WARNING:TEST:FileNotFoundError: a\character.txt is not found."))
         self.assertEqual(cm.output[1], ("INFO:TEST:oto.ini is loaded.files 0, records 0"))
         self.assertEqual(cm.output[2], ("INFO:TEST:prefix.map is loaded"))
+
+
+class TestResolveAlias(unittest.TestCase):
+    def setUp(self):
+        self.test_logger = settings.logger.get_logger("TEST", True)
+        self.dirpath = os.path.join("testdata", "vb")
+        os.makedirs(os.path.join(self.dirpath, "subdir"), exist_ok=True)
+        with open(os.path.join(self.dirpath, "oto.ini"), "w", encoding="cp932") as fw:
+            fw.write("a.wav=あ,100,900,-1000,300,100\r\n")
+        with open(os.path.join(self.dirpath, "subdir", "oto.ini"), "w", encoding="cp932") as fw:
+            fw.write("a_C4.wav=あ_C4,100,900,-1000,600,200\r\n")
+        with open(os.path.join(self.dirpath, "prefix.map"), "w", encoding="cp932") as fw:
+            fw.write("C4\t\t_C4\r\n")
+        with self.assertLogs(logger=self.test_logger):
+            self.vb = voicebank.VoiceBank(self.dirpath, logger=self.test_logger)
+
+    def tearDown(self):
+        if os.path.isdir(os.path.join("testdata")):
+            shutil.rmtree(os.path.join("testdata"))
+
+    def test_resolve(self):
+        self.assertEqual(self.vb.resolve_alias("あ", 60), ("あ_C4", os.path.join("subdir", "a_C4.wav")))
+        self.assertEqual(self.vb.resolve_alias("あ", 61), ("あ", "a.wav"))
+        self.assertEqual(self.vb.resolve_alias("あ", 60, True), ("あ", "a.wav"))
+        self.assertEqual(self.vb.resolve_alias("い", 60), ("", ""))
+        self.assertEqual((self.vb.alias_hits, self.vb.alias_misses), (0, 4))
+
+    def test_hits(self):
+        for i in range(3):
+            self.vb.resolve_alias("あ", 60)
+            self.vb.resolve_alias("あ", 60 + i, True)
+        self.assertEqual((self.vb.alias_hits, self.vb.alias_misses), (4, 2))
+
+    def test_precompute(self):
+        self.vb.precompute_aliases(["あ", "い"])
+        self.assertEqual(len(self.vb._aliases), 2 * 85)
+        self.assertEqual(self.vb.resolve_alias("あ", 60), ("あ_C4", os.path.join("subdir", "a_C4.wav")))
+        self.assertEqual(self.vb.resolve_alias("い", 107, True), ("", ""))
+        self.assertEqual((self.vb.alias_hits, self.vb.alias_misses), (2, 0))
+
+    def test_oto_reload(self):
+        self.assertEqual(self.vb.resolve_alias("い", 60), ("", ""))
+        with open(os.path.join(self.dirpath, "oto.ini"), "a", encoding="cp932") as fw:
+            fw.write("i.wav=い,100,900,-1000,300,100\r\n")
+        self.vb.oto.load(self.dirpath)
+        self.assertEqual(self.vb.resolve_alias("い", 60), ("い", "i.wav"))
+        self.assertEqual((self.vb.alias_hits, self.vb.alias_misses), (0, 2))
+
+    def test_prefix_reload(self):
+        self.assertEqual(self.vb.resolve_alias("あ", 61), ("あ", "a.wav"))
+        with open(os.path.join(self.dirpath, "prefix.map"), "w", encoding="cp932") as fw:
+            fw.write("C#4\t\t_C4\r\n")
+        self.vb.prefix.load(self.dirpath)
+        self.assertEqual(self.vb.resolve_alias("あ", 61), ("あ_C4", os.path.join("subdir", "a_C4.wav")))
+
+    def test_clear_aliases(self):
+        self.vb.resolve_alias("あ", 60)
+        self.vb.clear_aliases()
+        self.vb.resolve_alias("あ", 60)
+        self.assertEqual((self.vb.alias_hits, self.vb.alias_misses), (0, 2))
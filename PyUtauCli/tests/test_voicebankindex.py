@@ -0,0 +1,138 @@
+﻿'''
+voicebank.indexモジュールのテスト
+'''
+
+import unittest
+
+import os
+import os.path
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import voicebank
+import voicebank.index
+import settings.logger
+
+
+class TestVoiceBankIndex(unittest.TestCase):
+    def setUp(self):
+        self.test_logger = settings.logger.get_logger("TEST", True)
+        self.dirpath = os.path.join("testdata", "vb")
+        os.makedirs(os.path.join(self.dirpath, "sub"), exist_ok=True)
+        with open(os.path.join(self.dirpath, "character.txt"), "w", encoding="cp932") as fw:
+            fw.write("name=テスト\r\nauthor=foo\r\n")
+        with open(os.path.join(self.dirpath, "prefix.map"), "w", encoding="cp932") as fw:
+            fw.write("C4\t\t↑\r\n")
+        with open(os.path.join(self.dirpath, "oto.ini"), "w", encoding="cp932") as fw:
+            fw.write("あ.wav=- あ,100,200,-500,50,20\r\nあ.wav=あ↑,300,200,-500,50,20\r\n")
+        with open(os.path.join(self.dirpath, "sub", "oto.ini"), "w", encoding="cp932") as fw:
+            fw.write("か.wav=- か,100,200,-500,50,20\r\nか.wav=,300,200,-500,50,20\r\n")
+
+    def tearDown(self):
+        if os.path.isdir(os.path.join("testdata")):
+            shutil.rmtree(os.path.join("testdata"))
+
+    def _load(self) -> voicebank.VoiceBank:
+        with self.assertLogs(logger=self.test_logger):
+            return voicebank.VoiceBank(self.dirpath, logger=self.test_logger, use_index=True)
+
+    def test_build_and_load(self):
+        '''
+        2回目以降はインデックスから読み込み、解析した場合と同じ値を返す
+        '''
+        parsed = self._load()
+        self.assertNotIsInstance(parsed.oto, voicebank.index.IndexedOto)
+        self.assertTrue(os.path.isfile(os.path.join(self.dirpath, voicebank.index.VoiceBankIndex.INDEX_NAME)))
+        indexed = self._load()
+        self.assertIsInstance(indexed.oto, voicebank.index.IndexedOto)
+        self.assertEqual(indexed.character.name, "テスト")
+        self.assertEqual(indexed.character.author, "foo")
+        self.assertEqual(indexed.prefix[60].suffix, "↑")
+        self.assertEqual(indexed.prefix["C4"].key, "C4")
+        self.assertEqual(indexed.oto.files(), parsed.oto.files())
+        self.assertEqual(indexed.oto.records(), parsed.oto.records())
+        for alias in ["- あ", "あ↑", "あ", "- か", os.path.join("sub", "か")]:
+            self.assertTrue(indexed.oto.haskey(alias))
+            self.assertEqual(vars(indexed.oto[alias]), vars(parsed.oto[alias]))
+        self.assertFalse(indexed.oto.haskey("さ"))
+        with self.assertRaises(KeyError):
+            indexed.oto["さ"]
+
+    def test_shared_record(self):
+        '''
+        同じ行を指すaliasは同じOtoRecordを返す
+        '''
+        self._load()
+        indexed = self._load()
+        self.assertIs(indexed.oto["- あ"], indexed.oto["あ"])
+        self.assertIsNot(indexed.oto["- あ"], indexed.oto["あ↑"])
+
+    def test_close(self):
+        '''
+        closeでインデックスへの接続を閉じ、その後に参照した場合は開き直す
+        '''
+        self._load()
+        with self._load() as indexed:
+            self.assertTrue(indexed.oto.haskey("- あ"))
+        self.assertIsNone(indexed.oto._conn)
+        self.assertTrue(indexed.oto.haskey("- か"))
+        self.assertIsNotNone(indexed.oto._conn)
+        indexed.close()
+        indexed.close()
+        self.assertIsNone(indexed.oto._conn)
+        # インデックスを使用しない場合も呼び出せる
+        self._load().close()
+
+    def test_threads(self):
+        '''
+        複数のスレッドから同時に参照できる
+        '''
+        self._load()
+        indexed = self._load()
+        aliases = ["- あ", "あ↑", "あ", "- か", os.path.join("sub", "か"), "さ"] * 20
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            result = list(executor.map(indexed.oto.haskey, aliases))
+        self.assertEqual(result, [alias != "さ" for alias in aliases])
+        indexed.close()
+
+    def test_invalidate_on_edit(self):
+        '''
+        oto.iniを書き換えるとインデックスを作り直す
+        '''
+        self._load()
+        index = voicebank.index.VoiceBankIndex(self.dirpath, logger=self.test_logger)
+        self.assertTrue(index.is_valid())
+        time.sleep(0.01)
+        with open(os.path.join(self.dirpath, "sub", "oto.ini"), "a", encoding="cp932") as fw:
+            fw.write("さ.wav=- さ,100,200,-500,50,20\r\n")
+        self.assertFalse(index.is_valid())
+        index.close()
+        reparsed = self._load()
+        self.assertNotIsInstance(reparsed.oto, voicebank.index.IndexedOto)
+        indexed = self._load()
+        self.assertTrue(indexed.oto.haskey("- さ"))
+
+    def test_invalidate_on_new_dir(self):
+        '''
+        oto.iniを含むフォルダを追加するとインデックスを作り直す
+        '''
+        self._load()
+        os.makedirs(os.path.join(self.dirpath, "new"))
+        index = voicebank.index.VoiceBankIndex(self.dirpath, logger=self.test_logger)
+        self.assertFalse(index.is_valid())
+        index.close()
+
+    def test_index_path(self):
+        '''
+        インデックスを音源フォルダ以外に保存できる
+        '''
+        parsed = self._load()
+        path = os.path.join("testdata", "index.sqlite3")
+        index = voicebank.index.VoiceBankIndex(self.dirpath, path=path, logger=self.test_logger)
+        self.assertFalse(index.is_valid())
+        with self.assertLogs(logger=self.test_logger):
+            index.build(parsed.character, parsed.oto, parsed.prefix)
+        self.assertTrue(index.is_valid())
+        self.assertEqual(index.load_oto()["- か"].filename, "か.wav")
+        index.close()
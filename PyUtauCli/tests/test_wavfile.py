@@ -0,0 +1,166 @@
+﻿'''
+common.wavfileモジュールのテスト
+'''
+
+import unittest
+
+import os
+import os.path
+import shutil
+import struct
+import wave
+
+import numpy as np
+
+import common.wavfile
+
+
+def _write_pcm(path: str, samples: np.ndarray, sampwidth: int, channels: int = 1):
+    '''
+    samplesは(フレーム数 * チャンネル数)の整数の配列。8bitは符号なし
+    '''
+    os.makedirs(os.path.split(path)[0], exist_ok=True)
+    if sampwidth == 3:
+        raw: bytes = samples.astype("<i4").view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    else:
+        raw: bytes = samples.astype({1: np.uint8, 2: "<i2", 4: "<i4"}[sampwidth]).tobytes()
+    with wave.open(path, "wb") as ww:
+        ww.setnchannels(channels)
+        ww.setsampwidth(sampwidth)
+        ww.setframerate(44100)
+        ww.writeframes(raw)
+
+
+def _write_chunks(path: str, chunks: list):
+    os.makedirs(os.path.split(path)[0], exist_ok=True)
+    body: bytes = b"WAVE"
+    for chunk_id, data in chunks:
+        body += chunk_id + struct.pack("<I", len(data)) + data + (b"\0" if len(data) % 2 else b"")
+    with open(path, "wb") as fw:
+        fw.write(b"RIFF" + struct.pack("<I", len(body)) + body)
+
+
+def _fmt(format_tag: int, channels: int, bits: int) -> bytes:
+    blockalign: int = channels * bits // 8
+    return struct.pack("<HHIIHH", format_tag, channels, 44100, 44100 * blockalign, blockalign, bits)
+
+
+class TestWavFile(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join("testdata", "a.wav")
+        self.samples = np.random.RandomState(0)
+
+    def tearDown(self):
+        if os.path.isdir(os.path.join("testdata")):
+            shutil.rmtree(os.path.join("testdata"))
+
+    def test_pcm(self):
+        for sampwidth, low, high in [(1, 0, 256), (2, -2 ** 15, 2 ** 15), (3, -2 ** 23, 2 ** 23), (4, -2 ** 31, 2 ** 31)]:
+            with self.subTest(sampwidth=sampwidth):
+                samples: np.ndarray = self.samples.randint(low, high, 1000, dtype=np.int64)
+                samples[:2] = [low, high - 1]
+                _write_pcm(self.path, samples, sampwidth)
+                with common.wavfile.WavFile(self.path) as wav:
+                    self.assertEqual((wav.channels, wav.framerate, wav.sampwidth, wav.nframes), (1, 44100, sampwidth, 1000))
+                    np.testing.assert_array_equal(wav.frames()[:, 0], samples)
+                    if sampwidth == 1:
+                        np.testing.assert_array_equal(wav.read(), (samples - 128) / 128)
+                    else:
+                        np.testing.assert_array_equal(wav.read(), samples / 2 ** (sampwidth * 8 - 1))
+
+    def test_zero_copy(self):
+        '''
+        24bit以外はメモリマップを直接参照する読み取り専用の配列を返す
+        '''
+        _write_pcm(self.path, np.arange(100), 2)
+        wav = common.wavfile.WavFile(self.path)
+        frames: np.ndarray = wav.frames(10, 20)
+        self.assertFalse(frames.flags.owndata)
+        self.assertFalse(frames.flags.writeable)
+        self.assertTrue(np.shares_memory(frames, np.frombuffer(wav._mm, dtype=np.uint8)))
+        np.testing.assert_array_equal(frames[:, 0], np.arange(10, 20))
+        wav.close()
+        # 配列が残っていても閉じられ、配列は参照できる
+        np.testing.assert_array_equal(frames[:, 0], np.arange(10, 20))
+
+    def test_stereo(self):
+        samples: np.ndarray = np.arange(-100, 100)
+        for sampwidth in [2, 3]:
+            with self.subTest(sampwidth=sampwidth):
+                _write_pcm(self.path, samples, sampwidth, 2)
+                with common.wavfile.WavFile(self.path) as wav:
+                    self.assertEqual(wav.nframes, 100)
+                    np.testing.assert_array_equal(wav.frames(), samples.reshape(-1, 2))
+                    np.testing.assert_array_equal(wav.read(channel=1), samples[1::2] / 2 ** (sampwidth * 8 - 1))
+
+    def test_range(self):
+        '''
+        範囲はファイルの長さに切り詰める
+        '''
+        samples: np.ndarray = np.arange(-50, 50) * 300
+        for sampwidth in [2, 3]:
+            with self.subTest(sampwidth=sampwidth):
+                _write_pcm(self.path, samples, sampwidth)
+                with common.wavfile.WavFile(self.path) as wav:
+                    np.testing.assert_array_equal(wav.frames(10, 20)[:, 0], samples[10:20])
+                    np.testing.assert_array_equal(wav.frames(90, 200)[:, 0], samples[90:])
+                    np.testing.assert_array_equal(wav.frames(-5, 3)[:, 0], samples[:3])
+                    self.assertEqual(wav.frames(50, 40).shape, (0, 1))
+                    self.assertEqual(wav.frames(200).shape, (0, 1))
+
+    def test_float(self):
+        samples: np.ndarray = np.linspace(-1, 1, 50).astype("<f4")
+        _write_chunks(self.path, [(b"fmt ", _fmt(common.wavfile.WAVE_FORMAT_IEEE_FLOAT, 1, 32)),
+                                  (b"data", samples.tobytes())])
+        with common.wavfile.WavFile(self.path) as wav:
+            self.assertEqual(wav.frames().dtype, np.dtype("<f4"))
+            np.testing.assert_array_equal(wav.read(), samples.astype(np.float64))
+
+    def test_chunks(self):
+        '''
+        未知のチャンクや奇数長のパディングを読み飛ばし、WAVE_FORMAT_EXTENSIBLEのサブフォーマットを使用する
+        '''
+        samples: np.ndarray = np.arange(-30, 30) * 100000
+        fmt: bytes = (_fmt(common.wavfile.WAVE_FORMAT_EXTENSIBLE, 1, 24) + struct.pack("<HHI", 22, 24, 4)
+                      + struct.pack("<H", common.wavfile.WAVE_FORMAT_PCM) + b"\0" * 14)
+        _write_chunks(self.path, [(b"LIST", b"INFOabc"), (b"fmt ", fmt),
+                                  (b"data", samples.astype("<i4").view(np.uint8).reshape(-1, 4)[:, :3].tobytes())])
+        with common.wavfile.WavFile(self.path) as wav:
+            self.assertEqual((wav.format, wav.sampwidth, wav.nframes), (common.wavfile.WAVE_FORMAT_PCM, 3, 60))
+            np.testing.assert_array_equal(wav.frames()[:, 0], samples)
+
+    def test_truncated(self):
+        '''
+        dataチャンクがファイルの末尾を越える場合、ファイルの末尾までを読む
+        '''
+        _write_pcm(self.path, np.arange(100), 2)
+        with open(self.path, "r+b") as fw:
+            fw.truncate(os.path.getsize(self.path) - 21)
+        with common.wavfile.WavFile(self.path) as wav:
+            self.assertEqual(wav.nframes, 89)
+
+    def test_file_not_found(self):
+        with self.assertRaises(FileNotFoundError):
+            common.wavfile.WavFile(self.path)
+
+    def test_wave_error(self):
+        for name, chunks in [("not_riff", None),
+                             ("no_data", [(b"fmt ", _fmt(common.wavfile.WAVE_FORMAT_PCM, 1, 16))]),
+                             ("no_fmt", [(b"data", b"\0\0")]),
+                             ("unknown", [(b"fmt ", _fmt(0x0055, 1, 16)), (b"data", b"\0\0")]),
+                             ("float24", [(b"fmt ", _fmt(common.wavfile.WAVE_FORMAT_IEEE_FLOAT, 1, 24)), (b"data", b"\0\0\0")])]:
+            with self.subTest(name=name):
+                if chunks is None:
+                    os.makedirs("testdata", exist_ok=True)
+                    with open(self.path, "wb") as fw:
+                        fw.write(b"broken")
+                else:
+                    _write_chunks(self.path, chunks)
+                with self.assertRaises(wave.Error):
+                    common.wavfile.WavFile(self.path)
+
+    def test_read(self):
+        _write_pcm(self.path, np.arange(100) * 100, 2)
+        data, framerate = common.wavfile.read(self.path, 10, 20)
+        self.assertEqual(framerate, 44100)
+        np.testing.assert_array_equal(data, np.arange(10, 20) * 100 / 2 ** 15)
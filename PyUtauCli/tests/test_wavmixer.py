@@ -0,0 +1,184 @@
+﻿'''
+projects.WavMixerモジュールのテスト
+'''
+
+import unittest
+
+import os
+import os.path
+import shutil
+import wave
+
+import numpy as np
+import PyWavTool
+
+import projects.WavMixer
+
+
+def _write_wav(path: str, data: np.ndarray, sampwidth: int = 2, channels: int = 1):
+    with wave.open(path, "wb") as ww:
+        ww.setnchannels(channels)
+        ww.setsampwidth(sampwidth)
+        ww.setframerate(44100)
+        ww.writeframes(data.tobytes())
+
+
+def _read_wav(path: str) -> bytes:
+    with open(path, "rb") as fr:
+        return fr.read()
+
+
+class TestWavMixer(unittest.TestCase):
+    def setUp(self):
+        os.makedirs("testdata", exist_ok=True)
+        t = np.arange(44100) / 44100
+        self.wav1 = os.path.join("testdata", "a.wav")
+        self.wav2 = os.path.join("testdata", "b.wav")
+        _write_wav(self.wav1, (0.5 * np.sin(2 * np.pi * 220 * t) * 32767).astype("<i2"))
+        _write_wav(self.wav2, (0.5 * np.sin(2 * np.pi * 330 * t) * 32767).astype("<i2"))
+        self.params = [(self.wav1, [0, 5, 35, 0, 100, 100, 0], 0, 500),
+                       (self.wav2, [10, 20, 30, 50, 100, 80, 20, 25.5], 100, 400),
+                       (os.path.join("testdata", "notfound.wav"), [0, 5, 35, 0, 100, 100, 0, 10], 0, 200),
+                       (self.wav1, [10, 20, 30, 50, 100, 80, 20, 30, 15], 33.3, 600),
+                       (self.wav2, [10, 20, 30, 50, 100, 80, 20, 30, 15, 40, 70], 0, 300),
+                       (self.wav1, [0, 0], 0, 100),
+                       (self.wav1, [10, 20, 30, 50, 100, 80, 20, 50], 900, 300)]
+
+    def tearDown(self):
+        if os.path.isdir(os.path.join("testdata")):
+            shutil.rmtree(os.path.join("testdata"))
+
+    def _wavtool(self, output: str):
+        wavtool = PyWavTool.WavTool(output)
+        for input_path, envelope, stp, length in self.params:
+            wavtool.inputCheck(input_path)
+            wavtool.setEnvelope(envelope)
+            wavtool.applyData(stp, length)
+        wavtool.write()
+        with open(output, "wb") as fw:
+            fw.write(_read_wav(output + ".whd"))
+            fw.write(_read_wav(output + ".dat"))
+
+    def test_same_as_wavtool(self):
+        '''
+        PyWavToolと同じ出力が得られる
+        '''
+        self._wavtool(os.path.join("testdata", "wavtool.wav"))
+        mixer = projects.WavMixer.WavMixer(os.path.join("testdata", "mixer.wav"), 2400)
+        for input_path, envelope, stp, length in self.params:
+            mixer.inputCheck(input_path)
+            mixer.setEnvelope(envelope)
+            mixer.applyData(stp, length)
+        mixer.write()
+        self.assertEqual(_read_wav(os.path.join("testdata", "mixer.wav")),
+                         _read_wav(os.path.join("testdata", "wavtool.wav")))
+        self.assertFalse(os.path.isfile(os.path.join("testdata", "mixer.wav.whd")))
+        self.assertFalse(os.path.isfile(os.path.join("testdata", "mixer.wav.dat")))
+
+    def test_buffer_grow(self):
+        '''
+        事前に確保した長さを超えても合成できる
+        '''
+        mixer = projects.WavMixer.WavMixer(os.path.join("testdata", "mixer.wav"), 10)
+        mixer.inputCheck(self.wav1)
+        mixer.setEnvelope([0, 5, 35, 0, 100, 100, 0])
+        start, nframes = mixer.applyData(0, 500)
+        self.assertEqual((start, nframes), (0, 22050))
+        mixer.setEnvelope([0, 5, 35, 0, 100, 100, 0, 100])
+        start, nframes = mixer.applyData(0, 500)
+        self.assertEqual((start, nframes), (22050 - 4410, 22050))
+        self.assertEqual(mixer.nframes, 44100 - 4410)
+
+    def test_clip(self):
+        '''
+        オーバーラップで最大値を超えた場合はクリップする
+        '''
+        _write_wav(self.wav1, np.full(44100, 32767, dtype="<i2"))
+        mixer = projects.WavMixer.WavMixer(os.path.join("testdata", "mixer.wav"), 1000)
+        mixer.inputCheck(self.wav1)
+        mixer.setEnvelope([0, 0, 0, 100, 100, 100, 100, 0, 0])
+        mixer.applyData(0, 500)
+        mixer.setEnvelope([0, 0, 0, 100, 100, 100, 100, 500, 0])
+        mixer.applyData(0, 500)
+        data = mixer.get_data()
+        self.assertEqual(data.dtype, np.dtype("<i2"))
+        self.assertEqual(data[100], 32767)
+
+    def test_8bit(self):
+        '''
+        8bitのwavは符号なしとして読み込む
+        '''
+        _write_wav(self.wav2, np.array([0, 128, 255], dtype=np.uint8), 1)
+        mixer = projects.WavMixer.WavMixer(os.path.join("testdata", "mixer.wav"))
+        mixer.inputCheck(self.wav2)
+        self.assertFalse(mixer.error)
+        self.assertEqual(mixer._data.tolist(), [-1, 0, 127 / 128])
+
+    def test_error_envelope(self):
+        '''
+        エンベロープが不正な場合は無音を追加する
+        '''
+        mixer = projects.WavMixer.WavMixer(os.path.join("testdata", "mixer.wav"))
+        mixer.inputCheck(self.wav1)
+        mixer.setEnvelope([0, 5, 35])
+        self.assertTrue(mixer.error)
+        mixer.applyData(0, 100)
+        self.assertEqual(mixer.nframes, 4410)
+        self.assertTrue((mixer.get_data() == 0).all())
+
+    def test_remix(self):
+        '''
+        makeDataで作った波形を合成し直すと、applyDataで順に追記した場合と同じ出力が得られる
+        '''
+        mixer = projects.WavMixer.WavMixer(os.path.join("testdata", "mixer.wav"), 2400)
+        segments = []
+        for input_path, envelope, stp, length in self.params:
+            mixer.inputCheck(input_path)
+            mixer.setEnvelope(envelope)
+            data = mixer.makeData(stp, length)
+            expected_start = projects.WavMixer.WavMixer.getStart(mixer.nframes, mixer.getOverlap(), data.shape[0])
+            start, nframes = mixer.applyData(stp, length)
+            self.assertEqual((start, nframes), (expected_start, data.shape[0]))
+            segments.append((start, data))
+        expected = mixer.get_data().copy()
+        mixer.remix(10000, 60000, segments)
+        np.testing.assert_array_equal(mixer.get_data(), expected)
+        mixer.resize(mixer.nframes)
+        mixer.remix(0, mixer.nframes, segments)
+        np.testing.assert_array_equal(mixer.get_data(), expected)
+
+    def test_resize(self):
+        mixer = projects.WavMixer.WavMixer(os.path.join("testdata", "mixer.wav"))
+        mixer.inputCheck(self.wav1)
+        mixer.setEnvelope([0, 0])
+        mixer.applyData(0, 100)
+        mixer.resize(100)
+        self.assertEqual(mixer.nframes, 100)
+        mixer.resize(200)
+        self.assertEqual(mixer.nframes, 200)
+        self.assertEqual(mixer.get_data().shape[0], 200)
+
+    def test_patch(self):
+        '''
+        長さが同じ場合は指定した範囲だけを書き換え、異なる場合は全体を書き込む
+        '''
+        output = os.path.join("testdata", "mixer.wav")
+        mixer = projects.WavMixer.WavMixer(output)
+        mixer.inputCheck(self.wav1)
+        mixer.setEnvelope([0, 5, 35, 0, 100, 100, 0])
+        mixer.patch(0, 0)
+        self.assertEqual(os.path.getsize(output), 44)
+        data = mixer.makeData(0, 100)
+        mixer.resize(data.shape[0])
+        mixer.remix(0, data.shape[0], [(0, data)])
+        mixer.patch(0, 10)
+        self.assertEqual(os.path.getsize(output), 44 + 4410 * 2)
+        with open(output, "r+b") as fw:
+            fw.seek(44)
+            fw.write(bytes(4410 * 2))
+        mixer.patch(100, 200)
+        with wave.open(output, "rb") as wr:
+            result = np.frombuffer(wr.readframes(wr.getnframes()), dtype="<i2")
+        np.testing.assert_array_equal(result[100:200], mixer.get_data()[100:200])
+        np.testing.assert_array_equal(result[:100], np.zeros(100))
+        np.testing.assert_array_equal(result[200:], np.zeros(4410 - 200))
@@ -0,0 +1,42 @@
+﻿'''
+テストで使用するwavファイルを作成します。
+'''
+
+import os
+import os.path
+import wave
+
+import numpy as np
+
+
+def write_wav(path: str, frequency: float = 220, seconds: float = 0.3, harmonics: int = 5, amplitude: float = 0.2):
+    '''
+    | frequencyを基本周波数とし、harmonics次までの倍音を含む44100Hz、16bit、モノラルのwavを作成します。
+    | k次の倍音の振幅は、基本周波数の振幅の1/kです。
+
+    Parameters
+    ----------
+    path: str
+        作成するwavのパス。フォルダが存在しない場合は作成します。
+
+    frequency: float, default 220
+        基本周波数
+
+    seconds: float, default 0.3
+        wavの長さ(秒)
+
+    harmonics: int, default 5
+        含める倍音の次数
+
+    amplitude: float, default 0.2
+        最大1とした基本周波数の振幅
+    '''
+    if os.path.split(path)[0] != "":
+        os.makedirs(os.path.split(path)[0], exist_ok=True)
+    t: np.ndarray = np.arange(int(44100 * seconds)) / 44100
+    data: np.ndarray = sum([np.sin(2 * np.pi * frequency * k * t) / k for k in range(1, harmonics + 1)]) * amplitude
+    with wave.open(path, "wb") as ww:
+        ww.setnchannels(1)
+        ww.setsampwidth(2)
+        ww.setframerate(44100)
+        ww.writeframes((data * 32767).astype("<i2").tobytes())
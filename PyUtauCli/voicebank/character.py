@@ -1,5 +1,7 @@
 ﻿import os.path
 
+import common.textfile as textfile
+
 
 class Character:
     '''Character.txtを扱います
@@ -26,6 +28,10 @@ class Character:
 
     dirpath: str, default ""
         音源のルートのパス
+
+    encoding: str, default ""
+        | 読み込んだcharacter.txtのデコードに使用した文字コード。
+        | common.textfile.decodeの返す名前です。
     '''
     _name: str = ""
     image: str = ""
@@ -34,6 +40,7 @@ class Character:
     web: str = ""
     version: str = ""
     dirpath: str = ""
+    encoding: str = ""
 
     @property
     def name(self) -> str:
@@ -60,7 +67,7 @@ class Character:
         FileNotFoundError
             read実行時character.txtが見つからなかった場合
         UnicodeDecodeError
-            read実行時ファイルがcp932でも環境の文字コードでもなかった場合
+            read実行時ファイルがutf-8でもcp932でもなかった場合
         '''
         if dirpath != "":
             self.load(dirpath)
@@ -79,7 +86,7 @@ class Character:
         FileNotFoundError
             character.txtが見つからなかった場合
         UnicodeDecodeError
-            ファイルがcp932でも環境の文字コードでもなかった場合
+            ファイルがutf-8でもcp932でもなかった場合
         '''
         filepath: str = os.path.join(dirpath, "character.txt")
         lines: list
@@ -88,15 +95,10 @@ class Character:
             raise FileNotFoundError("{} is not found.".format(filepath))
 
         try:
-            with open(filepath, "r") as fr:
-                lines = fr.read().replace("\r", "").split("\n")
-        except:
-            try:
-                with open(filepath, "r", encoding="cp932") as fr:
-                    lines = fr.read().replace("\r", "").split("\n")
-            except UnicodeDecodeError as e:
-                e.reason = "can't read character.txt. because required character encoding is system default or cp932"
-                raise e
+            lines, self.encoding = textfile.read_lines(filepath)
+        except UnicodeDecodeError as e:
+            e.reason = "can't read character.txt. because required character encoding is utf-8 or cp932"
+            raise e
         key: str
         value: str
         for line in lines:
@@ -7,13 +7,23 @@ frq関係のデータを扱います。
 import os
 import os.path
 import struct
-import wave
 from typing import Tuple
 
 
 import numpy as np
 import pyworld as pw
 
+import common.wavfile as wavfile
+
+
+F0_METHODS: list = ["harvest", "dio", "fast"]
+'''
+| Frq.makeで選択できるf0の推定方法。
+| harvest: pw.harvestとpw.stonemask。最も遅いが、有声/無声の判定とf0が最も安定します。
+| dio: pw.dioとpw.stonemask。harvestの5～6倍程度高速ですが、子音の前後や雑音の多い録音で有声のフレームを無声と判定しやすくなります。
+| fast: pw.dioを4倍に間引いて実行し、stonemaskを省略します。harvestの数十倍高速ですが、f0の誤差が数cent程度大きくなります。音源の一括生成やプレビュー用です。
+'''
+
 
 class Frq:
     '''
@@ -106,7 +116,7 @@ class Frq:
             fw.write(self.f0.shape[0].to_bytes(4, "little"))
             fw.write(np.concatenate([[self.f0], [self.amp]]).T.tobytes())
 
-    def make(self, wavpath: str):
+    def make(self, wavpath: str, f0_method: str = "harvest"):
         '''
         wavpathで指定したwavファイルを解析し、self.frqpath, self.framerate, self.f0, self.f0_avg, self.amp, self.tを更新します。
 
@@ -115,20 +125,84 @@ class Frq:
         wavpath: str
             wavファイルの絶対パス
 
+        f0_method: str, default "harvest"
+            f0の推定方法。F0_METHODSのいずれか
+
         Raises
         ------
         FileNotFoundError
             wavpathのwavファイルが見つからなかったとき
         wave.Error
             input_pathで指定したファイルがwavではなかったとき
+        ValueError
+            f0_methodがF0_METHODSのいずれでもないとき
         '''
+        if f0_method not in F0_METHODS:
+            raise ValueError("{} is not f0 method. use one of {}".format(f0_method, F0_METHODS))
         datas, self.framerate = self._wave_load(wavpath)
         self.frqpath = ".".join(wavpath.split(".")[:-1]) + "_wav.frq"
-        self.f0, self.t = pw.harvest(datas, self.framerate, frame_period=1000 / self.framerate * 256)
-        self.f0 = pw.stonemask(datas, self.f0, self.t, self.framerate)
-        self.amp = np.zeros_like(self.f0)
-        for i in range(self.amp.shape[0]):
-            self.amp[i] = np.average(np.abs(datas[i * 256:(i + 1) * 256]))
+        self.f0, self.t = self._estimate_f0(datas, self.framerate, f0_method)
+        voiced: np.ndarray = self.f0[self.f0 > 0]
+        self.f0_avg = float(np.average(voiced)) if voiced.shape[0] != 0 else 0.0
+        self.amp = self._get_amp(datas, self.f0.shape[0])
+
+    @staticmethod
+    def _estimate_f0(datas: np.ndarray, framerate: int, f0_method: str) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        256sample毎のf0を推定します。
+
+        Parameters
+        ----------
+        datas: np.ndarray of np.float64
+            waveのデータ。1次元
+
+        framerate: int
+            wavのサンプリング周波数
+
+        f0_method: str
+            f0の推定方法。F0_METHODSのいずれか
+
+        Returns
+        -------
+        f0: np.ndarray of np.float64
+
+        t: np.ndarray of np.float64
+            時間配列(秒)
+        '''
+        frame_period: float = 1000 / framerate * 256
+        if f0_method == "harvest":
+            f0, t = pw.harvest(datas, framerate, frame_period=frame_period)
+        elif f0_method == "dio":
+            f0, t = pw.dio(datas, framerate, frame_period=frame_period)
+        else:
+            return pw.dio(datas, framerate, frame_period=frame_period, speed=4)
+        return pw.stonemask(datas, f0, t, framerate), t
+
+    @staticmethod
+    def _get_amp(datas: np.ndarray, frames: int) -> np.ndarray:
+        '''
+        | 256sample毎の振幅の絶対値の平均を求めます。
+        | データの末尾を超えるフレームは、範囲内のsampleだけで平均し、sampleが1つもない場合は0とします。
+
+        Parameters
+        ----------
+        datas: np.ndarray of np.float64
+            waveのデータ。1次元
+
+        frames: int
+            フレーム数
+
+        Returns
+        -------
+        amp: np.ndarray of np.float64
+        '''
+        amp: np.ndarray = np.zeros(frames)
+        abs_datas: np.ndarray = np.abs(datas)
+        full_frames: int = min(frames, abs_datas.shape[0] // 256)
+        amp[:full_frames] = abs_datas[:full_frames * 256].reshape(full_frames, 256).mean(axis=1)
+        if full_frames < frames and full_frames * 256 < abs_datas.shape[0]:
+            amp[full_frames] = abs_datas[full_frames * 256:].mean()
+        return amp
 
     def _wave_load(self, input_path) -> Tuple[np.ndarray, int]:
         '''
@@ -154,26 +228,4 @@ class Frq:
             input_pathで指定したファイルがwavではなかったとき
         '''
 
-        if not os.path.exists(input_path):
-            raise FileNotFoundError("{} not found.".format(input_path))
-        with wave.open(input_path, "rb") as wr:
-            channels: int = wr.getnchannels()
-            framerate: int = wr.getframerate()
-            sampwidth: int = wr.getsampwidth()
-            nframes: int = wr.getnframes()  # フレーム数
-            bytes_data: byte = wr.readframes(nframes)
-
-        if sampwidth == 1:
-            data = np.frombuffer(bytes_data, dtype="int8")
-        elif sampwidth == 2:
-            data = np.frombuffer(bytes_data, dtype="int16")
-        elif sampwidth == 3:
-            data = np.zeros(int((end_frame - offset_frame)), dtype="int32")
-            for i in range(int(len(bytes_data) / sampwidth)):
-                data[i] = int.from_bytes(bytes_data[i * sampwidth:(i + 1) * sampwidth], "little", signed=True)
-        elif sampwidth == 4:
-            data = np.frombuffer(bytes_data, dtype="int32")
-        if channels == 2:
-            data = data[::2]
-
-        return data / 2**(sampwidth * 8 - 1), framerate
+        return wavfile.read(input_path)
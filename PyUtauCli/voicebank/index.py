@@ -0,0 +1,323 @@
+﻿'''index
+
+| 音源フォルダのcharacter.txt、oto.ini、prefix.mapを解析した結果を、音源フォルダ内のSQLiteファイルに保存します。
+| 元のファイルの更新日時とサイズが変わっていなければ、次回以降は解析せずに読み込みます。
+
+'''
+
+import os
+import os.path
+import sqlite3
+import threading
+from logging import Logger
+
+import settings.logger as mylogger
+from .character import Character
+from .prefixmap import PrefixMap, MapRecord
+from .oto import Oto, OtoRecord
+
+
+default_logger = mylogger.get_logger(__name__, False)
+
+CHARACTER_KEYS: list = ["name", "image", "sample", "author", "web", "version"]
+'''インデックスに保存するCharacterの属性'''
+
+
+def get_sources(dirpath: str) -> dict:
+    '''
+    | 音源フォルダの解析結果が最新か判定するために使用するファイルの、更新日時とサイズを返します。
+    | Oto.loadと同様、ルートと直下のフォルダのoto.iniを対象にします。
+    | インデックス自身の書き込みで更新日時が変わるため、フォルダの更新日時は使用せず、
+    | 存在しないファイルも含めてoto.iniのパスを列挙することでフォルダの追加と削除を検出します。
+
+    Parameters
+    ----------
+    dirpath: str
+        音源のルートパス
+
+    Returns
+    -------
+    sources: dict
+        音源フォルダからの相対パスをkeyとし、(更新日時(ns), サイズ)を値とする辞書。存在しないファイルは(-1, -1)
+    '''
+    sources: dict = {}
+    paths: list = ["character.txt", "prefix.map", "oto.ini"]
+    for filename in os.listdir(dirpath):
+        if os.path.isdir(os.path.join(dirpath, filename)):
+            paths.append(os.path.join(filename, "oto.ini"))
+    for path in paths:
+        try:
+            stat: os.stat_result = os.stat(os.path.join(dirpath, path))
+            sources[path] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            sources[path] = (-1, -1)
+    return sources
+
+
+class IndexedOto(Oto):
+    '''
+    | VoiceBankIndexからaliasを参照するたびに原音設定を読み込むOto。
+    | 1度読み込んだOtoRecordは保持し、同じaliasには同じOtoRecordを返します。
+
+    | 接続は複数のスレッドで共有するため、問い合わせはロックで保護します。
+    | closeした後に参照した場合は、インデックスを開き直します。
+    '''
+    _conn: sqlite3.Connection
+    _path: str
+    _rows: dict
+    _lock: threading.Lock
+
+    def __init__(self, conn: sqlite3.Connection, path: str):
+        '''
+        Parameters
+        ----------
+        conn: sqlite3.Connection
+            VoiceBankIndexのインデックスへの接続。以後はこのIndexedOtoが閉じます。
+
+        path: str
+            インデックスのパス。close後に開き直すために使用します。
+        '''
+        super().__init__()
+        self._conn = conn
+        self._path = path
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def _query(self, sql: str, parameters: tuple = ()) -> list:
+        '''
+        sqlを実行し、全ての行を返します。self._lockを取得して呼び出してください。
+
+        Parameters
+        ----------
+        sql: str
+
+        parameters: tuple, default ()
+
+        Returns
+        -------
+        rows: list of tuple
+        '''
+        if self._conn is None:
+            self._conn = sqlite3.connect(self._path, timeout=30, check_same_thread=False)
+        return self._conn.execute(sql, parameters).fetchall()
+
+    def close(self):
+        '''
+        インデックスへの接続を閉じます。
+        '''
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def files(self) -> int:
+        '''
+        読み込んだoto.iniファイルの数を返す
+
+        Return
+        ------
+        files: int
+        '''
+        with self._lock:
+            return int(self._query("SELECT value FROM meta WHERE key = 'oto.files'")[0][0])
+
+    def records(self) -> int:
+        '''
+        読み込んだoto.iniの合計行数を返す
+
+        Return
+        ------
+        records: int
+        '''
+        with self._lock:
+            return self._query("SELECT COUNT(*) FROM aliases")[0][0]
+
+    def get_records(self) -> list:
+        '''
+        インデックスに保存したoto.iniの全ての行を、ファイルごとに記載順に並べて返す
+
+        Return
+        ------
+        records: list of OtoRecord
+        '''
+        with self._lock:
+            rows: list = self._query("SELECT subdir, filename, alias, offset, pre, ove, consonant, blank "
+                                     "FROM records ORDER BY subdir, position")
+        return [OtoRecord(*row) for row in rows]
+
+    def __getitem__(self, key) -> OtoRecord:
+        if not self.haskey(key):
+            raise KeyError(key)
+        return self._values[key]
+
+    def haskey(self, key) -> bool:
+        if key in self._values:
+            return True
+        with self._lock:
+            if key in self._values:
+                return True
+            rows: list = self._query("SELECT records.subdir, records.position, records.filename, records.alias, records.offset, "
+                                     "records.pre, records.ove, records.consonant, records.blank "
+                                     "FROM aliases JOIN records ON aliases.subdir = records.subdir AND aliases.position = records.position "
+                                     "WHERE aliases.alias = ?", (key,))
+            if len(rows) == 0:
+                return False
+            row: tuple = rows[0]
+            # 同じ行を指す別のaliasと、同じOtoRecordを共有する
+            if row[:2] not in self._rows:
+                self._rows[row[:2]] = OtoRecord(row[0], *row[2:])
+            self._values[key] = self._rows[row[:2]]
+            return True
+
+
+class VoiceBankIndex:
+    '''
+    | 音源フォルダの解析結果を保存するSQLiteのインデックス。
+    | インデックスは元のファイルの更新日時とサイズを保持しており、いずれかが変わるとis_validがFalseになります。
+
+    Attributes
+    ----------
+    dirpath: str
+        音源のルートパス
+
+    path: str
+        インデックスのパス
+    '''
+    INDEX_NAME: str = "pyutaucli_index.sqlite3"
+    SCHEMA_VERSION: int = 1
+
+    _dirpath: str
+    _path: str
+    _conn: sqlite3.Connection
+
+    @property
+    def dirpath(self) -> str:
+        return self._dirpath
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def __init__(self, dirpath: str, *, path: str = "", logger: Logger = None):
+        '''
+        Parameters
+        ----------
+        dirpath: str
+            音源のルートパス
+
+        path: str, default ""
+            インデックスのパス。省略した場合は音源フォルダ内のINDEX_NAME
+
+        Raises
+        ------
+        sqlite3.Error
+            インデックスを開けなかったとき
+        '''
+        self.logger = logger or default_logger
+        self._dirpath = dirpath
+        self._path = path or os.path.join(dirpath, self.INDEX_NAME)
+        self._conn = sqlite3.connect(self._path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS sources (path TEXT PRIMARY KEY, mtime INTEGER NOT NULL, size INTEGER NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS records ("
+                               "subdir TEXT NOT NULL, position INTEGER NOT NULL, filename TEXT NOT NULL, alias TEXT NOT NULL, "
+                               "offset REAL NOT NULL, pre REAL NOT NULL, ove REAL NOT NULL, consonant REAL NOT NULL, blank REAL NOT NULL, "
+                               "PRIMARY KEY (subdir, position))")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS aliases ("
+                               "alias TEXT PRIMARY KEY, subdir TEXT NOT NULL, position INTEGER NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS prefix ("
+                               "notenum INTEGER PRIMARY KEY, key TEXT NOT NULL, prefix TEXT NOT NULL, suffix TEXT NOT NULL)")
+
+    def close(self):
+        '''
+        インデックスを閉じます。
+        '''
+        self._conn.close()
+
+    def is_valid(self) -> bool:
+        '''
+        インデックスが構築済みで、元のファイルから変更がないか判定します。
+
+        Returns
+        -------
+        is_valid: bool
+        '''
+        row: tuple = self._conn.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+        if row is None or row[0] != str(self.SCHEMA_VERSION):
+            return False
+        stored: dict = {path: (mtime, size) for path, mtime, size in self._conn.execute("SELECT path, mtime, size FROM sources")}
+        return stored == get_sources(self._dirpath)
+
+    def build(self, character: Character, oto: Oto, prefix: PrefixMap):
+        '''
+        解析済みのcharacter、oto、prefixでインデックスを作り直します。
+
+        Parameters
+        ----------
+        character: Character
+
+        oto: Oto
+
+        prefix: PrefixMap
+        '''
+        positions: dict = {}
+        records: list = []
+        for subdir, datas in oto._datas_by_file.items():
+            for i, record in enumerate(datas):
+                positions[id(record)] = (subdir, i)
+                records.append((subdir, i, record.filename, record.alias, record.offset, record.pre,
+                                record.ove, record.consonant, record.blank))
+        with self._conn:
+            for table in ["meta", "sources", "records", "aliases", "prefix"]:
+                self._conn.execute("DELETE FROM {}".format(table))
+            self._conn.executemany("INSERT INTO sources VALUES (?, ?, ?)",
+                                   [(path, mtime, size) for path, (mtime, size) in get_sources(self._dirpath).items()])
+            self._conn.executemany("INSERT INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", records)
+            self._conn.executemany("INSERT INTO aliases VALUES (?, ?, ?)",
+                                   [(alias,) + positions[id(record)] for alias, record in oto._values.items()])
+            self._conn.executemany("INSERT INTO prefix VALUES (?, ?, ?, ?)",
+                                   [(notenum, record.key, record.prefix, record.suffix) for notenum, record in prefix._values.items()])
+            self._conn.executemany("INSERT INTO meta VALUES (?, ?)",
+                                   [("character." + key, getattr(character, "_name" if key == "name" else key)) for key in CHARACTER_KEYS])
+            self._conn.execute("INSERT INTO meta VALUES ('oto.files', ?)", (str(oto.files()),))
+            self._conn.execute("INSERT INTO meta VALUES ('schema', ?)", (str(self.SCHEMA_VERSION),))
+        self.logger.info("{} is built.".format(self._path))
+
+    def load_character(self) -> Character:
+        '''
+        インデックスからCharacterを生成します。
+
+        Returns
+        -------
+        character: Character
+        '''
+        character: Character = Character()
+        character.dirpath = self._dirpath
+        for key, value in self._conn.execute("SELECT key, value FROM meta WHERE key LIKE 'character.%'"):
+            setattr(character, key[len("character."):], value)
+        return character
+
+    def load_oto(self) -> IndexedOto:
+        '''
+        | インデックスを参照するOtoを生成します。
+        | 接続はIndexedOtoに引き継ぐため、このVoiceBankIndexのcloseは呼ばないでください。
+
+        Returns
+        -------
+        oto: IndexedOto
+        '''
+        return IndexedOto(self._conn, self._path)
+
+    def load_prefix(self) -> PrefixMap:
+        '''
+        インデックスからPrefixMapを生成します。
+
+        Returns
+        -------
+        prefix: PrefixMap
+        '''
+        prefix: PrefixMap = PrefixMap()
+        for notenum, key, prefix_value, suffix in self._conn.execute("SELECT notenum, key, prefix, suffix FROM prefix"):
+            prefix._values[notenum] = MapRecord("\t".join([key, prefix_value, suffix]))
+        return prefix
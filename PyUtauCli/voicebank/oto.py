@@ -1,5 +1,10 @@
 ﻿import os.path
-import wave
+from typing import Tuple
+
+import numpy as np
+
+import common.textfile as textfile
+import common.wavfile as wavfile
 
 
 class OtoRecord:
@@ -93,19 +98,66 @@ class OtoRecord:
         '''
         if not os.path.isfile(os.path.join(dirpath, self.otopath, self.filename)):
             raise FileNotFoundError("{} is not found.".format(os.path.join(dirpath, self.otopath, self.filename)))
-        with wave.open(os.path.join(dirpath, self.otopath, self.filename), "rb") as wr:
-            wav_length = wr.getnframes() / wr.getframerate() * 1000
+        with wavfile.WavFile(os.path.join(dirpath, self.otopath, self.filename)) as wav:
+            wav_length = wav.length_ms
         if self.blank >= 0:
             self.blank = self.offset - (wav_length - self.blank)
         else:
             self.blank = wav_length - (self.offset - self.blank)
 
+    def read_wav(self, dirpath: str) -> Tuple[np.ndarray, int]:
+        '''
+        | wavファイルのうち、offsetからblankまでの区間だけを読み込みます。
+        | 区間外のサンプルはファイルから読み込みません。
+
+        Parameters
+        ----------
+        dirpath: str
+            音源のルートディレクトリのパス。
+
+        Returns
+        -------
+        data: np.ndarray of np.float64
+            最大1に正規化した区間のデータ。ステレオの場合、左チャンネルのみ
+        framerate: int
+            wavのサンプリング周波数
+
+        Raises
+        ------
+        FileNotFoundError
+            os.path.join(dirpath, self.otopath, self.filename)のwavファイルが見つからなかったとき
+        wave.Error
+            os.path.join(dirpath, self.otopath, self.filename)がwavファイルではなかったとき
+        '''
+        with wavfile.WavFile(os.path.join(dirpath, self.otopath, self.filename)) as wav:
+            if self.blank >= 0:
+                end_ms: float = wav.length_ms - self.blank
+            else:
+                end_ms: float = self.offset - self.blank
+            return wav.read(wav.ms_to_frame(self.offset), wav.ms_to_frame(end_ms)), wav.framerate
+
 
 class Oto:
     '''oto.iniのデータを扱います。
+
+    Attributes
+    ----------
+    revision: int
+        | aliasの追加や更新のたびに増える値。
+        | VoiceBankのエイリアスのキャッシュが、変更を検出するために使用します。
+
+    encodings: dict
+        | 音源ルートディレクトリからの相対パスをkeyとし、そのoto.iniのデコードに使用した文字コードを値とする辞書。
+        | common.textfile.decodeの返す名前です。
     '''
     _values: dict = {}
     _datas_by_file: dict = {}
+    _revision: int = 0
+    encodings: dict = {}
+
+    @property
+    def revision(self) -> int:
+        return self._revision
 
     def __init__(self, dirpath: str = ""):
         '''
@@ -124,6 +176,7 @@ class Oto:
 
         self._values = {}
         self._datas_by_file = {}
+        self.encodings = {}
         if dirpath != "":
             self.load(dirpath)
 
@@ -147,9 +200,26 @@ class Oto:
         '''
         return len(self._values)
 
+    def get_records(self) -> list:
+        '''
+        読み込んだoto.iniの全ての行を、ファイルごとに記載順に並べて返す
+
+        Return
+        ------
+        records: list of OtoRecord
+        '''
+        return [record for datas in self._datas_by_file.values() for record in datas]
+
     def __getitem__(self, key) -> OtoRecord:
         return self._values[key]
 
+    def close(self):
+        '''
+        | 参照中のファイルを閉じます。
+        | ファイルを開いたままにしないOtoでは何もしません。
+        '''
+        pass
+
     def haskey(self, key) -> bool:
         return key in self._values
 
@@ -200,7 +270,7 @@ class Oto:
 
         record: OtoRecord
         '''
-        
+        self._revision += 1
         if alias not in self._values:
             self._values[alias]=record
         elif record.filename == self._values[alias].filename and record.offset < self._values[alias].offset:
@@ -227,15 +297,10 @@ class Oto:
             ファイルがcp932でもutf-8でもなかった場合
         '''
         try:
-            with open(otopath, "r", encoding="cp932") as fr:
-                lines=fr.read().replace("\r", "").split("\n")
-        except:
-            try:
-                with open(otopath, "r", encoding="utf-8") as fr:
-                    lines=fr.read().replace("\r", "").split("\n")
-            except UnicodeDecodeError as e:
-                e.reason="can't read {}. because required character encoding is utf-8 or cp932".format(otopath)
-                raise e
+            lines, self.encodings[subdir] = textfile.read_lines(otopath)
+        except UnicodeDecodeError as e:
+            e.reason="can't read {}. because required character encoding is utf-8 or cp932".format(otopath)
+            raise e
         self._datas_by_file[subdir]=[]
         for line in lines:
             if line == "":
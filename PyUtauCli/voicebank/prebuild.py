@@ -0,0 +1,333 @@
+﻿'''prebuild
+
+| 音源のoto.iniが参照する全てのwavについて、frqファイルとresampが使用するworldの解析結果を事前に生成します。
+| 配置時に実行しておくことで、出力時に初回の解析を待たずに済みます。
+
+    >>> python -m voicebank.prebuild voicedir --features feature_cache --workers 0
+
+'''
+
+import os
+import os.path
+import sys
+import time
+import logging
+import argparse
+import traceback
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from logging import Logger
+from typing import Tuple
+
+import PyRwu
+
+import settings.logger as mylogger
+import common.wavfile as wavfile
+from .voicebank import VoiceBank
+from .frq import Frq, F0_METHODS
+from projects.FeatureCache import FeatureCache
+
+
+default_logger = mylogger.get_logger(__name__, False)
+
+
+class PrebuildReport:
+    '''
+    prebuildの処理結果
+
+    Attributes
+    ----------
+    files: int
+        oto.iniが参照するwavの数
+
+    built: int
+        frqもしくは解析結果を生成したwavの数
+
+    skipped: int
+        生成済みのため処理しなかったwavの数
+
+    failed: list of str
+        生成に失敗したwavのパス
+
+    frqs: int
+        生成したfrqファイルの数
+
+    features: int
+        生成した解析結果の数
+
+    audio_sec: float
+        生成したwavの合計の長さ(秒)
+
+    elapsed: float
+        処理にかかった時間(秒)
+    '''
+    files: int
+    built: int
+    skipped: int
+    failed: list
+    frqs: int
+    features: int
+    audio_sec: float
+    elapsed: float
+
+    def __init__(self):
+        self.files = 0
+        self.built = 0
+        self.skipped = 0
+        self.failed = []
+        self.frqs = 0
+        self.features = 0
+        self.audio_sec = 0
+        self.elapsed = 0
+
+    @property
+    def files_per_sec(self) -> float:
+        '''
+        1秒あたりに生成したwavの数
+        '''
+        return self.built / self.elapsed if self.elapsed > 0 else 0
+
+    @property
+    def audio_sec_per_sec(self) -> float:
+        '''
+        1秒あたりに生成したwavの長さ(秒)
+        '''
+        return self.audio_sec / self.elapsed if self.elapsed > 0 else 0
+
+
+def _null_logger() -> Logger:
+    logger: Logger = logging.Logger(__name__ + ".worker")
+    logger.addHandler(logging.NullHandler())
+    return logger
+
+
+def _is_frq_valid(wavpath: str) -> bool:
+    '''
+    wavpathのfrqファイルが存在し、wavより新しいか判定します。
+
+    Parameters
+    ----------
+    wavpath: str
+
+    Returns
+    -------
+    is_valid: bool
+    '''
+    frqpath: str = ".".join(wavpath.split(".")[:-1]) + "_wav.frq"
+    return os.path.isfile(frqpath) and os.path.getmtime(frqpath) >= os.path.getmtime(wavpath)
+
+
+def _get_audio_sec(wavpath: str) -> float:
+    with wavfile.WavFile(wavpath) as wav:
+        return wav.nframes / wav.framerate
+
+
+def _prebuild_wav(wavpath: str, build_frq: bool, windows: list, resamp_class: type, f0_method: str) -> Tuple[str, list]:
+    '''
+    | worker poolから呼び出され、1つのwavのfrqファイルと解析結果を生成する。
+    | 例外は呼び出し元に送らず、エラーメッセージとして返す。
+
+    Parameters
+    ----------
+    wavpath: str
+        wavのパス
+
+    build_frq: bool
+        Trueの場合、frqファイルを生成する。
+
+    windows: list of tuple
+        解析結果を生成する(offset, end_ms)のリスト
+
+    resamp_class: type
+        PyRwu.Resampもしくはその派生クラス
+
+    f0_method: str
+        frqファイルのf0の推定方法
+
+    Returns
+    -------
+    error: str
+        エラーメッセージ。正常終了した場合""
+
+    features: list of tuple
+        FeatureCache.storeに渡す(key, framerate, f0, sp, ap)のリスト
+    '''
+    features: list = []
+    try:
+        if build_frq:
+            frq: Frq = Frq()
+            frq.make(wavpath, f0_method)
+            frq.save()
+        for offset, end_ms in windows:
+            resamp: PyRwu.Resamp = resamp_class(wavpath, "", "C4", 100, "", offset, 0, 0, end_ms, logger=_null_logger())
+            resamp.getInputData()
+            features.append((FeatureCache.get_key(resamp), resamp._framerate, resamp._f0, resamp._sp, resamp._ap))
+    except Exception as e:
+        return traceback.format_exception_only(type(e), e)[0].rstrip('\n'), []
+    return "", features
+
+
+def _get_pool(workers: int, use_thread: bool) -> Executor:
+    if use_thread:
+        return ThreadPoolExecutor(max_workers=workers)
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def _get_tasks(vb: VoiceBank, feature_cache: FeatureCache = None, resamp_class: type = PyRwu.Resamp,
+               force: bool = False) -> Tuple[list, int]:
+    '''
+    vbのoto.iniが参照するwavのうち、frqファイルか解析結果の生成が必要なものを返します。
+
+    Parameters
+    ----------
+    vb: VoiceBank
+
+    feature_cache: FeatureCache, default None
+        解析結果の保存先。Noneの場合、frqファイルだけを対象にします。
+
+    resamp_class: type, default PyRwu.Resamp
+        解析結果を使用するresampler
+
+    force: bool, default False
+        Trueの場合、生成済みのものも対象にします。
+
+    Returns
+    -------
+    tasks: list of tuple
+        _prebuild_wavに渡す(wavpath, build_frq, windows)のリスト
+
+    files: int
+        oto.iniが参照する、存在するwavの数
+    '''
+    windows_by_wav: dict = {}
+    for record in vb.oto.get_records():
+        wavpath: str = os.path.join(vb.dirpath, record.otopath, record.filename)
+        if wavpath not in windows_by_wav:
+            windows_by_wav[wavpath] = []
+        if (record.offset, record.blank) not in windows_by_wav[wavpath]:
+            windows_by_wav[wavpath].append((record.offset, record.blank))
+
+    tasks: list = []
+    files: int = 0
+    for wavpath, windows in windows_by_wav.items():
+        if not os.path.isfile(wavpath):
+            continue
+        files += 1
+        build_frq: bool = force or not _is_frq_valid(wavpath)
+        if feature_cache is None:
+            windows = []
+        elif not build_frq:
+            # frqファイルを作り直さない場合、キーが変わらないため保存済みのものは除く
+            windows = [window for window in windows
+                       if FeatureCache.get_key(resamp_class(wavpath, "", "C4", 100, "", window[0], 0, 0, window[1],
+                                                            logger=_null_logger())) not in feature_cache]
+        if build_frq or len(windows) != 0:
+            tasks.append((wavpath, build_frq, windows))
+    return tasks, files
+
+
+def prebuild(vb: VoiceBank, *, feature_cache: FeatureCache = None, resamp_class: type = PyRwu.Resamp, force: bool = False,
+             workers: int = 0, use_thread: bool = False, f0_method: str = "harvest", logger: Logger = None) -> PrebuildReport:
+    '''
+    | vbのoto.iniが参照する全てのwavについて、frqファイルと解析結果を生成します。
+    | frqファイルがwavより新しく、解析結果がfeature_cacheにあるwavは処理しません。
+
+    Parameters
+    ----------
+    vb: VoiceBank
+
+    feature_cache: FeatureCache, default None
+        | 解析結果の保存先。Noneの場合、frqファイルだけを生成します。
+        | 出力時と同じrootを指定したFeatureCacheを使用してください。
+
+    resamp_class: type, default PyRwu.Resamp
+        解析結果を使用するresampler。FeatureCacheのキーに含まれるため、出力時と同じものを指定してください。
+
+    force: bool, default False
+        Trueの場合、生成済みのものも作り直す。
+
+    workers: int, default 0
+        | 並列に実行するworkerの数。
+        | 0の場合、os.cpu_count()の値を使用する。
+
+    use_thread: bool, default False
+        Trueの場合、ProcessPoolExecutorの代わりにThreadPoolExecutorを使用する。
+
+    f0_method: str, default "harvest"
+        | frqファイルのf0の推定方法。voicebank.frq.F0_METHODSのいずれか
+        | 速度と精度の違いはvoicebank.frq.F0_METHODSを参照してください。
+
+    Returns
+    -------
+    report: PrebuildReport
+
+    Raises
+    ------
+    ValueError
+        f0_methodがF0_METHODSのいずれでもないとき
+
+    Notes
+    -----
+    | windows環境でworkersに2以上を指定する場合、呼び出し元のスクリプトを if __name__ == "__main__": で保護してください。
+    '''
+    logger = logger or default_logger
+    if f0_method not in F0_METHODS:
+        raise ValueError("{} is not f0 method. use one of {}".format(f0_method, F0_METHODS))
+    report: PrebuildReport = PrebuildReport()
+    start: float = time.perf_counter()
+    tasks, report.files = _get_tasks(vb, feature_cache, resamp_class, force)
+    report.skipped = report.files - len(tasks)
+    logger.info("prebuild {} / {} files".format(len(tasks), report.files))
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    if len(tasks) != 0:
+        with _get_pool(min(workers, len(tasks)), use_thread) as executor:
+            futures: list = [executor.submit(_prebuild_wav, *task, resamp_class, f0_method) for task in tasks]
+            for (wavpath, build_frq, windows), future in zip(tasks, futures):
+                try:
+                    error, features = future.result()
+                except Exception as e:
+                    error, features = traceback.format_exception_only(type(e), e)[0].rstrip('\n'), []
+                if error != "":
+                    logger.error("{} can't prebuild. because {}".format(wavpath, error))
+                    report.failed.append(wavpath)
+                    continue
+                for feature in features:
+                    feature_cache.store(*feature)
+                report.built += 1
+                report.frqs += int(build_frq)
+                report.features += len(features)
+                report.audio_sec += _get_audio_sec(wavpath)
+                logger.debug("{} is built. frq:{} features:{}".format(wavpath, build_frq, len(features)))
+    report.elapsed = time.perf_counter() - start
+    logger.info("prebuild {} files, {} frq, {} features, {} skipped, {} failed. {:.2f} files/s, {:.2f} audio-sec/s".format(
+        report.built, report.frqs, report.features, report.skipped, len(report.failed),
+        report.files_per_sec, report.audio_sec_per_sec))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="音源のfrqファイルとworldの解析結果を事前に生成します。")
+    parser.add_argument("voice_dir", help="音源のルートパス")
+    parser.add_argument("--features", default="", help="解析結果を保存するFeatureCacheのフォルダ。省略した場合frqファイルだけを生成します。")
+    parser.add_argument("--fast", action="store_true", help="FastResamp用の解析結果を生成します。")
+    parser.add_argument("--force", action="store_true", help="生成済みのものも作り直します。")
+    parser.add_argument("--f0-method", choices=F0_METHODS, default="harvest", help="frqファイルのf0の推定方法")
+    parser.add_argument("--workers", type=int, default=0, help="並列に実行するworkerの数。0の場合CPUのコア数")
+    args = parser.parse_args()
+    logger: Logger = default_logger
+    resamp_class: type = PyRwu.Resamp
+    if args.fast:
+        from projects.Render import FastResamp
+        resamp_class = FastResamp
+    feature_cache: FeatureCache = FeatureCache(args.features, logger=logger) if args.features != "" else None
+    report: PrebuildReport = prebuild(VoiceBank(args.voice_dir, logger=logger), feature_cache=feature_cache,
+                                      resamp_class=resamp_class, force=args.force, workers=args.workers,
+                                      f0_method=args.f0_method, logger=logger)
+    if feature_cache is not None:
+        feature_cache.close()
+    if len(report.failed) != 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
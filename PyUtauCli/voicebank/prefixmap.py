@@ -1,6 +1,7 @@
 ﻿import os.path
 
 import common.convert_notenum as convert_notenum
+import common.textfile as textfile
 
 
 class MapRecord:
@@ -42,9 +43,25 @@ class MapRecord:
 
 class PrefixMap:
     '''prefix.mapのデータを扱います。
+
+    Attributes
+    ----------
+    revision: int
+        | loadのたびに増える値。
+        | VoiceBankのエイリアスのキャッシュが、変更を検出するために使用します。
+
+    encoding: str, default ""
+        | 最後に読み込んだprefix.mapのデコードに使用した文字コード。
+        | common.textfile.decodeの返す名前です。
     '''
     _key: list = [i for i in range(24, 108)]
     _values: dict = {}
+    _revision: int = 0
+    encoding: str = ""
+
+    @property
+    def revision(self) -> int:
+        return self._revision
 
     def __init__(self, dirpath: str = ""):
         '''
@@ -60,6 +77,7 @@ class PrefixMap:
         UnicodeDecodeError
             load実行時ファイルがcp932でもutf-8でもなかった場合
         '''
+        self._values = {}
         for i in self._key:
             self._values[i] = MapRecord(convert_notenum.toStr(i) + "\t\t")
         if dirpath != "":
@@ -95,15 +113,10 @@ class PrefixMap:
             raise FileNotFoundError("{} is not found.".format(filepath))
 
         try:
-            with open(filepath, "r", encoding="cp932") as fr:
-                lines = fr.read().replace("\r", "").split("\n")
-        except:
-            try:
-                with open(filepath, "r", encoding="utf-8") as fr:
-                    lines = fr.read().replace("\r", "").split("\n")
-            except UnicodeDecodeError as e:
-                e.reason = "can't read prefix.map. because required character encoding is utf-8 or cp932"
-                raise e
+            lines, self.encoding = textfile.read_lines(filepath)
+        except UnicodeDecodeError as e:
+            e.reason = "can't read prefix.map. because required character encoding is utf-8 or cp932"
+            raise e
 
         for line in lines:
             if line == "":
@@ -111,6 +124,7 @@ class PrefixMap:
             if "\t" not in line:
                 continue
             self._values[convert_notenum.toInt(line.split("\t")[0])] = MapRecord(line)
+        self._revision += 1
 
     def save(self, dirpath: str, filename: str = "prefix.map", encoding: str = "cp932"):
         '''
@@ -0,0 +1,243 @@
+﻿'''registry
+
+| 複数のRenderで共有するVoiceBankを、音源フォルダのパスごとに保持します。
+
+'''
+
+import os
+import os.path
+import time
+import threading
+from collections import OrderedDict
+from logging import Logger
+
+import settings.logger as mylogger
+from .voicebank import VoiceBank
+from .index import get_sources
+
+
+default_logger = mylogger.get_logger(__name__, False)
+
+
+class _Entry:
+    '''
+    VoiceBankRegistryが保持する1音源分のデータ
+    '''
+    vb: VoiceBank
+    sources: dict
+    checked: float
+    records: int
+
+    def __init__(self, vb: VoiceBank, sources: dict, records: int):
+        self.vb = vb
+        self.sources = sources
+        self.checked = time.monotonic()
+        self.records = records
+
+
+class VoiceBankRegistry:
+    '''
+    | 音源フォルダの実パスをkeyとして、読み込み済みのVoiceBankを共有します。
+    | 元のファイルが変更された場合は読み込み直し、保持する原音設定の合計行数が上限を超えた場合は、最後に使用した日時が古いものから破棄します。
+    | getは複数のスレッドから同時に呼び出せます。
+    | 音源の読み込みや変更の確認は音源ごとのロックで行うため、ある音源の読み込み中も、他の音源は待たずに返します。
+
+    | 返すVoiceBankは他の呼出し元と共有されるため、読み取り専用として扱い、closeしないでください。
+    | 破棄や読み込み直しで保持しなくなったVoiceBankは、registryがcloseします。
+
+    Attributes
+    ----------
+    max_records: int
+        保持する音源のoto.iniの合計行数の上限。メモリ使用量の目安として使用します。
+
+    check_interval: float
+        同じ音源のファイルの変更を確認する間隔(秒)
+
+    hits: int
+        getで読み込み済みの音源を返した回数
+
+    misses: int
+        getで音源を読み込んだ回数。変更による読み込み直しを含みます。
+    '''
+    _banks: OrderedDict
+    _lock: threading.Lock
+    _key_locks: dict
+    _max_records: int
+    _check_interval: float
+    _use_index: bool
+    _hits: int
+    _misses: int
+
+    @property
+    def max_records(self) -> int:
+        return self._max_records
+
+    @property
+    def check_interval(self) -> float:
+        return self._check_interval
+
+    @property
+    def hits(self) -> int:
+        return self._hits
+
+    @property
+    def misses(self) -> int:
+        return self._misses
+
+    def __init__(self, *, max_records: int = 500000, check_interval: float = 1.0, use_index: bool = False, logger: Logger = None):
+        '''
+        Parameters
+        ----------
+        max_records: int, default 500000
+            保持する音源のoto.iniの合計行数の上限。直前に使用した音源は上限を超えても保持します。
+
+        check_interval: float, default 1.0
+            | 同じ音源のファイルの変更を確認する間隔(秒)
+            | 0の場合、getのたびに確認します。
+
+        use_index: bool, default False
+            Trueの場合、音源の読み込みにVoiceBankIndexを使用します。
+        '''
+        self.logger = logger or default_logger
+        self._banks = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._max_records = max_records
+        self._check_interval = check_interval
+        self._use_index = use_index
+        self._hits = 0
+        self._misses = 0
+
+    def __len__(self) -> int:
+        return len(self._banks)
+
+    def __contains__(self, dirpath: str) -> bool:
+        return os.path.realpath(dirpath) in self._banks
+
+    def get(self, dirpath: str) -> VoiceBank:
+        '''
+        dirpathのVoiceBankを返します。読み込み済みでないか、ファイルが変更されていれば読み込みます。
+
+        Parameters
+        ----------
+        dirpath: str
+            音源のルートパス
+
+        Returns
+        -------
+        vb: VoiceBank
+
+        Raises
+        ------
+        FileNotFoundError
+            指定したフォルダが見つからなかったとき
+
+        ValueError
+            指定したフォルダが音源フォルダではなかったとき
+        '''
+        key: str = os.path.realpath(dirpath)
+        with self._lock:
+            entry: _Entry = self._banks.get(key)
+            if entry is not None and not self._is_check_due(entry):
+                self._banks.move_to_end(key)
+                self._hits += 1
+                return entry.vb
+            key_lock: threading.Lock = self._key_locks.setdefault(key, threading.Lock())
+        # ファイルの確認と読み込みは、同じ音源を要求した呼出し元だけを待たせる
+        with key_lock:
+            with self._lock:
+                entry = self._banks.get(key)
+            if entry is not None and not self._is_changed(key, entry):
+                with self._lock:
+                    if key in self._banks:
+                        self._banks.move_to_end(key)
+                    self._hits += 1
+                return entry.vb
+            if entry is not None:
+                self.logger.info("{} is changed. reloading".format(key))
+            sources: dict = get_sources(key)
+            vb: VoiceBank = VoiceBank(key, logger=self.logger, use_index=self._use_index)
+            with self._lock:
+                self._misses += 1
+                replaced: _Entry = self._banks.pop(key, None)
+                self._banks[key] = _Entry(vb, sources, vb.oto.records() if hasattr(vb, "_oto") else 0)
+                evicted: list = self._evict()
+            for old in evicted + ([replaced] if replaced is not None else []):
+                old.vb.close()
+            return vb
+
+    def _is_check_due(self, entry: _Entry) -> bool:
+        '''
+        前回の確認からcheck_interval以上経過しているか判定します。
+
+        Parameters
+        ----------
+        entry: _Entry
+
+        Returns
+        -------
+        is_due: bool
+        '''
+        return time.monotonic() - entry.checked >= self._check_interval
+
+    def _is_changed(self, key: str, entry: _Entry) -> bool:
+        '''
+        check_interval以上経過していれば、音源のファイルが変更されたか確認します。
+
+        Parameters
+        ----------
+        key: str
+            音源フォルダの実パス
+
+        entry: _Entry
+
+        Returns
+        -------
+        is_changed: bool
+        '''
+        if not self._is_check_due(entry):
+            return False
+        entry.checked = time.monotonic()
+        return get_sources(key) != entry.sources
+
+    def _evict(self) -> list:
+        '''
+        合計行数がmax_recordsを超えている間、最後に使用した日時が古い音源を破棄します。self._lockを取得して呼び出してください。
+
+        Returns
+        -------
+        evicted: list of _Entry
+            破棄した音源。呼出し元がロックの外でcloseします。
+        '''
+        evicted: list = []
+        total: int = sum([entry.records for entry in self._banks.values()])
+        while total > self._max_records and len(self._banks) > 1:
+            key, entry = self._banks.popitem(last=False)
+            total -= entry.records
+            evicted.append(entry)
+            self.logger.info("{} is evicted".format(key))
+        return evicted
+
+    def remove(self, dirpath: str):
+        '''
+        dirpathのVoiceBankを破棄します。
+
+        Parameters
+        ----------
+        dirpath: str
+            音源のルートパス
+        '''
+        with self._lock:
+            entry: _Entry = self._banks.pop(os.path.realpath(dirpath), None)
+        if entry is not None:
+            entry.vb.close()
+
+    def clear(self):
+        '''
+        全てのVoiceBankを破棄します。
+        '''
+        with self._lock:
+            entries: list = list(self._banks.values())
+            self._banks.clear()
+        for entry in entries:
+            entry.vb.close()
@@ -1,5 +1,7 @@
 ﻿import os
 import os.path
+import sqlite3
+import threading
 import traceback
 from logging import Logger
 
@@ -7,6 +9,7 @@ import settings.logger as mylogger
 from .character import Character
 from .prefixmap import PrefixMap
 from .oto import Oto
+from .index import VoiceBankIndex
 
 
 default_logger = mylogger.get_logger(__name__, False)
@@ -29,12 +32,30 @@ class VoiceBank:
 
     prefix: PrefixMap
         prefix.map
+
+    alias_hits: int
+        resolve_aliasがキャッシュ済みの結果を返した回数
+
+    alias_misses: int
+        resolve_aliasが原音設定を参照してエイリアスを特定した回数
+
+    Notes
+    -----
+    | resolve_alias,precompute_aliases,clear_aliasesは複数のスレッドから同時に呼び出せます。
+    | キャッシュとalias_hits,alias_missesの更新は、VoiceBankごとのロックで保護します。
+
+    | use_indexで読み込んだ場合はインデックスを開いたままにするため、使い終わったらcloseするか、with文で使用してください。
     '''
 
     _dirpath: str
     _character: Character
     _oto: Oto
     _prefix: PrefixMap
+    _aliases: dict
+    _alias_revision: tuple
+    _alias_hits: int
+    _alias_misses: int
+    _alias_lock: threading.Lock
 
     @property
     def dirpath(self) -> str:
@@ -52,13 +73,26 @@ class VoiceBank:
     def prefix(self) -> PrefixMap:
         return self._prefix
 
-    def __init__(self, dirpath: str, *, logger:Logger = None):
+    @property
+    def alias_hits(self) -> int:
+        return self._alias_hits
+
+    @property
+    def alias_misses(self) -> int:
+        return self._alias_misses
+
+    def __init__(self, dirpath: str, *, logger:Logger = None, use_index: bool = False):
         '''
         Parameters
         ----------
         dirpath: str
             音源のルートパス
 
+        use_index: bool, default False
+            | Trueの場合、音源フォルダ内のVoiceBankIndexを使用します。
+            | インデックスが有効であればcharacter.txt、oto.ini、prefix.mapを解析せずに読み込み、
+            | 無効であれば解析した結果でインデックスを作り直します。
+
         Raises
         ------
         FileNotFoundErrod
@@ -72,6 +106,13 @@ class VoiceBank:
             self.logger.error("{} is not utau voicebanks".format(dirpath))
             raise ValueError("{} is not utau voicebanks".format(dirpath))
         self._dirpath = dirpath
+        self._aliases = {}
+        self._alias_revision = None
+        self._alias_hits = 0
+        self._alias_misses = 0
+        self._alias_lock = threading.Lock()
+        if use_index and self._load_index():
+            return
         try:
             self._character = Character(dirpath)
             self.logger.info("character.txt is loaded. VBName:{}".format(self._character.name))
@@ -92,6 +133,177 @@ class VoiceBank:
             self.logger.warn(traceback.format_exception_only(type(e), e)[0].rstrip('\n'))
             self._prefix = PrefixMap()
 
+        if use_index and hasattr(self, "_oto"):
+            self._build_index()
+
+    def __enter__(self) -> "VoiceBank":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        '''
+        | インデックスなど、参照中のファイルを閉じます。
+        | close後に原音設定を参照した場合は、インデックスを開き直します。
+        '''
+        if hasattr(self, "_oto"):
+            self._oto.close()
+
+    def _load_index(self) -> bool:
+        '''
+        有効なVoiceBankIndexがあれば、そこからcharacter、oto、prefixを読み込みます。
+
+        Returns
+        -------
+        loaded: bool
+            インデックスから読み込んだ場合True
+        '''
+        index: VoiceBankIndex = None
+        try:
+            index = VoiceBankIndex(self._dirpath, logger=self.logger)
+            if not index.is_valid():
+                index.close()
+                return False
+            self._character = index.load_character()
+            self._prefix = index.load_prefix()
+            self._oto = index.load_oto()
+        except (OSError, sqlite3.Error) as e:
+            self.logger.warn(traceback.format_exception_only(type(e), e)[0].rstrip('\n'))
+            if index is not None:
+                index.close()
+            return False
+        self.logger.info("{} is loaded. VBName:{}".format(index.path, self._character.name))
+        return True
+
+    def _build_index(self):
+        '''
+        解析したcharacter、oto、prefixでVoiceBankIndexを作り直します。書き込めない場合は警告のみ出力します。
+        '''
+        try:
+            index: VoiceBankIndex = VoiceBankIndex(self._dirpath, logger=self.logger)
+            index.build(self._character, self._oto, self._prefix)
+            index.close()
+        except (OSError, sqlite3.Error) as e:
+            self.logger.warn(traceback.format_exception_only(type(e), e)[0].rstrip('\n'))
+
+    def resolve_alias(self, lyric: str, notenum: int, no_prefix: bool = False) -> tuple:
+        '''
+        | 歌詞と音高からエイリアスと、そのwavファイルの音源ルートからの相対パスを特定します。
+        | 結果は(lyric, notenum, no_prefix)ごとにキャッシュし、oto.iniもしくはprefix.mapが読み込み直された場合は破棄します。
+        | prefix.mapのMapRecordを直接書き換えた場合は検出できないため、clear_aliasesを実行してください。
+
+        Parameters
+        ----------
+        lyric: str
+            歌詞
+
+        notenum: int
+            音高
+
+        no_prefix: bool, default False
+            Trueの場合、prefix.mapを参照しません。
+
+        Returns
+        -------
+        alias: str
+            一致する原音設定がない場合""
+
+        filename: str
+            一致する原音設定がない場合""
+        '''
+        key: tuple = (lyric, None if no_prefix else notenum, no_prefix)
+        with self._alias_lock:
+            self._check_alias_revision()
+            result: tuple = self._aliases.get(key)
+            if result is not None:
+                self._alias_hits += 1
+                return result
+            self._alias_misses += 1
+            aliases: dict = self._aliases
+        # 検索はロックの外で行う。同じkeyを同時に検索した場合は、同じ結果を2回書き込む
+        result = VoiceBank.find_alias(lyric, notenum, no_prefix, self._oto, self._prefix)
+        aliases[key] = result
+        return result
+
+    def precompute_aliases(self, lyrics: list):
+        '''
+        | lyricsの各歌詞について、prefix.mapの全ての音高のエイリアスを事前にキャッシュします。
+        | 事前の計算はalias_hits,alias_missesに含みません。
+
+        Parameters
+        ----------
+        lyrics: list of str
+            歌詞のリスト
+        '''
+        with self._alias_lock:
+            self._check_alias_revision()
+            aliases: dict = self._aliases
+        for lyric in lyrics:
+            for notenum in self._prefix._key:
+                key: tuple = (lyric, notenum, False)
+                if key not in aliases:
+                    aliases[key] = VoiceBank.find_alias(lyric, notenum, False, self._oto, self._prefix)
+            key = (lyric, None, True)
+            if key not in aliases:
+                aliases[key] = VoiceBank.find_alias(lyric, 0, True, self._oto, self._prefix)
+
+    def clear_aliases(self):
+        '''
+        resolve_aliasのキャッシュを破棄します。alias_hits,alias_missesは保持します。
+        '''
+        with self._alias_lock:
+            self._clear_aliases()
+
+    def _check_alias_revision(self):
+        '''
+        oto.iniもしくはprefix.mapが読み込み直されていれば、キャッシュを破棄します。self._alias_lockを取得して呼び出してください。
+        '''
+        if self._alias_revision != (self._oto._revision, self._prefix._revision):
+            self._clear_aliases()
+
+    def _clear_aliases(self):
+        # 検索中の呼出し元が古い辞書に書き込んでも影響しないよう、辞書を置き換える
+        self._aliases = {}
+        self._alias_revision = (self._oto._revision, self._prefix._revision)
+
+    @staticmethod
+    def find_alias(lyric: str, notenum: int, no_prefix: bool, oto: Oto, prefix: PrefixMap) -> tuple:
+        '''
+        | 歌詞、音高、prefix.mapを参照してエイリアスと、そのwavファイルの音源ルートからの相対パスを特定します。
+        | 一致する原音設定レコードが見つからない場合、("", "")を返します。
+
+        Parameters
+        ----------
+        lyric: str
+            歌詞
+
+        notenum: int
+            音高
+
+        no_prefix: bool
+            Trueの場合、prefix.mapを参照しません。
+
+        oto: Oto
+            原音設定ファイル
+
+        prefix: PrefixMap
+            エイリアスの推定に使用します。
+
+        Returns
+        -------
+        alias: str
+
+        filename: str
+        '''
+        if not no_prefix and oto.haskey(prefix[notenum].prefix + lyric + prefix[notenum].suffix):
+            alias: str = prefix[notenum].prefix + lyric + prefix[notenum].suffix
+        elif oto.haskey(lyric):
+            alias: str = lyric
+        else:
+            return "", ""
+        return alias, os.path.join(oto[alias].otopath, oto[alias].filename)
+
     @staticmethod
     def is_utau_voicebank(dirpath: str, *, logger:Logger = None) -> bool:
         '''